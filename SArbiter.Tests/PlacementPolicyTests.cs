@@ -0,0 +1,64 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using Xunit;
+
+namespace SArbiter.Tests
+{
+    public class PlacementPolicyTests
+    {
+        private static List<ArbiterTreeNode> MakeNodes(params uint[] shipCounts)
+        {
+            return shipCounts
+                .Select((count, i) => new ArbiterTreeNode(null, null, 0, $"http://node{i}/") { ShipCount = count })
+                .ToList();
+        }
+
+        [Fact]
+        public void LeastLoadedPicksMinimum()
+        {
+            var nodes = MakeNodes(5, 2, 7, 3);
+            Assert.Same(nodes[1], new LeastLoadedPlacement().Choose(nodes));
+        }
+
+        [Fact]
+        public void TwoChoicesBalances()
+        {
+            var nodes = MakeNodes(0, 0, 0, 0);
+            var policy = new TwoChoicesPlacement();
+            for (int i = 0; i < 400; i++)
+            {
+                policy.Choose(nodes).ShipCount++;
+            }
+            uint max = nodes.Max(node => node.ShipCount), min = nodes.Min(node => node.ShipCount);
+            Assert.True(max - min <= 10, $"Imbalance too high: {min}..{max}");
+        }
+
+        [Fact]
+        public void ReportedLoadUsesTickCost()
+        {
+            var nodes = MakeNodes(10, 10);
+            var policy = new ReportedLoadPlacement();
+
+            // Falls back to ship counts while reports are missing
+            nodes[1].ShipCount = 9;
+            Assert.Same(nodes[1], policy.Choose(nodes));
+
+            // Node 1 reported fewer ships but much slower ticks
+            nodes[0].HasLoadReport = nodes[1].HasLoadReport = true;
+            nodes[0].ReportedShipCount = 10; nodes[0].ReportedTickMs = 1.0;
+            nodes[1].ReportedShipCount = 9; nodes[1].ReportedTickMs = 20.0;
+            Assert.Same(nodes[0], policy.Choose(nodes));
+        }
+
+        [Fact]
+        public void CreateByName()
+        {
+            foreach (var name in PlacementPolicies.Names)
+            {
+                Assert.Equal(name, PlacementPolicies.Create(name).Name);
+            }
+            Assert.Null(PlacementPolicies.Create("nope"));
+        }
+    }
+}
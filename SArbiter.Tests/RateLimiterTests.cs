@@ -0,0 +1,49 @@
+using System;
+using Xunit;
+
+namespace SArbiter.Tests
+{
+    public class RateLimiterTests
+    {
+        [Fact]
+        public void BurstThenReject()
+        {
+            var limiter = new RateLimiter(
+                new RateLimiter.Limit() { Rate = 0.001, Burst = 3 },
+                new RateLimiter.Limit() { Rate = 0.0 });
+
+            for (int i = 0; i < 3; i++)
+            {
+                Assert.True(limiter.TryAcquireToken("spammer"));
+            }
+            Assert.False(limiter.TryAcquireToken("spammer"));
+            Assert.Equal(1, limiter.Rejected);
+
+            // Other ships are not affected
+            Assert.True(limiter.TryAcquireToken("innocent"));
+            // IP limit is disabled
+            for (int i = 0; i < 100; i++)
+            {
+                Assert.True(limiter.TryAcquireIp("127.0.0.1"));
+            }
+        }
+
+        [Fact]
+        public void ChangingLimitsAtRuntime()
+        {
+            var limiter = new RateLimiter(
+                new RateLimiter.Limit() { Rate = 0.001, Burst = 1 },
+                new RateLimiter.Limit() { Rate = 0.0 });
+
+            Assert.True(limiter.TryAcquireToken("ship"));
+            Assert.False(limiter.TryAcquireToken("ship"));
+
+            limiter.TokenLimit = new RateLimiter.Limit() { Rate = 0.0 };
+            Assert.True(limiter.TryAcquireToken("ship"));
+
+            limiter.IpLimit = new RateLimiter.Limit() { Rate = 0.001, Burst = 1 };
+            Assert.True(limiter.TryAcquireIp("10.0.0.1"));
+            Assert.False(limiter.TryAcquireIp("10.0.0.1"));
+        }
+    }
+}
@@ -0,0 +1,85 @@
+using System;
+using SShared;
+using Xunit;
+
+namespace SArbiter.Tests
+{
+    public class RebalancerTests
+    {
+        private static ArbiterTreeNode MakeNode(string name, uint reportedShips, params uint[] quadrantShips)
+        {
+            var node = new ArbiterTreeNode(null, null, 0, $"http://{name}/")
+            {
+                HasLoadReport = true,
+                ReportedShipCount = reportedShips,
+                ShipCount = reportedShips,
+            };
+            if (quadrantShips.Length == 4)
+            {
+                node.QuadrantShipCounts = quadrantShips;
+            }
+            return node;
+        }
+
+        private static Rebalancer MakeRebalancer(ArbiterTreeNode root)
+        {
+            root.MakeRoot(new Quad(0.0, 0.0, 1000.0));
+            var routingTable = new RoutingTable(null, root, 1000.0);
+            return new Rebalancer(routingTable) { SplitShips = 100, MergeShips = 10 };
+        }
+
+        [Fact]
+        public void SplitsDensestFreeQuadrant()
+        {
+            var root = MakeNode("root", 150, 10, 20, 100, 5);
+            root.SetChild(Quadrant.SW, MakeNode("child", 30));
+            var rebalancer = MakeRebalancer(root);
+
+            ArbiterTreeNode parent;
+            Quadrant quadrant;
+            Assert.True(rebalancer.ChooseSplit(out parent, out quadrant));
+            Assert.Same(root, parent);
+            // SW is taken already
+            Assert.Equal(Quadrant.NE, quadrant);
+        }
+
+        [Fact]
+        public void DoesNotSplitWithoutFreshReport()
+        {
+            var root = MakeNode("root", 150, 50, 50, 50, 0);
+            var rebalancer = MakeRebalancer(root);
+
+            root.HasLoadReport = false;
+            Assert.False(rebalancer.ChooseSplit(out _, out _));
+
+            root.HasLoadReport = true;
+            root.ReportedShipCount = 99;
+            Assert.False(rebalancer.ChooseSplit(out _, out _));
+
+            rebalancer.SplitTickMs = 5.0;
+            root.ReportedTickMs = 6.0;
+            Assert.True(rebalancer.ChooseSplit(out _, out _));
+        }
+
+        [Fact]
+        public void MergesOnlyWithHeadroom()
+        {
+            var root = MakeNode("root", 45);
+            var leaf = MakeNode("leaf", 3);
+            root.SetChild(Quadrant.NW, leaf);
+            var rebalancer = MakeRebalancer(root);
+
+            // 45 + 3 < 100 / 2
+            Assert.Same(leaf, rebalancer.ChooseMerge());
+
+            // ...but the parent would be too close to splitting again
+            root.ReportedShipCount = 48;
+            Assert.Null(rebalancer.ChooseMerge());
+
+            // The root itself is never merged
+            leaf.ReportedShipCount = 50;
+            root.ReportedShipCount = 0;
+            Assert.Null(rebalancer.ChooseMerge());
+        }
+    }
+}
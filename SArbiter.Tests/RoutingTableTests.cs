@@ -0,0 +1,129 @@
+using System;
+using System.Linq;
+using SShared;
+using Xunit;
+
+namespace SArbiter.Tests
+{
+    public class RoutingTableTests
+    {
+        [Fact]
+        public void ShipsByNodeFollowsAssignments()
+        {
+            var nodeA = new ArbiterTreeNode(null, null, 0, "http://a/");
+            var nodeB = new ArbiterTreeNode(null, null, 0, "http://b/");
+            var routingTable = new RoutingTable(null, nodeA, 1000.0);
+
+            routingTable.AssignShip("ship1", nodeA);
+            routingTable.AssignShip("ship2", nodeA);
+            routingTable.AssignShip("ship3", nodeB);
+            Assert.Equal(new[] { "ship1", "ship2" }, routingTable.ShipsOf(nodeA).OrderBy(token => token).ToArray());
+
+            // Moving one ship
+            routingTable.AssignShip("ship1", nodeB);
+            Assert.Equal(new[] { "ship2" }, routingTable.ShipsOf(nodeA).ToArray());
+            Assert.Equal(new[] { "ship1", "ship3" }, routingTable.ShipsOf(nodeB).OrderBy(token => token).ToArray());
+            Assert.Equal(1u, nodeA.ShipCount);
+            Assert.Equal(2u, nodeB.ShipCount);
+
+            // Moving all ships of a node
+            routingTable.ReassignAllShips(nodeB, nodeA);
+            Assert.Empty(routingTable.ShipsOf(nodeB));
+            Assert.Equal(new[] { "ship1", "ship2", "ship3" }, routingTable.ShipsOf(nodeA).OrderBy(token => token).ToArray());
+            Assert.Same(nodeA, routingTable.NodeWithShip("ship3"));
+            Assert.Equal(3u, nodeA.ShipCount);
+            Assert.Equal(0u, nodeB.ShipCount);
+
+            Assert.Same(nodeA, routingTable.UnassignShip("ship2"));
+            Assert.Null(routingTable.NodeWithShip("ship2"));
+            Assert.Equal(2, routingTable.ShipsOf(nodeA).Count);
+
+            // Ships left without a node are not indexed
+            routingTable.ReassignAllShips(nodeA, null);
+            Assert.Empty(routingTable.ShipsOf(nodeA));
+            Assert.Equal(0u, nodeA.ShipCount);
+            Assert.Null(routingTable.NodeWithShip("ship1"));
+        }
+
+        [Fact]
+        public void DisconnectsAreBatchedByNode()
+        {
+            var nodeA = new ArbiterTreeNode(null, null, 0, "http://a/");
+            var nodeB = new ArbiterTreeNode(null, null, 0, "http://b/");
+            var routingTable = new RoutingTable(null, nodeA, 1000.0);
+
+            routingTable.AssignShip("ship-0001", nodeA);
+            routingTable.AssignShip("ship-0002", nodeA);
+            routingTable.AssignShip("ship-0003", nodeB);
+            routingTable.AssignShip("ship-0004", null);
+
+            Assert.True(routingTable.RemoveShip("ship-0001"));
+            Assert.True(routingTable.RemoveShip("ship-0002"));
+            Assert.True(routingTable.RemoveShip("ship-0003"));
+            Assert.True(routingTable.RemoveShip("ship-0004"));
+            Assert.False(routingTable.RemoveShip("ship-0001"));
+
+            var batches = routingTable.TakePendingDisconnects();
+            Assert.Equal(3, batches.Count);
+            Assert.Equal(new[] { "ship-0001", "ship-0002" }, batches.Single(batch => batch.Item1 == nodeA).Item2);
+            Assert.Equal(new[] { "ship-0003" }, batches.Single(batch => batch.Item1 == nodeB).Item2);
+            // Ships with no known node are broadcast
+            Assert.Equal(new[] { "ship-0004" }, batches.Single(batch => batch.Item1 == null).Item2);
+
+            Assert.Empty(routingTable.TakePendingDisconnects());
+        }
+
+        [Fact]
+        public void RestoredShipsAreDroppedFromTheirPreviousNode()
+        {
+            var nodeA = new ArbiterTreeNode(null, null, 0, "http://a/");
+            var nodeB = new ArbiterTreeNode(nodeA, Quadrant.SE, 1, null, null, 0, "http://b/");
+            nodeA.SetChild(Quadrant.SE, nodeB);
+            var routingTable = new RoutingTable(null, nodeA, 1000.0);
+
+            routingTable.AssignShip("ship-0001", nodeA);
+            routingTable.RestoreShips(nodeB, new[] { "ship-0001", "ship-0002" });
+            Assert.Same(nodeB, routingTable.NodeWithShip("ship-0001"));
+            Assert.Same(nodeB, routingTable.NodeWithShip("ship-0002"));
+            var batch = Assert.Single(routingTable.TakePendingDisconnects());
+            Assert.Same(nodeA, batch.Item1);
+            Assert.Equal(new[] { "ship-0001" }, batch.Item2);
+
+            // A spare has no region: its ships are routed to the root until it hands them over
+            var spare = new ArbiterTreeNode(null, null, 0, "http://c/");
+            routingTable.SpareNodes.Add(spare);
+            routingTable.RestoreShips(spare, new[] { "ship-0002", "ship-0003" });
+            Assert.Same(nodeA, routingTable.NodeWithShip("ship-0002"));
+            Assert.Same(nodeA, routingTable.NodeWithShip("ship-0003"));
+            Assert.Empty(routingTable.ShipsOf(spare));
+            batch = Assert.Single(routingTable.TakePendingDisconnects());
+            Assert.Same(nodeB, batch.Item1);
+            Assert.Equal(new[] { "ship-0002" }, batch.Item2);
+        }
+
+        [Fact]
+        public void ScenarioShipsArePlacedByPosition()
+        {
+            var nodeA = new ArbiterTreeNode(null, null, 0, "http://a/");
+            var nodeB = new ArbiterTreeNode(nodeA, Quadrant.SE, 1, null, null, 0, "http://b/");
+            nodeA.SetChild(Quadrant.SE, nodeB);
+            var routingTable = new RoutingTable(null, nodeA, 1000.0);
+
+            ArbiterTreeNode node;
+            var inB = new Quad(nodeB.Bounds.CentreX, nodeB.Bounds.CentreY, 1.0);
+            var token1 = routingTable.PlaceShipAt(null, inB, out node);
+            Assert.Same(nodeB, node);
+            Assert.Same(nodeB, routingTable.NodeWithShip(token1));
+
+            var outsideB = new Quad(-3.0 * nodeB.Bounds.CentreX, -3.0 * nodeB.Bounds.CentreY, 1.0);
+            Assert.Equal("given-token-0001", routingTable.PlaceShipAt("given-token-0001", outsideB, out node));
+            Assert.Same(nodeA, node);
+
+            // Known ships stay where they are
+            Assert.Equal(token1, routingTable.PlaceShipAt(token1, outsideB, out node));
+            Assert.Same(nodeB, node);
+            Assert.Equal(1u, nodeA.ShipCount);
+            Assert.Equal(1u, nodeB.ShipCount);
+        }
+    }
+}
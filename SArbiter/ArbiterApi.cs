@@ -1,7 +1,10 @@
 using System;
 using System.Linq;
+using System.Collections.Generic;
+using System.Diagnostics;
 using System.Net.Http;
 using System.Threading.Tasks;
+using Newtonsoft.Json.Linq;
 using SShared;
 using Messages = SShared.Messages;
 
@@ -11,35 +14,104 @@ namespace SArbiter
     {
         public RoutingTable RoutingTable { get; set; }
 
-        public ArbiterApi(RoutingTable routingTable)
+        public RateLimiter RateLimiter { get; set; }
+
+        /// <summary>
+        /// How long to wait for an SGame node to create a connecting ship before trying another node.
+        /// </summary>
+        public TimeSpan ConnectTimeout { get; set; } = TimeSpan.FromSeconds(2.0);
+
+        /// <summary>
+        /// How many nodes to try to connect a ship to before giving up.
+        /// </summary>
+        public int ConnectAttempts { get; set; } = 3;
+
+        /// <summary>
+        /// The metrics of the arbiter (see the `metrics` route).
+        /// </summary>
+        public Metrics Metrics { get; private set; }
+
+        Histogram _connectWait;
+
+        Counter _connectRetries, _connectFailures;
+
+        public ArbiterApi(RoutingTable routingTable, RateLimiter rateLimiter, Metrics metrics)
         {
             this.RoutingTable = routingTable;
+            this.RateLimiter = rateLimiter;
+            this.Metrics = metrics;
+
+            _connectWait = metrics.Histogram("sarbiter_connect_wait_seconds", "Time spent waiting for an SGame node to create a connecting ship.");
+            _connectRetries = metrics.Counter("sarbiter_connect_retries_total", "Connects retried on another node after a node did not answer in time.");
+            _connectFailures = metrics.Counter("sarbiter_connect_failures_total", "Connects rejected because no node could take the ship.");
+        }
+
+        /// <summary>
+        /// Handles a "metrics" REST request, returning the metrics of the arbiter in the Prometheus text format.
+        /// </summary>
+        [ApiRoute("metrics")]
+        public Task GetMetrics(ApiResponse response, ApiData data)
+        {
+            return response.SendText(Metrics.Render(), "text/plain; version=0.0.4; charset=utf-8");
         }
 
         [ApiRoute("connect")]
         [ApiParam("token", typeof(string), Optional = true)]
         public async Task ConnectPlayer(ApiResponse response, ApiData data)
         {
-            ArbiterTreeNode shipNode = null;
-            var token = RoutingTable.AddNewShip(out shipNode, (string)data.Json["token"]);
-            response.Data["token"] = token;
+            var requestedToken = data.Arg<string>("token");
+            var failedNodes = new List<ArbiterTreeNode>();
+            for (int attempt = 0; attempt < ConnectAttempts; attempt++)
+            {
+                ArbiterTreeNode shipNode;
+                bool reserved;
+                var token = RoutingTable.PlaceShip(requestedToken, failedNodes, out shipNode, out reserved);
+                if (token == null)
+                {
+                    break;
+                }
 
-            Console.Error.WriteLine("connect {0} to {1}", token, shipNode.ApiUrl);
-            Console.Error.WriteLine("expecting a message from {0}...", shipNode.Peer.EndPoint);
+                Console.Error.WriteLine("connect {0} to {1}", token, shipNode.ApiUrl);
+                if (!reserved)
+                {
+                    Console.Error.WriteLine("expecting a message from {0}...", shipNode.Peer.EndPoint);
 
-            // TODO: Add a timeout in case we don't get a reply from the SGame node?
-            await new MessageWaiter<Messages.ShipConnected>(RoutingTable.BusMaster, shipNode.Peer, (msg) => msg.Token == token).Wait;
+                    // (Start waiting before sending, so that the reply cannot be missed)
+                    var connectWaiter = RoutingTable.BusMaster.Waiters.Wait<Messages.ShipConnected>(shipNode.Peer, token, ConnectTimeout);
+                    long waitStart = Stopwatch.GetTimestamp();
+                    RoutingTable.BusMaster.SendMessage(new Messages.ShipConnected() { Token = token }, shipNode.Peer);
+                    bool created = await connectWaiter != null;
+                    _connectWait.ObserveSince(waitStart);
+                    if (!created)
+                    {
+                        _connectRetries.Increment();
+                        Console.Error.WriteLine("{0} did not create {1} in time, trying another node", shipNode.ApiUrl, token);
+                        // (Also tells the slow node to drop the ship if it creates it late)
+                        RoutingTable.RemoveShip(token);
+                        failedNodes.Add(shipNode);
+                        continue;
+                    }
+                }
 
-            Console.Error.WriteLine("OK: {0} is on {1}", token, shipNode.ApiUrl);
+                Console.Error.WriteLine("OK: {0} is on {1}", token, shipNode.ApiUrl);
+                _ = RoutingTable.RefillReservations(shipNode);
 
-            await response.Send(200);
+                response.Data["token"] = token;
+                await response.Send(200);
+                return;
+            }
+
+            _connectFailures.Increment();
+            response.Data["error"] = "No SGame node could take the ship, try again later";
+            response.AddHeader("Retry-After", "1");
+            await response.Send(503);
         }
 
         [ApiRoute("disconnect")]
         [ApiParam("token", typeof(string))]
         public async Task DisconnectPlayer(ApiResponse response, ApiData data)
         {
-            var token = (string)data.Json["token"];
+            var token = data.Arg<string>("token");
 
             Console.Error.WriteLine("disconnect {0}", token);
 
@@ -49,7 +121,7 @@ namespace SArbiter
 
         internal async Task ForwardRequest(string route, ApiResponse response, ApiData data)
         {
-            var token = (string)data.Json["token"];
+            var token = data.Arg<string>("token");
             var node = RoutingTable.NodeWithShip(token);
             if (node == null)
             {
@@ -85,10 +157,16 @@ namespace SArbiter
         public Task Shoot(ApiResponse response, ApiData data) => ForwardRequest("shoot", response, data);
 
 #if DEBUG
+        /// <summary>
+        /// How long to wait for the nodes to acknowledge a sudo call.
+        /// </summary>
+        static readonly TimeSpan SUDO_TIMEOUT = TimeSpan.FromSeconds(5.0);
+
         [ApiRoute("sudo")]
         public async Task Sudo(ApiResponse response, ApiData data)
         {
             var message = new Messages.Sudo() { Json = data.Json };
+            var sudoKey = message.Json.ToString(Newtonsoft.Json.Formatting.None);
             if (data.Json.ContainsKey("token"))
             {
                 var shipToken = (string)data.Json["token"];
@@ -99,23 +177,210 @@ namespace SArbiter
                     await response.Send(500);
                     return;
                 }
-                RoutingTable.BusMaster.SendMessage(message, shipNode.Peer, LiteNetLib.DeliveryMethod.ReliableOrdered);
-
                 // Wait for the sudo to bounce back from the node
-                await new MessageWaiter<Messages.Sudo>(RoutingTable.BusMaster, shipNode.Peer,
-                    (sudo) => sudo.Json.Equals(message.Json)).Wait;
+                var waiter = RoutingTable.BusMaster.Waiters.Wait<Messages.Sudo>(shipNode.Peer, sudoKey, SUDO_TIMEOUT);
+                RoutingTable.BusMaster.SendMessage(message, shipNode.Peer, LiteNetLib.DeliveryMethod.ReliableOrdered);
+                await waiter;
             }
             else
             {
-                RoutingTable.BusMaster.BroadcastMessage(message);
-
                 // Wait for ALL nodes to ACK sudo...
                 var waiters = RoutingTable.BusMaster.Host.ConnectedPeerList
-                    .Select((peer) => new MessageWaiter<Messages.Sudo>(RoutingTable.BusMaster, peer, (sudo) => sudo.Json.Equals(message.Json)).Wait)
+                    .Select((peer) => RoutingTable.BusMaster.Waiters.Wait<Messages.Sudo>(peer, sudoKey, SUDO_TIMEOUT))
                     .ToArray();
-                Task.WaitAll(waiters);
+                RoutingTable.BusMaster.BroadcastMessage(message);
+                await Task.WhenAll(waiters);
+            }
+
+            await response.Send(200);
+        }
+
+        /// <summary>
+        /// Maximum number of ships sent to a node in a single `LoadShips` message.
+        /// </summary>
+        const int SCENARIO_BATCH_SIZE = 256;
+
+        /// <summary>
+        /// How long to wait for the nodes to load a scenario.
+        /// </summary>
+        static readonly TimeSpan SCENARIO_TIMEOUT = TimeSpan.FromSeconds(30.0);
+
+        /// <summary>
+        /// Parses a ship of a scenario: all attributes are optional, and angles are in degrees (like in the REST API).
+        /// Missing attributes get their defaults (for new ships); `given` is set to the ones that were not missing.
+        /// </summary>
+        static Spaceship ScenarioShip(JObject json, out Messages.LoadShips.Fields given)
+        {
+            var fields = Messages.LoadShips.Fields.None;
+            double? Field(string name, Messages.LoadShips.Fields field)
+            {
+                var value = (double?)json[name];
+                if (value.HasValue)
+                {
+                    fields |= field;
+                }
+                return value;
             }
 
+            var ship = new Spaceship((string)json["token"]);
+            ship.Pos = new Vector2(Field("posX", Messages.LoadShips.Fields.PosX) ?? ship.Pos.X,
+                Field("posY", Messages.LoadShips.Fields.PosY) ?? ship.Pos.Y);
+            ship.Velocity = new Vector2(Field("velX", Messages.LoadShips.Fields.VelX) ?? 0.0,
+                Field("velY", Messages.LoadShips.Fields.VelY) ?? 0.0);
+            ship.Area = Field("area", Messages.LoadShips.Fields.Area) ?? ship.Area;
+            ship.Energy = Field("energy", Messages.LoadShips.Fields.Energy) ?? ship.Energy;
+            ship.ShieldDir = MathUtils.Deg2Rad(Field("shieldDir", Messages.LoadShips.Fields.ShieldDir) ?? 0.0);
+            ship.ShieldWidth = MathUtils.Deg2Rad(Field("shieldWidth", Messages.LoadShips.Fields.ShieldWidth) ?? 0.0);
+            ship.KillReward = ship.Area;
+            given = fields;
+            return ship;
+        }
+
+        /// <summary>
+        /// Debug-only route to set up a whole scenario at once, instead of one `connect` and several `sudo` calls per ship.
+        /// `ships` is a list of `{token, posX, posY, velX, velY, area, energy, shieldDir, shieldWidth}` (all optional):
+        /// each ship is created on the node managing its position (or, if its token is known, only the given attributes
+        /// are updated on its node), and all nodes load their ships in parallel. Responds with the `tokens` of the ships,
+        /// in order.
+        /// </summary>
+        [ApiRoute("scenario")]
+        [ApiParam("ships", typeof(JArray))]
+        public async Task Scenario(ApiResponse response, ApiData data)
+        {
+            var ships = new List<Spaceship>();
+            var givenByShip = new Dictionary<Spaceship, Messages.LoadShips.Fields>();
+            foreach (var json in data.Arg<JArray>("ships"))
+            {
+                if (!(json is JObject shipJson))
+                {
+                    response.Data["error"] = "`ships` must be a list of objects";
+                    await response.Send(500);
+                    return;
+                }
+                var ship = ScenarioShip(shipJson, out var given);
+                ships.Add(ship);
+                givenByShip[ship] = given;
+            }
+
+            var shipsByNode = new Dictionary<ArbiterTreeNode, List<Spaceship>>();
+            foreach (var ship in ships)
+            {
+                ArbiterTreeNode node;
+                ship.Token = RoutingTable.PlaceShipAt(ship.Token, ship.Bounds, out node);
+                if (ship.Token == null)
+                {
+                    response.Data["error"] = "No SGame nodes to load the scenario on";
+                    await response.Send(503);
+                    return;
+                }
+                List<Spaceship> nodeShips;
+                if (!shipsByNode.TryGetValue(node, out nodeShips))
+                {
+                    nodeShips = shipsByNode[node] = new List<Spaceship>();
+                }
+                nodeShips.Add(ship);
+            }
+
+            // Send all batches (in order on each node), then wait for all of them
+            var waiters = new List<Task<Messages.LoadShips>>();
+            foreach (var nodeShips in shipsByNode)
+            {
+                for (int start = 0; start < nodeShips.Value.Count; start += SCENARIO_BATCH_SIZE)
+                {
+                    var batch = new Messages.LoadShips()
+                    {
+                        BatchId = Guid.NewGuid().ToString(),
+                        Ships = nodeShips.Value.Skip(start).Take(SCENARIO_BATCH_SIZE).ToArray(),
+                    };
+                    batch.Given = batch.Ships.Select(ship => givenByShip[ship]).ToArray();
+                    waiters.Add(RoutingTable.BusMaster.Waiters.Wait<Messages.LoadShips>(nodeShips.Key.Peer, batch.BatchId, SCENARIO_TIMEOUT));
+                    RoutingTable.BusMaster.SendMessage(batch, nodeShips.Key.Peer, LiteNetLib.DeliveryMethod.ReliableOrdered);
+                }
+            }
+            var replies = await Task.WhenAll(waiters);
+            Console.Error.WriteLine("Scenario: loaded {0} ships on {1} nodes", ships.Count, shipsByNode.Count);
+
+            if (replies.Any(reply => reply == null))
+            {
+                response.Data["error"] = "Some SGame nodes did not load their ships in time";
+                await response.Send(504);
+                return;
+            }
+            response.Data["tokens"] = new JArray(ships.Select(ship => ship.Token));
+            await response.Send(200);
+        }
+
+        /// <summary>
+        /// Debug-only route to read and change the rate limits at runtime; a rate of 0 disables the relative limit.
+        /// Responds with the (new) limits.
+        /// </summary>
+        [ApiRoute("ratelimit")]
+        [ApiParam("tokenRate", typeof(double), Optional = true)]
+        [ApiParam("tokenBurst", typeof(double), Optional = true)]
+        [ApiParam("ipRate", typeof(double), Optional = true)]
+        [ApiParam("ipBurst", typeof(double), Optional = true)]
+        public async Task RateLimit(ApiResponse response, ApiData data)
+        {
+            var tokenLimit = RateLimiter.TokenLimit;
+            if (data.HasArg("tokenRate") || data.HasArg("tokenBurst"))
+            {
+                tokenLimit.Rate = data.Arg<double>("tokenRate", tokenLimit.Rate);
+                tokenLimit.Burst = data.Arg<double>("tokenBurst", tokenLimit.Burst);
+                RateLimiter.TokenLimit = tokenLimit;
+            }
+
+            var ipLimit = RateLimiter.IpLimit;
+            if (data.HasArg("ipRate") || data.HasArg("ipBurst"))
+            {
+                ipLimit.Rate = data.Arg<double>("ipRate", ipLimit.Rate);
+                ipLimit.Burst = data.Arg<double>("ipBurst", ipLimit.Burst);
+                RateLimiter.IpLimit = ipLimit;
+            }
+
+            Console.Error.WriteLine("Rate limits: per-token {0}, per-IP {1}", tokenLimit, ipLimit);
+
+            response.Data["tokenRate"] = tokenLimit.Rate;
+            response.Data["tokenBurst"] = tokenLimit.Burst;
+            response.Data["ipRate"] = ipLimit.Rate;
+            response.Data["ipBurst"] = ipLimit.Burst;
+            response.Data["rejected"] = RateLimiter.Rejected;
+            await response.Send(200);
+        }
+
+        /// <summary>
+        /// Debug-only route to read and change the placement policy for new ships at runtime.
+        /// Responds with the (new) policy and the number of ships on each node.
+        /// </summary>
+        [ApiRoute("placement")]
+        [ApiParam("policy", typeof(string), Optional = true)]
+        public async Task Placement(ApiResponse response, ApiData data)
+        {
+            if (data.HasArg("policy"))
+            {
+                var policy = PlacementPolicies.Create(data.Arg<string>("policy"));
+                if (policy == null)
+                {
+                    response.Data["error"] = $"Unknown placement policy (valid: {string.Join(", ", PlacementPolicies.Names)})";
+                    await response.Send(500);
+                    return;
+                }
+                RoutingTable.PlacementPolicy = policy;
+                Console.Error.WriteLine("Placement policy: {0}", policy.Name);
+            }
+
+            response.Data["policy"] = RoutingTable.PlacementPolicy.Name;
+            var shipCounts = new Newtonsoft.Json.Linq.JObject();
+            lock (RoutingTable)
+            {
+                if (RoutingTable.RootNode != null)
+                {
+                    foreach (var node in RoutingTable.RootNode.Traverse().Cast<ArbiterTreeNode>())
+                    {
+                        shipCounts[node.ApiUrl] = node.ShipCount;
+                    }
+                }
+            }
+            response.Data["shipCounts"] = shipCounts;
             await response.Send(200);
         }
 #endif
@@ -24,8 +24,36 @@ namespace SArbiter
 
         public uint BusPort { get; set; }
 
+        /// <summary>
+        /// Number of ships managed by the node, as known by the arbiter (kept up to date by the `RoutingTable`).
+        /// </summary>
         public uint ShipCount { get; set; }
 
+        /// <summary>
+        /// True if the node has reported its load at least once (see `Messages.NodeLoad`).
+        /// </summary>
+        public bool HasLoadReport { get; set; }
+
+        /// <summary>
+        /// Number of ships the node reported managing in its last load report.
+        /// </summary>
+        public uint ReportedShipCount { get; set; }
+
+        /// <summary>
+        /// Average time (in milliseconds) the node reported to spend on each game tick in its last load report.
+        /// </summary>
+        public double ReportedTickMs { get; set; }
+
+        /// <summary>
+        /// Number of new ships placed on this node since its last load report.
+        /// </summary>
+        public uint ShipsPlacedSinceReport { get; set; }
+
+        /// <summary>
+        /// Number of ships the node reported in each of its quadrants that have no child node, indexed by `Quadrant`.
+        /// </summary>
+        public uint[] QuadrantShipCounts { get; set; } = new uint[4];
+
         public ArbiterTreeNode(NetPeer peer, IPAddress busAddress, uint busPort, string apiUrl)
             : base(new Quad(0.0, 0.0, Double.MaxValue), 0)
         {
@@ -46,12 +74,29 @@ namespace SArbiter
             this.ShipCount = 0;
         }
 
-        public override Task<List<ArbiterTreeItem>> CheckRangeLocal(Quad range) => throw new NotImplementedException();
+        /// <summary>
+        /// The arbiter does not track where ships are (only how many each node has), so it never finds any items.
+        /// </summary>
+        public override Task<List<ArbiterTreeItem>> QueryLocal(SpatialQuery query) => Task.FromResult(new List<ArbiterTreeItem>());
 
         public void MakeRoot(Quad bounds)
         {
             this.Parent = null;
             this.Bounds = bounds;
         }
+
+        /// <summary>
+        /// Forgets this node's parent (after it was removed from the tree) and any load it reported while in the tree.
+        /// </summary>
+        public void Detach()
+        {
+            this.Parent = null;
+            this.ShipCount = 0;
+            this.HasLoadReport = false;
+            this.ReportedShipCount = 0;
+            this.ReportedTickMs = 0.0;
+            this.ShipsPlacedSinceReport = 0;
+            this.QuadrantShipCounts = new uint[4];
+        }
     }
 }
@@ -0,0 +1,149 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+
+namespace SArbiter
+{
+    /// <summary>
+    /// Chooses the SGame node a newly-connected ship is placed on.
+    /// </summary>
+    internal interface IPlacementPolicy
+    {
+        /// <summary>
+        /// Name of the policy (as passed to `--placement`).
+        /// </summary>
+        string Name { get; }
+
+        /// <summary>
+        /// Picks one of the (non-empty list of) candidate nodes.
+        /// </summary>
+        ArbiterTreeNode Choose(IReadOnlyList<ArbiterTreeNode> candidates);
+    }
+
+    /// <summary>
+    /// Places ships on a uniformly random node.
+    /// </summary>
+    internal class RandomPlacement : IPlacementPolicy
+    {
+        Random _random = new Random();
+
+        public string Name => "random";
+
+        public ArbiterTreeNode Choose(IReadOnlyList<ArbiterTreeNode> candidates)
+        {
+            return candidates[_random.Next(candidates.Count)];
+        }
+    }
+
+    /// <summary>
+    /// Places ships on the node that manages the fewest ships (ties broken randomly).
+    /// </summary>
+    internal class LeastLoadedPlacement : IPlacementPolicy
+    {
+        Random _random = new Random();
+
+        public string Name => "least-loaded";
+
+        public ArbiterTreeNode Choose(IReadOnlyList<ArbiterTreeNode> candidates)
+        {
+            ArbiterTreeNode best = null;
+            int ties = 0;
+            foreach (var node in candidates)
+            {
+                if (best == null || node.ShipCount < best.ShipCount)
+                {
+                    best = node;
+                    ties = 1;
+                }
+                else if (node.ShipCount == best.ShipCount && _random.Next(++ties) == 0)
+                {
+                    // (Reservoir sampling among the tied nodes)
+                    best = node;
+                }
+            }
+            return best;
+        }
+    }
+
+    /// <summary>
+    /// "Power of two choices": samples two random nodes and places the ship on the one managing fewer ships.
+    /// Nearly as balanced as `LeastLoadedPlacement`, but avoids herding all concurrent connects onto the same node.
+    /// </summary>
+    internal class TwoChoicesPlacement : IPlacementPolicy
+    {
+        Random _random = new Random();
+
+        public string Name => "two-choices";
+
+        public ArbiterTreeNode Choose(IReadOnlyList<ArbiterTreeNode> candidates)
+        {
+            if (candidates.Count == 1)
+            {
+                return candidates[0];
+            }
+            int first = _random.Next(candidates.Count);
+            int second = (first + 1 + _random.Next(candidates.Count - 1)) % candidates.Count;
+            var a = candidates[first];
+            var b = candidates[second];
+            return b.ShipCount < a.ShipCount ? b : a;
+        }
+    }
+
+    /// <summary>
+    /// Places ships on the node with the lowest estimated tick cost, based on the load the nodes report through the
+    /// bus (see `Messages.NodeLoad`) plus the ships placed on them since their last report.
+    /// Falls back to `LeastLoadedPlacement` while some node has not reported its load yet.
+    /// </summary>
+    internal class ReportedLoadPlacement : IPlacementPolicy
+    {
+        LeastLoadedPlacement _fallback = new LeastLoadedPlacement();
+
+        public string Name => "reported";
+
+        /// <summary>
+        /// Estimated tick cost (in milliseconds) of a node after placing one more ship on it.
+        /// </summary>
+        static double EstimatedTickCost(ArbiterTreeNode node)
+        {
+            double costPerShip = node.ReportedTickMs / Math.Max(1u, node.ReportedShipCount);
+            return node.ReportedTickMs + (node.ShipsPlacedSinceReport + 1) * costPerShip;
+        }
+
+        public ArbiterTreeNode Choose(IReadOnlyList<ArbiterTreeNode> candidates)
+        {
+            if (candidates.Any(node => !node.HasLoadReport))
+            {
+                return _fallback.Choose(candidates);
+            }
+            return candidates.Aggregate((best, node) => EstimatedTickCost(node) < EstimatedTickCost(best) ? node : best);
+        }
+    }
+
+    /// <summary>
+    /// Creates placement policies by name.
+    /// </summary>
+    internal static class PlacementPolicies
+    {
+        static readonly Dictionary<string, Func<IPlacementPolicy>> FACTORIES = new Dictionary<string, Func<IPlacementPolicy>>()
+        {
+            { "random", () => new RandomPlacement() },
+            { "least-loaded", () => new LeastLoadedPlacement() },
+            { "two-choices", () => new TwoChoicesPlacement() },
+            { "reported", () => new ReportedLoadPlacement() },
+        };
+
+        /// <summary>
+        /// The names of all available policies.
+        /// </summary>
+        public static IEnumerable<string> Names => FACTORIES.Keys;
+
+        /// <summary>
+        /// Creates the policy with the given name; returns null if there is no such policy.
+        /// </summary>
+        public static IPlacementPolicy Create(string name)
+        {
+            Func<IPlacementPolicy> factory;
+            return FACTORIES.TryGetValue(name, out factory) ? factory() : null;
+        }
+    }
+}
@@ -38,6 +38,102 @@ namespace SArbiter
         /// </summary>
         [Option("tickrate", Default = 100u, Required = false, HelpText = "Tickrate of the arbiter, i.e. how often it polls for bus events per second.")]
         public uint Tickrate { get; set; }
+
+        /// <summary>
+        /// Maximum size of a REST request body.
+        /// </summary>
+        [Option("max-body-size", Default = ApiRequestReader.DEFAULT_MAX_BODY_SIZE, Required = false, HelpText = "Maximum size of a REST request body, in bytes; larger requests are rejected with HTTP 413.")]
+        public int MaxBodySize { get; set; }
+
+        /// <summary>
+        /// Per-ship request rate limit.
+        /// </summary>
+        [Option("token-rate", Default = 0.0, Required = false, HelpText = "Maximum average requests per second per ship token (0 to disable).")]
+        public double TokenRate { get; set; }
+
+        /// <summary>
+        /// Per-ship request burst size.
+        /// </summary>
+        [Option("token-burst", Default = 200.0, Required = false, HelpText = "Maximum burst of requests per ship token.")]
+        public double TokenBurst { get; set; }
+
+        /// <summary>
+        /// Per-IP request rate limit.
+        /// </summary>
+        [Option("ip-rate", Default = 0.0, Required = false, HelpText = "Maximum average requests per second per client IP (0 to disable).")]
+        public double IpRate { get; set; }
+
+        /// <summary>
+        /// Per-IP request burst size.
+        /// </summary>
+        [Option("ip-burst", Default = 1000.0, Required = false, HelpText = "Maximum burst of requests per client IP.")]
+        public double IpBurst { get; set; }
+
+        /// <summary>
+        /// Placement policy for new ships.
+        /// </summary>
+        [Option("placement", Default = "two-choices", Required = false, HelpText = "Policy used to choose the SGame node new ships are placed on: random, least-loaded, two-choices or reported.")]
+        public string Placement { get; set; }
+
+        /// <summary>
+        /// Whether to split and merge quadtree nodes based on their load.
+        /// </summary>
+        [Option("rebalance", Default = false, Required = false, HelpText = "Keep SGame nodes connecting after the root as spares, and attach/detach them where the reported load requires.")]
+        public bool Rebalance { get; set; }
+
+        /// <summary>
+        /// Ship count at which a node is split.
+        /// </summary>
+        [Option("split-ships", Default = 200u, Required = false, HelpText = "With --rebalance, split a node when it reports at least this many ships.")]
+        public uint SplitShips { get; set; }
+
+        /// <summary>
+        /// Tick time at which a node is split.
+        /// </summary>
+        [Option("split-tick-ms", Default = 0.0, Required = false, HelpText = "With --rebalance, split a node when its average tick takes at least this many milliseconds (0 to disable).")]
+        public double SplitTickMs { get; set; }
+
+        /// <summary>
+        /// Ship count at which a leaf is merged into its parent.
+        /// </summary>
+        [Option("merge-ships", Default = 20u, Required = false, HelpText = "With --rebalance, merge a leaf node into its parent when it reports at most this many ships.")]
+        public uint MergeShips { get; set; }
+
+        /// <summary>
+        /// Timeout for an SGame node to create a connecting ship.
+        /// </summary>
+        [Option("connect-timeout", Default = 2000u, Required = false, HelpText = "Milliseconds to wait for an SGame node to create a connecting ship before trying another node.")]
+        public uint ConnectTimeout { get; set; }
+
+        /// <summary>
+        /// Number of nodes to try when connecting a ship.
+        /// </summary>
+        [Option("connect-attempts", Default = 3, Required = false, HelpText = "Number of SGame nodes to try to connect a ship to before failing with HTTP 503.")]
+        public int ConnectAttempts { get; set; }
+
+        /// <summary>
+        /// Size of the batches of ship tokens reserved on the nodes.
+        /// </summary>
+        [Option("reserve-batch", Default = 0, Required = false, HelpText = "Reserve ship tokens on the SGame nodes in batches of this size, so that connects do not wait for a node (0 to disable).")]
+        public int ReserveBatch { get; set; }
+
+        /// <summary>
+        /// Whether to poll the event bus from a dedicated thread.
+        /// </summary>
+        [Option("bus-thread", Default = false, Required = false, HelpText = "Handle bus messages on a dedicated thread as soon as they arrive, instead of once per tick.")]
+        public bool BusThread { get; set; }
+
+        /// <summary>
+        /// File to record the spans of traced requests to.
+        /// </summary>
+        [Option("trace-file", Default = null, Required = false, HelpText = "Record timed spans of traced requests (see the X-Request-Id header) to this file, one JSON object per line.")]
+        public string TraceFile { get; set; }
+
+        /// <summary>
+        /// File to record the REST requests served to.
+        /// </summary>
+        [Option("record", Default = null, Required = false, HelpText = "Record all REST requests served (with their whole bodies and timings) to this file, to be replayed by tests/replay.py.")]
+        public string RecordFile { get; set; }
     }
 
     class Program : IDisposable
@@ -50,29 +146,124 @@ namespace SArbiter
 
         private Router<ArbiterApi> _apiRouter = null;
 
+        /// <summary>
+        /// The metrics of the arbiter (see the `metrics` route).
+        /// </summary>
+        private Metrics _metrics = new Metrics();
+
+        private Counter _throttled = null;
+
+        /// <summary>
+        /// Records the spans of traced requests; null if tracing is disabled.
+        /// </summary>
+        private Tracer _tracer = null;
+
+        /// <summary>
+        /// Records the REST requests served; null if recording is disabled.
+        /// </summary>
+        private RequestRecorder _recorder = null;
+
         private Timer _updateTimer = null;
 
+        private int _maxBodySize;
+
+        private RateLimiter _rateLimiter = null;
+
+        /// <summary>
+        /// Routes that are never rate-limited by ship token.
+        /// (Disconnecting must always be possible, and debug routes must not interfere with tests.)
+        /// </summary>
+        private static readonly HashSet<string> TOKEN_LIMIT_EXEMPT_ROUTES = new HashSet<string>()
+        {
+            "disconnect",
+#if DEBUG
+            "sudo",
+            "ratelimit",
+#endif
+        };
+
+        /// <summary>
+        /// How often to drop idle rate limiter buckets, in number of updates.
+        /// </summary>
+        private const int RATE_LIMITER_CLEANUP_PERIOD = 1000;
+
+        private int _updatesSinceCleanup = 0;
+
+        /// <summary>
+        /// How long to wait for a newly-connected SGame node to send its configuration.
+        /// </summary>
+        private static readonly TimeSpan NODE_CONFIG_TIMEOUT = TimeSpan.FromSeconds(10.0);
+
+        /// <summary>
+        /// Splits and merges nodes; null if rebalancing is disabled.
+        /// </summary>
+        private Rebalancer _rebalancer = null;
+
+        private int _rebalancePeriod;
+
+        private int _updatesSinceRebalance = 0;
+
         internal Program(CmdLineOptions options)
         {
+            _maxBodySize = options.MaxBodySize;
             _busMaster = new NetNode(listenPort: (int)options.BusPort);
             _busPort = options.BusPort;
             // TODO: Command-line flag to change universe size
             _routingTable = new RoutingTable(_busMaster, null, 1 << 31);
-            _apiRouter = new Router<ArbiterApi>(new ArbiterApi(_routingTable));
+            _routingTable.PlacementPolicy = PlacementPolicies.Create(options.Placement);
+            if (_routingTable.PlacementPolicy == null)
+            {
+                throw new ArgumentException($"Unknown placement policy: {options.Placement} (valid: {string.Join(", ", PlacementPolicies.Names)})");
+            }
+            if (options.Rebalance)
+            {
+                _routingTable.KeepSpares = true;
+                _rebalancer = new Rebalancer(_routingTable)
+                {
+                    SplitShips = options.SplitShips,
+                    SplitTickMs = options.SplitTickMs,
+                    MergeShips = options.MergeShips,
+                };
+                // Rebalance about once a second
+                _rebalancePeriod = (int)Math.Max(1u, options.Tickrate);
+            }
+            _rateLimiter = new RateLimiter(
+                new RateLimiter.Limit() { Rate = options.TokenRate, Burst = options.TokenBurst },
+                new RateLimiter.Limit() { Rate = options.IpRate, Burst = options.IpBurst });
+            _routingTable.ReserveBatchSize = options.ReserveBatch;
+            _routingTable.ReplyTimeout = TimeSpan.FromMilliseconds(options.ConnectTimeout);
+            _tracer = options.TraceFile != null ? new Tracer(options.TraceFile, options.ApiUrl) : null;
+            _recorder = options.RecordFile != null ? new RequestRecorder(options.RecordFile) : null;
+            _busMaster.RegisterMetrics(_metrics);
+            _routingTable.RegisterMetrics(_metrics);
+            _throttled = _metrics.Counter("sarbiter_requests_throttled_total", "REST requests rejected by the rate limiter.");
+            _apiRouter = new Router<ArbiterApi>(new ArbiterApi(_routingTable, _rateLimiter, _metrics)
+            {
+                ConnectTimeout = TimeSpan.FromMilliseconds(options.ConnectTimeout),
+                ConnectAttempts = options.ConnectAttempts,
+            }, _metrics);
 
             _busMaster.PeerConnectedEvent += OnSGameConnected;
             _busMaster.PeerDisconnectedEvent += OnSGameDisconnected;
             _busMaster.PacketProcessor.Events<SShared.Messages.TransferShip>().OnMessageReceived += OnShipTransferRequest;
+            _busMaster.PacketProcessor.Events<SShared.Messages.NodeLoad>().OnMessageReceived += OnNodeLoad;
 
             _updateTimer = new Timer(1000.0 / options.Tickrate);
             _updateTimer.AutoReset = true;
             _updateTimer.Elapsed += Update;
+
+            if (options.BusThread)
+            {
+                _busMaster.StartBusThread();
+            }
         }
 
         public void Dispose()
         {
             _updateTimer.Dispose();
             _busMaster.Dispose();
+            _tracer?.Dispose();
+            _recorder?.Dispose();
         }
 
         private void OnShipTransferRequest(NetPeer sender, SShared.Messages.TransferShip msg)
@@ -89,29 +280,75 @@ namespace SArbiter
             }
 
         }
+        private void OnNodeLoad(NetPeer sender, SShared.Messages.NodeLoad msg)
+        {
+            _routingTable.UpdateNodeLoad(sender, msg);
+        }
+
         private void OnSGameConnected(NetPeer peer)
         {
-            var newNodeInfoWaiter = new MessageWaiter<SShared.Messages.NodeConfig>(_busMaster, peer).Wait;
-            newNodeInfoWaiter.Wait();
-            var newNodeInfo = newNodeInfoWaiter.Result;
+            // (Must not block: the node's configuration arrives through the bus, possibly on this very thread)
+            _ = AddSGameNode(peer);
+        }
+
+        private async Task AddSGameNode(NetPeer peer)
+        {
+            var newNodeInfo = await _busMaster.Waiters.Wait<SShared.Messages.NodeConfig>(peer, null, NODE_CONFIG_TIMEOUT);
+            if (newNodeInfo == null)
+            {
+                Console.Error.WriteLine(">>> SGame node {0} did not send its configuration; ignoring it <<<", peer.EndPoint);
+                return;
+            }
 
             var newNode = _routingTable.AddSGameNode(peer, newNodeInfo.BusAddress, newNodeInfo.BusPort, newNodeInfo.ApiUrl);
-            Console.Error.WriteLine(">>> SGame node {0} (API: {1}) connected at {2} <<<", peer.EndPoint, newNode.ApiUrl, newNode.Path());
+            bool isSpare = _routingTable.IsSpare(newNode);
+            if (isSpare)
+            {
+                Console.Error.WriteLine(">>> SGame node {0} (API: {1}) connected as a spare <<<", peer.EndPoint, newNode.ApiUrl);
+            }
+            else
+            {
+                Console.Error.WriteLine(">>> SGame node {0} (API: {1}) connected at {2} <<<", peer.EndPoint, newNode.ApiUrl, newNode.Path());
+            }
+            if (newNodeInfo.Tokens.Length > 0)
+            {
+                _routingTable.RestoreShips(newNode, newNodeInfo.Tokens);
+                Console.Error.WriteLine(">>> SGame node {0} restored {1} ships <<<", peer.EndPoint, newNodeInfo.Tokens.Length);
+            }
 
             // IMPORTANT: Send the whole network topology (as of now) to the new node (so that it can build a routing table for itself)
-            foreach (var treeNode in _routingTable.RootNode.Traverse().Cast<ArbiterTreeNode>())
+            lock (_routingTable)
             {
-                if (treeNode.Peer == peer) continue;
+                foreach (var treeNode in _routingTable.RootNode.Traverse().Cast<ArbiterTreeNode>())
+                {
+                    if (treeNode.Peer == peer) continue;
 
-                var otherNodeConfig = new SShared.Messages.NodeConfig()
+                    var otherNodeConfig = new SShared.Messages.NodeConfig()
+                    {
+                        BusAddress = treeNode.BusAddress,
+                        BusPort = treeNode.BusPort,
+                        Bounds = treeNode.Bounds,
+                        Path = treeNode.Path(),
+                        ApiUrl = treeNode.ApiUrl,
+                    };
+                    _busMaster.SendMessage(otherNodeConfig, peer, DeliveryMethod.ReliableOrdered);
+                }
+            }
+
+            if (isSpare)
+            {
+                if (newNodeInfo.Tokens.Length > 0)
                 {
-                    BusAddress = treeNode.BusAddress,
-                    BusPort = treeNode.BusPort,
-                    Bounds = treeNode.Bounds,
-                    Path = treeNode.Path(),
-                    ApiUrl = treeNode.ApiUrl,
-                };
-                _busMaster.SendMessage(otherNodeConfig, peer, DeliveryMethod.ReliableOrdered);
+                    // A spare has no region to manage its restored ships in: have it hand them to the tree (which it
+                    // now knows of), as retiring nodes do
+                    _busMaster.SendMessage(new SShared.Messages.NodeOffline()
+                    {
+                        Path = newNode.Path(),
+                        ApiUrl = newNode.ApiUrl,
+                    }, peer, DeliveryMethod.ReliableOrdered);
+                }
+                // Spares are announced once they get attached to the tree
+                return;
             }
 
             // IMPORTANT: Broadcast that the new node is online and where it is (incl. the new node itself to tell it its path)
@@ -129,7 +366,7 @@ namespace SArbiter
         private void OnSGameDisconnected(NetPeer peer, DisconnectInfo info)
         {
             Console.Error.WriteLine(">>> SGame node {0} disconnected ({1}) <<<", peer.EndPoint, info.Reason);
-            _routingTable.RemoveSGameNode(peer).Wait();
+            _ = _routingTable.RemoveSGameNode(peer);
         }
 
         private async Task<bool> ProcessRequest(HttpListenerContext context)
@@ -142,32 +379,108 @@ namespace SArbiter
                 return false;
             }
 #endif
+            double received = Tracer.Now;
             ApiResponse response = new ApiResponse(context.Response);
+            string traceId = Tracer.ParseTraceId(context.Request.Headers[Tracer.HEADER]);
+            if (traceId == null && _tracer != null)
+            {
+                traceId = Tracer.NewTraceId();
+            }
+            if (traceId != null)
+            {
+                // (Clients following a redirect are expected to pass the header on to the SGame node)
+                response.AddHeader(Tracer.HEADER, traceId);
+            }
 
-            var body = new StreamReader(context.Request.InputStream).ReadToEnd();
-            JObject json = new JObject();
-            if (body.Length > 0)
+            // Admission control (1): per-client, before even reading the body
+            if (!_rateLimiter.TryAcquireIp(context.Request.RemoteEndPoint?.Address.ToString()))
             {
-                try
-                {
-                    json = JObject.Parse(body);
-                }
-                catch (JsonReaderException exc)
-                {
-                    response.Data["error"] = "Malformed request: " + exc.Message;
-                    await response.Send(500);
-                    return true;
-                }
+                await SendTooManyRequests(response);
+                RequestDone(route, received, traceId, null, response);
+                return true;
             }
 
-            ApiData data = new ApiData(json);
+            // (Recordings need the whole body, as it is what the client will send to the SGame node after a redirect)
+            var body = await ApiRequestReader.Read(context.Request.InputStream, context.Request.ContentLength64,
+                _maxBodySize, _recorder != null ? ApiRequestFields.All : _apiRouter.RequestFields(route));
+            if (body.Status != ApiRequestStatus.Ok)
+            {
+                response.Data["error"] = body.Error;
+                await response.Send(body.Status == ApiRequestStatus.TooLarge ? 413 : 500);
+                RequestDone(route, received, traceId, null, response);
+                return true;
+            }
+
+            // Admission control (2): per-ship, before routing the request anywhere
+            // (Only for ships that exist, so that made-up tokens cannot create buckets; those were limited by IP above)
+            if (!TOKEN_LIMIT_EXEMPT_ROUTES.Contains(route)
+                && body.Json.TryGetValue("token", out JToken token) && token.Type == JTokenType.String
+                && _routingTable.NodeWithShip((string)token) != null
+                && !_rateLimiter.TryAcquireToken((string)token))
+            {
+                await SendTooManyRequests(response);
+                RequestDone(route, received, traceId, body.Json, response);
+                return true;
+            }
+
+            ApiData data = new ApiData(body.Json) { TraceId = traceId };
             await _apiRouter.Dispatch(route, response, data);
+            RequestDone(route, received, traceId, body.Json, response);
             return true;
         }
 
+        /// <summary>
+        /// Traces and records (if enabled) a request received at `received` and answered by `response`.
+        /// </summary>
+        private void RequestDone(string route, double received, string traceId, JObject body, ApiResponse response)
+        {
+            _tracer?.RecordSince(traceId, "arbiter.request", received, $"{route} ({response.Status})");
+            _recorder?.Record(received, route, body, response);
+        }
+
+        /// <summary>
+        /// Processes a request, completing `exitRequested` if it asks the arbiter to stop.
+        /// </summary>
+        private async Task HandleRequest(HttpListenerContext context, TaskCompletionSource<bool> exitRequested)
+        {
+            try
+            {
+                if (!await ProcessRequest(context))
+                {
+                    exitRequested.TrySetResult(true);
+                }
+            }
+            catch (Exception exc)
+            {
+                Console.Error.WriteLine("Error while processing {0}: {1}", context.Request.RawUrl, exc);
+                context.Response.Abort();
+            }
+        }
+
+        private async Task SendTooManyRequests(ApiResponse response)
+        {
+            _throttled.Increment();
+            response.Data["error"] = "Too many requests";
+            response.AddHeader("Retry-After", "1");
+            await response.Send(429);
+        }
+
         private void Update(object sender, ElapsedEventArgs e)
         {
             _busMaster.Update();
+            _routingTable.FlushDisconnects();
+
+            if (++_updatesSinceCleanup >= RATE_LIMITER_CLEANUP_PERIOD)
+            {
+                _rateLimiter.RemoveIdleBuckets();
+                _updatesSinceCleanup = 0;
+            }
+
+            if (_rebalancer != null && ++_updatesSinceRebalance >= _rebalancePeriod)
+            {
+                _rebalancer.Step();
+                _updatesSinceRebalance = 0;
+            }
         }
 
         public async Task ServerLoop(SArbiter.CmdLineOptions options)
@@ -188,13 +501,18 @@ namespace SArbiter
                 _updateTimer.Start();
                 Console.Error.WriteLine("Listening...");
 
-                bool keepGoing = true;
-                do
+                // Requests are handled concurrently, so that slow ones (e.g. connects waiting for an SGame node)
+                // do not hold up the others
+                var exitRequested = new TaskCompletionSource<bool>(TaskCreationOptions.RunContinuationsAsynchronously);
+                while (true)
                 {
-                    var task = await listener.GetContextAsync();
-                    keepGoing = await ProcessRequest(task);
+                    var contextTask = listener.GetContextAsync();
+                    if (await Task.WhenAny(contextTask, exitRequested.Task) != contextTask)
+                    {
+                        break;
+                    }
+                    _ = HandleRequest(contextTask.Result, exitRequested);
                 }
-                while (keepGoing);
 
                 listener.Stop();
                 _updateTimer.Stop();
@@ -0,0 +1,160 @@
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Linq;
+
+namespace SArbiter
+{
+    /// <summary>
+    /// Token-bucket rate limiter for incoming REST requests, keyed both by ship token and by client IP.
+    /// All methods are thread-safe.
+    /// </summary>
+    internal class RateLimiter
+    {
+        /// <summary>
+        /// A token bucket; refilled lazily when it is accessed.
+        /// </summary>
+        class Bucket
+        {
+            /// <summary>
+            /// Available request tokens.
+            /// </summary>
+            public double Tokens;
+
+            /// <summary>
+            /// Time of the last refill, in seconds.
+            /// </summary>
+            public double LastRefill;
+        }
+
+        /// <summary>
+        /// The rate and burst size of a set of buckets.
+        /// </summary>
+        public struct Limit
+        {
+            /// <summary>
+            /// Requests per second that are allowed on average; zero or less disables the limit.
+            /// </summary>
+            public double Rate;
+
+            /// <summary>
+            /// Maximum number of requests that can be made in a burst (= bucket capacity).
+            /// </summary>
+            public double Burst;
+
+            public bool Enabled => Rate > 0.0;
+
+            public override string ToString() => Enabled ? $"{Rate}/s (burst {Burst})" : "disabled";
+        }
+
+        /// <summary>
+        /// Buckets idle for longer than this (in seconds) are full again and can be dropped.
+        /// </summary>
+        const double IDLE_BUCKET_TIMEOUT = 60.0;
+
+        Stopwatch _clock = Stopwatch.StartNew();
+
+        Dictionary<string, Bucket> _tokenBuckets = new Dictionary<string, Bucket>();
+
+        Dictionary<string, Bucket> _ipBuckets = new Dictionary<string, Bucket>();
+
+        Limit _tokenLimit, _ipLimit;
+
+        /// <summary>
+        /// The limit for requests made with a given ship token.
+        /// </summary>
+        public Limit TokenLimit
+        {
+            get { lock (this) return _tokenLimit; }
+            set { lock (this) { _tokenLimit = value; _tokenBuckets.Clear(); } }
+        }
+
+        /// <summary>
+        /// The limit for requests made from a given client IP.
+        /// </summary>
+        public Limit IpLimit
+        {
+            get { lock (this) return _ipLimit; }
+            set { lock (this) { _ipLimit = value; _ipBuckets.Clear(); } }
+        }
+
+        /// <summary>
+        /// Total number of requests rejected so far.
+        /// </summary>
+        public long Rejected { get; private set; }
+
+        public RateLimiter(Limit tokenLimit, Limit ipLimit)
+        {
+            _tokenLimit = tokenLimit;
+            _ipLimit = ipLimit;
+        }
+
+        /// <summary>
+        /// Consumes a request token from the bucket of the given client IP; returns false if the client is over its limit.
+        /// </summary>
+        public bool TryAcquireIp(string ip) => TryAcquire(_ipBuckets, ref _ipLimit, ip);
+
+        /// <summary>
+        /// Consumes a request token from the bucket of the given ship token; returns false if the ship is over its limit.
+        /// </summary>
+        public bool TryAcquireToken(string token) => TryAcquire(_tokenBuckets, ref _tokenLimit, token);
+
+        bool TryAcquire(Dictionary<string, Bucket> buckets, ref Limit limit, string key)
+        {
+            if (key == null)
+            {
+                return true;
+            }
+
+            lock (this)
+            {
+                if (!limit.Enabled)
+                {
+                    return true;
+                }
+
+                double now = _clock.Elapsed.TotalSeconds;
+                Bucket bucket;
+                if (!buckets.TryGetValue(key, out bucket))
+                {
+                    bucket = buckets[key] = new Bucket() { Tokens = limit.Burst, LastRefill = now };
+                }
+                else
+                {
+                    bucket.Tokens = Math.Min(limit.Burst, bucket.Tokens + (now - bucket.LastRefill) * limit.Rate);
+                    bucket.LastRefill = now;
+                }
+
+                if (bucket.Tokens < 1.0)
+                {
+                    Rejected++;
+                    return false;
+                }
+                bucket.Tokens -= 1.0;
+                return true;
+            }
+        }
+
+        /// <summary>
+        /// Drops the buckets that have not been used in a while (i.e. that would be full anyway).
+        /// </summary>
+        public void RemoveIdleBuckets()
+        {
+            lock (this)
+            {
+                double now = _clock.Elapsed.TotalSeconds;
+                foreach (var buckets in new[] { _tokenBuckets, _ipBuckets })
+                {
+                    var idleKeys = buckets
+                        .Where(kv => now - kv.Value.LastRefill > IDLE_BUCKET_TIMEOUT)
+                        .Select(kv => kv.Key)
+                        .ToList();
+                    foreach (var key in idleKeys)
+                    {
+                        buckets.Remove(key);
+                    }
+                }
+            }
+        }
+    }
+}
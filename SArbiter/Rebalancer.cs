@@ -0,0 +1,141 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using SShared;
+
+namespace SArbiter
+{
+    /// <summary>
+    /// Splits overloaded quadtree nodes by attaching spare SGame nodes under them, and merges underloaded leaves
+    /// back into their parents (returning them to the spare pool), based on the load the nodes report.
+    /// </summary>
+    internal class Rebalancer
+    {
+        const uint MaxDepth = SShared.QuadTreeNode<SShared.Spaceship>.MaxDepth;
+
+        RoutingTable _routingTable;
+
+        /// <summary>
+        /// A node reporting at least this many ships gets split.
+        /// </summary>
+        public uint SplitShips { get; set; } = 200;
+
+        /// <summary>
+        /// A node reporting an average tick time (in milliseconds) of at least this much gets split; zero or less disables this.
+        /// </summary>
+        public double SplitTickMs { get; set; } = 0.0;
+
+        /// <summary>
+        /// A leaf reporting at most this many ships gets merged into its parent (if the parent would not need to split
+        /// again right after).
+        /// </summary>
+        public uint MergeShips { get; set; } = 20;
+
+        public Rebalancer(RoutingTable routingTable)
+        {
+            _routingTable = routingTable;
+        }
+
+        bool IsOverloaded(ArbiterTreeNode node)
+        {
+            return node.HasLoadReport
+                && (node.ReportedShipCount >= SplitShips || (SplitTickMs > 0.0 && node.ReportedTickMs >= SplitTickMs));
+        }
+
+        /// <summary>
+        /// Finds the most loaded node that should be split, and the free quadrant of it holding the most ships.
+        /// Returns false if no node needs (or can be) split.
+        /// </summary>
+        internal bool ChooseSplit(out ArbiterTreeNode parent, out Quadrant quadrant)
+        {
+            parent = null;
+            quadrant = Quadrant.NW;
+            if (_routingTable.RootNode == null)
+            {
+                return false;
+            }
+
+            var candidates = _routingTable.RootNode.Traverse()
+                .Cast<ArbiterTreeNode>()
+                .Where(node => node.Depth < MaxDepth && IsOverloaded(node))
+                .OrderByDescending(node => node.ReportedTickMs)
+                .ThenByDescending(node => node.ReportedShipCount);
+            foreach (var node in candidates)
+            {
+                uint bestCount = 0;
+                for (int i = 0; i < 4; i++)
+                {
+                    // Splitting off a quadrant with no ships in it would not take any load off the node
+                    if (node.Child((Quadrant)i) == null && node.QuadrantShipCounts[i] > bestCount)
+                    {
+                        bestCount = node.QuadrantShipCounts[i];
+                        quadrant = (Quadrant)i;
+                    }
+                }
+                if (bestCount > 0)
+                {
+                    parent = node;
+                    return true;
+                }
+            }
+            return false;
+        }
+
+        /// <summary>
+        /// Finds the least loaded leaf that can be merged into its parent. Returns null if there is none.
+        /// </summary>
+        internal ArbiterTreeNode ChooseMerge()
+        {
+            if (_routingTable.RootNode == null)
+            {
+                return null;
+            }
+
+            return _routingTable.RootNode.Traverse()
+                .Cast<ArbiterTreeNode>()
+                .Where(node => node.Parent != null && node.FirstChild() == null)
+                .Where(node => node.HasLoadReport && node.ReportedShipCount <= MergeShips)
+                .Where(node =>
+                {
+                    // Leave some headroom below the split threshold, or the parent would keep splitting and merging
+                    var parent = (ArbiterTreeNode)node.Parent;
+                    return parent.HasLoadReport && parent.ReportedShipCount + node.ReportedShipCount < SplitShips / 2;
+                })
+                .OrderBy(node => node.ReportedShipCount)
+                .FirstOrDefault();
+        }
+
+        /// <summary>
+        /// Performs at most one split or merge.
+        /// Nodes involved in a split or merge must report their load anew before they are considered again.
+        /// </summary>
+        public void Step()
+        {
+            lock (_routingTable)
+            {
+                StepLocked();
+            }
+        }
+
+        private void StepLocked()
+        {
+            ArbiterTreeNode parent;
+            Quadrant quadrant;
+            if (_routingTable.SpareNodes.Count > 0 && ChooseSplit(out parent, out quadrant))
+            {
+                var spare = _routingTable.SpareNodes[0];
+                Console.Error.WriteLine(">>> Splitting {0} ({1} ships, {2:F2} ms/tick): attaching spare {3} at its {4} quadrant <<<",
+                    parent.Path(), parent.ReportedShipCount, parent.ReportedTickMs, spare.ApiUrl, quadrant);
+                _routingTable.AttachSpare(spare, parent, quadrant);
+                return;
+            }
+
+            var leaf = ChooseMerge();
+            if (leaf != null)
+            {
+                Console.Error.WriteLine(">>> Merging {0} ({1} ships) into its parent <<<", leaf.Path(), leaf.ReportedShipCount);
+                _routingTable.RetireNode(leaf);
+            }
+        }
+    }
+}
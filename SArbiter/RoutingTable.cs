@@ -11,20 +11,86 @@ using System.Net.Http;
 
 namespace SArbiter
 {
+    /// <summary>
+    /// Keeps track of the tree of SGame nodes and of which node manages each ship.
+    /// All public methods are thread-safe (they lock the routing table).
+    /// </summary>
     internal class RoutingTable
     {
         const uint MaxDepth = SShared.QuadTreeNode<SShared.Spaceship>.MaxDepth;
 
         Dictionary<string, ArbiterTreeNode> _nodeByShipToken = new Dictionary<string, ArbiterTreeNode>();
 
+        /// <summary>
+        /// Reverse index of `_nodeByShipToken`: the tokens of the ships managed by each node.
+        /// </summary>
+        Dictionary<ArbiterTreeNode, HashSet<string>> _shipsByNode = new Dictionary<ArbiterTreeNode, HashSet<string>>();
+
+        /// <summary>
+        /// The node (in the tree or spare) of each connected SGame peer.
+        /// </summary>
+        Dictionary<NetPeer, ArbiterTreeNode> _nodeByPeer = new Dictionary<NetPeer, ArbiterTreeNode>();
+
         HashSet<string> _shipPublicIds = new HashSet<string>();
 
+        /// <summary>
+        /// Tokens reserved on each node (see `Messages.ReserveShips`) that have not been handed out yet.
+        /// </summary>
+        Dictionary<ArbiterTreeNode, Queue<string>> _reservedTokens = new Dictionary<ArbiterTreeNode, Queue<string>>();
+
+        /// <summary>
+        /// Nodes a batch of tokens is currently being reserved on.
+        /// </summary>
+        HashSet<ArbiterTreeNode> _refillingNodes = new HashSet<ArbiterTreeNode>();
+
+        /// <summary>
+        /// Tokens of the disconnected ships each node still has to be told about (see `FlushDisconnects()`).
+        /// </summary>
+        Dictionary<ArbiterTreeNode, List<string>> _pendingDisconnects = new Dictionary<ArbiterTreeNode, List<string>>();
+
+        /// <summary>
+        /// Tokens of disconnected ships that no node is known to manage, to be broadcast to all nodes.
+        /// </summary>
+        List<string> _pendingBroadcastDisconnects = new List<string>();
+
+        /// <summary>
+        /// Maximum number of tokens sent in a single `ShipsDisconnected` message.
+        /// </summary>
+        public const int MaxDisconnectBatch = 512;
+
         public ArbiterTreeNode RootNode { get; set; }
 
         public NetNode BusMaster { get; set; }
 
         public double UniverseSize { get; set; }
 
+        /// <summary>
+        /// Chooses the node to place newly-connected ships on.
+        /// </summary>
+        public IPlacementPolicy PlacementPolicy { get; set; } = new TwoChoicesPlacement();
+
+        /// <summary>
+        /// If true, SGame nodes connecting after the root are kept aside as spares (to be attached by the `Rebalancer`
+        /// where the load is) instead of being attached to the tree right away.
+        /// </summary>
+        public bool KeepSpares { get; set; } = false;
+
+        /// <summary>
+        /// Connected SGame nodes that are currently not part of the tree.
+        /// </summary>
+        public List<ArbiterTreeNode> SpareNodes { get; } = new List<ArbiterTreeNode>();
+
+        /// <summary>
+        /// Number of ship tokens to reserve on a node at once, so that ships can be connected to it without waiting for
+        /// a reply; zero disables reservations.
+        /// </summary>
+        public int ReserveBatchSize { get; set; } = 0;
+
+        /// <summary>
+        /// How long to wait for an SGame node to acknowledge a request before giving up on it.
+        /// </summary>
+        public TimeSpan ReplyTimeout { get; set; } = TimeSpan.FromSeconds(2.0);
+
         public RoutingTable(NetNode busMaster, ArbiterTreeNode rootNode, double universeSize)
         {
             this.BusMaster = busMaster;
@@ -32,13 +98,57 @@ namespace SArbiter
             this.UniverseSize = universeSize;
         }
 
+        /// <summary>
+        /// Registers gauges about the cluster (ships, nodes and ships per node) into `metrics`.
+        /// </summary>
+        public void RegisterMetrics(Metrics metrics)
+        {
+            metrics.Gauge("sarbiter_ships", "Ships connected to the cluster.", () =>
+            {
+                lock (this) return _nodeByShipToken.Count;
+            });
+            metrics.Gauge("sarbiter_nodes", "SGame nodes connected to the arbiter (in the tree or spare).", () =>
+            {
+                lock (this) return _nodeByPeer.Count;
+            });
+            metrics.Gauge("sarbiter_spare_nodes", "SGame nodes kept aside as spares.", () =>
+            {
+                lock (this) return SpareNodes.Count;
+            });
+            metrics.GaugeSet("sarbiter_node_ships", "Ships managed by each SGame node, by API URL.", () =>
+            {
+                lock (this)
+                {
+                    return _nodeByPeer.Values
+                        .Select(node => new KeyValuePair<string, double>(Metrics.Labels("api_url", node.ApiUrl), node.ShipCount))
+                        .ToList();
+                }
+            });
+        }
+
         public ArbiterTreeNode AddSGameNode(NetPeer peer, IPAddress busAddress, uint busPort, string apiUrl)
+        {
+            lock (this)
+            {
+                return AddSGameNodeLocked(peer, busAddress, busPort, apiUrl);
+            }
+        }
+
+        private ArbiterTreeNode AddSGameNodeLocked(NetPeer peer, IPAddress busAddress, uint busPort, string apiUrl)
         {
             if (this.RootNode == null)
             {
                 this.RootNode = new ArbiterTreeNode(peer, busAddress, busPort, apiUrl);
+                _nodeByPeer[peer] = this.RootNode;
                 return this.RootNode;
             }
+            else if (KeepSpares)
+            {
+                var spare = new ArbiterTreeNode(peer, busAddress, busPort, apiUrl);
+                SpareNodes.Add(spare);
+                _nodeByPeer[peer] = spare;
+                return spare;
+            }
             else
             {
                 // TODO: Different node assignment logic?
@@ -54,6 +164,7 @@ namespace SArbiter
                         {
                             var node = new ArbiterTreeNode(peer, busAddress, busPort, apiUrl);
                             parent.SetChild(quadrant, node);
+                            _nodeByPeer[peer] = node;
                             return node;
                         }
                     }
@@ -62,106 +173,277 @@ namespace SArbiter
             }
         }
 
-        public async Task<bool> RemoveSGameNode(NetPeer peer)
+        /// <summary>
+        /// True if `node` is a spare node, i.e. connected but not part of the tree.
+        /// </summary>
+        public bool IsSpare(ArbiterTreeNode node)
         {
-            if (RootNode == null) return false;
+            lock (this) return SpareNodes.Contains(node);
+        }
 
-            var disconnectedNode = RootNode.Traverse().Cast<ArbiterTreeNode>().Where((node) => node.Peer == peer).FirstOrDefault();
-            if (disconnectedNode == null) return false;
+        /// <summary>
+        /// Attaches a spare node to the tree as the `quadrant` child of `parent`, and broadcasts its new configuration.
+        /// Ships in the parent that lie in that quadrant will then be transferred to it by the parent itself.
+        /// </summary>
+        public void AttachSpare(ArbiterTreeNode spare, ArbiterTreeNode parent, Quadrant quadrant)
+        {
+            lock (this)
+            {
+                SpareNodes.Remove(spare);
+                parent.SetChild(quadrant, spare);
 
+                // Both nodes' loads are about to change; wait for new reports before acting on them again
+                parent.HasLoadReport = false;
+                spare.HasLoadReport = false;
+
+                BusMaster.BroadcastMessage(new Messages.NodeConfig()
+                {
+                    BusAddress = spare.BusAddress,
+                    BusPort = spare.BusPort,
+                    Bounds = spare.Bounds,
+                    Path = spare.Path(),
+                    ApiUrl = spare.ApiUrl,
+                }, DeliveryMethod.ReliableOrdered);
+            }
+        }
+
+        /// <summary>
+        /// Takes a leaf node out of the tree, merging its region back into its parent, and keeps it as a spare.
+        /// The retired node hands its ships to the parent itself (via `TransferShip`) when it receives the `NodeOffline`.
+        /// </summary>
+        public void RetireNode(ArbiterTreeNode leaf)
+        {
+            lock (this)
+            {
+                var parent = (ArbiterTreeNode)leaf.Parent;
+                BusMaster.BroadcastMessage(new Messages.NodeOffline()
+                {
+                    Path = leaf.Path(),
+                    ApiUrl = leaf.ApiUrl,
+                }, DeliveryMethod.ReliableOrdered);
+
+                // Route requests for the leaf's ships to the parent straight away; the transfers will follow
+                ReassignAllShips(leaf, parent);
+                DropReservations(leaf);
+                parent.HasLoadReport = false;
+
+                parent.SetChild(leaf.Quadrant, null);
+                leaf.Detach();
+                SpareNodes.Add(leaf);
+            }
+        }
+
+        /// <summary>
+        /// Returns the node (in the tree or spare) managed by the given SGame peer, or null if there is none.
+        /// </summary>
+        public ArbiterTreeNode NodeOfPeer(NetPeer peer)
+        {
+            lock (this) return _nodeByPeer.GetValueOrDefault(peer, null);
+        }
+
+        public async Task<bool> RemoveSGameNode(NetPeer peer)
+        {
             ArbiterTreeNode substituteNode;
-            if (disconnectedNode.Parent == null)
+            string[] orphanTokens;
+            lock (this)
             {
-                ArbiterTreeNode childToPromote = (ArbiterTreeNode)disconnectedNode.FirstChild();
-                if (childToPromote == null)
+                ArbiterTreeNode disconnectedNode;
+                if (!_nodeByPeer.Remove(peer, out disconnectedNode)) return false;
+
+                DropReservations(disconnectedNode);
+                // (Its ships are gone with it anyway)
+                _pendingDisconnects.Remove(disconnectedNode);
+                if (SpareNodes.Remove(disconnectedNode))
                 {
-                    substituteNode = null;
-                    RootNode = null;
+                    // Not in the tree and has no ships; nobody else needs to know
+                    return true;
+                }
+
+                if (disconnectedNode.Parent == null)
+                {
+                    ArbiterTreeNode childToPromote = (ArbiterTreeNode)disconnectedNode.FirstChild();
+                    if (childToPromote == null && SpareNodes.Count > 0)
+                    {
+                        // Promote a spare node to root
+                        substituteNode = SpareNodes[0];
+                        SpareNodes.RemoveAt(0);
+                    }
+                    else if (childToPromote == null)
+                    {
+                        substituteNode = null;
+                        RootNode = null;
+                    }
+                    else
+                    {
+                        substituteNode = childToPromote;
+                    }
                 }
                 else
                 {
-                    substituteNode = childToPromote;
+                    ArbiterTreeNode leafToPromote = (ArbiterTreeNode)disconnectedNode.RandomLeafNode();
+                    if (leafToPromote == null)
+                    {
+                        // No leaf means `disconnectedNode` had no childtren, so we just send the ships to the parent
+                        substituteNode = (ArbiterTreeNode)disconnectedNode.Parent;
+                    }
+                    else
+                    {
+                        substituteNode = leafToPromote;
+                    }
                 }
-            }
-            else
-            {
-                ArbiterTreeNode leafToPromote = (ArbiterTreeNode)disconnectedNode.RandomLeafNode();
-                if (leafToPromote == null)
+
+                if (substituteNode != null)
                 {
-                    // No leaf means `disconnectedNode` had no childtren, so we just send the ships to the parent
-                    substituteNode = (ArbiterTreeNode)disconnectedNode.Parent;
+                    Console.Error.WriteLine("Moving ships that were in {0} to {1}", disconnectedNode.Path(), substituteNode.Path());
                 }
                 else
                 {
-                    substituteNode = leafToPromote;
+                    Console.Error.WriteLine("There is no node to promote to root!");
                 }
-            }
 
-            if (substituteNode != null)
-            {
-                Console.Error.WriteLine("Moving ships that were in {0} to {1}", disconnectedNode.Path(), substituteNode.Path());
-            }
-            else
-            {
-                Console.Error.WriteLine("There is no node to promote to root!");
-            }
+                // Route requests for the orphaned ships to the substitute straight away
+                orphanTokens = ShipsOf(disconnectedNode).ToArray();
+                ReassignAllShips(disconnectedNode, substituteNode);
 
-            // New substitute node retains his children but also gets the new ones
-            // We assume the disconnected node persisted its ships to Elastic before dying;
-            // if it has, the connect REST calls below will transfer the ships to the substitute!
-            foreach (var token in _nodeByShipToken.Keys.ToList())
-            {
-                if (_nodeByShipToken[token] == disconnectedNode)
+                if (substituteNode != null)
                 {
-                    if (substituteNode != null)
+                    if (substituteNode.Parent != null)
                     {
-                        var connectWaiter = new MessageWaiter<Messages.ShipConnected>(BusMaster, substituteNode.Peer).Wait;
-                        BusMaster.SendMessage(new Messages.ShipConnected() { Token = token }, substituteNode.Peer);
-                        await connectWaiter;
+                        substituteNode.Parent.SetChild(substituteNode.Quadrant, null);
                     }
-                    _nodeByShipToken[token] = substituteNode;
+
+                    if (disconnectedNode.Parent != null)
+                    {
+                        disconnectedNode.Parent.SetChild(disconnectedNode.Quadrant, substituteNode);
+                    }
+                    else
+                    {
+                        substituteNode.MakeRoot(new Quad(0.0, 0.0, UniverseSize));
+                        RootNode = substituteNode;
+                    }
+
+                    BusMaster.BroadcastMessage(new Messages.NodeOffline()
+                    {
+                        Path = disconnectedNode.Path(),
+                        ApiUrl = disconnectedNode.ApiUrl,
+                    }, DeliveryMethod.ReliableOrdered);
+
+                    BusMaster.BroadcastMessage(new Messages.NodeConfig()
+                    {
+                        BusAddress = substituteNode.BusAddress,
+                        BusPort = substituteNode.BusPort,
+                        Bounds = substituteNode.Bounds,
+                        Path = substituteNode.Path(),
+                        ApiUrl = substituteNode.ApiUrl,
+                    }, DeliveryMethod.ReliableOrdered);
                 }
             }
 
-            if (substituteNode != null)
+            // New substitute node retains his children but also gets the new ones
+            // We assume the disconnected node persisted its ships to Elastic before dying;
+            // if it has, the substitute will fetch them from there!
+            // All orphaned ships are moved in one message, with one acknowledgement
+            if (substituteNode != null && orphanTokens.Length > 0)
             {
-                if (substituteNode.Parent != null)
+                var reassignWaiter = BusMaster.Waiters.Wait<Messages.ShipsReassigned>(substituteNode.Peer, null, ReplyTimeout);
+                BusMaster.SendMessage(new Messages.ShipsReassigned() { Tokens = orphanTokens }, substituteNode.Peer);
+                if (await reassignWaiter == null)
                 {
-                    substituteNode.Parent.SetChild(substituteNode.Quadrant, null);
+                    Console.Error.WriteLine("{0} did not acknowledge taking over {1} ships in time", substituteNode.ApiUrl, orphanTokens.Length);
                 }
+            }
 
-                if (disconnectedNode.Parent != null)
-                {
-                    disconnectedNode.Parent.SetChild(disconnectedNode.Quadrant, substituteNode);
-                }
-                else
-                {
-                    substituteNode.MakeRoot(new Quad(0.0, 0.0, UniverseSize));
-                    RootNode = substituteNode;
-                }
+            return true;
+        }
 
-                BusMaster.BroadcastMessage(new Messages.NodeOffline()
-                {
-                    Path = disconnectedNode.Path(),
-                    ApiUrl = disconnectedNode.ApiUrl,
-                }, DeliveryMethod.ReliableOrdered);
+        public ArbiterTreeNode NodeWithShip(string token)
+        {
+            lock (this) return _nodeByShipToken.GetValueOrDefault(token, null);
+        }
 
-                BusMaster.BroadcastMessage(new Messages.NodeConfig()
+        /// <summary>
+        /// Returns the tokens of the ships managed by `node` (do not modify the returned set, and lock the routing table
+        /// while using it).
+        /// </summary>
+        public IReadOnlyCollection<string> ShipsOf(ArbiterTreeNode node)
+        {
+            HashSet<string> tokens;
+            return _shipsByNode.TryGetValue(node, out tokens) ? tokens : (IReadOnlyCollection<string>)Array.Empty<string>();
+        }
+
+        /// <summary>
+        /// Records that the ship with the given token is managed by `node` (null if there is no node to manage it).
+        /// Keeps the `ShipCount` of the nodes involved in sync with the index.
+        /// </summary>
+        internal void AssignShip(string token, ArbiterTreeNode node)
+        {
+            UnassignShip(token);
+            _nodeByShipToken[token] = node;
+            if (node != null)
+            {
+                HashSet<string> tokens;
+                if (!_shipsByNode.TryGetValue(node, out tokens))
                 {
-                    BusAddress = substituteNode.BusAddress,
-                    BusPort = substituteNode.BusPort,
-                    Bounds = substituteNode.Bounds,
-                    Path = substituteNode.Path(),
-                    ApiUrl = substituteNode.ApiUrl,
-                }, DeliveryMethod.ReliableOrdered);
+                    tokens = _shipsByNode[node] = new HashSet<string>();
+                }
+                tokens.Add(token);
+                node.ShipCount = (uint)tokens.Count;
             }
+        }
 
-            return true;
+        /// <summary>
+        /// Forgets which node manages the ship with the given token; returns the node (or null if there was none).
+        /// </summary>
+        internal ArbiterTreeNode UnassignShip(string token)
+        {
+            ArbiterTreeNode node;
+            if (!_nodeByShipToken.Remove(token, out node))
+            {
+                return null;
+            }
+            HashSet<string> tokens;
+            if (node != null && _shipsByNode.TryGetValue(node, out tokens))
+            {
+                tokens.Remove(token);
+                node.ShipCount = (uint)tokens.Count;
+                if (tokens.Count == 0)
+                {
+                    _shipsByNode.Remove(node);
+                }
+            }
+            return node;
         }
 
-        public ArbiterTreeNode NodeWithShip(string token)
+        /// <summary>
+        /// Records that all ships managed by `source` are now managed by `destination` (which may be null).
+        /// </summary>
+        internal void ReassignAllShips(ArbiterTreeNode source, ArbiterTreeNode destination)
         {
-            return _nodeByShipToken.GetValueOrDefault(token, null);
+            HashSet<string> tokens;
+            if (!_shipsByNode.Remove(source, out tokens))
+            {
+                return;
+            }
+            source.ShipCount = 0;
+            foreach (var token in tokens)
+            {
+                _nodeByShipToken[token] = destination;
+            }
+            if (destination == null)
+            {
+                return;
+            }
+
+            HashSet<string> destinationTokens;
+            if (_shipsByNode.TryGetValue(destination, out destinationTokens))
+            {
+                destinationTokens.UnionWith(tokens);
+            }
+            else
+            {
+                _shipsByNode[destination] = destinationTokens = tokens;
+            }
+            destination.ShipCount = (uint)destinationTokens.Count;
         }
 
         private static string PublicIdFromToken(string token) => token.Substring(token.Length - 8);
@@ -180,87 +462,318 @@ namespace SArbiter
             return token;
         }
 
-        public string AddNewShip(out ArbiterTreeNode parentNode, string token)
+        /// <summary>
+        /// Registers a new ship on a leaf node chosen by `PlacementPolicy` (avoiding `excludedNodes` if possible); uses
+        /// `token` as its token, or generates a new one if it is null. Returns the token, or null if there are no nodes.
+        /// If no token was given and the node has a reserved token left, the ship gets that token and the node is
+        /// notified right away: `reserved` is then true and there is no reply to wait for. Otherwise, the caller has to
+        /// send a `ShipConnected` to the node and wait for its reply.
+        /// </summary>
+        public string PlaceShip(string token, ICollection<ArbiterTreeNode> excludedNodes, out ArbiterTreeNode parentNode, out bool reserved)
         {
-            if (token == null)
-                token = AddShipToken();
-            else
-                _shipPublicIds.Add(PublicIdFromToken(token));
-            parentNode = (ArbiterTreeNode)RootNode.RandomLeafNode();
-            _nodeByShipToken[token] = parentNode;
+            lock (this)
+            {
+                parentNode = null;
+                reserved = false;
+                if (RootNode == null)
+                {
+                    return null;
+                }
+                parentNode = PlaceNewShip(excludedNodes);
 
-            BusMaster.SendMessage(new Messages.ShipConnected() { Token = token }, parentNode.Peer);
+                Queue<string> reservedTokens;
+                if (token == null && _reservedTokens.TryGetValue(parentNode, out reservedTokens) && reservedTokens.Count > 0)
+                {
+                    // (The public ID of a reserved token was registered when it was reserved)
+                    token = reservedTokens.Dequeue();
+                    reserved = true;
+                    BusMaster.SendMessage(new Messages.ShipConnected() { Token = token, Reserved = true }, parentNode.Peer);
+                }
+                else if (token == null)
+                {
+                    token = AddShipToken();
+                }
+                else
+                {
+                    // The ship may have just disconnected; make sure its old node hears about that before it reconnects
+                    FlushDisconnects();
+                    _shipPublicIds.Add(PublicIdFromToken(token));
+                }
+                AssignShip(token, parentNode);
+                return token;
+            }
+        }
 
-            return token;
+        /// <summary>
+        /// Registers a ship on the smallest node of the tree whose bounds contain `bounds` (or the root), e.g. to load a
+        /// scenario; uses `token` as its token, or generates a new one if it is null. A ship that is already registered
+        /// stays on its node. Returns the token, or null if there are no nodes.
+        /// The caller has to send the ship itself to `node`.
+        /// </summary>
+        public string PlaceShipAt(string token, Quad bounds, out ArbiterTreeNode node)
+        {
+            lock (this)
+            {
+                node = null;
+                if (RootNode == null)
+                {
+                    return null;
+                }
+                if (token != null && _nodeByShipToken.TryGetValue(token, out node) && node != null)
+                {
+                    return token;
+                }
+
+                node = (ArbiterTreeNode)RootNode.SmallestNodeWhichContains(bounds) ?? RootNode;
+                if (token == null)
+                {
+                    token = AddShipToken();
+                }
+                else
+                {
+                    FlushDisconnects();
+                    _shipPublicIds.Add(PublicIdFromToken(token));
+                }
+                AssignShip(token, node);
+                return token;
+            }
         }
 
-#if DEBUG
-        internal int _shipCount = 0;
-#endif
+        /// <summary>
+        /// Registers the ships a node already manages when it connects (e.g. restored from a snapshot) as managed by it.
+        /// The restored ships take precedence: any other node that was thought to manage them (as happens when a
+        /// restarting node's ships were handed to a substitute) is told to drop them, with the next `ShipsDisconnected` batch.
+        /// A spare node has no region to manage ships in, so its ships are registered on the root until the spare hands
+        /// them to the tree (when told to, see `Program.AddSGameNode()`).
+        /// </summary>
+        public void RestoreShips(ArbiterTreeNode node, IEnumerable<string> tokens)
+        {
+            lock (this)
+            {
+                FlushDisconnects();
+                var owner = SpareNodes.Contains(node) ? RootNode : node;
+                foreach (var token in tokens)
+                {
+                    _shipPublicIds.Add(PublicIdFromToken(token));
+                    var previousNode = _nodeByShipToken.GetValueOrDefault(token, null);
+                    if (previousNode != null && previousNode != node)
+                    {
+                        QueueDisconnect(previousNode, token);
+                    }
+                    AssignShip(token, owner);
+                }
+            }
+        }
 
-        public string AddNewShip(out ArbiterTreeNode parentNode)
+        /// <summary>
+        /// If reservations are enabled and `node` is running low on reserved tokens, reserves a new batch of them on it.
+        /// </summary>
+        public async Task RefillReservations(ArbiterTreeNode node)
         {
-            string token = AddShipToken();
+            string[] tokens;
+            lock (this)
+            {
+                Queue<string> reservedTokens;
+                if (ReserveBatchSize <= 0 || _refillingNodes.Contains(node)
+                    || (_reservedTokens.TryGetValue(node, out reservedTokens) && reservedTokens.Count > ReserveBatchSize / 2))
+                {
+                    return;
+                }
+                _refillingNodes.Add(node);
+                tokens = Enumerable.Range(0, ReserveBatchSize).Select(i => AddShipToken()).ToArray();
+            }
 
-#if false
-            // This is just for testing - in debug mode, assume there are just two SGame nodes and round-robin ships to them
-            if ((_shipCount++) % 2 == 0)
+            var reserveWaiter = BusMaster.Waiters.Wait<Messages.ReserveShips>(node.Peer, tokens[0], ReplyTimeout);
+            BusMaster.SendMessage(new Messages.ReserveShips() { Tokens = tokens }, node.Peer);
+            bool acknowledged = await reserveWaiter != null;
+
+            lock (this)
             {
-                parentNode = (ArbiterTreeNode)RootNode;
+                _refillingNodes.Remove(node);
+                if (!acknowledged || !_nodeByPeer.ContainsKey(node.Peer) || SpareNodes.Contains(node))
+                {
+                    // The node is gone (or did not answer); do not hand these tokens out
+                    foreach (var token in tokens)
+                    {
+                        _shipPublicIds.Remove(PublicIdFromToken(token));
+                    }
+                    return;
+                }
+
+                Queue<string> reservedTokens;
+                if (!_reservedTokens.TryGetValue(node, out reservedTokens))
+                {
+                    reservedTokens = _reservedTokens[node] = new Queue<string>();
+                }
+                foreach (var token in tokens)
+                {
+                    reservedTokens.Enqueue(token);
+                }
             }
-            else
+        }
+
+        /// <summary>
+        /// Forgets the tokens reserved on `node` (e.g. because it is leaving the tree).
+        /// </summary>
+        private void DropReservations(ArbiterTreeNode node)
+        {
+            Queue<string> reservedTokens;
+            if (_reservedTokens.Remove(node, out reservedTokens))
             {
-                parentNode = null;
-                for (int i = 0; i < 4; i++)
+                foreach (var token in reservedTokens)
                 {
-                    var q = RootNode.Child((Quadrant)i);
-                    if (q == null) continue;
-                    parentNode = (ArbiterTreeNode)q;
-                    break;
+                    _shipPublicIds.Remove(PublicIdFromToken(token));
                 }
             }
-#else
-            parentNode = (ArbiterTreeNode)RootNode.RandomLeafNode();
-#endif
+        }
 
-            _nodeByShipToken[token] = parentNode;
-            parentNode.ShipCount++;
+        /// <summary>
+        /// Chooses the leaf node to place a new ship on via `PlacementPolicy`, avoiding `excludedNodes` unless there is
+        /// no other choice.
+        /// </summary>
+        private ArbiterTreeNode PlaceNewShip(ICollection<ArbiterTreeNode> excludedNodes = null)
+        {
+            var leaves = RootNode.Traverse()
+                .Cast<ArbiterTreeNode>()
+                .Where(node => Enumerable.Range(0, 4).All(i => node.Child((Quadrant)i) == null))
+                .ToList();
+            if (excludedNodes != null && leaves.Any(node => !excludedNodes.Contains(node)))
+            {
+                leaves.RemoveAll(node => excludedNodes.Contains(node));
+            }
 
-            BusMaster.SendMessage(new Messages.ShipConnected() { Token = token }, parentNode.Peer);
-            return token;
+            var node = PlacementPolicy.Choose(leaves);
+            node.ShipsPlacedSinceReport++;
+            return node;
         }
 
-        public bool MoveShip(Spaceship ship, ArbiterTreeNode transferNode)
+        /// <summary>
+        /// Records a load report sent by the node managed by `peer`.
+        /// </summary>
+        public void UpdateNodeLoad(NetPeer peer, Messages.NodeLoad load)
         {
-            string token = ship.Token;
-            ArbiterTreeNode sourceNode;
-            if (!_nodeByShipToken.Remove(token, out sourceNode))
+            lock (this)
             {
-                return false;
+                var node = NodeOfPeer(peer);
+                if (node == null || IsSpare(node))
+                {
+                    return;
+                }
+                node.HasLoadReport = true;
+                node.ReportedShipCount = load.ShipCount;
+                node.ReportedTickMs = load.TickMilliseconds;
+                node.ShipsPlacedSinceReport = 0;
+                node.QuadrantShipCounts = load.QuadrantShipCounts;
             }
+        }
 
-            _nodeByShipToken[token] = transferNode;
-            sourceNode.ShipCount--;
-            transferNode.ShipCount++;
+        public bool MoveShip(Spaceship ship, ArbiterTreeNode transferNode)
+        {
+            lock (this)
+            {
+                string token = ship.Token;
+                if (!_nodeByShipToken.ContainsKey(token))
+                {
+                    return false;
+                }
 
-            Messages.ShipTransferred msg = new Messages.ShipTransferred() { Ship = ship };
-            BusMaster.SendMessage(msg, transferNode.Peer);
-            return true;
+                AssignShip(token, transferNode);
+
+                Messages.ShipTransferred msg = new Messages.ShipTransferred() { Ship = ship };
+                BusMaster.SendMessage(msg, transferNode.Peer);
+                return true;
+            }
         }
 
         public bool RemoveShip(string token)
         {
-            ArbiterTreeNode node;
-            if (!_nodeByShipToken.Remove(token, out node))
+            lock (this)
             {
-                return false;
+                if (!_nodeByShipToken.ContainsKey(token))
+                {
+                    return false;
+                }
+
+                var node = UnassignShip(token);
+                _shipPublicIds.Remove(PublicIdFromToken(token));
+
+                // Only the node managing the ship needs to know; tell it in the next batch
+                QueueDisconnect(node, token);
+                return true;
             }
+        }
 
-            _shipPublicIds.Remove(PublicIdFromToken(token));
-            node.ShipCount--;
+        /// <summary>
+        /// Queues a `ShipsDisconnected` notification of the ship with the given token for `node` (or for all nodes, if
+        /// null) in the next batch; see `FlushDisconnects()`.
+        /// </summary>
+        private void QueueDisconnect(ArbiterTreeNode node, string token)
+        {
+            if (node != null)
+            {
+                List<string> tokens;
+                if (!_pendingDisconnects.TryGetValue(node, out tokens))
+                {
+                    tokens = _pendingDisconnects[node] = new List<string>();
+                }
+                tokens.Add(token);
+            }
+            else
+            {
+                _pendingBroadcastDisconnects.Add(token);
+            }
+        }
 
-            BusMaster.BroadcastMessage(new Messages.ShipDisconnected() { Token = token });
-            return true;
+        /// <summary>
+        /// Returns (and forgets) the tokens of the ships disconnected since the last call, grouped by the node to notify;
+        /// tokens to broadcast to all nodes are grouped under a null node.
+        /// </summary>
+        internal List<(ArbiterTreeNode, string[])> TakePendingDisconnects()
+        {
+            var batches = new List<(ArbiterTreeNode, string[])>();
+            lock (this)
+            {
+                foreach (var pending in _pendingDisconnects)
+                {
+                    if (pending.Value.Count > 0)
+                    {
+                        batches.Add((pending.Key, pending.Value.ToArray()));
+                        pending.Value.Clear();
+                    }
+                }
+                if (_pendingBroadcastDisconnects.Count > 0)
+                {
+                    batches.Add((null, _pendingBroadcastDisconnects.ToArray()));
+                    _pendingBroadcastDisconnects.Clear();
+                }
+            }
+            return batches;
+        }
+
+        /// <summary>
+        /// Sends the `ShipsDisconnected` notifications batched since the last call: one message (per `MaxDisconnectBatch`
+        /// tokens) to each node that had ships disconnected. Called once per arbiter tick.
+        /// </summary>
+        public void FlushDisconnects()
+        {
+            foreach (var (node, tokens) in TakePendingDisconnects())
+            {
+                for (int start = 0; start < tokens.Length; start += MaxDisconnectBatch)
+                {
+                    var msg = new Messages.ShipsDisconnected()
+                    {
+                        Tokens = tokens.Skip(start).Take(MaxDisconnectBatch).ToArray(),
+                    };
+                    if (node == null)
+                    {
+                        BusMaster.BroadcastMessage(msg);
+                    }
+                    else if (node.Peer != null)
+                    {
+                        BusMaster.SendMessage(msg, node.Peer);
+                    }
+                }
+            }
         }
     }
 }
@@ -0,0 +1,183 @@
+using System;
+using SShared;
+
+namespace SGame.Tests
+{
+    /// <summary>
+    /// A frozen copy of the original shield computation, that `MathUtils.ShieldingAmount()` is checked against.
+    /// </summary>
+    static class ReferenceShielding
+    {
+        /// <summary>
+        /// `MathUtils.CircleTangents()`, as it was.
+        /// </summary>
+        public static void CircleTangents(Vector2 circleCenter, double circleRadius, Vector2 point, out Vector2 tg1, out Vector2 tg2, out double bisectAngle)
+        {
+            Vector2 centerDelta = circleCenter - point;
+            bisectAngle = Math.PI * 0.5 - Math.Acos(circleRadius / centerDelta.Length());
+            double centerAngle = Math.Atan2(centerDelta.Y, centerDelta.X);
+
+            double internalAngle = Math.PI / 2 - bisectAngle;
+            tg1 = circleCenter - MathUtils.DirVec(centerAngle - internalAngle) * (double)circleRadius;
+            tg2 = circleCenter - MathUtils.DirVec(centerAngle + internalAngle) * (double)circleRadius;
+        }
+
+        /// <summary>
+        /// `MathUtils.ShieldingAmount()`, as it was (minus logging).
+        /// </summary>
+        public static double ShieldingAmount(Spaceship ship, Vector2 shotOrigin, double shotDir, double shotWidth, double shotRadius)
+        {
+            double shipR = ship.Radius();
+            if ((shotOrigin - ship.Pos).Length() <= shipR)
+            {
+                return 0.0;
+            }
+
+            if (ship.ShieldWidth < 0.001)
+            {
+                return 0.0;
+            }
+
+            shotDir = MathUtils.NormalizeAngle(MathUtils.ClampAngle(shotDir));
+
+            Vector2 tgLeft, tgRight;
+            double tgAngle;
+            CircleTangents(ship.Pos, shipR, shotOrigin, out tgLeft, out tgRight, out tgAngle);
+
+            Vector2 shipCenterDelta = ship.Pos - shotOrigin;
+            double shipCenterAngle = Math.Atan2(shipCenterDelta.Y, shipCenterDelta.X);
+            double CAS2SS = MathUtils.NormalizeAngle(shipCenterAngle - shotDir);
+
+            double tgLeftAngleSS = -tgAngle + CAS2SS, tgRightAngleSS = tgAngle + CAS2SS;
+            if (tgLeftAngleSS > tgRightAngleSS)
+            {
+                (tgLeftAngleSS, tgRightAngleSS) = (tgRightAngleSS, tgLeftAngleSS);
+                (tgLeft, tgRight) = (tgRight, tgLeft);
+            }
+
+            Vector2? capHitLeft, capHitRight;
+            double leftCapAngleSS = Double.NegativeInfinity, rightCapAngleSS = Double.PositiveInfinity;
+            if (MathUtils.CircleCircleIntersection(shotOrigin, shotRadius, ship.Pos, shipR, out capHitLeft, out capHitRight))
+            {
+                if (capHitRight == null) capHitRight = capHitLeft;
+
+                double capDist1 = (capHitLeft.Value - tgLeft).Length(), capDist2 = (capHitRight.Value - tgLeft).Length();
+                if (capDist2 < capDist1)
+                {
+                    (capHitLeft, capHitRight) = (capHitRight, capHitLeft);
+                }
+
+                Vector2 leftCapDelta = capHitLeft.Value - shotOrigin, rightCapDelta = capHitRight.Value - shotOrigin;
+                Vector2 leftTgDelta = tgLeft - shotOrigin, rightTgDelta = tgRight - shotOrigin;
+                if (leftCapDelta.LengthSquared() < leftTgDelta.LengthSquared())
+                {
+                    leftCapAngleSS = Math.Atan2(leftCapDelta.Y, leftCapDelta.X) - shotDir;
+                }
+                if (rightCapDelta.LengthSquared() < rightTgDelta.LengthSquared())
+                {
+                    rightCapAngleSS = Math.Atan2(rightCapDelta.Y, rightCapDelta.X) - shotDir;
+                }
+
+            }
+
+            tgLeftAngleSS = MathUtils.NormalizeAngle(tgLeftAngleSS);
+            tgRightAngleSS = MathUtils.NormalizeAngle(tgRightAngleSS);
+            if (!Double.IsNegativeInfinity(leftCapAngleSS)) leftCapAngleSS = MathUtils.NormalizeAngle(leftCapAngleSS);
+            if (!Double.IsPositiveInfinity(rightCapAngleSS)) rightCapAngleSS = MathUtils.NormalizeAngle(rightCapAngleSS);
+
+            double leftRayAngleSS = Math.Max(Math.Max(-shotWidth, tgLeftAngleSS), leftCapAngleSS);
+            double rightRayAngleSS = Math.Min(Math.Min(tgRightAngleSS, shotWidth), rightCapAngleSS);
+
+            Vector2? leftHitNear = null, leftHitFar = null;
+            bool leftHit = new Ray(shotOrigin, shotDir + leftRayAngleSS).HitCircle(ship.Pos, shipR, out leftHitNear, out leftHitFar);
+            Vector2? rightHitNear = null, rightHitFar = null;
+            bool rightHit = new Ray(shotOrigin, shotDir + rightRayAngleSS).HitCircle(ship.Pos, shipR, out rightHitNear, out rightHitFar);
+
+            if (!leftHit || !rightHit)
+            {
+                throw new InvalidOperationException("Raycast missed during shield calculation!");
+            }
+
+            double leftVictimHit = Math.Atan2(leftHitNear.Value.Y - ship.Pos.Y, leftHitNear.Value.X - ship.Pos.X);
+            double rightVictimHit = Math.Atan2(rightHitNear.Value.Y - ship.Pos.Y, rightHitNear.Value.X - ship.Pos.X);
+
+            return ShotShieldIntersection(leftVictimHit, rightVictimHit, ship);
+        }
+
+        /// <summary>
+        /// `MathUtils.ShotShieldIntersection()`, as it was (minus logging).
+        /// </summary>
+        public static double ShotShieldIntersection(double shotStart, double shotStop, Spaceship shielder)
+        {
+
+            shotStart = MathUtils.ClampAngle(shotStart);
+            shotStop = MathUtils.ClampAngle(shotStop);
+
+            if (Math.Abs(shotStop - shotStart) > Math.PI)
+            {
+                double larger = Math.Max(shotStart, shotStop);
+                double smaller = Math.Min(shotStart, shotStop);
+                shotStart = larger;
+                shotStop = smaller;
+            }
+            else
+            {
+                double larger = Math.Max(shotStart, shotStop);
+                double smaller = Math.Min(shotStart, shotStop);
+                shotStart = smaller;
+                shotStop = larger;
+            }
+
+            double shieldStart = MathUtils.ClampAngle(shielder.ShieldDir - shielder.ShieldWidth);
+            double shieldStop = MathUtils.ClampAngle(shielder.ShieldDir + shielder.ShieldWidth);
+
+            if (Math.Min(shieldStart, shieldStop) > MathUtils.ClampAngle(shielder.ShieldDir) || Math.Max(shieldStart, shieldStop) < MathUtils.ClampAngle(shielder.ShieldDir))
+            {
+                double larger = Math.Max(shieldStart, shieldStop);
+                double smaller = Math.Min(shieldStart, shieldStop);
+                shieldStop = smaller;
+                shieldStart = larger;
+            }
+            else
+            {
+                double larger = Math.Max(shieldStart, shieldStop);
+                double smaller = Math.Min(shieldStart, shieldStop);
+                shieldStart = smaller;
+                shieldStop = larger;
+            }
+
+            if (shotStop < shotStart) shotStop += 2 * Math.PI;
+            if (shieldStart < shotStart) shieldStart += 2 * Math.PI;
+            if (shieldStop < shotStart) shieldStop += 2 * Math.PI;
+
+            double[] angles = { shotStart, shotStop, shieldStart, shieldStop };
+            Array.Sort(angles);
+
+            double distanceShielded = 0;
+
+            if (angles[1] == shotStop)
+            {
+                if (angles[2] == shieldStop)
+                    distanceShielded = shotStop - shotStart;
+                else
+                    distanceShielded = 0;
+            }
+            else if (angles[1] == shieldStart)
+            {
+                distanceShielded = angles[2] - angles[1];
+            }
+            else
+            {
+                distanceShielded = angles[1] - angles[0];
+
+                if (angles[2] == shieldStart)
+                {
+                    distanceShielded += angles[3] - angles[2];
+                }
+            }
+
+            double distanceTotal = shotStop - shotStart;
+            return distanceShielded / distanceTotal;
+        }
+    }
+}
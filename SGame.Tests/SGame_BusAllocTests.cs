@@ -0,0 +1,121 @@
+using System;
+using LiteNetLib.Utils;
+using SShared;
+using SShared.Messages;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_BusAllocTests
+    {
+        const int SHIPS = 16;
+        const int ITERATIONS = 2000;
+
+        private static Struck MakeStruck()
+        {
+            var struck = new Struck() { Originator = "originator-token", OriginatorAreaGain = 1.5 };
+            for (int i = 0; i < SHIPS; i++)
+            {
+                struck.ShipsInfo.Add(new Struck.ShipInfo()
+                {
+                    PublicId = $"{i:x8}",
+                    Area = 1.0 + i,
+                    Pos = new Vector2(i * 2.0, -i * 3.0),
+                    Damage = i % 3 == 0 ? -0.5 : 0.25,
+                });
+            }
+            return struck;
+        }
+
+        private static void WriteAndRead(NetNodePacketProcessor processor, NetDataReader reader, Struck struck)
+        {
+            var writer = NetDataWriterPool.Rent();
+            processor.Write(writer, struck);
+            reader.SetSource(writer);
+            processor.ReadAllPackets(null, reader);
+            NetDataWriterPool.Return(writer);
+        }
+
+        [Fact]
+        public void StruckRoundTrips()
+        {
+            var processor = new NetNodePacketProcessor();
+            Serialization.RegisterAllSerializers(processor);
+            Struck received = null;
+            processor.Events<Struck>().OnMessageReceived += (sender, message) => received = message;
+
+            var sent = MakeStruck();
+            WriteAndRead(processor, new NetDataReader(), sent);
+
+            Assert.Equal(sent.Originator, received.Originator);
+            Assert.Equal(sent.OriginatorAreaGain, received.OriginatorAreaGain);
+            Assert.Equal(SHIPS, received.ShipsInfo.Count);
+            for (int i = 0; i < SHIPS; i++)
+            {
+                Assert.Equal(sent.ShipsInfo[i].PublicId, received.ShipsInfo[i].PublicId);
+                Assert.Equal(sent.ShipsInfo[i].Area, received.ShipsInfo[i].Area);
+                Assert.Equal(sent.ShipsInfo[i].Pos.X, received.ShipsInfo[i].Pos.X);
+                Assert.Equal(sent.ShipsInfo[i].Pos.Y, received.ShipsInfo[i].Pos.Y);
+                Assert.Equal(sent.ShipsInfo[i].Damage, received.ShipsInfo[i].Damage);
+                Assert.Null(received.ShipsInfo[i].Ship);
+            }
+        }
+
+        [Fact]
+        public void SendingDoesNotAllocate()
+        {
+            var processor = new NetNodePacketProcessor();
+            Serialization.RegisterAllSerializers(processor);
+            var struck = MakeStruck();
+
+            // (Warm up the pool and the writer's buffer)
+            for (int i = 0; i < 10; i++)
+            {
+                var writer = NetDataWriterPool.Rent();
+                processor.Write(writer, struck);
+                NetDataWriterPool.Return(writer);
+            }
+
+            long before = GC.GetAllocatedBytesForCurrentThread();
+            for (int i = 0; i < ITERATIONS; i++)
+            {
+                var writer = NetDataWriterPool.Rent();
+                processor.Write(writer, struck);
+                NetDataWriterPool.Return(writer);
+            }
+            long allocated = GC.GetAllocatedBytesForCurrentThread() - before;
+
+            Console.WriteLine($"Struck send: {(double)allocated / ITERATIONS:F1} bytes/message");
+            Assert.Equal(0, allocated);
+        }
+
+        [Fact]
+        public void ReceivingAllocatesOnlyThePayload()
+        {
+            var processor = new NetNodePacketProcessor();
+            Serialization.RegisterAllSerializers(processor);
+            int received = 0;
+            processor.Events<Struck>().OnMessageReceived += (sender, message) => received++;
+            var reader = new NetDataReader();
+            var struck = MakeStruck();
+
+            for (int i = 0; i < 10; i++)
+            {
+                WriteAndRead(processor, reader, struck);
+            }
+
+            long before = GC.GetAllocatedBytesForCurrentThread();
+            for (int i = 0; i < ITERATIONS; i++)
+            {
+                WriteAndRead(processor, reader, struck);
+            }
+            long allocated = GC.GetAllocatedBytesForCurrentThread() - before;
+
+            // The message itself, its list and the id strings; no per-ship objects and no dispatch overhead
+            double perMessage = (double)allocated / ITERATIONS;
+            Console.WriteLine($"Struck receive: {perMessage:F1} bytes/message ({SHIPS} ships)");
+            Assert.Equal(ITERATIONS + 10, received);
+            Assert.True(perMessage < 256 + SHIPS * 96, $"Too many bytes allocated per message: {perMessage}");
+        }
+    }
+}
@@ -0,0 +1,80 @@
+using System;
+using SGame;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_DeadShipStoreTests
+    {
+        [Fact]
+        public void EvictsLeastRecentlyKilledWhenFull()
+        {
+            long now = 0;
+            var store = new DeadShipStore() { Capacity = 3, Clock = () => now };
+
+            store.Add("a");
+            store.Add("b");
+            store.Add("c");
+            store.Add("a"); // (killed again: now the most recent)
+            store.Add("d");
+
+            Assert.Equal(3, store.Count);
+            Assert.Equal(1, store.EvictedFull);
+            Assert.False(store.Take("b"));
+            Assert.True(store.Take("a"));
+            Assert.False(store.Take("a"));
+            Assert.True(store.Take("c"));
+            Assert.True(store.Take("d"));
+            Assert.Equal(0, store.Count);
+        }
+
+        [Fact]
+        public void ExpiresOldTokens()
+        {
+            long now = 0;
+            var store = new DeadShipStore() { TimeToLive = TimeSpan.FromSeconds(10.0), Clock = () => now };
+
+            store.Add("old");
+            now = 6000;
+            store.Add("new");
+
+            now = 9999;
+            store.EvictExpired();
+            Assert.Equal(2, store.Count);
+
+            now = 10000;
+            store.EvictExpired();
+            Assert.Equal(1, store.Count);
+            Assert.Equal(1, store.EvictedExpired);
+            Assert.False(store.Take("old"));
+            Assert.True(store.Take("new"));
+
+            // (Nothing to spill to)
+            Assert.Equal(0, store.Spilled);
+        }
+
+        [Fact]
+        public void OnlySpillsTokensEvictedForCapacity()
+        {
+            long now = 0;
+            var store = new DeadShipStore(new Persistence("http://127.0.0.1:9"))
+            {
+                Capacity = 2, TimeToLive = TimeSpan.FromSeconds(10.0), Clock = () => now,
+            };
+
+            store.Add("expired");
+            now = 10000;
+            store.EvictExpired();
+            Assert.Equal(1, store.EvictedExpired);
+            Assert.Equal(0, store.Spilled);
+            // (Nothing was spilled, so there is nothing to look up)
+            Assert.False(store.TakeSpilled("expired").Result);
+
+            store.Add("a");
+            store.Add("b");
+            store.Add("c");
+            Assert.Equal(1, store.EvictedFull);
+            Assert.Equal(1, store.Spilled);
+        }
+    }
+}
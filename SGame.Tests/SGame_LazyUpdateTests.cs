@@ -0,0 +1,183 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using SGame;
+using SShared;
+using Xunit;
+using Messages = SShared.Messages;
+
+namespace SGame.Tests
+{
+    public class SGame_LazyUpdateTests
+    {
+        [Fact]
+        public void EventQueuePopsInTimeOrder()
+        {
+            var queue = new ShipEventQueue();
+            queue.Schedule("c", 300.0);
+            queue.Schedule("a", 100.0);
+            queue.Schedule("b", 200.0);
+
+            var popped = new List<string>();
+            string token;
+            while (queue.TryPopDue(250.0, out token))
+            {
+                popped.Add(token);
+            }
+
+            Assert.Equal(new List<string> { "a", "b" }, popped);
+            Assert.Equal(1, queue.Count);
+        }
+
+        [Fact]
+        public void EventQueueReschedulingInvalidatesOldEvent()
+        {
+            var queue = new ShipEventQueue();
+            queue.Schedule("a", 100.0);
+            queue.Schedule("a", 500.0);
+
+            string token;
+            Assert.False(queue.TryPopDue(200.0, out token));
+            Assert.True(queue.TryPopDue(500.0, out token));
+            Assert.Equal("a", token);
+            Assert.False(queue.TryPopDue(double.MaxValue, out token));
+
+            queue.Schedule("b", 100.0);
+            queue.Schedule("b", double.PositiveInfinity);
+            Assert.False(queue.TryPopDue(double.MaxValue, out token));
+            Assert.Equal(0, queue.Count);
+        }
+
+        [Fact]
+        public void NextTransferTimeOnExit()
+        {
+            var gameTime = new GameTime();
+            gameTime.SetElapsedMillisecondsManually(1000);
+            var node = new LocalQuadTreeNode(new Quad(0.0, 0.0, 100.0), 0);
+
+            var ship = new LocalSpaceship("token-00000000", gameTime);
+            ship.Pos = new Vector2(0.0, 0.0);
+
+            // Still ship: never leaves
+            Assert.True(double.IsPositiveInfinity(node.NextTransferTime(ship)));
+
+            // Moving right at 10 units/s: touches the right edge after (100 - radius) / 10 seconds
+            ship.Velocity = new Vector2(10.0, 0.0);
+            double expected = 1000.0 + (100.0 - ship.Radius()) / 10.0 * 1000.0;
+            Assert.Equal(expected, node.NextTransferTime(ship), 6);
+        }
+
+        [Theory]
+        [InlineData(false)]
+        [InlineData(true)]
+        public void ScansOnlyUpdateShipsThatMayBeScanned(bool soaStorage)
+        {
+            var gameTime = new GameTime();
+            gameTime.SetElapsedMillisecondsManually(0);
+            var node = new LocalQuadTreeNode(new Quad(0.0, 0.0, 1000.0), 0) { LazyUpdates = true, GameTime = gameTime };
+            node.UseShipStore(soaStorage);
+
+            var scanner = new LocalSpaceship("token-00000000", gameTime);
+            // (Moves into the scanned sector by the time of the scan)
+            var incoming = new LocalSpaceship("token-00000001", gameTime) { Pos = new Vector2(200.0, 0.0), Velocity = new Vector2(-10.0, 0.0) };
+            var faraway = new LocalSpaceship("token-00000002", gameTime) { Pos = new Vector2(-500.0, 0.0) };
+            node.AddShip(scanner);
+            node.AddShip(incoming);
+            node.AddShip(faraway);
+
+            gameTime.SetElapsedMillisecondsManually(10000);
+            var msg = new Messages.ScanShoot()
+            {
+                Originator = scanner.Token, Origin = scanner.Pos, Direction = 0.0, Width = 0.5, Radius = 150.0,
+            };
+            var scanned = node.ScanShootLocal(msg).ShipsInfo;
+
+            Assert.Equal(incoming.PublicId, Assert.Single(scanned).PublicId);
+            Assert.Equal(100.0, incoming.Pos.X, 6);
+            Assert.Equal(10000.0, incoming.LastUpdate);
+            Assert.Equal(0.0, faraway.LastUpdate);
+        }
+
+        [Fact]
+        public void QueriesOnlyUpdateShipsFound()
+        {
+            var gameTime = new GameTime();
+            gameTime.SetElapsedMillisecondsManually(0);
+            var node = new LocalQuadTreeNode(new Quad(0.0, 0.0, 1000.0), 0) { LazyUpdates = true, GameTime = gameTime };
+
+            var incoming = new LocalSpaceship("token-00000001", gameTime) { Pos = new Vector2(200.0, 0.0), Velocity = new Vector2(-10.0, 0.0) };
+            var leaving = new LocalSpaceship("token-00000002", gameTime) { Pos = new Vector2(0.0, 0.0), Velocity = new Vector2(0.0, 50.0) };
+            node.AddShip(incoming);
+            node.AddShip(leaving);
+
+            gameTime.SetElapsedMillisecondsManually(10000);
+            var found = node.QueryLocal(new RadiusQuery(new Vector2(0.0, 0.0), 150.0)).Result;
+
+            Assert.Same(incoming, Assert.Single(found));
+            Assert.Equal(10000.0, incoming.LastUpdate);
+            Assert.Equal(0.0, leaving.LastUpdate);
+        }
+
+        [Theory]
+        [InlineData(false)]
+        [InlineData(true)]
+        public void ScansMatchPerTickUpdates(bool soaStorage)
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            gameTime.SetElapsedMillisecondsManually(0);
+            var perTick = new LocalQuadTreeNode(new Quad(0.0, 0.0, 2000.0), 0) { GameTime = gameTime };
+            var lazy = new LocalQuadTreeNode(new Quad(0.0, 0.0, 2000.0), 0) { LazyUpdates = true, GameTime = gameTime };
+            lazy.UseShipStore(soaStorage);
+
+            // (The same fleet on both nodes, moving, and spread away from the world origin)
+            var random = new Random(26);
+            var fleet = Enumerable.Range(0, 1000)
+                .Select(_ => (new Vector2(random.NextDouble() * 1500.0 - 500.0, random.NextDouble() * 1500.0 - 500.0),
+                              new Vector2(random.NextDouble() * 20.0 - 10.0, random.NextDouble() * 20.0 - 10.0)))
+                .ToList();
+            foreach (var node in new[] { perTick, lazy })
+            {
+                for (int i = 0; i < fleet.Count; i++)
+                {
+                    node.AddShip(new LocalSpaceship($"token-{i:x8}", gameTime) { Pos = fleet[i].Item1, Velocity = fleet[i].Item2, Area = 10.0 });
+                }
+            }
+
+            for (long time = 100; time <= 5000; time += 100)
+            {
+                gameTime.SetElapsedMillisecondsManually(time);
+                perTick.UpdateShips(time);
+
+                var scanner = perTick.ShipsByToken[$"token-{random.Next(fleet.Count):x8}"];
+                var msg = new Messages.ScanShoot()
+                {
+                    Originator = scanner.Token, Origin = scanner.Pos, Direction = random.NextDouble() * 2.0 * Math.PI,
+                    Width = 0.05 + random.NextDouble(), Radius = random.NextDouble() * 300.0,
+                };
+                var scanned = new[] { perTick, lazy }
+                    .Select(node => node.ScanShootLocal(msg).ShipsInfo.Select(info => info.PublicId).OrderBy(id => id).ToList())
+                    .ToList();
+                Assert.Equal(scanned[0], scanned[1]);
+            }
+        }
+
+        [Fact]
+        public void NextTransferTimeOnChildEntry()
+        {
+            var gameTime = new GameTime();
+            gameTime.SetElapsedMillisecondsManually(0);
+            var node = new LocalQuadTreeNode(new Quad(0.0, 0.0, 100.0), 0);
+            node.SetChild(Quadrant.NE, new DummyQuadTreeNode());
+
+            var ship = new LocalSpaceship("token-00000000", gameTime);
+            ship.Pos = new Vector2(-50.0, 50.0);
+            ship.Velocity = new Vector2(10.0, 0.0);
+
+            // The ship is fully inside the child once its left edge crosses the child's left edge
+            var childBounds = node.Child(Quadrant.NE).Bounds;
+            Assert.True(childBounds.Y + ship.Radius() <= 50.0 && 50.0 <= childBounds.Y2 - ship.Radius());
+            double expected = (childBounds.X + ship.Radius() + 50.0) / 10.0 * 1000.0;
+            Assert.Equal(expected, node.NextTransferTime(ship), 6);
+        }
+    }
+}
@@ -0,0 +1,56 @@
+using System;
+using System.Collections.Generic;
+using SShared;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_MetricsTests
+    {
+        [Fact]
+        public void RendersPrometheusText()
+        {
+            var metrics = new Metrics();
+            var scans = metrics.Counter("api_requests_total", "REST requests handled, by route.", Metrics.Labels("route", "scan"));
+            metrics.Counter("api_requests_total", "REST requests handled, by route.", Metrics.Labels("route", "shoot"));
+            var latency = metrics.Histogram("latency_seconds", "Latency.", null, new double[] { 0.1, 1.0 });
+            metrics.Gauge("ships", "Ships.", () => 3.0);
+            metrics.GaugeSet("node_ships", "Ships per node.", () => new[]
+            {
+                new KeyValuePair<string, double>(Metrics.Labels("api_url", "http://a\"b/"), 2.0),
+            });
+
+            // Looking an instrument up again returns the same one
+            Assert.Same(scans, metrics.Counter("api_requests_total", "REST requests handled, by route.", Metrics.Labels("route", "scan")));
+            Assert.Throws<InvalidOperationException>(() => metrics.Histogram("ships", "Ships."));
+
+            scans.Increment();
+            scans.Increment(2);
+            latency.Observe(0.05);
+            latency.Observe(0.5);
+            latency.Observe(0.5);
+            latency.Observe(10.0);
+
+            var expected = string.Join("\n",
+                "# HELP api_requests_total REST requests handled, by route.",
+                "# TYPE api_requests_total counter",
+                "api_requests_total{route=\"scan\"} 3",
+                "api_requests_total{route=\"shoot\"} 0",
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                "latency_seconds_bucket{le=\"0.1\"} 1",
+                "latency_seconds_bucket{le=\"1\"} 3",
+                "latency_seconds_bucket{le=\"+Inf\"} 4",
+                "latency_seconds_sum 11.05",
+                "latency_seconds_count 4",
+                "# HELP node_ships Ships per node.",
+                "# TYPE node_ships gauge",
+                "node_ships{api_url=\"http://a\\\"b/\"} 2",
+                "# HELP ships Ships.",
+                "# TYPE ships gauge",
+                "ships 3",
+                "");
+            Assert.Equal(expected, metrics.Render());
+        }
+    }
+}
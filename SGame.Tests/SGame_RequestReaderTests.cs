@@ -0,0 +1,71 @@
+using System;
+using System.IO;
+using System.Text;
+using SShared;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_RequestReaderTests
+    {
+        private static (ApiRequestStatus Status, Newtonsoft.Json.Linq.JObject Json, string Error) Read(string body, ApiRequestFields fields, int maxBodySize = 1024, bool declareLength = true)
+        {
+            byte[] bytes = Encoding.UTF8.GetBytes(body);
+            using (var stream = new MemoryStream(bytes))
+            {
+                return ApiRequestReader.Read(stream, declareLength ? bytes.Length : -1, maxBodySize, fields).Result;
+            }
+        }
+
+        [Fact]
+        public void KeepsOnlyKnownFields()
+        {
+            var fields = new ApiRequestFields(new[] { "token", "x" });
+            var result = Read("{\"gift\": {\"a\": [1, 2, \"junk\"]}, \"token\": \"abc\", \"x\": 1.5, \"y\": 2}", fields);
+
+            Assert.Equal(ApiRequestStatus.Ok, result.Status);
+            Assert.Equal(2, result.Json.Count);
+            Assert.Equal("abc", (string)result.Json["token"]);
+            Assert.Equal(1.5, (double)result.Json["x"]);
+        }
+
+        [Fact]
+        public void AllFieldsKeepsNestedValues()
+        {
+            var result = Read("{\"a\": {\"b\": [true, null, 3]}, \"c\": -2}", ApiRequestFields.All);
+
+            Assert.Equal(ApiRequestStatus.Ok, result.Status);
+            Assert.Equal(3, (int)result.Json["a"]["b"][2]);
+            Assert.Equal(-2, (int)result.Json["c"]);
+        }
+
+        [Fact]
+        public void EmptyBodyIsEmptyObject()
+        {
+            var result = Read("", ApiRequestFields.All);
+            Assert.Equal(ApiRequestStatus.Ok, result.Status);
+            Assert.Empty(result.Json);
+        }
+
+        [Theory]
+        [InlineData("{\"token\": ")]
+        [InlineData("[1, 2, 3]")]
+        [InlineData("not json")]
+        public void RejectsMalformedBodies(string body)
+        {
+            var result = Read(body, ApiRequestFields.All);
+            Assert.Equal(ApiRequestStatus.Malformed, result.Status);
+            Assert.NotNull(result.Error);
+        }
+
+        [Theory]
+        [InlineData(true)]
+        [InlineData(false)]
+        public void RejectsOversizedBodies(bool declareLength)
+        {
+            string body = "{\"gift\": \"" + new string('x', 5000) + "\"}";
+            Assert.Equal(ApiRequestStatus.TooLarge, Read(body, ApiRequestFields.None, 4096, declareLength).Status);
+            Assert.Equal(ApiRequestStatus.Ok, Read(body, ApiRequestFields.None, 8192, declareLength).Status);
+        }
+    }
+}
@@ -0,0 +1,61 @@
+using System;
+using System.Collections.Generic;
+using SGame;
+using SShared;
+using SShared.Messages;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_ScanCacheTests
+    {
+        private static ScanShoot MakeScan(string originator, double x = 10.0, double direction = 1.0)
+        {
+            return new ScanShoot()
+            {
+                Originator = originator,
+                Origin = new Vector2(x, -5.0),
+                Direction = direction,
+                Width = 0.5,
+                Radius = 100.0,
+            };
+        }
+
+        [Fact]
+        public void ServesRepeatedScansUntilInvalidated()
+        {
+            var cache = new ScanCache();
+            var ships = new List<Struck.ShipInfo>() { new Struck.ShipInfo() { PublicId = "0000abcd", Area = 2.0 } };
+
+            Assert.Null(cache.Get(MakeScan("ship")));
+            cache.Put(MakeScan("ship"), cache.Epoch, ships);
+
+            // Same scan, up to quantization (and angle wrapping)
+            Assert.Same(ships, cache.Get(MakeScan("ship", x: 10.0 + ScanCache.POSITION_QUANTUM / 10.0)));
+            Assert.Same(ships, cache.Get(MakeScan("ship", direction: 1.0 + 2.0 * Math.PI)));
+            // Different ship or scan
+            Assert.Null(cache.Get(MakeScan("other")));
+            Assert.Null(cache.Get(MakeScan("ship", x: 11.0)));
+
+            cache.Invalidate();
+            Assert.Null(cache.Get(MakeScan("ship")));
+
+            Assert.Equal(2, cache.Hits);
+            Assert.Equal(4, cache.Misses);
+            Assert.Equal(2.0 / 6.0, cache.HitRate, 6);
+        }
+
+        [Fact]
+        public void DropsResultsFromAnOldEpoch()
+        {
+            var cache = new ScanCache();
+            long epoch = cache.Epoch;
+
+            // Invalidated while the scan was waiting for the other nodes
+            cache.Invalidate();
+            cache.Put(MakeScan("ship"), epoch, new List<Struck.ShipInfo>());
+
+            Assert.Null(cache.Get(MakeScan("ship")));
+        }
+    }
+}
@@ -135,6 +135,59 @@ namespace SGame.Tests
             // Assert.Equal(expectedValue, actual);
             Assert.True(MathUtils.ToleranceEquals(expectedValue, actual, 0.02));
 
+            Assert.Equal(ReferenceShielding.ShieldingAmount(ship, shotOrigin, MathUtils.Deg2Rad(shotDir), MathUtils.Deg2Rad(shotWidth), shotRadius), actual);
+            var shieldings = new double[1];
+            MathUtils.ShieldingAmounts(new[] { ship }, shotOrigin, MathUtils.Deg2Rad(shotDir), MathUtils.Deg2Rad(shotWidth), shotRadius, shieldings);
+            Assert.Equal(actual, shieldings[0]);
+        }
+
+        [Fact]
+        public void ShieldingAmountMatchesReference()
+        {
+            var random = new Random(48);
+            var gameTime = new GameTime();
+            int compared = 0, fullyShielded = 0, unshielded = 0;
+            for (int i = 0; i < 20000; i++)
+            {
+                var ship = new LocalSpaceship($"{i:D8}", gameTime);
+                ship.Pos = new Vector2(random.NextDouble() * 200.0 - 100.0, random.NextDouble() * 200.0 - 100.0);
+                ship.Area = 1.0 + random.NextDouble() * 100.0;
+                ship.ShieldDir = random.NextDouble() * 4.0 * Math.PI - 2.0 * Math.PI;
+                ship.ShieldWidth = random.Next(10) == 0 ? 0.0 : random.NextDouble() * Math.PI;
+
+                // A shot from outside the ship, aimed (roughly) at it
+                double distance = ship.Radius() * (1.0 + random.NextDouble() * 20.0);
+                double angle = random.NextDouble() * 2.0 * Math.PI;
+                var shotOrigin = ship.Pos + MathUtils.DirVec(angle) * distance;
+                double shotWidth = 0.01 + random.NextDouble() * Math.PI / 2.0;
+                double shotDir = angle + Math.PI + (random.NextDouble() - 0.5) * shotWidth;
+                double shotRadius = distance + ship.Radius() * (random.NextDouble() * 3.0 - 0.5);
+
+                double expected;
+                try
+                {
+                    expected = ReferenceShielding.ShieldingAmount(ship, shotOrigin, shotDir, shotWidth, shotRadius);
+                }
+                catch (InvalidOperationException)
+                {
+                    continue;
+                }
+                if (double.IsNaN(expected))
+                {
+                    continue;
+                }
+
+                Assert.Equal(expected, MathUtils.ShieldingAmount(ship, shotOrigin, shotDir, shotWidth, shotRadius));
+                compared++;
+                if (expected == 1.0) fullyShielded++;
+                if (expected == 0.0) unshielded++;
+            }
+
+            // (Make sure that all paths were exercised)
+            Assert.True(compared > 15000);
+            Assert.True(fullyShielded > 1000);
+            Assert.True(unshielded > 1000);
+            Assert.True(compared - fullyShielded - unshielded > 1000);
         }
     }
 
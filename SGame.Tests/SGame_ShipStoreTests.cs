@@ -0,0 +1,149 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using SGame;
+using SShared;
+using Xunit;
+using Messages = SShared.Messages;
+
+namespace SGame.Tests
+{
+    public class SGame_ShipStoreTests
+    {
+        [Fact]
+        public void UpdateAllMatchesUpdateState()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            gameTime.SetElapsedMillisecondsManually(0);
+
+            var store = new ShipStore(4);
+            var reference = new List<LocalSpaceship>();
+            for (int i = 0; i < 37; i++)
+            {
+                reference.Add(TestShips.Make(i, gameTime));
+                store.Attach(TestShips.Make(i, gameTime));
+            }
+
+            foreach (long time in new long[] { 16, 500, 4000, 90000 })
+            {
+                gameTime.SetElapsedMillisecondsManually(time);
+                store.UpdateAll(time);
+                foreach (var ship in reference)
+                {
+                    ship.UpdateState();
+                }
+
+                for (int i = 0; i < reference.Count; i++)
+                {
+                    var expected = reference[i];
+                    var actual = store.Ships[store.SlotOf(expected.Token)];
+                    Assert.Equal(expected.Pos.X, actual.Pos.X, 9);
+                    Assert.Equal(expected.Pos.Y, actual.Pos.Y, 9);
+                    Assert.Equal(expected.Energy, actual.Energy, 9);
+                    Assert.Equal(expected.ShieldWidth, actual.ShieldWidth, 9);
+                    Assert.Equal(expected.KillReward, actual.KillReward, 9);
+                    Assert.Equal(expected.LastUpdate, actual.LastUpdate);
+                }
+            }
+        }
+
+        [Fact]
+        public void DetachKeepsStateAndSlots()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            gameTime.SetElapsedMillisecondsManually(0);
+
+            var store = new ShipStore();
+            var ships = new List<LocalSpaceship>();
+            for (int i = 0; i < 5; i++)
+            {
+                ships.Add(TestShips.Make(i, gameTime));
+                store.Attach(ships[i]);
+            }
+
+            ships[1].Area = 42.0;
+            var detached = store.Detach(ships[1].Token);
+            Assert.Same(ships[1], detached);
+            Assert.Null(detached.Store);
+            Assert.Equal(42.0, detached.Area);
+            Assert.Equal(new Vector2(3.0, -2.0).X, detached.Pos.X);
+            Assert.Equal(-1, store.SlotOf(ships[1].Token));
+            Assert.Equal(4, store.Count);
+
+            // The last ship was moved into the freed slot
+            Assert.Equal(1, ships[4].Slot);
+            Assert.Same(ships[4], store.Ships[1]);
+            Assert.Equal(TestShips.Make(4, gameTime).Pos.X, ships[4].Pos.X);
+
+            Assert.Null(store.Detach(ships[1].Token));
+        }
+
+        [Fact]
+        public void SlotsNearFiltersByDistance()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            var store = new ShipStore();
+
+            var near = new LocalSpaceship("token-00000001", gameTime) { Pos = new Vector2(5.0, 0.0) };
+            var far = new LocalSpaceship("token-00000002", gameTime) { Pos = new Vector2(50.0, 0.0) };
+            store.Attach(near);
+            store.Attach(far);
+
+            var slots = new List<int>();
+            store.SlotsNear(new Vector2(0.0, 0.0), 5.0, slots);
+            Assert.Equal(new List<int> { near.Slot }, slots);
+
+            // Where the ships will be in 10 seconds (without moving them)
+            far.Velocity = new Vector2(-5.0, 0.0);
+            slots.Clear();
+            store.SlotsNear(new Vector2(0.0, 0.0), 5.0, slots, 10000);
+            Assert.Equal(new List<int> { near.Slot, far.Slot }, slots);
+            Assert.Equal(50.0, far.Pos.X);
+        }
+
+        [Fact]
+        public void ScanShootLocalMatchesWithoutStore()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            gameTime.SetElapsedMillisecondsManually(0);
+            var nodes = new[] { new LocalQuadTreeNode(new Quad(0.0, 0.0, 2000.0), 0), new LocalQuadTreeNode(new Quad(0.0, 0.0, 2000.0), 0) };
+            nodes[1].UseShipStore(true);
+
+            // (The same fleet on both nodes, spread away from the world origin)
+            var random = new Random(27);
+            var positions = Enumerable.Range(0, 2000)
+                .Select(_ => new Vector2(random.NextDouble() * 1500.0 - 500.0, random.NextDouble() * 1500.0 - 500.0))
+                .ToList();
+            foreach (var node in nodes)
+            {
+                for (int i = 0; i < positions.Count; i++)
+                {
+                    var ship = TestShips.Make(i, gameTime);
+                    ship.Pos = positions[i];
+                    ship.Velocity = new Vector2(0.0, 0.0);
+                    ship.Area = 10.0;
+                    // (Unshielded, as the shielding of grazing shots can fail to compute)
+                    ship.ShieldWidth = 0.0;
+                    node.AddShip(ship);
+                }
+            }
+
+            for (int i = 0; i < 100; i++)
+            {
+                var origin = positions[random.Next(positions.Count)];
+                var msg = new Messages.ScanShoot()
+                {
+                    Originator = "none", Origin = origin, Direction = random.NextDouble() * 2.0 * Math.PI,
+                    Width = 0.05 + random.NextDouble(), Radius = random.NextDouble() * 300.0,
+                    ScaledShotEnergy = i % 2 == 0 ? 0.0 : 0.01,
+                };
+                var results = nodes.Select(node => node.ScanShootLocal(msg).ShipsInfo
+                    .Select(info => (info.PublicId, info.Damage, info.Area))
+                    .OrderBy(info => info.PublicId)
+                    .ToList()).ToList();
+                Assert.NotEmpty(results[0]);
+                Assert.Equal(results[0], results[1]);
+            }
+        }
+    }
+}
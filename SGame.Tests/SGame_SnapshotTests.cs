@@ -0,0 +1,85 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using SGame;
+using SShared;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_SnapshotTests
+    {
+        [Fact]
+        public void RoundTripsAllShips()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            gameTime.SetElapsedMillisecondsManually(5000);
+            var ships = Enumerable.Range(0, 100).Select(i => TestShips.Make(i, gameTime)).ToList();
+
+            string path = Path.Combine(Path.GetTempPath(), $"sgame-snapshot-{Guid.NewGuid()}.bin");
+            try
+            {
+                File.WriteAllText(path, "an older snapshot");
+                long bytes = Snapshot.Write(path, ships, gameTime.ElapsedMilliseconds, new Quad(1.0, 2.0, 3.0));
+                Assert.Equal(new FileInfo(path).Length, bytes);
+                Assert.False(File.Exists(path + ".tmp"));
+
+                // (Restored on a node whose clock is elsewhere: times are kept relative)
+                var restoredTime = new GameTime(GameTimeMode.Manual);
+                restoredTime.SetElapsedMillisecondsManually(100);
+                Quad bounds;
+                var restored = Snapshot.Read(path, restoredTime, out bounds);
+
+                Assert.Equal(new Quad(1.0, 2.0, 3.0), bounds);
+                Assert.Equal(ships.Count, restored.Count);
+                for (int i = 0; i < ships.Count; i++)
+                {
+                    var expected = ships[i];
+                    var actual = restored[i];
+                    Assert.Equal(expected.Token, actual.Token);
+                    Assert.Equal(expected.Pos, actual.Pos);
+                    Assert.Equal(expected.Velocity, actual.Velocity);
+                    Assert.Equal(expected.Area, actual.Area);
+                    Assert.Equal(expected.Energy, actual.Energy);
+                    Assert.Equal(expected.ShieldDir, actual.ShieldDir);
+                    Assert.Equal(expected.ShieldWidth, actual.ShieldWidth);
+                    Assert.Equal(expected.KillReward, actual.KillReward);
+                    Assert.Equal(100 - (5000 - expected.LastCombat), actual.LastCombat);
+                    Assert.Same(restoredTime, actual.GameTime);
+                }
+            }
+            finally
+            {
+                File.Delete(path);
+            }
+        }
+
+        [Fact]
+        public void RejectsCorruptSnapshots()
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            var ships = new List<LocalSpaceship>() { TestShips.Make(1, gameTime) };
+
+            string path = Path.Combine(Path.GetTempPath(), $"sgame-snapshot-{Guid.NewGuid()}.bin");
+            try
+            {
+                Snapshot.Write(path, ships, 0, new Quad(0.0, 0.0, 1.0));
+                var bytes = File.ReadAllBytes(path);
+                File.WriteAllBytes(path, bytes.Take(bytes.Length - 1).ToArray());
+                Assert.Throws<InvalidDataException>(() => Snapshot.Read(path, gameTime, out _));
+
+                bytes[0] = (byte)'X';
+                File.WriteAllBytes(path, bytes);
+                Assert.Throws<InvalidDataException>(() => Snapshot.Read(path, gameTime, out _));
+
+                File.WriteAllText(path, "");
+                Assert.Throws<InvalidDataException>(() => Snapshot.Read(path, gameTime, out _));
+            }
+            finally
+            {
+                File.Delete(path);
+            }
+        }
+    }
+}
@@ -0,0 +1,181 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using System.Threading.Tasks;
+using LiteNetLib.Utils;
+using SGame;
+using SShared;
+using Xunit;
+using Messages = SShared.Messages;
+
+namespace SGame.Tests
+{
+    public class SGame_SpatialQueryTests
+    {
+        /// <summary>
+        /// A node whose queries only complete when `Answer()` is called.
+        /// </summary>
+        private class SlowQuadTreeNode : SGameQuadTreeNode
+        {
+            private TaskCompletionSource<List<Spaceship>> _answer = new TaskCompletionSource<List<Spaceship>>();
+
+            public SlowQuadTreeNode() : base(new Quad(0.0, 0.0, 0.0)) { }
+
+            public void Answer(List<Spaceship> ships) => _answer.SetResult(ships);
+
+            public override Task<List<Spaceship>> QueryLocal(SpatialQuery query) => _answer.Task;
+
+            public override Messages.Struck ScanShootLocal(Messages.ScanShoot msg) => new Messages.Struck();
+        }
+
+        /// <summary>
+        /// Builds a root node with 4 local children (the NW one with 4 local children of its own), and spreads
+        /// `numShips` random ships in it; returns the root and all ships.
+        /// </summary>
+        private static (LocalQuadTreeNode, List<LocalSpaceship>) MakeTree(int numShips, int seed)
+        {
+            var gameTime = new GameTime(GameTimeMode.Manual);
+            var root = new LocalQuadTreeNode(new Quad(0.0, 0.0, 1000.0), 0);
+            foreach (Quadrant quadrant in Enum.GetValues(typeof(Quadrant)))
+            {
+                root.SetChild(quadrant, new LocalQuadTreeNode(root, quadrant, 1));
+            }
+            var nw = root.Child(Quadrant.NW);
+            foreach (Quadrant quadrant in Enum.GetValues(typeof(Quadrant)))
+            {
+                nw.SetChild(quadrant, new LocalQuadTreeNode(nw, quadrant, 2));
+            }
+
+            var random = new Random(seed);
+            var ships = new List<LocalSpaceship>();
+            for (int i = 0; i < numShips; i++)
+            {
+                var ship = new LocalSpaceship($"{i:D8}", gameTime);
+                ship.Pos = new Vector2(random.NextDouble() * 1900.0 - 950.0, random.NextDouble() * 1900.0 - 950.0);
+                ship.Area = 1.0 + random.NextDouble() * 20.0;
+                var node = (LocalQuadTreeNode)root.SmallestNodeWhichContains(ship.Bounds);
+                node.AddShip(ship);
+                ships.Add(ship);
+            }
+            return (root, ships);
+        }
+
+        private static void AssertSameShips(IEnumerable<Spaceship> expected, IEnumerable<Spaceship> actual)
+        {
+            Assert.Equal(expected.Select(ship => ship.Token).OrderBy(token => token),
+                actual.Select(ship => ship.Token).OrderBy(token => token));
+        }
+
+        [Fact]
+        public void FindsTheSameShipsAsBruteForce()
+        {
+            var (root, ships) = MakeTree(500, 49);
+            var random = new Random(490);
+            for (int i = 0; i < 200; i++)
+            {
+                var centre = new Vector2(random.NextDouble() * 2000.0 - 1000.0, random.NextDouble() * 2000.0 - 1000.0);
+                double radius = random.NextDouble() * 400.0;
+                var queries = new SpatialQuery[]
+                {
+                    new RangeQuery(new Quad(centre.X, centre.Y, radius)),
+                    new RadiusQuery(centre, radius),
+                    new SectorQuery(centre, random.NextDouble() * 2.0 * Math.PI, random.NextDouble() * Math.PI / 2.0, radius),
+                };
+                foreach (var query in queries)
+                {
+                    var found = root.QueryAll(query).Result;
+                    Assert.Equal(found.Count, found.Distinct().Count());
+                    AssertSameShips(ships.Where(ship => query.Matches(ship.Bounds)), found);
+                }
+
+                var range = new Quad(centre.X, centre.Y, radius);
+                AssertSameShips(ships.Where(ship => ship.Bounds.Intersects(range)), root.CheckRangeRecur(range).Result);
+            }
+
+            var circle = new RadiusQuery(new Vector2(100.0, -200.0), 300.0);
+            AssertSameShips(ships.Where(ship => (ship.Pos - circle.Centre).Length() <= 300.0 + ship.Radius()), root.QueryAll(circle).Result);
+        }
+
+        [Fact]
+        public void LocalQueriesComplete()
+        {
+            var (root, ships) = MakeTree(50, 1);
+            root.SetChild(Quadrant.SE, new DummyQuadTreeNode());
+
+            var everything = new RangeQuery(root.Bounds);
+            Assert.True(root.CheckRangeLocal(root.Bounds).Wait(TimeSpan.FromSeconds(5.0)));
+            Assert.True(root.Child(Quadrant.SE).QueryLocal(everything).Wait(TimeSpan.FromSeconds(5.0)));
+            Assert.True(root.CheckRangeRecur(root.Bounds).Wait(TimeSpan.FromSeconds(5.0)));
+        }
+
+        [Fact]
+        public async Task StreamsResultsAsNodesAnswer()
+        {
+            var (root, ships) = MakeTree(100, 2);
+            var slow = new SlowQuadTreeNode();
+            root.SetChild(Quadrant.SE, slow);
+            var slowShip = new Spaceship() { Token = "slow" };
+
+            var everything = new RangeQuery(root.Bounds);
+            var results = new List<List<Spaceship>>();
+            var streaming = Task.Run(async () =>
+            {
+                await foreach (var found in root.QueryRecur(everything))
+                {
+                    lock (results) results.Add(found);
+                }
+            });
+
+            // (All local nodes but the replaced SE one answer right away; the slow one only once told to)
+            int localNodes = root.Traverse().Count(node => node is LocalQuadTreeNode);
+            for (int i = 0; i < 100 && results.Count < localNodes; i++)
+            {
+                await Task.Delay(10);
+            }
+            lock (results) Assert.Equal(localNodes, results.Count);
+            Assert.False(streaming.IsCompleted);
+
+            slow.Answer(new List<Spaceship>() { slowShip });
+            Assert.True(streaming.Wait(TimeSpan.FromSeconds(5.0)));
+            Assert.Same(slowShip, results.Last().Single());
+            // (The ships in the replaced SE node are gone)
+            AssertSameShips(ships.Where(ship => root.SmallestNodeWhichContains(ship.Bounds) != slow).Append(slowShip),
+                results.SelectMany(found => found));
+        }
+
+        [Fact]
+        public void RoundTripsQueries()
+        {
+            var queries = new SpatialQuery[]
+            {
+                new RangeQuery(new Quad(1.0, -2.0, 3.0)),
+                new RadiusQuery(new Vector2(4.0, 5.0), 6.0),
+                new SectorQuery(new Vector2(-7.0, 8.0), 0.9, 0.1, 11.0),
+            };
+            var writer = new NetDataWriter();
+            var msg = new Messages.QueryShips() { QueryId = "q", Query = queries[2] };
+            foreach (var query in queries)
+            {
+                query.Write(writer);
+            }
+            msg.Serialize(writer);
+
+            var reader = new NetDataReader(writer.CopyData());
+            var range = SpatialQuery.Read(reader) as RangeQuery;
+            Assert.NotNull(range);
+            Assert.Equal(new Quad(1.0, -2.0, 3.0), range.Range);
+            var radius = SpatialQuery.Read(reader) as RadiusQuery;
+            Assert.NotNull(radius);
+            Assert.Equal(new Vector2(4.0, 5.0), radius.Centre);
+            Assert.Equal(6.0, radius.Radius);
+            var sector = SpatialQuery.Read(reader) as SectorQuery;
+            Assert.NotNull(sector);
+            Assert.Equal((new Vector2(-7.0, 8.0), 0.9, 0.1, 11.0), (sector.Origin, sector.Direction, sector.Width, sector.Radius));
+
+            var received = new Messages.QueryShips();
+            received.Deserialize(reader);
+            Assert.Equal("q", received.QueryId);
+            Assert.IsType<SectorQuery>(received.Query);
+        }
+    }
+}
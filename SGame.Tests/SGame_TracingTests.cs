@@ -0,0 +1,82 @@
+using System;
+using System.IO;
+using System.Linq;
+using LiteNetLib.Utils;
+using Newtonsoft.Json.Linq;
+using SShared;
+using SShared.Messages;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_TracingTests
+    {
+        [Fact]
+        public void WritesSpansAsJsonLines()
+        {
+            string path = Path.GetTempFileName();
+            try
+            {
+                using (var tracer = new Tracer(path, "http://node/"))
+                {
+                    double start = Tracer.Now;
+                    tracer.RecordSince("abc", "sgame.request", start, "scan");
+                    tracer.Record(null, "untraced", start, start);
+                    tracer.Record("def", "scanshoot.local", start, start + 1.0);
+                }
+
+                var spans = File.ReadAllLines(path).Select(JObject.Parse).ToList();
+                Assert.Equal(2, spans.Count);
+                Assert.Equal("abc", (string)spans[0]["trace"]);
+                Assert.Equal("http://node/", (string)spans[0]["node"]);
+                Assert.Equal("sgame.request", (string)spans[0]["span"]);
+                Assert.Equal("scan", (string)spans[0]["detail"]);
+                Assert.True((double)spans[0]["end"] >= (double)spans[0]["start"]);
+                Assert.Equal(1.0, (double)spans[1]["end"] - (double)spans[1]["start"], 6);
+                Assert.Null(spans[1]["detail"]);
+            }
+            finally
+            {
+                File.Delete(path);
+            }
+        }
+
+        [Fact]
+        public void ParsesTraceIds()
+        {
+            Assert.Null(Tracer.ParseTraceId(null));
+            Assert.Null(Tracer.ParseTraceId("  "));
+            Assert.Equal("abc", Tracer.ParseTraceId(" abc "));
+            Assert.Equal(Tracer.MAX_TRACE_ID_LENGTH, Tracer.ParseTraceId(new string('x', 1000)).Length);
+        }
+
+        [Fact]
+        public void ScanShootCarriesTheTraceId()
+        {
+            var processor = new NetNodePacketProcessor();
+            Serialization.RegisterAllSerializers(processor);
+            ScanShoot received = null;
+            processor.Events<ScanShoot>().OnMessageReceived += (sender, message) => received = message;
+
+            var writer = new NetDataWriter();
+            processor.Write(writer, new ScanShoot() { Originator = "ship", Radius = 5.0, TraceId = "abc", SentAt = 123.5 });
+            var reader = new NetDataReader();
+            reader.SetSource(writer);
+            processor.ReadAllPackets(null, reader);
+
+            Assert.Equal("ship", received.Originator);
+            Assert.Equal(5.0, received.Radius);
+            Assert.Equal("abc", received.TraceId);
+            Assert.Equal(123.5, received.SentAt);
+
+            // (Untraced scans stay untraced)
+            writer.Reset();
+            processor.Write(writer, new ScanShoot() { Originator = "ship", Radius = 5.0, TraceId = null });
+            reader.SetSource(writer);
+            processor.ReadAllPackets(null, reader);
+
+            Assert.Equal(5.0, received.Radius);
+            Assert.Null(received.TraceId);
+        }
+    }
+}
@@ -0,0 +1,67 @@
+using System;
+using System.Threading;
+using SShared;
+using SShared.Messages;
+using Xunit;
+
+namespace SGame.Tests
+{
+    public class SGame_WaiterRegistryTests
+    {
+        private static WaiterRegistry MakeRegistry()
+        {
+            var registry = new WaiterRegistry(new NetNodePacketProcessor());
+            Serialization.RegisterReplyKeys(registry);
+            return registry;
+        }
+
+        [Fact]
+        public void DeliversByKeyInOrder()
+        {
+            var registry = MakeRegistry();
+            var first = registry.Wait<ShipConnected>(null, "a", Timeout.InfiniteTimeSpan);
+            var second = registry.Wait<ShipConnected>(null, "a", Timeout.InfiniteTimeSpan);
+            var other = registry.Wait<ShipConnected>(null, "b", Timeout.InfiniteTimeSpan);
+            Assert.Equal(3, registry.Pending);
+
+            var reply = new ShipConnected() { Token = "a" };
+            Assert.True(registry.Deliver(null, reply));
+            Assert.Same(reply, first.Result);
+            Assert.False(second.IsCompleted);
+            Assert.False(other.IsCompleted);
+
+            Assert.True(registry.Deliver(null, new ShipConnected() { Token = "a" }));
+            Assert.True(second.IsCompleted);
+            Assert.False(registry.Deliver(null, new ShipConnected() { Token = "c" }));
+
+            Assert.Equal(1, registry.Pending);
+            Assert.Equal(2, registry.Completed);
+            Assert.Equal(1, registry.Unclaimed);
+        }
+
+        [Fact]
+        public void ExpiresOverdueWaiters()
+        {
+            var registry = MakeRegistry();
+            var overdue = registry.Wait<Struck>(null, "ship", TimeSpan.Zero);
+            var pending = registry.Wait<Struck>(null, "ship", TimeSpan.FromHours(1.0));
+
+            registry.ExpireOverdue();
+            Assert.Null(overdue.Result);
+            Assert.False(pending.IsCompleted);
+            Assert.Equal(1, registry.Expired);
+
+            // The late reply goes to the waiter that is still live
+            Assert.True(registry.Deliver(null, new Struck() { Originator = "ship" }));
+            Assert.Equal("ship", pending.Result.Originator);
+            Assert.Equal(0, registry.Pending);
+        }
+
+        [Fact]
+        public void RejectsUnregisteredTypes()
+        {
+            var registry = new WaiterRegistry(new NetNodePacketProcessor());
+            Assert.Throws<InvalidOperationException>(() => registry.Wait<Struck>(null, "ship", TimeSpan.Zero));
+        }
+    }
+}
@@ -0,0 +1,28 @@
+using SGame;
+using SShared;
+
+namespace SGame.Tests
+{
+    /// <summary>
+    /// Ships for tests, with a varied but deterministic state.
+    /// </summary>
+    static class TestShips
+    {
+        /// <summary>
+        /// Makes the `i`-th test ship (with a token unique to `i`).
+        /// </summary>
+        public static LocalSpaceship Make(int i, GameTime gameTime)
+        {
+            var ship = new LocalSpaceship($"token-{i:x8}", gameTime);
+            ship.Pos = new Vector2(i * 3.0, -i * 2.0);
+            ship.Velocity = new Vector2(i % 5 - 2.0, 1.5 - i % 3);
+            ship.Area = 1.0 + i % 4;
+            ship.Energy = i % 7;
+            ship.ShieldWidth = (i % 3) * 1.2;
+            ship.ShieldDir = i * 0.7;
+            ship.KillReward = i;
+            ship.LastCombat = gameTime.ElapsedMilliseconds - i * 100;
+            return ship;
+        }
+    }
+}
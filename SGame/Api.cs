@@ -8,6 +8,7 @@ using System.Threading.Tasks;
 using SShared;
 using Messages = SShared.Messages;
 using System.Net;
+using System.Diagnostics;
 
 [assembly: System.Runtime.CompilerServices.InternalsVisibleTo("SGame.Tests")]
 namespace SGame
@@ -58,9 +59,121 @@ namespace SGame
         public uint LocalBusPort { get; set; }
 
         /// <summary>
-        /// All ships who died in this node. F.
+        /// The ships who died in this node (until their owners are told). F.
         /// </summary>
-        internal Dictionary<string, Spaceship> DeadShips { get; set; }
+        internal DeadShipStore DeadShips { get; set; }
+
+        /// <summary>
+        /// Tokens the arbiter reserved on this node (see `Messages.ReserveShips`) whose ships have not been created yet.
+        /// A reserved ship is created by whichever comes first: its `ShipConnected` message, or a request for it.
+        /// </summary>
+        internal HashSet<string> ReservedTokens { get; } = new HashSet<string>();
+
+        /// <summary>
+        /// Queue of the game times at which (lazily-updated) ships may cross the boundaries of this node.
+        /// Only used if `LazyUpdates` is true.
+        /// </summary>
+        internal ShipEventQueue ShipEvents { get; private set; }
+
+        /// <summary>
+        /// If true, idle ships are not integrated on every tick; they are brought up to date only when they are read
+        /// (by REST handlers, by scans over their region, or at migration/persistence checkpoints), and `ShipEvents`
+        /// is used to find the ships that might need to be transferred to another node on each tick.
+        /// </summary>
+        public bool LazyUpdates
+        {
+            get { return QuadTreeNode.LazyUpdates; }
+            set
+            {
+                QuadTreeNode.LazyUpdates = value;
+                RescheduleTransferChecks();
+            }
+        }
+
+        /// <summary>
+        /// If true, the state of the ships on this node is kept in a structure-of-arrays `ShipStore` so that it can be
+        /// integrated and scanned with tight loops over contiguous arrays.
+        /// </summary>
+        public bool SoaStorage
+        {
+            get { return QuadTreeNode.Store != null; }
+            set { QuadTreeNode.UseShipStore(value); }
+        }
+
+        /// <summary>
+        /// If true, game time only advances when the game is stepped (see `Step()` and the `step` route) instead of with
+        /// the wall clock, and the game loop only polls the bus.
+        /// </summary>
+        public bool Stepped
+        {
+            get { return _stepped; }
+            set
+            {
+                _stepped = value;
+                if (value)
+                {
+                    _gameTime.SetElapsedMillisecondsManually(_gameTime.ElapsedMilliseconds);
+                }
+            }
+        }
+
+        bool _stepped = false;
+
+        /// <summary>
+        /// Game time a tick advances by when stepping, unless the `step` request says otherwise.
+        /// </summary>
+        public long StepMilliseconds { get; set; } = 33;
+
+        /// <summary>
+        /// Maximum number of ticks a single `step` request can advance the game by.
+        /// </summary>
+        public const int MAX_STEP_TICKS = 100_000;
+
+        /// <summary>
+        /// Serializes game ticks and bus polling (which may come from the game loop and from REST requests), the scans
+        /// and queries over the ships of this node that do not wait for a tick (see `HandleLocalScanShoot()`), and the
+        /// reads and changes of ships by REST handlers (see `GetLocalShip()`).
+        /// </summary>
+        readonly object _tickLock = new object();
+
+        /// <summary>
+        /// If not null, repeated scans within a game tick are answered from this cache instead of being broadcast again.
+        /// </summary>
+        public ScanCache ScanCache { get; set; } = null;
+
+        /// <summary>
+        /// If not null, the spans of traced scans and shoots are recorded here.
+        /// </summary>
+        public Tracer Tracer { get; set; } = null;
+
+        /// <summary>
+        /// If not null, the file the ships of this node are snapshotted to (see `SaveSnapshot()`).
+        /// </summary>
+        public string SnapshotPath { get; set; } = null;
+
+        /// <summary>
+        /// Number of game ticks between two load reports to the arbiter.
+        /// </summary>
+        public const int LOAD_REPORT_PERIOD = 30;
+
+        /// <summary>
+        /// Weight of the latest tick in `AverageTickMilliseconds`.
+        /// </summary>
+        const double TICK_COST_SMOOTHING = 0.1;
+
+        /// <summary>
+        /// Exponential moving average of the time spent on each game tick, in milliseconds.
+        /// </summary>
+        public double AverageTickMilliseconds { get; private set; }
+
+        private int _ticksSinceLoadReport = 0;
+
+        /// <summary>
+        /// The metrics of this node (see the `metrics` route).
+        /// </summary>
+        public Metrics Metrics { get; private set; } = new Metrics();
+
+        Histogram _tickDuration, _scanWait, _shootWait;
 
         // start the gameTime stopwatch on API creation
         public Api(string apiUrl, SGameQuadTreeNode rootNode, LocalQuadTreeNode quadTreeNode, NetNode bus, NetPeer arbiterPeer, uint localBusPort, Persistence persistence)
@@ -76,47 +189,106 @@ namespace SGame
             this.ArbiterPeer = arbiterPeer;
 
             this.QuadTreeNode = quadTreeNode;
+            this.QuadTreeNode.GameTime = _gameTime;
             this.RootNode = rootNode;
             this.Persistence = persistence;
-            this.DeadShips = new Dictionary<string, Spaceship>();
+            this.DeadShips = new DeadShipStore(persistence);
+            this.ShipEvents = new ShipEventQueue();
+            RegisterMetrics();
 
             this.Bus.PeerConnectedEvent += OnPeerConnected;
             this.Bus.PeerDisconnectedEvent += OnPeerDisconnected;
-            this.Bus.PacketProcessor.Events<Messages.ShipConnected>().OnMessageReceived += OnShipConnected;
-            this.Bus.PacketProcessor.Events<Messages.ShipDisconnected>().OnMessageReceived += OnShipDisconnected;
-            this.Bus.PacketProcessor.Events<Messages.ShipTransferred>().OnMessageReceived += OnShipTransferred;
-            this.Bus.PacketProcessor.Events<Messages.NodeConfig>().OnMessageReceived += OnNodeConfigReceived;
-            this.Bus.PacketProcessor.Events<Messages.NodeOffline>().OnMessageReceived += OnNodeOffline;
+            this.Bus.SubscribeDeferred<Messages.ShipConnected>(OnShipConnected);
+            this.Bus.SubscribeDeferred<Messages.ShipsReassigned>(OnShipsReassigned);
+            this.Bus.SubscribeDeferred<Messages.ReserveShips>(OnReserveShips);
+            this.Bus.SubscribeDeferred<Messages.ShipsDisconnected>(OnShipsDisconnected);
+            this.Bus.SubscribeDeferred<Messages.ShipTransferred>(OnShipTransferred);
+            this.Bus.SubscribeDeferred<Messages.NodeConfig>(OnNodeConfigReceived);
+            this.Bus.SubscribeDeferred<Messages.NodeOffline>(OnNodeOffline);
+            // Scans and queries from other nodes are answered right away (on the bus thread, if running) so that they do
+            // not wait for the next tick; their handlers lock out ticks while they read and change the ships
             this.Bus.PacketProcessor.Events<Messages.ScanShoot>().OnMessageReceived += OnScanShootReceived;
+            this.Bus.PacketProcessor.Events<Messages.QueryShips>().OnMessageReceived += OnQueryShipsReceived;
 #if DEBUG
-            this.Bus.PacketProcessor.Events<Messages.Sudo>().OnMessageReceived += OnSudo;
+            this.Bus.SubscribeDeferred<Messages.Sudo>(OnSudo);
+            this.Bus.SubscribeDeferred<Messages.LoadShips>(OnLoadShips);
 #endif
         }
 
         /// <summary>
-        /// Looks up a local spaceship from data["token"]. If token is present and valid, and the spaceship is present
-        /// and not dead, returns the relevant ship; otherwise sends an error response and returns null.
+        /// Registers the metrics of this node and of its bus (and persistence, if any) into `Metrics`.
+        /// </summary>
+        private void RegisterMetrics()
+        {
+            Bus.RegisterMetrics(Metrics);
+            if (Persistence != null)
+            {
+                Persistence.Metrics = Metrics;
+            }
+
+            Metrics.Gauge("sgame_ships", "Ships managed by this node.", () => QuadTreeNode.ShipsByToken.Count);
+            Metrics.Gauge("sgame_dead_ships", "Killed ships whose owners have not been told yet (in memory).", () => DeadShips.Count);
+            Metrics.CounterFunc("sgame_dead_ships_evicted_total", "Killed ships evicted from memory, by reason.",
+                () => DeadShips.EvictedFull, Metrics.Labels("reason", "capacity"));
+            Metrics.CounterFunc("sgame_dead_ships_evicted_total", "Killed ships evicted from memory, by reason.",
+                () => DeadShips.EvictedExpired, Metrics.Labels("reason", "expired"));
+            Metrics.CounterFunc("sgame_dead_ships_spilled_total", "Evicted killed ships written to persistence.", () => DeadShips.Spilled);
+            Metrics.CounterFunc("sgame_dead_ships_spill_failures_total", "Evicted killed ships that could not be written to persistence.",
+                () => DeadShips.SpillFailures);
+            Metrics.Gauge("sgame_reserved_ships", "Ship tokens reserved on this node and not connected yet.", () =>
+            {
+                lock (ReservedTokens) return ReservedTokens.Count;
+            });
+            Metrics.Gauge("sgame_tick_milliseconds_average", "Moving average of the time spent on each game tick.", () => AverageTickMilliseconds);
+            Metrics.CounterFunc("sgame_scan_cache_hits_total", "Scans answered from the scan cache.", () => ScanCache?.Hits ?? 0);
+            Metrics.CounterFunc("sgame_scan_cache_misses_total", "Scans not found in the scan cache.", () => ScanCache?.Misses ?? 0);
+
+            _tickDuration = Metrics.Histogram("sgame_tick_duration_seconds", "Time spent on each game tick.");
+            _scanWait = Metrics.Histogram("sgame_scanshoot_wait_seconds", "Time spent waiting for the other nodes to answer a scan or shot.",
+                Metrics.Labels("op", "scan"));
+            _shootWait = Metrics.Histogram("sgame_scanshoot_wait_seconds", "Time spent waiting for the other nodes to answer a scan or shot.",
+                Metrics.Labels("op", "shoot"));
+        }
+
+        /// <summary>
+        /// Looks up a local spaceship from the "token" argument. If token is present and valid, and the spaceship is
+        /// present and not dead, returns the relevant ship; otherwise sends an error response and returns null.
+        /// The ship must only be read or changed under `_tickLock` (it can still be killed by a shot handled on the bus
+        /// thread in the meantime: then it is no longer on this node, and changes to it are dropped along with it).
         /// <summary>
-        async Task<LocalSpaceship> GetLocalShip(ApiResponse response, JObject data)
+        async Task<LocalSpaceship> GetLocalShip(ApiResponse response, ApiData data)
         {
-            if (!data.ContainsKey("token"))
+            var token = data.Arg<string>("token");
+            if (token == null)
             {
                 response.Data["error"] = "Spaceship token not in sent data.";
                 await response.Send(500);
                 return null;
             }
-            var token = (string)data["token"];
 
-            if (DeadShips.ContainsKey(token))
+            if (DeadShips.Take(token)) // (no need to notify the other nodes for this)
             {
-                DeadShips.Remove(token); // (no need to notify the other nodes for this)
-
                 response.Data["error"] = "Your spaceship has been killed. Please reconnect.";
                 await response.Send(500);
                 return null;
             }
 
-            var ship = QuadTreeNode.ShipsByToken.GetValueOrDefault(token, null);
+            LocalSpaceship ship;
+            lock (_tickLock)
+            {
+                ship = QuadTreeNode.ShipsByToken.GetValueOrDefault(token, null);
+                if (ship == null)
+                {
+                    // The client might be faster than the `ShipConnected` for a reserved token
+                    ship = ActivateReservedShip(token);
+                }
+            }
+            if (ship == null && await DeadShips.TakeSpilled(token))
+            {
+                response.Data["error"] = "Your spaceship has been killed. Please reconnect.";
+                await response.Send(500);
+                return null;
+            }
             if (ship == null)
             {
                 response.Data["error"] = "Ship not found for given token.";
@@ -124,20 +296,70 @@ namespace SGame
                 return null;
             }
 
+            lock (_tickLock)
+            {
+                TouchShip(ship);
+            }
             return ship;
         }
 
         /// <summary>
-        /// Updates each spaceship's state (energy, position, ...) based on time it was not updated
+        /// Brings a ship up to date before it is read, if ships are not being updated every tick.
         /// </summary>
-        public void UpdateGameState()
+        internal void TouchShip(LocalSpaceship ship)
         {
-            foreach (var ship in QuadTreeNode.ShipsByToken.Values)
+            if (LazyUpdates)
             {
                 ship.UpdateState();
             }
         }
 
+        /// <summary>
+        /// (Re)schedules the check for when a ship might need to be transferred to another node.
+        /// Must be called whenever the position, velocity or area of a ship are changed externally.
+        /// </summary>
+        internal void ScheduleTransferCheck(LocalSpaceship ship)
+        {
+            if (LazyUpdates)
+            {
+                ShipEvents.Schedule(ship.Token, QuadTreeNode.NextTransferTime(ship));
+            }
+        }
+
+        /// <summary>
+        /// Reschedules the transfer checks of all ships (e.g. after the game time was changed manually).
+        /// </summary>
+        internal void RescheduleTransferChecks()
+        {
+            ShipEvents.Clear();
+            foreach (var ship in QuadTreeNode.ShipsByToken.Values)
+            {
+                ScheduleTransferCheck(ship);
+            }
+        }
+
+        /// <summary>
+        /// Updates each spaceship's state (energy, position, ...) based on time it was not updated.
+        /// Does nothing if `LazyUpdates` is enabled (see `GarbageCollect()`).
+        /// </summary>
+        public void UpdateGameState()
+        {
+            // (Ships move on every tick, even if lazily)
+            ScanCache?.Invalidate();
+            if (!LazyUpdates)
+            {
+                UpdateAllShips();
+            }
+        }
+
+        /// <summary>
+        /// Brings all ships on this node up to date, regardless of `LazyUpdates`.
+        /// </summary>
+        public void UpdateAllShips()
+        {
+            QuadTreeNode.UpdateShips(_gameTime.ElapsedMilliseconds);
+        }
+
         /// <summary>
         /// If persistence is enabled, persist all currently-connected ships.
         /// </summary>
@@ -146,6 +368,10 @@ namespace SGame
             if (Persistence != null)
             {
                 Console.Error.WriteLine($"Persist all ships to {Persistence.ElasticUrl}...");
+                if (LazyUpdates)
+                {
+                    UpdateAllShips();
+                }
                 var persistRequests = QuadTreeNode.ShipsByToken.Values
                     .Select(ship => Persistence.PutShip(ship))
                     .ToArray();
@@ -153,12 +379,76 @@ namespace SGame
             }
         }
 
+        /// <summary>
+        /// Writes a snapshot of all ships on this node to `path` (see `Snapshot`), atomically replacing the previous one.
+        /// Returns the size of the snapshot in bytes.
+        /// </summary>
+        public long SaveSnapshot(string path)
+        {
+            lock (_tickLock)
+            {
+                UpdateAllShips();
+                return Snapshot.Write(path, QuadTreeNode.ShipsByToken.Values, _gameTime.ElapsedMilliseconds, QuadTreeNode.Bounds);
+            }
+        }
+
+        /// <summary>
+        /// Loads all ships in the snapshot at `path` into this node, replacing the ones with the same tokens.
+        /// Must be called before connecting to the arbiter, which learns of the restored ships from our `NodeConfig`.
+        /// Returns the number of ships loaded.
+        /// </summary>
+        public int LoadSnapshot(string path)
+        {
+            lock (_tickLock)
+            {
+                var ships = Snapshot.Read(path, _gameTime, out _);
+                foreach (var ship in ships)
+                {
+                    QuadTreeNode.RemoveShip(ship.Token, out _);
+                    QuadTreeNode.AddShip(ship);
+                    ScheduleTransferCheck(ship);
+                }
+                ScanCache?.Invalidate();
+                return ships.Count;
+            }
+        }
+
+        /// <summary>
+        /// Requests the arbiter to transfer all ships that left the bounds of this node (or entered the bounds of one of
+        /// its children) to the node that should manage them.
+        /// If `LazyUpdates` is enabled, only the ships whose boundary crossing event is due are checked.
+        /// </summary>
         public void GarbageCollect()
         {
-            foreach (var ship in QuadTreeNode.ShipsByToken.Values)
+            List<LocalSpaceship> candidates;
+            if (LazyUpdates)
+            {
+                candidates = new List<LocalSpaceship>();
+                string token;
+                while (ShipEvents.TryPopDue(_gameTime.ElapsedMilliseconds, out token))
+                {
+                    var ship = QuadTreeNode.ShipsByToken.GetValueOrDefault(token, null);
+                    if (ship == null) continue;
+                    ship.UpdateState();
+                    candidates.Add(ship);
+                }
+            }
+            else
+            {
+                candidates = QuadTreeNode.ShipsByToken.Values.ToList();
+            }
+
+            LocalQuadTreeNode currentNode = QuadTreeNode;
+            foreach (var ship in candidates)
             {
-                LocalQuadTreeNode currentNode = QuadTreeNode;
                 QuadTreeNode<Spaceship> bestFitNode = currentNode.SmallestNodeWhichContains(ship.Bounds);
+                if (bestFitNode == currentNode || (bestFitNode == null && currentNode.Parent == null))
+                {
+                    // Still ours (or out of the universe, with nowhere else to go)
+                    ScheduleTransferCheck(ship);
+                    continue;
+                }
+
                 Messages.TransferShip msg;
                 if (bestFitNode == null)
                 {
@@ -172,8 +462,131 @@ namespace SGame
 
                 Console.Error.WriteLine("Transferring request for ship {0} (pos=({1}) was sent from node at {2} to node at {3}", ship.Token, ship.Pos, this.ApiUrl, msg.Path);
                 Bus.SendMessage(msg, ArbiterPeer);
-                QuadTreeNode.ShipsByToken.Remove(ship.Token);
+                QuadTreeNode.RemoveShip(ship.Token, out _);
+                ShipEvents.Remove(ship.Token);
+            }
+        }
+
+        /// <summary>
+        /// Runs a game tick: handles the pending bus messages, updates the game state and transfers the ships that left
+        /// this node. Returns the time the tick took, in milliseconds.
+        /// </summary>
+        public double Tick()
+        {
+            lock (_tickLock)
+            {
+                long start = Stopwatch.GetTimestamp();
+                Bus.Update();
+                UpdateGameState();
+                GarbageCollect();
+                DeadShips.EvictExpired();
+                double tickMilliseconds = (double)(Stopwatch.GetTimestamp() - start) * 1000.0 / Stopwatch.Frequency;
+                RecordTick(tickMilliseconds);
+                return tickMilliseconds;
+            }
+        }
+
+        /// <summary>
+        /// Handles the pending bus messages without running a game tick (used by the game loop when `Stepped`).
+        /// </summary>
+        public void PollBus()
+        {
+            lock (_tickLock)
+            {
+                Bus.Update();
+            }
+        }
+
+        /// <summary>
+        /// The outcome of `Step()`.
+        /// </summary>
+        public class StepResult
+        {
+            /// <summary>
+            /// Time each tick took on this node, in milliseconds.
+            /// </summary>
+            public double[] TickMilliseconds;
+
+            /// <summary>
+            /// Game time after the last tick, in milliseconds.
+            /// </summary>
+            public long GameMilliseconds;
+
+            /// <summary>
+            /// Number of ships on this node after the last tick.
+            /// </summary>
+            public int Ships;
+        }
+
+        /// <summary>
+        /// Advances game time by `ticks` ticks of `tickMilliseconds` each, running a game tick for each of them.
+        /// </summary>
+        public StepResult Step(int ticks, long tickMilliseconds)
+        {
+            var result = new StepResult() { TickMilliseconds = new double[ticks] };
+            for (int i = 0; i < ticks; i++)
+            {
+                _gameTime.SetElapsedMillisecondsManually(_gameTime.ElapsedMilliseconds + tickMilliseconds);
+                result.TickMilliseconds[i] = Tick();
+            }
+            result.GameMilliseconds = _gameTime.ElapsedMilliseconds;
+            result.Ships = QuadTreeNode.ShipsByToken.Count;
+            return result;
+        }
+
+        /// <summary>
+        /// Records the time spent on a game tick, periodically reporting the load of this node to the arbiter.
+        /// </summary>
+        public void RecordTick(double tickMilliseconds)
+        {
+            AverageTickMilliseconds += TICK_COST_SMOOTHING * (tickMilliseconds - AverageTickMilliseconds);
+            _tickDuration.Observe(tickMilliseconds / 1000.0);
+
+            if (++_ticksSinceLoadReport >= LOAD_REPORT_PERIOD && ArbiterPeer.ConnectionState == ConnectionState.Connected)
+            {
+                _ticksSinceLoadReport = 0;
+                Bus.SendMessage(new Messages.NodeLoad()
+                {
+                    ShipCount = (uint)QuadTreeNode.ShipsByToken.Count,
+                    TickMilliseconds = AverageTickMilliseconds,
+                    QuadrantShipCounts = CountShipsInFreeQuadrants(),
+                }, ArbiterPeer);
+            }
+        }
+
+        /// <summary>
+        /// For each quadrant of this node that has no child node, counts the ships fully contained in it.
+        /// In lazy mode, ships are counted where they are now (without updating them).
+        /// </summary>
+        private uint[] CountShipsInFreeQuadrants()
+        {
+            var counts = new uint[4];
+            var quadrantBounds = new Quad?[4];
+            for (int i = 0; i < 4; i++)
+            {
+                if (QuadTreeNode.Child((Quadrant)i) == null)
+                {
+                    quadrantBounds[i] = QuadTreeNode.Bounds.QuadrantBounds((Quadrant)i);
+                }
+            }
+            if (quadrantBounds.All(bounds => bounds == null))
+            {
+                return counts;
+            }
+
+            long now = _gameTime.ElapsedMilliseconds;
+            foreach (var ship in QuadTreeNode.ShipsByToken.Values)
+            {
+                var shipBounds = LazyUpdates ? ship.BoundsAt(now) : ship.Bounds;
+                for (int i = 0; i < 4; i++)
+                {
+                    if (quadrantBounds[i]?.ContainsQuad(shipBounds) == true)
+                    {
+                        counts[i]++;
+                    }
+                }
             }
+            return counts;
         }
 
         /// <summary>
@@ -195,6 +608,8 @@ namespace SGame
                     ApiUrl = this.ApiUrl,
                     Path = QuadTreeNode.Path(),
                     Bounds = QuadTreeNode.Bounds,
+                    // (Ships restored from a snapshot, that the arbiter does not know about yet)
+                    Tokens = QuadTreeNode.ShipsByToken.Keys.ToArray(),
                 };
                 this.Bus.SendMessage(currentConfig, peer);
             }
@@ -268,6 +683,9 @@ namespace SGame
                     RootNode.SetChild((Quadrant)i, rootChildren[i]);
                 }
             }
+
+            // The ships that need to move to other nodes might have changed
+            RescheduleTransferChecks();
         }
 
         /// <summary>
@@ -275,6 +693,12 @@ namespace SGame
         /// </summary>
         private void OnNodeOffline(NetPeer arbiterPeer, Messages.NodeOffline msg)
         {
+            if (msg.ApiUrl == this.ApiUrl)
+            {
+                RetireNode();
+                return;
+            }
+
             var offlineNode = RootNode.Traverse()
                 .Where(node => (node is RemoteQuadTreeNode) && ((RemoteQuadTreeNode)node).ApiUrl == msg.ApiUrl)
                 .FirstOrDefault();
@@ -286,12 +710,62 @@ namespace SGame
 
             Console.Error.WriteLine(">>> Node at {0} offline <<<", offlineNode.Path());
             offlineNode.Parent.SetChild(offlineNode.Quadrant, null);
+            RescheduleTransferChecks();
+        }
+
+        /// <summary>
+        /// Called when the arbiter takes this node out of the tree (e.g. to merge it into its parent):
+        /// hands all of our ships to the parent node via `TransferShip` and detaches our node from the tree, so that
+        /// this node can be placed elsewhere later.
+        /// Also called on spare nodes (not in the tree) that have ships of their own, restored from a snapshot: each ship
+        /// is then handed to the node of the tree that should manage it.
+        /// </summary>
+        private void RetireNode()
+        {
+            var parent = QuadTreeNode.Parent;
+            bool isSpare = parent == null && RootNode != QuadTreeNode;
+            if (parent == null && !isSpare)
+            {
+                Console.Error.WriteLine(">>> Asked to retire the root node; ignoring <<<");
+                return;
+            }
+
+            var parentPath = parent?.Path();
+            if (isSpare)
+            {
+                Console.Error.WriteLine(">>> This node is a spare; moving its {0} ships to the tree <<<", QuadTreeNode.ShipsByToken.Count);
+            }
+            else
+            {
+                Console.Error.WriteLine(">>> This node is retiring; moving {0} ships to {1} <<<", QuadTreeNode.ShipsByToken.Count, parentPath);
+            }
+
+            UpdateAllShips();
+            foreach (var ship in QuadTreeNode.ShipsByToken.Values.ToList())
+            {
+                var path = isSpare ? (RootNode.SmallestNodeWhichContains(ship.Bounds) ?? RootNode).Path() : parentPath;
+                Bus.SendMessage(new Messages.TransferShip() { Ship = ship, Path = path }, ArbiterPeer);
+                QuadTreeNode.RemoveShip(ship.Token, out _);
+            }
+            ShipEvents.Clear();
+            lock (ReservedTokens)
+            {
+                // (The arbiter forgets them too)
+                ReservedTokens.Clear();
+            }
+
+            parent?.SetChild(QuadTreeNode.Quadrant, null);
+            for (int i = 0; i < 4; i++)
+            {
+                QuadTreeNode.SetChild((Quadrant)i, null);
+            }
         }
 
         private void OnShipTransferred(NetPeer peer, Messages.ShipTransferred msg)
         {
             LocalSpaceship localShip = new LocalSpaceship(msg.Ship, _gameTime);
-            QuadTreeNode.ShipsByToken.Add(msg.Ship.Token, localShip);
+            QuadTreeNode.AddShip(localShip);
+            ScheduleTransferCheck(localShip);
         }
 
         /// <summary>
@@ -299,6 +773,12 @@ namespace SGame
         /// </summary>
         public void OnShipConnected(NetPeer sender, Messages.ShipConnected msg)
         {
+            if (msg.Reserved)
+            {
+                ActivateReservedShip(msg.Token);
+                return;
+            }
+
             LocalSpaceship ship = null;
             if (Persistence != null)
             {
@@ -307,61 +787,151 @@ namespace SGame
                 shipFetcher.Wait();
                 ship = shipFetcher.Result;
             }
+            AddConnectedShip(msg.Token, ship);
+
+            Console.WriteLine($"Send message from {ApiUrl} to {ArbiterPeer.EndPoint}...");
+            Bus.SendMessage(new Messages.ShipConnected() { Token = msg.Token }, ArbiterPeer);
+        }
+
+        /// <summary>
+        /// Handles a "ships reassigned" bus message: adds all the ships, then acknowledges them at once.
+        /// </summary>
+        public void OnShipsReassigned(NetPeer sender, Messages.ShipsReassigned msg)
+        {
+            Console.WriteLine($"Taking over {msg.Tokens.Length} ships");
+
+            LocalSpaceship[] ships = new LocalSpaceship[msg.Tokens.Length];
+            if (Persistence != null)
+            {
+                // Fetch all of them concurrently instead of one round trip at a time
+                var shipFetcher = Task.WhenAll(msg.Tokens.Select(token => Persistence.GetShip(token, _gameTime)));
+                shipFetcher.Wait();
+                ships = shipFetcher.Result;
+            }
+            for (int i = 0; i < msg.Tokens.Length; i++)
+            {
+                AddConnectedShip(msg.Tokens[i], ships[i]);
+            }
+
+            Bus.SendMessage(new Messages.ShipsReassigned() { Tokens = msg.Tokens }, ArbiterPeer);
+        }
+
+        /// <summary>
+        /// Handles a "reserve ships" bus message: remembers the tokens, then acknowledges them at once.
+        /// </summary>
+        public void OnReserveShips(NetPeer sender, Messages.ReserveShips msg)
+        {
+            lock (ReservedTokens)
+            {
+                ReservedTokens.UnionWith(msg.Tokens);
+            }
+            Bus.SendMessage(new Messages.ReserveShips() { Tokens = msg.Tokens }, ArbiterPeer);
+        }
+
+        /// <summary>
+        /// Creates the ship for a reserved token, if the token is still reserved; returns the ship, or null.
+        /// </summary>
+        private LocalSpaceship ActivateReservedShip(string token)
+        {
+            lock (ReservedTokens)
+            {
+                if (!ReservedTokens.Remove(token))
+                {
+                    return null;
+                }
+            }
+            // (Reserved tokens are brand new, so there is nothing to fetch from persistence)
+            return AddConnectedShip(token, null);
+        }
+
+        /// <summary>
+        /// Adds a ship that was connected to this node; `ship` is its persisted state, or null to create a new ship.
+        /// Returns the added ship.
+        /// </summary>
+        private LocalSpaceship AddConnectedShip(string token, LocalSpaceship ship)
+        {
             if (ship == null)
             {
-                Console.WriteLine($"Create a new ship for token={msg.Token}");
-                ship = new LocalSpaceship(msg.Token, _gameTime);
+                Console.WriteLine($"Create a new ship for token={token}");
+                ship = new LocalSpaceship(token, _gameTime);
                 Quad randomShipBounds = MathUtils.RandomQuadInQuad(QuadTreeNode.Bounds, ship.Radius());
                 ship.Pos = new Vector2(randomShipBounds.CentreX, randomShipBounds.CentreY);
             }
 
-            QuadTreeNode.ShipsByToken.Add(msg.Token, ship);
-
-            Console.WriteLine($"Send message from {ApiUrl} to {ArbiterPeer.EndPoint}...");
-            Bus.SendMessage(new Messages.ShipConnected() { Token = msg.Token }, ArbiterPeer);
+            QuadTreeNode.AddShip(ship);
+            ScheduleTransferCheck(ship);
+            return ship;
         }
 
         /// <summary>
-        /// Handles a "ship disconnected" bus message.
+        /// Handles a "ships disconnected" bus message (a batch of the ships disconnected during an arbiter tick).
         /// </summary>
-        public void OnShipDisconnected(NetPeer sender, Messages.ShipDisconnected msg)
+        public void OnShipsDisconnected(NetPeer sender, Messages.ShipsDisconnected msg)
         {
-            Console.WriteLine($"Disconnecting player (token={msg.Token})");
+            Console.WriteLine($"Disconnecting {msg.Tokens.Length} player(s)");
 
-            LocalSpaceship ship = null;
-            if (QuadTreeNode.ShipsByToken.Remove(msg.Token, out ship))
+            lock (ReservedTokens)
+            {
+                ReservedTokens.ExceptWith(msg.Tokens);
+            }
+
+            var shipSavers = new List<Task>();
+            foreach (var token in msg.Tokens)
             {
-                if (Persistence != null)
+                LocalSpaceship ship = null;
+                if (QuadTreeNode.RemoveShip(token, out ship))
                 {
-                    Console.WriteLine($"Persist disconnected ship with token={msg.Token}");
-                    var shipSaver = Persistence.PutShip(ship);
-                    shipSaver.Wait();
+                    ShipEvents.Remove(token);
+                    TouchShip(ship);
+                    if (Persistence != null)
+                    {
+                        Console.WriteLine($"Persist disconnected ship with token={token}");
+                        shipSavers.Add(Persistence.PutShip(ship));
+                    }
                 }
-
-                Bus.SendMessage(new Messages.ShipDisconnected() { Token = msg.Token }, ArbiterPeer);
             }
+            // (Save the whole batch concurrently)
+            Task.WaitAll(shipSavers.ToArray());
         }
 
         /// <summary>
         /// Handle scanning/shooting on this node:
         /// - Broadcasts the Struck response for the local node
         /// - Moves ships to the graveyard as needed
+        /// Can be called from any thread (REST handlers, the bus thread): the ships are only touched under `_tickLock`.
         /// </summary>
         private Messages.Struck HandleLocalScanShoot(Messages.ScanShoot msg)
         {
-            Messages.Struck results = QuadTreeNode.ScanShootLocal(msg);
-            Bus.BroadcastMessage(results);
-
-            foreach (var ourStruck in results.ShipsInfo)
+            double start = Tracer.Now;
+            Messages.Struck results;
+            lock (_tickLock)
             {
-                if (ourStruck.Damage < 0.0) // ship ded
+                results = QuadTreeNode.ScanShootLocal(msg);
+                foreach (var ourStruck in results.ShipsInfo)
                 {
-                    var ourDeadShip = ourStruck.Ship;
-                    QuadTreeNode.ShipsByToken.Remove(ourDeadShip.Token);
-                    DeadShips.Add(ourDeadShip.Token, ourDeadShip);
+                    if (ourStruck.Damage < 0.0) // ship ded
+                    {
+                        var ourDeadShip = ourStruck.Ship;
+                        QuadTreeNode.RemoveShip(ourDeadShip.Token, out _);
+                        ShipEvents.Remove(ourDeadShip.Token);
+                        DeadShips.Add(ourDeadShip.Token);
+                    }
                 }
             }
 
+            if (msg.TraceId != null)
+            {
+                results.TraceId = msg.TraceId;
+                results.SentAt = Tracer.Now;
+            }
+            Bus.BroadcastMessage(results);
+            Tracer?.RecordSince(msg.TraceId, "scanshoot.local", start, $"{results.ShipsInfo.Count} ships");
+            if (msg.ScaledShotEnergy > 0.0)
+            {
+                // (Shots are handled by all nodes, so this also catches the ones changing areas elsewhere)
+                ScanCache?.Invalidate();
+            }
+
             return results;
         }
 
@@ -370,9 +940,116 @@ namespace SGame
         /// </summary>
         private void OnScanShootReceived(NetPeer arbiterPeer, Messages.ScanShoot msg)
         {
+            Tracer?.RecordSince(msg.TraceId, "scanshoot.bus", msg.SentAt, $"from {arbiterPeer.EndPoint}");
             HandleLocalScanShoot(msg);
         }
 
+        /// <summary>
+        /// Called when a node sends a spatial query; replies with the ships on this node that match it.
+        /// </summary>
+        private void OnQueryShipsReceived(NetPeer peer, Messages.QueryShips msg)
+        {
+            lock (_tickLock)
+            {
+                // (Local queries complete immediately; the reply is written before a tick can change the ships found)
+                var found = QuadTreeNode.QueryLocal(msg.Query).Result;
+                Bus.SendMessage(new Messages.ShipsFound() { QueryId = msg.QueryId, Ships = found.ToArray() }, peer);
+            }
+        }
+
+        /// <summary>
+        /// Records when (and if) each of the `peers` replied to a traced scan/shoot.
+        /// </summary>
+        private void TraceReplies(Messages.ScanShoot msg, NetPeer[] peers, Task<Messages.Struck>[] waiters)
+        {
+            if (Tracer == null || msg.TraceId == null)
+            {
+                return;
+            }
+            for (int i = 0; i < peers.Length; i++)
+            {
+                var peer = peers[i];
+                waiters[i].ContinueWith(waiter =>
+                {
+                    var reply = waiter.Result;
+                    if (reply == null)
+                    {
+                        Tracer.RecordSince(msg.TraceId, "scanshoot.timeout", msg.SentAt, $"from {peer.EndPoint}");
+                        return;
+                    }
+                    double now = Tracer.Now;
+                    Tracer.Record(msg.TraceId, "scanshoot.reply", msg.SentAt, now,
+                        $"from {peer.EndPoint}, {reply.ShipsInfo.Count} ships, {(now - reply.SentAt) * 1000.0:F3}ms on the bus");
+                }, TaskContinuationOptions.ExecuteSynchronously | TaskContinuationOptions.OnlyOnRanToCompletion);
+            }
+        }
+
+        /// <summary>
+        /// Handles a "metrics" REST request, returning the metrics of this node in the Prometheus text format.
+        /// </summary>
+        [ApiRoute("metrics")]
+        public Task GetMetrics(ApiResponse response, ApiData data)
+        {
+            return response.SendText(Metrics.Render(), "text/plain; version=0.0.4; charset=utf-8");
+        }
+
+#if DEBUG
+        /// <summary>
+        /// Handles a "snapshot" REST request: writes a snapshot of all ships on this node to `SnapshotPath`.
+        /// </summary>
+        [ApiRoute("snapshot")]
+        public async Task TakeSnapshot(ApiResponse response, ApiData data)
+        {
+            if (SnapshotPath == null)
+            {
+                response.Data["error"] = "No snapshot file (start the node with --snapshot)";
+                await response.Send(400);
+                return;
+            }
+            long start = Stopwatch.GetTimestamp();
+            long bytes = SaveSnapshot(SnapshotPath);
+            response.Data["ships"] = QuadTreeNode.ShipsByToken.Count;
+            response.Data["bytes"] = bytes;
+            response.Data["ms"] = (double)(Stopwatch.GetTimestamp() - start) * 1000.0 / Stopwatch.Frequency;
+            await response.Send();
+        }
+#endif
+
+        /// <summary>
+        /// Handles a "step" REST request: if `Stepped`, advances the game by `ticks` ticks (of `dt` milliseconds each, or
+        /// `StepMilliseconds`) and returns the time each of them took on this node.
+        /// </summary>
+        [ApiRoute("step")]
+        [ApiParam("ticks", typeof(int))]
+        [ApiParam("dt", typeof(int), Optional = true)]
+        public async Task StepGame(ApiResponse response, ApiData data)
+        {
+            if (!Stepped)
+            {
+                response.Data["error"] = "Not in stepped mode (start the node with --stepped)";
+                await response.Send(400);
+                return;
+            }
+            int ticks = data.Arg<int>("ticks");
+            long dt = data.HasArg("dt") ? data.Arg<int>("dt") : StepMilliseconds;
+            if (ticks < 1 || ticks > MAX_STEP_TICKS || dt < 0)
+            {
+                response.Data["error"] = $"Invalid step (ticks must be in [1..{MAX_STEP_TICKS}], dt must be >= 0)";
+                await response.Send(400);
+                return;
+            }
+
+            var result = Step(ticks, dt);
+            double totalMilliseconds = result.TickMilliseconds.Sum();
+            response.Data["ticks"] = ticks;
+            response.Data["time"] = result.GameMilliseconds;
+            response.Data["ships"] = result.Ships;
+            response.Data["tickMs"] = new JArray(result.TickMilliseconds);
+            response.Data["totalMs"] = totalMilliseconds;
+            response.Data["shipTicksPerSecond"] = totalMilliseconds > 0.0 ? result.Ships * ticks / (totalMilliseconds / 1000.0) : 0.0;
+            await response.Send();
+        }
+
         /// <summary>
         /// Handles an "accelerate" REST request.
         /// </summary>
@@ -384,21 +1061,25 @@ namespace SGame
         [ApiParam("y", typeof(double))]
         public async Task AcceleratePlayer(ApiResponse response, ApiData data)
         {
-            var ship = await GetLocalShip(response, data.Json);
+            var ship = await GetLocalShip(response, data);
             if (ship == null)
             {
                 return;
             }
-            double x = (double)data.Json["x"];
-            double y = (double)data.Json["y"];
+            double x = data.Arg<double>("x");
+            double y = data.Arg<double>("y");
 
             if (x != 0 || y != 0)
             {
-                int energyRequired = (int)Math.Ceiling(ship.Area * (Math.Abs(x) + Math.Abs(y)));
-                int energySpent = Math.Min(energyRequired, (int)Math.Floor(ship.Energy));
-                ship.Energy -= energySpent;
-                double accelerationApplied = (double)energySpent / (double)energyRequired;
-                ship.Velocity += Vector2.Multiply(new Vector2(x, y), accelerationApplied);
+                lock (_tickLock)
+                {
+                    int energyRequired = (int)Math.Ceiling(ship.Area * (Math.Abs(x) + Math.Abs(y)));
+                    int energySpent = Math.Min(energyRequired, (int)Math.Floor(ship.Energy));
+                    ship.Energy -= energySpent;
+                    double accelerationApplied = (double)energySpent / (double)energyRequired;
+                    ship.Velocity += Vector2.Multiply(new Vector2(x, y), accelerationApplied);
+                    ScheduleTransferCheck(ship);
+                }
             }
 
             await response.Send(200);
@@ -416,24 +1097,27 @@ namespace SGame
         {
 #if DEBUG
             // HACK: Force sudo params to be applied
-            Bus.Update();
+            PollBus();
 #endif
 
-            var ship = await GetLocalShip(response, data.Json);
+            var ship = await GetLocalShip(response, data);
             if (ship == null)
             {
                 return;
             }
 
-            response.Data["id"] = ship.PublicId;
-            response.Data["area"] = ship.Area;
-            response.Data["energy"] = ship.Energy;
-            response.Data["posX"] = ship.Pos.X;
-            response.Data["posY"] = ship.Pos.Y;
-            response.Data["velX"] = ship.Velocity.X;
-            response.Data["velY"] = ship.Velocity.Y;
-            response.Data["shieldWidth"] = ship.ShieldWidth * 180 / Math.PI;
-            response.Data["shieldDir"] = ship.ShieldDir * 180 / Math.PI;
+            lock (_tickLock)
+            {
+                response.Data["id"] = ship.PublicId;
+                response.Data["area"] = ship.Area;
+                response.Data["energy"] = ship.Energy;
+                response.Data["posX"] = ship.Pos.X;
+                response.Data["posY"] = ship.Pos.Y;
+                response.Data["velX"] = ship.Velocity.X;
+                response.Data["velY"] = ship.Velocity.Y;
+                response.Data["shieldWidth"] = ship.ShieldWidth * 180 / Math.PI;
+                response.Data["shieldDir"] = ship.ShieldDir * 180 / Math.PI;
+            }
             await response.Send();
         }
 
@@ -457,8 +1141,8 @@ namespace SGame
             // The circular sector is a triangle whose vertices are pos, and the points at an angle (worldDeg +- scanWidth) and distance radius
             // And a segment between those points on the circle centered at pos with that radius
 
-            Vector2 leftPoint = new Vector2(radius * Math.Cos(worldRad + scanWidth), radius * Math.Sin(worldRad + scanWidth));
-            Vector2 rightPoint = new Vector2(radius * Math.Cos(worldRad - scanWidth), radius * Math.Sin(worldRad - scanWidth));
+            Vector2 leftPoint = pos + new Vector2(radius * Math.Cos(worldRad + scanWidth), radius * Math.Sin(worldRad + scanWidth));
+            Vector2 rightPoint = pos + new Vector2(radius * Math.Cos(worldRad - scanWidth), radius * Math.Sin(worldRad - scanWidth));
 
             Console.WriteLine("Scanning with radius " + radius + "; In triangle " + pos.ToString() + "," + leftPoint.ToString() + "," + rightPoint.ToString());
 
@@ -494,59 +1178,85 @@ namespace SGame
                 return;
             }
 
-            int energy = (int)data.Json["energy"];
-            double directionDeg = (double)data.Json["direction"];
-            double widthDeg = (double)data.Json["width"];
+            int energy = data.Arg<int>("energy");
+            double directionDeg = data.Arg<double>("direction");
+            double widthDeg = data.Arg<double>("width");
 
-            energy = (int)Math.Min(energy, Math.Floor(ship.Energy));
-            ship.Energy -= energy;
+            Vector2 origin;
+            lock (_tickLock)
+            {
+                energy = (int)Math.Min(energy, Math.Floor(ship.Energy));
+                ship.Energy -= energy;
+                origin = ship.Pos;
+            }
 
-            Console.WriteLine($"Scan by {ship.PublicId}, pos={ship.Pos}, dir={directionDeg}°, width={widthDeg}°, energy spent={energy}");
+            Console.WriteLine($"Scan by {ship.PublicId}, pos={origin}, dir={directionDeg}°, width={widthDeg}°, energy spent={energy}");
 
             // 1) Broadcast the "need to scan this" message
             var scanMsg = new SShared.Messages.ScanShoot()
             {
                 Originator = ship.Token,
-                Origin = ship.Pos,
+                Origin = origin,
                 Direction = MathUtils.Deg2Rad(directionDeg),
                 ScaledShotEnergy = 0,
                 Width = MathUtils.Deg2Rad(widthDeg),
                 Radius = MathUtils.ScanShootRadius(MathUtils.Deg2Rad(widthDeg), energy),
+                TraceId = data.TraceId,
             };
 
-            // Construct waiters BEFORE we potentially get a reply so that we know for sure it will reach us
-            var resultWaiters = Bus.Host.ConnectedPeerList
-                .Where(peer => peer != ArbiterPeer)
-                .Select(peer => new MessageWaiter<Messages.Struck>(Bus, peer, struck => struck.Originator == scanMsg.Originator).Wait)
-                .ToArray();
+            // (The same scan repeated within a tick gives the same results)
+            var scannedShips = ScanCache?.Get(scanMsg);
+            if (scannedShips != null)
+            {
+                Tracer?.Record(data.TraceId, "scan.cached", Tracer.Now, Tracer.Now, $"{scannedShips.Count} ships");
+            }
+            else
+            {
+                long cacheEpoch = ScanCache?.Epoch ?? 0;
 
-            Bus.BroadcastMessage(scanMsg, excludedPeer: ArbiterPeer);
+                // Construct waiters BEFORE we potentially get a reply so that we know for sure it will reach us
+                var peers = Bus.Host.ConnectedPeerList.Where(peer => peer != ArbiterPeer).ToArray();
+                var resultWaiters = peers
+                    .Select(peer => Bus.Waiters.Wait<Messages.Struck>(peer, scanMsg.Originator, TimeSpan.FromMilliseconds(ScanShootTimeout)))
+                    .ToArray();
 
-            // 2) Scan locally and broadcast the results of the local scan
-            Messages.Struck results = HandleLocalScanShoot(scanMsg);
+                scanMsg.SentAt = Tracer.Now;
+                Bus.BroadcastMessage(scanMsg, excludedPeer: ArbiterPeer);
+                TraceReplies(scanMsg, peers, resultWaiters);
 
-            // 3) Wait for the scanning results of all other nodes
-            Task.WaitAll(resultWaiters, ScanShootTimeout);
+                // 2) Scan locally and broadcast the results of the local scan
+                Messages.Struck results = HandleLocalScanShoot(scanMsg);
 
-            // 4) Combine the results that arrived with our local ones to find the whole list of scanned ships
-            foreach (var waiter in resultWaiters)
-            {
-                if (waiter.Status != TaskStatus.RanToCompletion) continue;
-                results.ShipsInfo.AddRange(waiter.Result.ShipsInfo);
+                // 3) Wait for the scanning results of all other nodes
+                long waitStart = Stopwatch.GetTimestamp();
+                double traceWaitStart = Tracer.Now;
+                Task.WaitAll(resultWaiters, ScanShootTimeout);
+                _scanWait.ObserveSince(waitStart);
+                Tracer?.RecordSince(data.TraceId, "scanshoot.wait", traceWaitStart, $"{peers.Length} nodes");
+
+                // 4) Combine the results that arrived with our local ones to find the whole list of scanned ships
+                foreach (var waiter in resultWaiters)
+                {
+                    if (waiter.Status != TaskStatus.RanToCompletion || waiter.Result == null) continue;
+                    results.ShipsInfo.AddRange(waiter.Result.ShipsInfo);
+                }
+
+                scannedShips = results.ShipsInfo;
+                ScanCache?.Put(scanMsg, cacheEpoch, scannedShips);
             }
 
             JArray respDict = new JArray();
-            foreach (var scanned in results.ShipsInfo)
+            foreach (var scanned in scannedShips)
             {
-                if (scanned.Ship.Token == ship.Token)
+                if (scanned.PublicId == ship.PublicId)
                     continue;
 
                 //The api doesnt have a return value for shooting, but ive left this in for now for testing purposes.
                 JToken struckShipInfo = new JObject();
-                struckShipInfo["id"] = scanned.Ship.PublicId;
-                struckShipInfo["area"] = scanned.Ship.Area;
-                struckShipInfo["posX"] = scanned.Ship.Pos.X;
-                struckShipInfo["posY"] = scanned.Ship.Pos.Y;
+                struckShipInfo["id"] = scanned.PublicId;
+                struckShipInfo["area"] = scanned.Area;
+                struckShipInfo["posX"] = scanned.Pos.X;
+                struckShipInfo["posY"] = scanned.Pos.Y;
                 respDict.Add(struckShipInfo);
             }
 
@@ -570,51 +1280,67 @@ namespace SGame
         {
 #if DEBUG
             // HACK: Force game update so older tests still function
-            UpdateGameState();
+            lock (_tickLock)
+            {
+                UpdateGameState();
+            }
 #endif
             LocalSpaceship ship = await IntersectionParamCheck(response, data, true);
             if (ship == null)
             {
                 return;
             }
-            double widthDeg = (double)data.Json["width"];
-            double directionDeg = (double)data.Json["direction"];
-            double damageScaling = (double)data.Json["damage"];
+            double widthDeg = data.Arg<double>("width");
+            double directionDeg = data.Arg<double>("direction");
+            double damageScaling = data.Arg<double>("damage");
 
-            int energy = (int)Math.Min((int)data.Json["energy"], Math.Floor(ship.Energy / damageScaling));
-            ship.Energy -= energy * damageScaling; //remove energy for the shot
+            int energy;
+            Vector2 origin;
+            lock (_tickLock)
+            {
+                energy = (int)Math.Min(data.Arg<int>("energy"), Math.Floor(ship.Energy / damageScaling));
+                ship.Energy -= energy * damageScaling; //remove energy for the shot
+                origin = ship.Pos;
+            }
 
-            Console.WriteLine($"Shot by {ship.PublicId}, pos={ship.Pos}, dir={directionDeg}°, width={widthDeg}°, energy spent={energy}, scaling={damageScaling}");
+            Console.WriteLine($"Shot by {ship.PublicId}, pos={origin}, dir={directionDeg}°, width={widthDeg}°, energy spent={energy}, scaling={damageScaling}");
 
             // 1) Broadcast the "need to shoot this" message
             var shootMsg = new SShared.Messages.ScanShoot()
             {
                 Originator = ship.Token,
-                Origin = ship.Pos,
+                Origin = origin,
                 Direction = MathUtils.Deg2Rad(directionDeg),
                 ScaledShotEnergy = energy * damageScaling,
                 Width = MathUtils.Deg2Rad(widthDeg),
                 Radius = MathUtils.ScanShootRadius(MathUtils.Deg2Rad(widthDeg), energy),
+                TraceId = data.TraceId,
             };
 
             // Construct waiters BEFORE we potentially get a reply so that we know for sure it will reach us
-            var resultWaiters = Bus.Host.ConnectedPeerList
-                .Where(peer => peer != ArbiterPeer)
-                .Select(peer => new MessageWaiter<Messages.Struck>(Bus, peer, struck => struck.Originator == shootMsg.Originator).Wait)
+            var peers = Bus.Host.ConnectedPeerList.Where(peer => peer != ArbiterPeer).ToArray();
+            var resultWaiters = peers
+                .Select(peer => Bus.Waiters.Wait<Messages.Struck>(peer, shootMsg.Originator, TimeSpan.FromMilliseconds(ScanShootTimeout)))
                 .ToArray();
 
+            shootMsg.SentAt = Tracer.Now;
             Bus.BroadcastMessage(shootMsg, excludedPeer: ArbiterPeer);
+            TraceReplies(shootMsg, peers, resultWaiters);
 
             // 2) Shoot locally and broadcast the results of the local shoot
             Messages.Struck results = HandleLocalScanShoot(shootMsg);
 
             // 3) Wait for the scanning results of all other nodes
+            long waitStart = Stopwatch.GetTimestamp();
+            double traceWaitStart = Tracer.Now;
             Task.WaitAll(resultWaiters, ScanShootTimeout);
+            _shootWait.ObserveSince(waitStart);
+            Tracer?.RecordSince(data.TraceId, "scanshoot.wait", traceWaitStart, $"{peers.Length} nodes");
 
             // 4) Combine the results that arrived with our local ones to find the complete list of all victims
             foreach (var waiter in resultWaiters)
             {
-                if (waiter.Status != TaskStatus.RanToCompletion) continue;
+                if (waiter.Status != TaskStatus.RanToCompletion || waiter.Result == null) continue;
                 lock (results)
                 {
                     results.ShipsInfo.AddRange(waiter.Result.ShipsInfo);
@@ -623,23 +1349,30 @@ namespace SGame
             }
 
             // 5) Apply area gain to the local shooter ship (if any)
-            ship.Area += results.OriginatorAreaGain;
+            lock (_tickLock)
+            {
+                ship.Area += results.OriginatorAreaGain;
+                if (results.OriginatorAreaGain > 0.0)
+                {
+                    ScheduleTransferCheck(ship);
+                }
+            }
 
             JArray respDict = new JArray();
             foreach (var struckShip in results.ShipsInfo)
             {
                 // ignore our ship
-                if (struckShip.Ship.Token == ship.Token)
+                if (struckShip.PublicId == ship.PublicId)
                     continue;
 
-                double preShotArea = struckShip.Ship.Area + Math.Abs(struckShip.Damage);
+                double preShotArea = struckShip.Area + Math.Abs(struckShip.Damage);
 
                 //The api doesnt have a return value for shooting, but ive left this in for now for testing purposes.
                 JToken struckShipInfo = new JObject();
-                struckShipInfo["id"] = struckShip.Ship.PublicId;
+                struckShipInfo["id"] = struckShip.PublicId;
                 struckShipInfo["area"] = preShotArea;
-                struckShipInfo["posX"] = struckShip.Ship.Pos.X;
-                struckShipInfo["posY"] = struckShip.Ship.Pos.Y;
+                struckShipInfo["posX"] = struckShip.Pos.X;
+                struckShipInfo["posY"] = struckShip.Pos.Y;
                 respDict.Add(struckShipInfo);
             }
 
@@ -665,21 +1398,24 @@ namespace SGame
         [ApiParam("width", typeof(double))]
         public async Task Shield(ApiResponse response, ApiData data)
         {
-            var ship = await GetLocalShip(response, data.Json);
+            var ship = await GetLocalShip(response, data);
             if (ship == null)
             {
                 return;
             }
 
-            double dirDeg = (double)data.Json["direction"];
-            double hWidthDeg = (double)data.Json["width"];
-            ship.ShieldDir = MathUtils.Deg2Rad(dirDeg); // (autonormalized)
+            double dirDeg = data.Arg<double>("direction");
+            double hWidthDeg = data.Arg<double>("width");
             if (hWidthDeg < 0.0 || hWidthDeg > 180.0)
             {
                 response.Data["error"] = "Invalid angle passed (range: [0..180])";
                 await response.Send(500);
             }
-            ship.ShieldWidth = MathUtils.Deg2Rad(hWidthDeg);
+            lock (_tickLock)
+            {
+                ship.ShieldDir = MathUtils.Deg2Rad(dirDeg); // (autonormalized)
+                ship.ShieldWidth = MathUtils.Deg2Rad(hWidthDeg);
+            }
 
             Console.WriteLine($"Shields up for {ship.PublicId}, width/2={hWidthDeg}°, dir={dirDeg}°");
 
@@ -697,7 +1433,7 @@ namespace SGame
         /// </summary>
         private async Task<LocalSpaceship> IntersectionParamCheck(ApiResponse response, ApiData data, bool requireDamage = false)
         {
-            var ship = await GetLocalShip(response, data.Json);
+            var ship = await GetLocalShip(response, data);
             if (ship == null)
             {
                 return null;
@@ -707,7 +1443,7 @@ namespace SGame
 
             for (int i = 0; i < requiredParams.Length; i++)
             {
-                if (data.Json[requiredParams[i]] == null)
+                if (!data.HasArg(requiredParams[i]))
                 {
                     response.Data["error"] = "Requires parameter: " + requiredParams[i];
                     await response.Send(500);
@@ -715,9 +1451,7 @@ namespace SGame
                 }
             }
 
-            double direction = (double)data.Json["direction"];
-
-            double width = (double)data.Json["width"];
+            double width = data.Arg<double>("width");
             if (width <= 0 || width >= 90)
             {
                 response.Data["error"] = "Width not in interval (0,90) degrees";
@@ -725,7 +1459,7 @@ namespace SGame
                 return null;
             }
 
-            int energy = (int)data.Json["energy"];
+            int energy = data.Arg<int>("energy");
             if (energy <= 0)
             {
                 response.Data["error"] = "Energy spent must be positive";
@@ -735,14 +1469,14 @@ namespace SGame
 
             if (requireDamage)
             {
-                if (data.Json["damage"] == null)
+                if (!data.HasArg("damage"))
                 {
                     response.Data["error"] = "Requires parameter: " + "damage";
                     await response.Send(500);
                     return null;
                 }
 
-                double damage = (double)data.Json["damage"];
+                double damage = data.Arg<double>("damage");
                 if (damage <= 0)
                 {
                     response.Data["error"] = "Damage scaling must be positive";
@@ -780,7 +1514,8 @@ namespace SGame
             { "velY", (api, ship, velY) => ship.Velocity = new Vector2(ship.Velocity.X, (double)velY) },
             { "time", (api, ship, timeMs) => {
                 api._gameTime.SetElapsedMillisecondsManually((long)timeMs);
-                api.UpdateGameState();
+                api.UpdateAllShips();
+                api.RescheduleTransferChecks();
             }}
         };
 
@@ -801,6 +1536,7 @@ namespace SGame
                 {
                     return;
                 }
+                TouchShip(ship);
             }
 
             foreach (var kv in data.Json)
@@ -825,9 +1561,52 @@ namespace SGame
                 }
             }
 
+            if (ship != null)
+            {
+                ScheduleTransferCheck(ship);
+            }
+
             // Send the same sudo back to the arbiter as ACK
             Bus.SendMessage(data, ArbiterPeer, LiteNetLib.DeliveryMethod.ReliableOrdered);
         }
+
+        /// <summary>
+        /// Debug-only message used to load (part of) a scenario: creates the given ships, or overwrites the state of the
+        /// ones this node already manages.
+        /// </summary>
+        public void OnLoadShips(NetPeer peer, Messages.LoadShips msg)
+        {
+            for (int i = 0; i < msg.Ships.Length; i++)
+            {
+                var loaded = msg.Ships[i];
+                LocalSpaceship ship = QuadTreeNode.ShipsByToken.GetValueOrDefault(loaded.Token, null);
+                if (ship == null)
+                {
+                    ship = new LocalSpaceship(loaded, _gameTime);
+                    QuadTreeNode.AddShip(ship);
+                }
+                else
+                {
+                    // (Only overwrite the attributes the scenario gave)
+                    var given = msg.Given[i];
+                    bool Has(Messages.LoadShips.Fields field) => (given & field) != 0;
+
+                    TouchShip(ship);
+                    if (Has(Messages.LoadShips.Fields.Area)) ship.Area = loaded.Area;
+                    if (Has(Messages.LoadShips.Fields.Energy)) ship.Energy = loaded.Energy;
+                    ship.Pos = new Vector2(Has(Messages.LoadShips.Fields.PosX) ? loaded.Pos.X : ship.Pos.X,
+                        Has(Messages.LoadShips.Fields.PosY) ? loaded.Pos.Y : ship.Pos.Y);
+                    ship.Velocity = new Vector2(Has(Messages.LoadShips.Fields.VelX) ? loaded.Velocity.X : ship.Velocity.X,
+                        Has(Messages.LoadShips.Fields.VelY) ? loaded.Velocity.Y : ship.Velocity.Y);
+                    if (Has(Messages.LoadShips.Fields.ShieldDir)) ship.ShieldDir = loaded.ShieldDir;
+                    if (Has(Messages.LoadShips.Fields.ShieldWidth)) ship.ShieldWidth = loaded.ShieldWidth;
+                }
+                ScheduleTransferCheck(ship);
+            }
+            ScanCache?.Invalidate();
+
+            Bus.SendMessage(new Messages.LoadShips() { BatchId = msg.BatchId }, ArbiterPeer, LiteNetLib.DeliveryMethod.ReliableOrdered);
+        }
 #endif
 
     }
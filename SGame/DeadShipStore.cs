@@ -0,0 +1,243 @@
+using System;
+using System.Collections.Generic;
+using System.Linq;
+using System.Threading.Tasks;
+
+namespace SGame
+{
+    /// <summary>
+    /// The tokens of the ships killed on this node, kept until their owners are told (by their next request) that they
+    /// are dead.
+    /// The store is bounded: tokens expire after `TimeToLive`, and the least recently killed ones are evicted once there
+    /// are more than `Capacity`. Expired tokens are dropped; tokens evicted for capacity are spilled to `Persistence` (if
+    /// any), from where `TakeSpilled()` can still find them until they would have expired. A token is only ever read once
+    /// (when it is taken), so kill order is also least-recently-used order.
+    /// All methods are thread-safe.
+    /// </summary>
+    class DeadShipStore
+    {
+        /// <summary>
+        /// Default for `Capacity`.
+        /// </summary>
+        public const int DEFAULT_CAPACITY = 100_000;
+
+        /// <summary>
+        /// Default for `TimeToLive`.
+        /// </summary>
+        public static readonly TimeSpan DEFAULT_TIME_TO_LIVE = TimeSpan.FromHours(1.0);
+
+        /// <summary>
+        /// The tokens in kill order (oldest first), with their kill times.
+        /// </summary>
+        LinkedList<(string Token, long KilledAt)> _order = new LinkedList<(string, long)>();
+
+        Dictionary<string, LinkedListNode<(string Token, long KilledAt)>> _nodes = new Dictionary<string, LinkedListNode<(string, long)>>();
+
+        long _evictedFull = 0, _evictedExpired = 0, _spilled = 0, _spillFailures = 0;
+
+        /// <summary>
+        /// When tokens were last spilled to `Persistence`, or null if never.
+        /// </summary>
+        long? _lastSpillAt = null;
+
+        /// <summary>
+        /// Maximum number of tokens kept in memory.
+        /// </summary>
+        public int Capacity { get; set; } = DEFAULT_CAPACITY;
+
+        /// <summary>
+        /// How long tokens are kept in memory.
+        /// </summary>
+        public TimeSpan TimeToLive { get; set; } = DEFAULT_TIME_TO_LIVE;
+
+        /// <summary>
+        /// If not null, tokens evicted for capacity are spilled here.
+        /// </summary>
+        public Persistence Persistence { get; set; }
+
+        /// <summary>
+        /// The current time in milliseconds (of any monotonic clock; wall-clock time, not game time, by default).
+        /// </summary>
+        public Func<long> Clock { get; set; } = () => Environment.TickCount64;
+
+        public DeadShipStore(Persistence persistence = null)
+        {
+            Persistence = persistence;
+        }
+
+        /// <summary>
+        /// Number of tokens in memory.
+        /// </summary>
+        public int Count
+        {
+            get { lock (this) return _nodes.Count; }
+        }
+
+        /// <summary>
+        /// Number of tokens evicted because the store was full.
+        /// </summary>
+        public long EvictedFull
+        {
+            get { lock (this) return _evictedFull; }
+        }
+
+        /// <summary>
+        /// Number of tokens evicted because they were older than `TimeToLive`.
+        /// </summary>
+        public long EvictedExpired
+        {
+            get { lock (this) return _evictedExpired; }
+        }
+
+        /// <summary>
+        /// Number of tokens evicted for capacity and spilled to `Persistence` (successfully or not).
+        /// </summary>
+        public long Spilled
+        {
+            get { lock (this) return _spilled; }
+        }
+
+        /// <summary>
+        /// Number of tokens that could not be spilled to `Persistence`.
+        /// </summary>
+        public long SpillFailures
+        {
+            get { lock (this) return _spillFailures; }
+        }
+
+        /// <summary>
+        /// Records that the ship with the given token was killed, evicting the oldest tokens if needed.
+        /// </summary>
+        public void Add(string token)
+        {
+            List<string> evicted;
+            lock (this)
+            {
+                LinkedListNode<(string Token, long KilledAt)> node;
+                if (_nodes.Remove(token, out node))
+                {
+                    _order.Remove(node);
+                }
+                _nodes[token] = _order.AddLast((token, Clock()));
+
+                evicted = EvictLocked();
+            }
+            Spill(evicted);
+        }
+
+        /// <summary>
+        /// If the ship with the given token is in memory, forgets it and returns true.
+        /// </summary>
+        public bool Take(string token)
+        {
+            lock (this)
+            {
+                LinkedListNode<(string Token, long KilledAt)> node;
+                if (!_nodes.Remove(token, out node))
+                {
+                    return false;
+                }
+                _order.Remove(node);
+                return true;
+            }
+        }
+
+        /// <summary>
+        /// If the ship with the given token was spilled to `Persistence`, forgets it and returns true.
+        /// Only looks it up if tokens were spilled within `TimeToLive` (the ones spilled before would have expired anyway).
+        /// </summary>
+        public async Task<bool> TakeSpilled(string token)
+        {
+            if (Persistence == null)
+            {
+                return false;
+            }
+            lock (this)
+            {
+                if (_lastSpillAt == null || _lastSpillAt.Value <= Clock() - (long)TimeToLive.TotalMilliseconds)
+                {
+                    return false;
+                }
+            }
+            try
+            {
+                return await Persistence.TakeDeadShip(token);
+            }
+            catch (Exception exc)
+            {
+                Console.Error.WriteLine("Could not look up dead ship {0}: {1}", token, exc.Message);
+                return false;
+            }
+        }
+
+        /// <summary>
+        /// Drops all tokens older than `TimeToLive` (called on every game tick; cheap when there are none).
+        /// </summary>
+        public void EvictExpired()
+        {
+            List<string> evicted;
+            lock (this)
+            {
+                evicted = EvictLocked();
+            }
+            Spill(evicted);
+        }
+
+        /// <summary>
+        /// Removes the tokens that are expired or over capacity; returns the latter (the ones to spill).
+        /// </summary>
+        private List<string> EvictLocked()
+        {
+            List<string> evicted = null;
+            long expiredBefore = Clock() - (long)TimeToLive.TotalMilliseconds;
+            while (_order.First != null)
+            {
+                var oldest = _order.First.Value;
+                if (oldest.KilledAt <= expiredBefore)
+                {
+                    _evictedExpired++;
+                }
+                else if (_nodes.Count > Capacity)
+                {
+                    _evictedFull++;
+                    (evicted = evicted ?? new List<string>()).Add(oldest.Token);
+                }
+                else
+                {
+                    break;
+                }
+                _order.RemoveFirst();
+                _nodes.Remove(oldest.Token);
+            }
+            return evicted;
+        }
+
+        /// <summary>
+        /// Writes the given evicted tokens to `Persistence` in the background (if there is one).
+        /// </summary>
+        private void Spill(List<string> tokens)
+        {
+            if (tokens == null || Persistence == null)
+            {
+                return;
+            }
+            lock (this)
+            {
+                _spilled += tokens.Count;
+                _lastSpillAt = Clock();
+            }
+            _ = Task.WhenAll(tokens.Select(token => Persistence.PutDeadShip(token))).ContinueWith(task =>
+            {
+                if (task.IsFaulted)
+                {
+                    int failures = task.Exception.InnerExceptions.Count;
+                    lock (this)
+                    {
+                        _spillFailures += failures;
+                    }
+                    Console.Error.WriteLine("Could not spill {0} dead ships to persistence: {1}", failures, task.Exception.InnerException.Message);
+                }
+            });
+        }
+    }
+}
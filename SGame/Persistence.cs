@@ -2,9 +2,11 @@ using System;
 using System.Net;
 using System.Text;
 using System.IO;
+using System.Diagnostics;
 using System.Threading.Tasks;
 using Newtonsoft.Json;
 using Newtonsoft.Json.Linq;
+using SShared;
 
 namespace SGame
 {
@@ -20,6 +22,16 @@ namespace SGame
 
         public const string ElasticIndex = "ships";
 
+        /// <summary>
+        /// Index of the tokens of dead ships spilled by `DeadShipStore`.
+        /// </summary>
+        public const string ElasticDeadIndex = "deadships";
+
+        /// <summary>
+        /// If not null, the latency of the requests to ElasticSearch is recorded here.
+        /// </summary>
+        public Metrics Metrics { get; set; }
+
         public Persistence(string elasticUrl)
         {
             this.ElasticUrl = elasticUrl;
@@ -27,6 +39,7 @@ namespace SGame
 
         internal async Task<JObject> RequestJson(string url, string method, JObject payload = null)
         {
+            long start = Stopwatch.GetTimestamp();
             WebRequest req = WebRequest.Create(url);
             req.Method = method;
             req.ContentType = "application/json";
@@ -54,6 +67,8 @@ namespace SGame
             {
                 respJson = JObject.Parse(reader.ReadToEnd());
             }
+            Metrics?.Histogram("sgame_persistence_request_duration_seconds", "Time spent on requests to ElasticSearch, by HTTP method.",
+                Metrics.Labels("method", method)).ObserveSince(start);
             return respJson;
         }
 
@@ -92,5 +107,25 @@ namespace SGame
                 throw new ApplicationException("ElasticSearch: " + resp["error"].ToString());
             }
         }
+
+        public async Task PutDeadShip(string token)
+        {
+            string url = $"{ElasticUrl}/{ElasticDeadIndex}/_doc/{token}";
+            var resp = await RequestJson(url, "PUT", new JObject() { ["dead"] = true });
+            if (resp.ContainsKey("error"))
+            {
+                throw new ApplicationException("ElasticSearch: " + resp["error"].ToString());
+            }
+        }
+
+        /// <summary>
+        /// Deletes the dead ship with the given token; returns true if there was one.
+        /// </summary>
+        public async Task<bool> TakeDeadShip(string token)
+        {
+            string url = $"{ElasticUrl}/{ElasticDeadIndex}/_doc/{token}";
+            var resp = await RequestJson(url, "DELETE");
+            return (string)resp["result"] == "deleted";
+        }
     }
 }
@@ -53,6 +53,66 @@ namespace SGame
         /// </summary>
         [Option('T', "tickrate", Default = 30u, Required = false, HelpText = "SGame tickrate (updates per second).")]
         public uint Tickrate { get; set; }
+
+        /// <summary>
+        /// If set, ships are only integrated when read instead of on every tick.
+        /// </summary>
+        [Option("lazy-updates", Default = false, Required = false, HelpText = "Only update idle ships when they are read (by requests, scans or checkpoints) instead of on every tick.")]
+        public bool LazyUpdates { get; set; }
+
+        /// <summary>
+        /// Whether to store ship state in structure-of-arrays form.
+        /// </summary>
+        [Option("soa-storage", Default = false, Required = false, HelpText = "Store ship state in contiguous structure-of-arrays form for faster physics updates and scans.")]
+        public bool SoaStorage { get; set; }
+
+        /// <summary>
+        /// Maximum size of a REST request body.
+        /// </summary>
+        [Option("max-body-size", Default = ApiRequestReader.DEFAULT_MAX_BODY_SIZE, Required = false, HelpText = "Maximum size of a REST request body, in bytes; larger requests are rejected with HTTP 413.")]
+        public int MaxBodySize { get; set; }
+
+        /// <summary>
+        /// Whether to poll the event bus from a dedicated thread.
+        /// </summary>
+        [Option("bus-thread", Default = false, Required = false, HelpText = "Handle bus messages on a dedicated thread as soon as they arrive, instead of once per tick (state-changing messages are still applied by the game loop).")]
+        public bool BusThread { get; set; }
+
+        /// <summary>
+        /// Whether to cache the results of repeated scans within a tick.
+        /// </summary>
+        [Option("scan-cache", Default = false, Required = false, HelpText = "Answer a ship repeating the same scan within a tick from a per-node cache instead of scanning the whole cluster again.")]
+        public bool ScanCache { get; set; }
+
+        /// <summary>
+        /// File to record the spans of traced requests to.
+        /// </summary>
+        [Option("trace-file", Default = null, Required = false, HelpText = "Record timed spans of traced requests (see the X-Request-Id header) to this file, one JSON object per line.")]
+        public string TraceFile { get; set; }
+
+        /// <summary>
+        /// Whether game time only advances through `step` requests.
+        /// </summary>
+        [Option("stepped", Default = false, Required = false, HelpText = "Stepped benchmark mode: game time only advances through `step` requests (which report the cost of each tick); the game loop only polls the bus.")]
+        public bool Stepped { get; set; }
+
+        /// <summary>
+        /// Snapshot file to restore the ships from on startup (if it exists) and to save them to on shutdown.
+        /// </summary>
+        [Option("snapshot", Default = null, Required = false, HelpText = "Binary snapshot file: ships are restored from it on startup (if it exists) and saved to it on shutdown.")]
+        public string SnapshotPath { get; set; }
+
+        /// <summary>
+        /// Maximum number of killed ships remembered in memory.
+        /// </summary>
+        [Option("dead-ships-capacity", Default = DeadShipStore.DEFAULT_CAPACITY, Required = false, HelpText = "Maximum number of killed ships remembered in memory until their owners are told; older ones are spilled to persistence (if any) or forgotten.")]
+        public int DeadShipsCapacity { get; set; }
+
+        /// <summary>
+        /// How long killed ships are remembered in memory.
+        /// </summary>
+        [Option("dead-ships-ttl", Default = 3600.0, Required = false, HelpText = "Seconds killed ships are remembered in memory until their owners are told; older ones are spilled to persistence (if any) or forgotten.")]
+        public double DeadShipsTtl { get; set; }
     }
 
     /// <summary>
@@ -95,6 +155,11 @@ namespace SGame
         /// </summary>
         Persistence persistence;
 
+        /// <summary>
+        /// Records the spans of traced requests; null if tracing is disabled.
+        /// </summary>
+        Tracer tracer;
+
         /// <summary>
         /// Initializes an instance of the program.
         /// </summary>
@@ -110,12 +175,36 @@ namespace SGame
             var rootNode = localTree;
 
             this.api = new Api(options.ApiUrl, rootNode, localTree, bus, arbiterPeer, options.LocalBusPort, persistence);
-            this.router = new Router<Api>(api);
+            this.api.LazyUpdates = options.LazyUpdates;
+            this.api.SoaStorage = options.SoaStorage;
+            this.api.ScanCache = options.ScanCache ? new ScanCache() : null;
+            this.api.DeadShips.Capacity = options.DeadShipsCapacity;
+            this.api.DeadShips.TimeToLive = TimeSpan.FromSeconds(options.DeadShipsTtl);
+            this.tracer = options.TraceFile != null ? new Tracer(options.TraceFile, options.ApiUrl) : null;
+            this.api.Tracer = tracer;
+            this.api.Stepped = options.Stepped;
+            this.api.StepMilliseconds = Math.Max(1L, (long)Math.Round(1000.0 / options.Tickrate));
+            this.router = new Router<Api>(api, api.Metrics);
+
+            // (Before the connection to the arbiter is established, so that it learns of the restored ships)
+            this.api.SnapshotPath = options.SnapshotPath;
+            if (options.SnapshotPath != null && File.Exists(options.SnapshotPath))
+            {
+                var watch = System.Diagnostics.Stopwatch.StartNew();
+                int restored = this.api.LoadSnapshot(options.SnapshotPath);
+                Console.Error.WriteLine("Restored {0} ships from {1} in {2}ms", restored, options.SnapshotPath, watch.ElapsedMilliseconds);
+            }
+
+            if (options.BusThread)
+            {
+                this.bus.StartBusThread();
+            }
         }
 
         public void Dispose()
         {
             bus.Dispose();
+            tracer?.Dispose();
         }
 
         public async Task<bool> ProcessRequest(HttpListenerContext context)
@@ -123,20 +212,6 @@ namespace SGame
             string requestUrl = context.Request.RawUrl.Substring(1);
             Console.Error.WriteLine("Got a request: {0}", requestUrl);
 
-            var body = new StreamReader(context.Request.InputStream).ReadToEnd();
-            JObject json = new JObject();
-            if (body.Length > 0)
-            {
-                try
-                {
-                    json = JObject.Parse(body);
-                }
-                catch (JsonReaderException exc)
-                {
-                    // TODO: Log this and (likely) send a HTTP 500
-                }
-            }
-
 #if DEBUG
             // Handle "exit" in debug mode
             if (requestUrl == "exit")
@@ -145,9 +220,32 @@ namespace SGame
             }
 #endif
 
+            double received = Tracer.Now;
             var response = new ApiResponse(context.Response);
-            var data = new ApiData(json);
+            string traceId = Tracer.ParseTraceId(context.Request.Headers[Tracer.HEADER]);
+            if (traceId == null && tracer != null)
+            {
+                traceId = Tracer.NewTraceId();
+            }
+            if (traceId != null)
+            {
+                response.AddHeader(Tracer.HEADER, traceId);
+            }
+
+            var body = await ApiRequestReader.Read(context.Request.InputStream, context.Request.ContentLength64,
+                options.MaxBodySize, router.RequestFields(requestUrl));
+            if (body.Status != ApiRequestStatus.Ok)
+            {
+                response.Data["error"] = body.Error;
+                await response.Send(body.Status == ApiRequestStatus.TooLarge ? 413 : 500);
+                return true;
+            }
+
+            var data = new ApiData(body.Json) { TraceId = traceId };
+            double dispatched = Tracer.Now;
             await router.Dispatch(requestUrl, response, data);
+            tracer?.Record(traceId, "sgame.handle", dispatched, Tracer.Now, requestUrl);
+            tracer?.Record(traceId, "sgame.request", received, Tracer.Now, requestUrl);
             return true;
         }
 
@@ -162,9 +260,13 @@ namespace SGame
 
         private void GameLoopTick(Object source, ElapsedEventArgs e)
         {
-            bus.Update();
-            api.UpdateGameState();
-            api.GarbageCollect();
+            if (api.Stepped)
+            {
+                // (The game is only updated by `step` requests, but ships still connect, disconnect, etc.)
+                api.PollBus();
+                return;
+            }
+            api.Tick();
             //Console.WriteLine("Updated game state at {0:HH:mm:ss.fff}", e.SignalTime);
         }
 
@@ -197,6 +299,11 @@ namespace SGame
                 } while (keepGoing);
 
                 await api.PersistAllShips();
+                if (options.SnapshotPath != null)
+                {
+                    long bytes = api.SaveSnapshot(options.SnapshotPath);
+                    Console.Error.WriteLine("Saved {0} ships to {1} ({2} bytes)", api.QuadTreeNode.ShipsByToken.Count, options.SnapshotPath, bytes);
+                }
 
                 listener.Stop();
                 GameLoopTimer.Stop();
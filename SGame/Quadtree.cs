@@ -33,14 +33,173 @@ namespace SGame
 
         public Dictionary<string, LocalSpaceship> ShipsByToken { get; private set; }
 
-        public override Task<List<Spaceship>> CheckRangeLocal(Quad range)
+        /// <summary>
+        /// The structure-of-arrays store holding the state of all ships in `ShipsByToken`, or null if the state of each
+        /// ship is held by the ship object itself (see `UseShipStore()`).
+        /// </summary>
+        public ShipStore Store { get; private set; }
+
+        /// <summary>
+        /// Enables or disables structure-of-arrays storage for the ships on this node, moving the state of all
+        /// current ships in or out of the store.
+        /// </summary>
+        public void UseShipStore(bool enable)
+        {
+            if (enable && Store == null)
+            {
+                Store = new ShipStore(ShipsByToken.Count);
+                foreach (var ship in ShipsByToken.Values)
+                {
+                    Store.Attach(ship);
+                }
+            }
+            else if (!enable && Store != null)
+            {
+                Store.DetachAll();
+                Store = null;
+            }
+        }
+
+        /// <summary>
+        /// Adds a ship to this node (and to `Store`, if enabled).
+        /// </summary>
+        public void AddShip(LocalSpaceship ship)
+        {
+            ShipsByToken.Add(ship.Token, ship);
+            Store?.Attach(ship);
+        }
+
+        /// <summary>
+        /// Removes the ship with the given token from this node (and from `Store`, if enabled).
+        /// Returns false if no such ship is present.
+        /// </summary>
+        public bool RemoveShip(string token, out LocalSpaceship ship)
+        {
+            if (!ShipsByToken.Remove(token, out ship))
+            {
+                return false;
+            }
+            Store?.Detach(token);
+            return true;
+        }
+
+        /// <summary>
+        /// Integrates the state of all ships on this node up to `time` (in milliseconds).
+        /// </summary>
+        public void UpdateShips(long time)
+        {
+            if (Store != null)
+            {
+                Store.UpdateAll(time);
+            }
+            else
+            {
+                foreach (var ship in ShipsByToken.Values)
+                {
+                    ship.UpdateState();
+                }
+            }
+        }
+
+        /// <summary>
+        /// If true, ships are not integrated every tick and must be brought up to date when read (see `Api.LazyUpdates`).
+        /// </summary>
+        public bool LazyUpdates { get; set; }
+
+        /// <summary>
+        /// The game time of the SGame node (and of the ships on it); must be set if `LazyUpdates` is true.
+        /// </summary>
+        public GameTime GameTime { get; set; }
+
+        /// <summary>
+        /// The current game time (in milliseconds) if `LazyUpdates` is true, or null.
+        /// Lazily-updated ships are tested where they are at this time, and only the ones that pass are updated.
+        /// </summary>
+        private long? LazyUpdateTime()
+        {
+            return LazyUpdates ? GameTime.ElapsedMilliseconds : (long?)null;
+        }
+
+        /// <summary>
+        /// Returns the ships on this node that match `query`; in lazy mode, these (only) are brought up to date.
+        /// Must not run concurrently with changes to `ShipsByToken` (see `Api._tickLock`).
+        /// </summary>
+        public override Task<List<Spaceship>> QueryLocal(SpatialQuery query)
+        {
+            long? now = LazyUpdateTime();
+            var found = ShipsByToken.Values
+                .Where((ship) => query.Matches(now.HasValue ? ship.BoundsAt(now.Value) : ship.Bounds))
+                .ToList();
+            if (now.HasValue)
+            {
+                foreach (var ship in found)
+                {
+                    ship.UpdateState();
+                }
+            }
+
+            return Task.FromResult(found.Select(localShip => (Spaceship)localShip).ToList());
+        }
+
+        /// <summary>
+        /// Returns the earliest game time (in milliseconds) at which `ship` may need to be transferred to another node,
+        /// i.e. when it will stop being fully contained in this node's bounds or start being fully contained in one of
+        /// its children, assuming it keeps moving at its current velocity. Returns `double.PositiveInfinity` if never.
+        /// </summary>
+        public double NextTransferTime(LocalSpaceship ship)
+        {
+            double radius = ship.Radius();
+            Vector2 pos = ship.Pos, vel = ship.Velocity;
+
+            // 1) Exit from this node's bounds (shrunk by the ship's radius)
+            double exitX = SlabExitTime(pos.X, vel.X, Bounds.X + radius, Bounds.X2 - radius);
+            double exitY = SlabExitTime(pos.Y, vel.Y, Bounds.Y + radius, Bounds.Y2 - radius);
+            double seconds = Math.Min(exitX, exitY);
+
+            // 2) Entry into any of the children's bounds (shrunk by the ship's radius)
+            for (int i = 0; i < 4; i++)
+            {
+                var child = Child((Quadrant)i);
+                if (child == null) continue;
+
+                double enterTime = 0.0, leaveTime = double.PositiveInfinity;
+                if (!SlabInterval(pos.X, vel.X, child.Bounds.X + radius, child.Bounds.X2 - radius, ref enterTime, ref leaveTime)) continue;
+                if (!SlabInterval(pos.Y, vel.Y, child.Bounds.Y + radius, child.Bounds.Y2 - radius, ref enterTime, ref leaveTime)) continue;
+                if (enterTime <= leaveTime)
+                {
+                    seconds = Math.Min(seconds, enterTime);
+                }
+            }
+
+            return double.IsPositiveInfinity(seconds) ? seconds : ship.LastUpdate + seconds * 1000.0;
+        }
+
+        /// <summary>
+        /// Time (in seconds, >= 0) at which a point at `pos` moving at `vel` leaves the [min, max] range.
+        /// </summary>
+        private static double SlabExitTime(double pos, double vel, double min, double max)
+        {
+            if (pos < min || pos > max) return 0.0;
+            if (vel > 0.0) return (max - pos) / vel;
+            if (vel < 0.0) return (min - pos) / vel;
+            return double.PositiveInfinity;
+        }
+
+        /// <summary>
+        /// Intersects the [enter, leave] time interval (in seconds) with the one in which a point at `pos` moving at `vel`
+        /// is within the [min, max] range. Returns false if the point never is.
+        /// </summary>
+        private static bool SlabInterval(double pos, double vel, double min, double max, ref double enter, ref double leave)
         {
-            return new Task<List<Spaceship>>(() =>
-                ShipsByToken.Values
-                    .Where((ship) => ship.Bounds.Intersects(range))
-                    .Select(localShip => (Spaceship)localShip)
-                    .ToList()
-            );
+            if (min > max) return false;
+            if (vel == 0.0)
+            {
+                return min <= pos && pos <= max;
+            }
+            double t1 = (min - pos) / vel, t2 = (max - pos) / vel;
+            enter = Math.Max(enter, Math.Min(t1, t2));
+            leave = Math.Min(leave, Math.Max(t1, t2));
+            return leave >= 0.0;
         }
 
         /// <summary>
@@ -57,33 +216,61 @@ namespace SGame
             bool affected = true; // FIXME - This is here to make sure scans always go through; ideally, though, ships would always be in the SGame node that manages them...
             if (affected)
             {
-                Vector2 leftPoint = MathUtils.DirVec(msg.Direction + msg.Width) * msg.Radius;
-                Vector2 rightPoint = MathUtils.DirVec(msg.Direction - msg.Width) * msg.Radius;
+                Vector2 leftPoint = msg.Origin + MathUtils.DirVec(msg.Direction + msg.Width) * msg.Radius;
+                Vector2 rightPoint = msg.Origin + MathUtils.DirVec(msg.Direction - msg.Width) * msg.Radius;
 
-                Console.WriteLine($"Scanning with radius {msg.Radius}, in triangle <{msg.Origin}, {leftPoint}, {rightPoint}>");
+                MathUtils.GeometryTrace($"Scanning with radius {msg.Radius}, in triangle <{msg.Origin}, {leftPoint}, {rightPoint}>");
 
-                var iscanned = ShipsByToken.Values
+                IEnumerable<LocalSpaceship> candidates = ShipsByToken.Values;
+                if (Store != null)
+                {
+                    // Broad phase over the contiguous position/area arrays
+                    long? now = LazyUpdateTime();
+                    var nearSlots = new List<int>();
+                    Store.SlotsNear(msg.Origin, msg.Radius, nearSlots, now);
+                    candidates = nearSlots.Select(slot => Store.Ships[slot]).ToList();
+                    if (now.HasValue)
+                    {
+                        // Bring the ships that may be scanned (only) up to date before hit-testing them
+                        foreach (var ship in candidates)
+                        {
+                            ship.UpdateState();
+                        }
+                    }
+                }
+                else if (LazyUpdates)
+                {
+                    // (Also brings the ships that may be scanned, and only them, up to date)
+                    candidates = QueryLocal(new RadiusQuery(msg.Origin, msg.Radius)).Result.Cast<LocalSpaceship>();
+                }
+
+                var iscanned = candidates
                     .Where((ship) =>
                         ship.Token != msg.Originator
                         && (MathUtils.CircleTriangleIntersection(ship.Pos, ship.Radius(), msg.Origin, leftPoint, rightPoint)
                             || MathUtils.CircleSegmentIntersection(ship.Pos, ship.Radius(), msg.Origin, msg.Radius, msg.Direction, msg.Width))
                     )
-                    .Select((ship) => new Messages.Struck.ShipInfo() { Ship = ship });
-
-                results.ShipsInfo.AddRange(iscanned);
+                    .ToList();
 
+                double[] shieldings = null;
                 if (msg.ScaledShotEnergy > 0.0)
                 {
-                    foreach (var struck in results.ShipsInfo)
-                    {
-                        var ourShip = (LocalSpaceship)struck.Ship;
+                    shieldings = new double[iscanned.Count];
+                    MathUtils.ShieldingAmounts(iscanned, msg.Origin, msg.Direction, msg.Width, msg.Radius, shieldings);
+                }
 
+                for (int i = 0; i < iscanned.Count; i++)
+                {
+                    var ourShip = iscanned[i];
+                    var struck = new Messages.Struck.ShipInfo() { Ship = ourShip };
+                    if (msg.ScaledShotEnergy > 0.0)
+                    {
                         double shipDistance = (ourShip.Pos - msg.Origin).Length();
                         double damage = MathUtils.ShotDamage(msg.ScaledShotEnergy, msg.Width, shipDistance);
-                        double shielding = MathUtils.ShieldingAmount(ourShip, msg.Origin, msg.Direction, msg.Width, msg.Radius);
+                        double shielding = shieldings[i];
                         if (shielding > 0.0)
                         {
-                            Console.WriteLine($"{ourShip.PublicId} shielded itself for {shielding * 100.0}% of {msg.Originator}'s shot (= {damage * shielding} damage)");
+                            MathUtils.GeometryTrace($"{ourShip.PublicId} shielded itself for {shielding * 100.0}% of {msg.Originator}'s shot (= {damage * shielding} damage)");
                         }
                         damage *= (1.0 - shielding);
 
@@ -105,6 +292,11 @@ namespace SGame
                             struck.Damage = damage;
                         }
                     }
+
+                    struck.PublicId = ourShip.PublicId;
+                    struck.Area = ourShip.Area;
+                    struck.Pos = ourShip.Pos;
+                    results.ShipsInfo.Add(struck);
                 }
             }
             return results;
@@ -115,6 +307,11 @@ namespace SGame
     {
         public static readonly TimeSpan REPLYTIMEOUT = new TimeSpan(1500);
 
+        /// <summary>
+        /// How long to wait for the remote node to answer a spatial query (it is then assumed to have found nothing).
+        /// </summary>
+        public static readonly TimeSpan QUERY_TIMEOUT = TimeSpan.FromMilliseconds(1500.0);
+
         /// <summary>
         /// The message bus to the other nodes.
         /// </summary>
@@ -136,7 +333,7 @@ namespace SGame
         {
             this.Bus = bus;
             this.NodePeer = nodePeer;
-            this.ApiUrl = ApiUrl;
+            this.ApiUrl = apiUrl;
         }
 
         public RemoteQuadTreeNode(SGameQuadTreeNode parent, Quadrant quadrant, uint depth, NetNode bus, LiteNetLib.NetPeer nodePeer, string apiUrl)
@@ -144,14 +341,17 @@ namespace SGame
         {
             this.Bus = bus;
             this.NodePeer = nodePeer;
-            this.ApiUrl = ApiUrl;
+            this.ApiUrl = apiUrl;
         }
 
-        public override Task<List<Spaceship>> CheckRangeLocal(Quad range)
+        public override async Task<List<Spaceship>> QueryLocal(SpatialQuery query)
         {
-            // TODO Peer.SendBusMessage(new BusMsgs.CheckRangeLocal(thing))
-            // TODO Peer.AwaitBusResponse(MyResp)
-            throw new NotImplementedException();
+            var request = new Messages.QueryShips() { QueryId = Guid.NewGuid().ToString(), Query = query };
+            var reply = Bus.Waiters.Wait<Messages.ShipsFound>(NodePeer, request.QueryId, QUERY_TIMEOUT);
+            Bus.SendMessage(request, NodePeer);
+
+            var found = await reply.ConfigureAwait(false);
+            return found != null ? found.Ships.ToList() : new List<Spaceship>();
         }
 
         public override Messages.Struck ScanShootLocal(Messages.ScanShoot msg)
@@ -159,11 +359,11 @@ namespace SGame
             bool affected = MathUtils.DoesQuadIntersectCircleSector(this.Bounds, msg);
             if (affected)
             {
+                var struckTask = Bus.Waiters.Wait<Messages.Struck>(NodePeer, msg.Originator, REPLYTIMEOUT);
                 Bus.SendMessage(msg, NodePeer);
 
-                var struckTask = new MessageWaiter<Messages.Struck>(Bus, NodePeer, (struck) => struck.Originator == msg.Originator).Wait;
                 Messages.Struck results = new Messages.Struck();
-                if (Task.WaitAll(new Task[] { struckTask }, REPLYTIMEOUT))
+                if (Task.WaitAll(new Task[] { struckTask }, REPLYTIMEOUT) && struckTask.Result != null)
                 {
                     results.OriginatorAreaGain += struckTask.Result.OriginatorAreaGain;
                     results.ShipsInfo.AddRange(struckTask.Result.ShipsInfo);
@@ -189,9 +389,9 @@ namespace SGame
         {
         }
 
-        public override Task<List<Spaceship>> CheckRangeLocal(Quad range)
+        public override Task<List<Spaceship>> QueryLocal(SpatialQuery query)
         {
-            return new Task<List<Spaceship>>(() => new List<Spaceship>());
+            return Task.FromResult(new List<Spaceship>());
         }
 
         public override Messages.Struck ScanShootLocal(Messages.ScanShoot msg)
@@ -0,0 +1,122 @@
+using System;
+using System.Collections.Generic;
+using SShared;
+using Messages = SShared.Messages;
+
+namespace SGame
+{
+    /// <summary>
+    /// Caches the (cluster-wide) results of the scans issued on this node, so that a ship repeating the same scan within
+    /// a game tick is answered without broadcasting a new `ScanShoot` to all nodes.
+    /// Scans are keyed by originator and quantized origin, direction, width and radius; the whole cache is invalidated
+    /// (i.e. the epoch advances) on every game tick and whenever a shot may have changed ship areas.
+    /// All methods are thread-safe.
+    /// </summary>
+    class ScanCache
+    {
+        /// <summary>
+        /// Scans whose origins (and radii) differ by less than this many units share a cache entry.
+        /// </summary>
+        public const double POSITION_QUANTUM = 1e-3;
+
+        /// <summary>
+        /// Scans whose directions (and widths) differ by less than this many radians share a cache entry.
+        /// </summary>
+        public const double ANGLE_QUANTUM = 1e-4;
+
+        Dictionary<(string, long, long, long, long, long), List<Messages.Struck.ShipInfo>> _entries
+            = new Dictionary<(string, long, long, long, long, long), List<Messages.Struck.ShipInfo>>();
+
+        long _epoch = 0;
+
+        /// <summary>
+        /// Number of times the cache was invalidated so far.
+        /// </summary>
+        public long Epoch
+        {
+            get { lock (this) return _epoch; }
+        }
+
+        /// <summary>
+        /// Number of scans answered from the cache so far.
+        /// </summary>
+        public long Hits { get; private set; }
+
+        /// <summary>
+        /// Number of scans that were not in the cache so far.
+        /// </summary>
+        public long Misses { get; private set; }
+
+        /// <summary>
+        /// Fraction of the scans answered from the cache so far (0 if there were none).
+        /// </summary>
+        public double HitRate
+        {
+            get
+            {
+                lock (this)
+                {
+                    long total = Hits + Misses;
+                    return total > 0 ? (double)Hits / total : 0.0;
+                }
+            }
+        }
+
+        static (string, long, long, long, long, long) KeyOf(Messages.ScanShoot scan)
+        {
+            return (
+                scan.Originator,
+                (long)Math.Round(scan.Origin.X / POSITION_QUANTUM),
+                (long)Math.Round(scan.Origin.Y / POSITION_QUANTUM),
+                (long)Math.Round(MathUtils.NormalizeAngle(scan.Direction) / ANGLE_QUANTUM),
+                (long)Math.Round(scan.Width / ANGLE_QUANTUM),
+                (long)Math.Round(scan.Radius / POSITION_QUANTUM)
+            );
+        }
+
+        /// <summary>
+        /// Looks up the results of a scan in the current epoch; returns null (and counts a miss) if there are none.
+        /// </summary>
+        public List<Messages.Struck.ShipInfo> Get(Messages.ScanShoot scan)
+        {
+            lock (this)
+            {
+                List<Messages.Struck.ShipInfo> ships;
+                if (_entries.TryGetValue(KeyOf(scan), out ships))
+                {
+                    Hits++;
+                    return ships;
+                }
+                Misses++;
+                return null;
+            }
+        }
+
+        /// <summary>
+        /// Stores the results of a scan started at the given epoch. Does nothing if the cache was invalidated since (as the
+        /// results may already be stale).
+        /// </summary>
+        public void Put(Messages.ScanShoot scan, long epoch, List<Messages.Struck.ShipInfo> ships)
+        {
+            lock (this)
+            {
+                if (epoch == _epoch)
+                {
+                    _entries[KeyOf(scan)] = ships;
+                }
+            }
+        }
+
+        /// <summary>
+        /// Drops all cached results, advancing the epoch.
+        /// </summary>
+        public void Invalidate()
+        {
+            lock (this)
+            {
+                _epoch++;
+                _entries.Clear();
+            }
+        }
+    }
+}
@@ -0,0 +1,151 @@
+using System;
+using System.Collections.Generic;
+
+namespace SGame
+{
+    /// <summary>
+    /// A min-priority queue of (game time, ship token) events.
+    /// Each ship has at most one live event: rescheduling a ship simply invalidates its old heap entry, which will be
+    /// skipped when popped (lazy deletion), so scheduling is O(log n) and never requires a search in the heap.
+    /// </summary>
+    class ShipEventQueue
+    {
+        struct Entry
+        {
+            public double Time;
+            public string Token;
+        }
+
+        /// <summary>
+        /// Binary min-heap of entries, sorted by `Time`.
+        /// </summary>
+        List<Entry> _heap = new List<Entry>();
+
+        /// <summary>
+        /// The due time of the (only) live event of each ship.
+        /// </summary>
+        Dictionary<string, double> _dueTimes = new Dictionary<string, double>();
+
+        /// <summary>
+        /// Number of ships with a live event.
+        /// </summary>
+        public int Count => _dueTimes.Count;
+
+        /// <summary>
+        /// Schedules (or reschedules) the event for the ship with the given token at `time`.
+        /// A time of `double.PositiveInfinity` unschedules the ship.
+        /// </summary>
+        public void Schedule(string token, double time)
+        {
+            if (double.IsPositiveInfinity(time))
+            {
+                Remove(token);
+                return;
+            }
+
+            _dueTimes[token] = time;
+            _heap.Add(new Entry() { Time = time, Token = token });
+            SiftUp(_heap.Count - 1);
+
+            // Compact the heap if too many entries are stale
+            if (_heap.Count > 2 * _dueTimes.Count + 64)
+            {
+                Rebuild();
+            }
+        }
+
+        /// <summary>
+        /// Unschedules the event for the ship with the given token (if any).
+        /// </summary>
+        public bool Remove(string token)
+        {
+            return _dueTimes.Remove(token);
+        }
+
+        /// <summary>
+        /// Pops the token of a ship whose event is due at or before `now`.
+        /// Returns false if there are no (more) due events.
+        /// </summary>
+        public bool TryPopDue(double now, out string token)
+        {
+            while (_heap.Count > 0 && _heap[0].Time <= now)
+            {
+                Entry top = PopTop();
+                double liveTime;
+                if (_dueTimes.TryGetValue(top.Token, out liveTime) && liveTime == top.Time)
+                {
+                    _dueTimes.Remove(top.Token);
+                    token = top.Token;
+                    return true;
+                }
+                // (Otherwise the entry is stale; skip it)
+            }
+            token = null;
+            return false;
+        }
+
+        /// <summary>
+        /// Removes all events.
+        /// </summary>
+        public void Clear()
+        {
+            _heap.Clear();
+            _dueTimes.Clear();
+        }
+
+        private Entry PopTop()
+        {
+            Entry top = _heap[0];
+            int last = _heap.Count - 1;
+            _heap[0] = _heap[last];
+            _heap.RemoveAt(last);
+            if (_heap.Count > 0)
+            {
+                SiftDown(0);
+            }
+            return top;
+        }
+
+        private void Rebuild()
+        {
+            _heap.Clear();
+            foreach (var kv in _dueTimes)
+            {
+                _heap.Add(new Entry() { Time = kv.Value, Token = kv.Key });
+            }
+            for (int i = _heap.Count / 2 - 1; i >= 0; i--)
+            {
+                SiftDown(i);
+            }
+        }
+
+        private void SiftUp(int i)
+        {
+            Entry item = _heap[i];
+            while (i > 0)
+            {
+                int parent = (i - 1) / 2;
+                if (_heap[parent].Time <= item.Time) break;
+                _heap[i] = _heap[parent];
+                i = parent;
+            }
+            _heap[i] = item;
+        }
+
+        private void SiftDown(int i)
+        {
+            Entry item = _heap[i];
+            int count = _heap.Count;
+            while (true)
+            {
+                int child = 2 * i + 1;
+                if (child >= count) break;
+                if (child + 1 < count && _heap[child + 1].Time < _heap[child].Time) child++;
+                if (item.Time <= _heap[child].Time) break;
+                _heap[i] = _heap[child];
+                i = child;
+            }
+            _heap[i] = item;
+        }
+    }
+}
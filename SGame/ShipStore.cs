@@ -0,0 +1,241 @@
+using System;
+using System.Collections.Generic;
+using SShared;
+using Vector = System.Numerics.Vector;
+using VectorD = System.Numerics.Vector<double>;
+
+namespace SGame
+{
+    /// <summary>
+    /// Structure-of-arrays storage for the state of the ships simulated on a node.
+    /// Each attached ship owns a dense slot id; its physical state lives in contiguous arrays indexed by that slot,
+    /// so that per-tick integration and scan filtering are tight (SIMD-friendly) loops instead of pointer chasing.
+    /// </summary>
+    class ShipStore
+    {
+        private const int INITIAL_CAPACITY = 64;
+
+        public double[] PosX, PosY, VelX, VelY;
+        public double[] Energy, Area, ShieldDir, ShieldWidth, KillReward;
+        public double[] LastUpdate, LastCombat;
+
+        /// <summary>
+        /// The ship attached to each slot.
+        /// </summary>
+        public LocalSpaceship[] Ships;
+
+        /// <summary>
+        /// Maps ship tokens to slot ids.
+        /// </summary>
+        private Dictionary<string, int> _slotByToken = new Dictionary<string, int>();
+
+        /// <summary>
+        /// Number of slots in use (= slots 0..Count-1).
+        /// </summary>
+        public int Count { get; private set; }
+
+        public ShipStore(int capacity = INITIAL_CAPACITY)
+        {
+            Resize(Math.Max(capacity, 1));
+        }
+
+        /// <summary>
+        /// Returns the slot of the ship with the given token, or -1 if not in this store.
+        /// </summary>
+        public int SlotOf(string token)
+        {
+            return _slotByToken.TryGetValue(token, out int slot) ? slot : -1;
+        }
+
+        /// <summary>
+        /// Moves the state of `ship` into a new slot of this store; from now on its properties will read/write the store.
+        /// </summary>
+        public void Attach(LocalSpaceship ship)
+        {
+            if (ship.Store != null)
+            {
+                throw new InvalidOperationException($"Ship {ship.PublicId} is already attached to a store");
+            }
+            if (Count == Ships.Length)
+            {
+                Resize(Ships.Length * 2);
+            }
+
+            int slot = Count++;
+            PosX[slot] = ship.Pos.X; PosY[slot] = ship.Pos.Y;
+            VelX[slot] = ship.Velocity.X; VelY[slot] = ship.Velocity.Y;
+            Energy[slot] = ship.Energy;
+            Area[slot] = ship.Area;
+            ShieldDir[slot] = ship.ShieldDir;
+            ShieldWidth[slot] = ship.ShieldWidth;
+            KillReward[slot] = ship.KillReward;
+            LastUpdate[slot] = ship.LastUpdate;
+            LastCombat[slot] = ship.LastCombat;
+            Ships[slot] = ship;
+            _slotByToken.Add(ship.Token, slot);
+
+            ship.Store = this;
+            ship.Slot = slot;
+        }
+
+        /// <summary>
+        /// Copies the state of the ship with the given token back into the ship object and frees its slot
+        /// (by moving the last slot into it). Returns the detached ship, or null if it was not in this store.
+        /// </summary>
+        public LocalSpaceship Detach(string token)
+        {
+            int slot;
+            if (!_slotByToken.Remove(token, out slot))
+            {
+                return null;
+            }
+
+            LocalSpaceship ship = Ships[slot];
+            ship.Store = null;
+            ship.Slot = -1;
+            ship.Pos = new Vector2(PosX[slot], PosY[slot]);
+            ship.Velocity = new Vector2(VelX[slot], VelY[slot]);
+            ship.Energy = Energy[slot];
+            ship.Area = Area[slot];
+            ship.ShieldDir = ShieldDir[slot];
+            ship.ShieldWidth = ShieldWidth[slot];
+            ship.KillReward = KillReward[slot];
+            ship.LastUpdate = LastUpdate[slot];
+            ship.LastCombat = LastCombat[slot];
+
+            int last = --Count;
+            if (slot != last)
+            {
+                PosX[slot] = PosX[last]; PosY[slot] = PosY[last];
+                VelX[slot] = VelX[last]; VelY[slot] = VelY[last];
+                Energy[slot] = Energy[last];
+                Area[slot] = Area[last];
+                ShieldDir[slot] = ShieldDir[last];
+                ShieldWidth[slot] = ShieldWidth[last];
+                KillReward[slot] = KillReward[last];
+                LastUpdate[slot] = LastUpdate[last];
+                LastCombat[slot] = LastCombat[last];
+
+                LocalSpaceship moved = Ships[last];
+                Ships[slot] = moved;
+                moved.Slot = slot;
+                _slotByToken[moved.Token] = slot;
+            }
+            Ships[last] = null;
+            return ship;
+        }
+
+        /// <summary>
+        /// Detaches all ships (see `Detach()`).
+        /// </summary>
+        public void DetachAll()
+        {
+            while (Count > 0)
+            {
+                Detach(Ships[Count - 1].Token);
+            }
+        }
+
+        /// <summary>
+        /// Integrates the state of all ships up to `time` (in milliseconds); equivalent to calling
+        /// `LocalSpaceship.UpdateState()` on each of them.
+        /// </summary>
+        public void UpdateAll(long time)
+        {
+            int count = Count;
+            double now = time;
+
+            // 1) Positions (vectorised)
+            int i = 0;
+            int width = VectorD.Count;
+            if (Vector.IsHardwareAccelerated)
+            {
+                var nowVec = new VectorD(now);
+                var msToSeconds = new VectorD(0.001);
+                for (; i <= count - width; i += width)
+                {
+                    var elapsed = (nowVec - new VectorD(LastUpdate, i)) * msToSeconds;
+                    (new VectorD(PosX, i) + new VectorD(VelX, i) * elapsed).CopyTo(PosX, i);
+                    (new VectorD(PosY, i) + new VectorD(VelY, i) * elapsed).CopyTo(PosY, i);
+                }
+            }
+            for (; i < count; i++)
+            {
+                double elapsed = (now - LastUpdate[i]) / 1000;
+                PosX[i] += VelX[i] * elapsed;
+                PosY[i] += VelY[i] * elapsed;
+            }
+
+            // 2) Energy, shields and kill rewards
+            for (i = 0; i < count; i++)
+            {
+                double elapsedSeconds = (now - LastUpdate[i]) / 1000;
+                double area = Area[i];
+                double energyGain = area;
+                double shieldUsedEnergy = Spaceship.ShieldEnergyUsage(ShieldWidth[i], area);
+
+                if (shieldUsedEnergy > energyGain
+                    && elapsedSeconds >= Energy[i] / (shieldUsedEnergy - energyGain))
+                {
+                    // Ran out of energy: shield turns off and energy recovers for the remaining time
+                    double timeToNoEnergy = Energy[i] / (shieldUsedEnergy - energyGain);
+                    ShieldWidth[i] = 0.0;
+                    Energy[i] = (elapsedSeconds - timeToNoEnergy) * energyGain;
+                }
+                else Energy[i] += (energyGain - shieldUsedEnergy) * elapsedSeconds;
+
+                Energy[i] = Math.Min(area * 10, Energy[i]);
+
+                LastUpdate[i] = now;
+                if (now - LastCombat[i] > LocalSpaceship.COMBAT_COOLDOWN)
+                {
+                    KillReward[i] = area;
+                }
+                else KillReward[i] = Math.Max(KillReward[i], area);
+            }
+        }
+
+        /// <summary>
+        /// Appends to `slots` the slots of all ships whose bounding circle is within `radius` of `origin`.
+        /// Used as a cheap broad-phase filter before exact scan hit-testing.
+        /// If `time` (in milliseconds) is given, ships are tested where `UpdateAll(time)` would move them, without
+        /// actually updating them (for lazily-updated ships).
+        /// </summary>
+        public void SlotsNear(Vector2 origin, double radius, List<int> slots, long? time = null)
+        {
+            double invPi = 1.0 / Math.PI;
+            for (int i = 0; i < Count; i++)
+            {
+                double px = PosX[i], py = PosY[i];
+                if (time.HasValue)
+                {
+                    double elapsed = (time.Value - LastUpdate[i]) / 1000;
+                    px += VelX[i] * elapsed;
+                    py += VelY[i] * elapsed;
+                }
+                double dx = px - origin.X, dy = py - origin.Y;
+                double reach = radius + Math.Sqrt(Area[i] * invPi);
+                if (dx * dx + dy * dy <= reach * reach)
+                {
+                    slots.Add(i);
+                }
+            }
+        }
+
+        private void Resize(int capacity)
+        {
+            Array.Resize(ref PosX, capacity);
+            Array.Resize(ref PosY, capacity);
+            Array.Resize(ref VelX, capacity);
+            Array.Resize(ref VelY, capacity);
+            Array.Resize(ref Energy, capacity);
+            Array.Resize(ref Area, capacity);
+            Array.Resize(ref ShieldDir, capacity);
+            Array.Resize(ref ShieldWidth, capacity);
+            Array.Resize(ref KillReward, capacity);
+            Array.Resize(ref LastUpdate, capacity);
+            Array.Resize(ref LastCombat, capacity);
+            Array.Resize(ref Ships, capacity);
+        }
+    }
+}
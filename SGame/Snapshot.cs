@@ -0,0 +1,174 @@
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.IO.MemoryMappedFiles;
+using System.Runtime.InteropServices;
+using System.Text;
+using SShared;
+
+namespace SGame
+{
+    /// <summary>
+    /// Compact binary snapshots of all the ships simulated on a node, for fast restarts, handovers and benchmark worlds.
+    /// A snapshot is a `Header`, followed by one fixed-size `ShipRecord` per ship, followed by the UTF-8 bytes of all
+    /// ship tokens (each record points to its token in there). Everything is little-endian, as laid out in memory.
+    /// Snapshots are written to a temporary file that then replaces the old one, so a crash while writing never leaves
+    /// a torn snapshot behind; they are read back through a memory mapping, without parsing.
+    /// </summary>
+    static class Snapshot
+    {
+        /// <summary>
+        /// "SGSNAP01", as a little-endian 64-bit integer.
+        /// </summary>
+        public const ulong MAGIC = 0x3130_5041_4E53_4753;
+
+        /// <summary>
+        /// Bumped whenever the layout of `Header` or `ShipRecord` changes.
+        /// </summary>
+        public const int VERSION = 1;
+
+        [StructLayout(LayoutKind.Sequential, Pack = 1)]
+        public struct Header
+        {
+            public ulong Magic;
+            public int Version;
+            public int Count;
+            public long GameMilliseconds;
+            public double CentreX, CentreY, Radius;
+            public int TokenBytes;
+        }
+
+        /// <summary>
+        /// The state of a ship; times are stored relative to the snapshot's game time (as in `LocalSpaceship.ToJson()`).
+        /// </summary>
+        [StructLayout(LayoutKind.Sequential, Pack = 1)]
+        public struct ShipRecord
+        {
+            public double Energy, Area;
+            public double PosX, PosY, VelX, VelY;
+            public double ShieldDir, ShieldWidth, KillReward;
+            public double LastUpdateDelta, LastCombatDelta;
+            public int TokenOffset, TokenLength;
+        }
+
+        /// <summary>
+        /// Writes a snapshot of `ships` (all up to date at `gameMilliseconds`) managed by a node with the given bounds to
+        /// `path`, atomically replacing any existing file. Returns the size of the snapshot, in bytes.
+        /// </summary>
+        public static long Write(string path, ICollection<LocalSpaceship> ships, long gameMilliseconds, Quad bounds)
+        {
+            var records = new ShipRecord[ships.Count];
+            var tokens = new MemoryStream();
+            int i = 0;
+            foreach (var ship in ships)
+            {
+                byte[] token = Encoding.UTF8.GetBytes(ship.Token);
+                records[i++] = new ShipRecord()
+                {
+                    Energy = ship.Energy,
+                    Area = ship.Area,
+                    PosX = ship.Pos.X,
+                    PosY = ship.Pos.Y,
+                    VelX = ship.Velocity.X,
+                    VelY = ship.Velocity.Y,
+                    ShieldDir = ship.ShieldDir,
+                    ShieldWidth = ship.ShieldWidth,
+                    KillReward = ship.KillReward,
+                    LastUpdateDelta = gameMilliseconds - ship.LastUpdate,
+                    LastCombatDelta = gameMilliseconds - ship.LastCombat,
+                    TokenOffset = (int)tokens.Length,
+                    TokenLength = token.Length,
+                };
+                tokens.Write(token, 0, token.Length);
+            }
+
+            var header = new Header()
+            {
+                Magic = MAGIC,
+                Version = VERSION,
+                Count = records.Length,
+                GameMilliseconds = gameMilliseconds,
+                CentreX = bounds.CentreX,
+                CentreY = bounds.CentreY,
+                Radius = bounds.Radius,
+                TokenBytes = (int)tokens.Length,
+            };
+
+            string tempPath = path + ".tmp";
+            using (var file = new FileStream(tempPath, FileMode.Create, FileAccess.Write, FileShare.None))
+            {
+                file.Write(MemoryMarshal.AsBytes(MemoryMarshal.CreateReadOnlySpan(ref header, 1)));
+                file.Write(MemoryMarshal.AsBytes(new ReadOnlySpan<ShipRecord>(records)));
+                tokens.Position = 0;
+                tokens.CopyTo(file);
+                file.Flush(flushToDisk: true);
+            }
+            File.Move(tempPath, path, overwrite: true);
+            return new FileInfo(path).Length;
+        }
+
+        /// <summary>
+        /// Reads the snapshot at `path`, returning its ships (timed by `gameTime`) and the bounds of the node that wrote it.
+        /// Throws an `InvalidDataException` if the file is not a valid snapshot.
+        /// </summary>
+        public static List<LocalSpaceship> Read(string path, GameTime gameTime, out Quad bounds)
+        {
+            int headerSize = Marshal.SizeOf<Header>();
+            int recordSize = Marshal.SizeOf<ShipRecord>();
+            long length = new FileInfo(path).Length;
+            if (length < headerSize)
+            {
+                throw new InvalidDataException($"{path} is not a ship snapshot (too short)");
+            }
+
+            using (var file = MemoryMappedFile.CreateFromFile(path, FileMode.Open, null, 0, MemoryMappedFileAccess.Read))
+            using (var view = file.CreateViewAccessor(0, length, MemoryMappedFileAccess.Read))
+            {
+                Header header;
+                view.Read(0, out header);
+                if (header.Magic != MAGIC)
+                {
+                    throw new InvalidDataException($"{path} is not a ship snapshot");
+                }
+                if (header.Version != VERSION)
+                {
+                    throw new InvalidDataException($"{path} is a version {header.Version} snapshot (expected version {VERSION})");
+                }
+                if (header.Count < 0 || header.TokenBytes < 0 || headerSize + (long)header.Count * recordSize + header.TokenBytes != length)
+                {
+                    throw new InvalidDataException($"{path} is truncated or corrupt");
+                }
+
+                var records = new ShipRecord[header.Count];
+                view.ReadArray(headerSize, records, 0, records.Length);
+                var tokens = new byte[header.TokenBytes];
+                view.ReadArray(headerSize + (long)header.Count * recordSize, tokens, 0, tokens.Length);
+
+                bounds = new Quad(header.CentreX, header.CentreY, header.Radius);
+                long now = gameTime.ElapsedMilliseconds;
+                var ships = new List<LocalSpaceship>(records.Length);
+                foreach (var record in records)
+                {
+                    if (record.TokenOffset < 0 || record.TokenLength < 0 || record.TokenOffset + record.TokenLength > tokens.Length)
+                    {
+                        throw new InvalidDataException($"{path} is truncated or corrupt");
+                    }
+                    var ship = new LocalSpaceship(Encoding.UTF8.GetString(tokens, record.TokenOffset, record.TokenLength), gameTime)
+                    {
+                        Energy = record.Energy,
+                        Area = record.Area,
+                        Pos = new Vector2(record.PosX, record.PosY),
+                        Velocity = new Vector2(record.VelX, record.VelY),
+                        ShieldDir = record.ShieldDir,
+                        ShieldWidth = record.ShieldWidth,
+                        KillReward = record.KillReward,
+                        LastUpdate = now - record.LastUpdateDelta,
+                        LastCombat = now - record.LastCombatDelta,
+                    };
+                    ships.Add(ship);
+                }
+                return ships;
+            }
+        }
+    }
+}
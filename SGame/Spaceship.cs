@@ -14,15 +14,97 @@ namespace SGame
         /// </summary>
         public GameTime GameTime { get; set; }
 
+        /// <summary>
+        /// The structure-of-arrays store holding the state of this ship, or null if the state is held by this object.
+        /// </summary>
+        public ShipStore Store { get; set; }
+
+        /// <summary>
+        /// The slot of this ship in `Store` (-1 if not attached to a store).
+        /// </summary>
+        public int Slot { get; set; } = -1;
+
+        private double _lastUpdate;
+
         /// <summary>
         /// Timestamp of last time the ship was updated.
         /// </summary>
-        public double LastUpdate { get; set; }
+        public double LastUpdate
+        {
+            get { return Store != null ? Store.LastUpdate[Slot] : _lastUpdate; }
+            set { if (Store != null) Store.LastUpdate[Slot] = value; else _lastUpdate = value; }
+        }
+
+        private double _lastCombat;
 
         /// <summary>
         /// Timestamp of last time the ship was in combat.
         /// </summary>
-        public double LastCombat { get; set; }
+        public double LastCombat
+        {
+            get { return Store != null ? Store.LastCombat[Slot] : _lastCombat; }
+            set { if (Store != null) Store.LastCombat[Slot] = value; else _lastCombat = value; }
+        }
+
+        // ===== Store-backed state ============================================
+
+        public override double Energy
+        {
+            get { return Store != null ? Store.Energy[Slot] : base.Energy; }
+            set { if (Store != null) Store.Energy[Slot] = value; else base.Energy = value; }
+        }
+
+        public override double Area
+        {
+            get { return Store != null ? Store.Area[Slot] : base.Area; }
+            set { if (Store != null) Store.Area[Slot] = value; else base.Area = value; }
+        }
+
+        public override Vector2 Pos
+        {
+            get { return Store != null ? new Vector2(Store.PosX[Slot], Store.PosY[Slot]) : base.Pos; }
+            set
+            {
+                if (Store != null)
+                {
+                    Store.PosX[Slot] = value.X;
+                    Store.PosY[Slot] = value.Y;
+                }
+                else base.Pos = value;
+            }
+        }
+
+        public override Vector2 Velocity
+        {
+            get { return Store != null ? new Vector2(Store.VelX[Slot], Store.VelY[Slot]) : base.Velocity; }
+            set
+            {
+                if (Store != null)
+                {
+                    Store.VelX[Slot] = value.X;
+                    Store.VelY[Slot] = value.Y;
+                }
+                else base.Velocity = value;
+            }
+        }
+
+        public override double ShieldDir
+        {
+            get { return Store != null ? Store.ShieldDir[Slot] : base.ShieldDir; }
+            set { if (Store != null) Store.ShieldDir[Slot] = NormalizeShieldDir(value); else base.ShieldDir = value; }
+        }
+
+        public override double ShieldWidth
+        {
+            get { return Store != null ? Store.ShieldWidth[Slot] : base.ShieldWidth; }
+            set { if (Store != null) Store.ShieldWidth[Slot] = value; else base.ShieldWidth = value; }
+        }
+
+        public override double KillReward
+        {
+            get { return Store != null ? Store.KillReward[Slot] : base.KillReward; }
+            set { if (Store != null) Store.KillReward[Slot] = value; else base.KillReward = value; }
+        }
 
         /// <summary>
         /// Number of milliseconds between combat actions that reset the kill reward
@@ -71,6 +153,24 @@ namespace SGame
             return json;
         }
 
+        /// <summary>
+        /// Position `UpdateState()` would move this ship to at game time `time` (in milliseconds), without updating it.
+        /// </summary>
+        public Vector2 PosAt(long time)
+        {
+            double elapsedSeconds = (double)(time - LastUpdate) / 1000;
+            return Pos + Vector2.Multiply(Velocity, elapsedSeconds);
+        }
+
+        /// <summary>
+        /// Bounds of this ship at game time `time` (in milliseconds); see `PosAt()`.
+        /// </summary>
+        public Quad BoundsAt(long time)
+        {
+            Vector2 pos = PosAt(time);
+            return new Quad(pos.X, pos.Y, Radius());
+        }
+
         public void UpdateState()
         {
             long time = GameTime.ElapsedMilliseconds;
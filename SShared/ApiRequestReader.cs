@@ -0,0 +1,229 @@
+using System;
+using System.Buffers;
+using System.Collections.Generic;
+using System.IO;
+using System.Text;
+using System.Text.Json;
+using System.Threading.Tasks;
+using Newtonsoft.Json.Linq;
+
+namespace SShared
+{
+    /// <summary>
+    /// The set of top-level JSON fields a route is interested in (see `Router.RequestFields()`).
+    /// </summary>
+    public class ApiRequestFields
+    {
+        /// <summary>
+        /// Accept all fields (for routes that do not declare their `ApiParam`s).
+        /// </summary>
+        public static readonly ApiRequestFields All = new ApiRequestFields(null);
+
+        /// <summary>
+        /// Accept no fields (e.g. for unknown routes).
+        /// </summary>
+        public static readonly ApiRequestFields None = new ApiRequestFields(new string[0]);
+
+        /// <summary>
+        /// UTF-8 encoded names of the accepted fields, or null to accept all.
+        /// </summary>
+        byte[][] utf8Names;
+
+        public ApiRequestFields(IEnumerable<string> names)
+        {
+            if (names != null)
+            {
+                var encoded = new List<byte[]>();
+                foreach (var name in names)
+                {
+                    encoded.Add(Encoding.UTF8.GetBytes(name));
+                }
+                utf8Names = encoded.ToArray();
+            }
+        }
+
+        /// <summary>
+        /// Returns true if the field whose (unescaped) property name `reader` is positioned at is accepted.
+        /// </summary>
+        internal bool Accepts(ref Utf8JsonReader reader)
+        {
+            if (utf8Names == null)
+            {
+                return true;
+            }
+            foreach (var name in utf8Names)
+            {
+                if (reader.ValueTextEquals(name))
+                {
+                    return true;
+                }
+            }
+            return false;
+        }
+    }
+
+    /// <summary>
+    /// The outcome of `ApiRequestReader.Read()`.
+    /// </summary>
+    public enum ApiRequestStatus
+    {
+        Ok,
+        TooLarge,
+        Malformed,
+    }
+
+    /// <summary>
+    /// Reads the JSON body of REST requests into a pooled buffer and extracts only the fields a route is interested in;
+    /// all other fields are skipped without being materialized.
+    /// </summary>
+    public static class ApiRequestReader
+    {
+        /// <summary>
+        /// The default maximum size of a request body, in bytes.
+        /// </summary>
+        public const int DEFAULT_MAX_BODY_SIZE = 64 * 1024;
+
+        /// <summary>
+        /// Size of the buffer rented to read bodies of unknown length.
+        /// </summary>
+        const int INITIAL_BUFFER_SIZE = 4096;
+
+        /// <summary>
+        /// Reads at most `maxBodySize` bytes of a JSON object from `input`, keeping only the top-level fields accepted by
+        /// `fields`. `contentLength` is the declared size of the body, or -1 if unknown.
+        /// On error, the returned `Json` is null and `Error` describes the error.
+        /// </summary>
+        public static async Task<(ApiRequestStatus Status, JObject Json, string Error)> Read(Stream input, long contentLength, int maxBodySize, ApiRequestFields fields)
+        {
+            if (contentLength > maxBodySize)
+            {
+                return (ApiRequestStatus.TooLarge, null, $"Request body too large (max {maxBodySize} bytes)");
+            }
+
+            // Read at most one byte more than allowed, to detect oversized bodies of unknown length
+            int limit = maxBodySize + 1;
+            int capacity = contentLength >= 0 ? (int)contentLength + 1 : Math.Min(INITIAL_BUFFER_SIZE, limit);
+            byte[] buffer = ArrayPool<byte>.Shared.Rent(capacity);
+            try
+            {
+                int length = 0;
+                while (length < limit)
+                {
+                    if (length == buffer.Length)
+                    {
+                        byte[] bigger = ArrayPool<byte>.Shared.Rent(Math.Min(buffer.Length * 2, limit));
+                        Buffer.BlockCopy(buffer, 0, bigger, 0, length);
+                        ArrayPool<byte>.Shared.Return(buffer);
+                        buffer = bigger;
+                    }
+                    int read = await input.ReadAsync(buffer, length, Math.Min(buffer.Length, limit) - length);
+                    if (read == 0)
+                    {
+                        break;
+                    }
+                    length += read;
+                }
+
+                if (length > maxBodySize)
+                {
+                    return (ApiRequestStatus.TooLarge, null, $"Request body too large (max {maxBodySize} bytes)");
+                }
+                if (length == 0)
+                {
+                    return (ApiRequestStatus.Ok, new JObject(), null);
+                }
+
+                try
+                {
+                    return (ApiRequestStatus.Ok, Parse(buffer, length, fields), null);
+                }
+                catch (Exception exc) when (exc is JsonException || exc is InvalidOperationException)
+                {
+                    return (ApiRequestStatus.Malformed, null, "Malformed request: " + exc.Message);
+                }
+            }
+            finally
+            {
+                ArrayPool<byte>.Shared.Return(buffer);
+            }
+        }
+
+        /// <summary>
+        /// Parses a JSON object from the first `length` bytes of `utf8Json`, keeping only the top-level fields accepted
+        /// by `fields`. Throws a `JsonException` if the JSON is malformed or not an object.
+        /// </summary>
+        public static JObject Parse(byte[] utf8Json, int length, ApiRequestFields fields)
+        {
+            var reader = new Utf8JsonReader(new ReadOnlySpan<byte>(utf8Json, 0, length), new JsonReaderOptions() { CommentHandling = JsonCommentHandling.Skip });
+            if (!reader.Read() || reader.TokenType != JsonTokenType.StartObject)
+            {
+                throw new JsonException("Expected a JSON object");
+            }
+
+            var json = new JObject();
+            while (reader.Read() && reader.TokenType == JsonTokenType.PropertyName)
+            {
+                if (fields.Accepts(ref reader))
+                {
+                    string name = reader.GetString();
+                    reader.Read();
+                    json[name] = ReadToken(ref reader);
+                }
+                else
+                {
+                    // Skip the value (and all of its children) without materializing it
+                    reader.Read();
+                    reader.Skip();
+                }
+            }
+            if (reader.TokenType != JsonTokenType.EndObject)
+            {
+                throw new JsonException("Unterminated JSON object");
+            }
+            return json;
+        }
+
+        /// <summary>
+        /// Reads the value `reader` is positioned at (and all of its children) into a `JToken`.
+        /// </summary>
+        static JToken ReadToken(ref Utf8JsonReader reader)
+        {
+            switch (reader.TokenType)
+            {
+                case JsonTokenType.String:
+                    return new JValue(reader.GetString());
+                case JsonTokenType.Number:
+                    long integer;
+                    if (reader.TryGetInt64(out integer))
+                    {
+                        return new JValue(integer);
+                    }
+                    return new JValue(reader.GetDouble());
+                case JsonTokenType.True:
+                    return new JValue(true);
+                case JsonTokenType.False:
+                    return new JValue(false);
+                case JsonTokenType.Null:
+                    return JValue.CreateNull();
+                case JsonTokenType.StartArray:
+                    var array = new JArray();
+                    while (reader.Read() && reader.TokenType != JsonTokenType.EndArray)
+                    {
+                        array.Add(ReadToken(ref reader));
+                    }
+                    return array;
+                case JsonTokenType.StartObject:
+                    var obj = new JObject();
+                    while (reader.Read() && reader.TokenType == JsonTokenType.PropertyName)
+                    {
+                        string name = reader.GetString();
+                        reader.Read();
+                        obj[name] = ReadToken(ref reader);
+                    }
+                    return obj;
+                default:
+                    throw new JsonException($"Unexpected JSON token: {reader.TokenType}");
+            }
+        }
+    }
+}
@@ -0,0 +1,70 @@
+using System;
+using System.Collections.Concurrent;
+using System.IO;
+using System.Threading;
+using System.Threading.Tasks;
+using Newtonsoft.Json.Linq;
+
+namespace SShared
+{
+    /// <summary>
+    /// Appends JSON objects to a file, one per line, from a background task so that writing one never blocks on I/O.
+    /// </summary>
+    public class JsonLinesWriter : IDisposable
+    {
+        /// <summary>
+        /// Maximum number of lines waiting to be written; further lines are dropped (and counted).
+        /// </summary>
+        public const int MAX_PENDING_LINES = 1 << 16;
+
+        /// <summary>
+        /// Number of lines dropped because too many were waiting to be written.
+        /// </summary>
+        public long Dropped => Interlocked.Read(ref _dropped);
+
+        long _dropped = 0;
+
+        BlockingCollection<string> _pending = new BlockingCollection<string>(MAX_PENDING_LINES);
+
+        Task _writerTask;
+
+        public JsonLinesWriter(string path)
+        {
+            var writer = new StreamWriter(path, append: true);
+            _writerTask = Task.Factory.StartNew(() =>
+            {
+                using (writer)
+                {
+                    foreach (var line in _pending.GetConsumingEnumerable())
+                    {
+                        writer.WriteLine(line);
+                        if (_pending.Count == 0)
+                        {
+                            writer.Flush();
+                        }
+                    }
+                }
+            }, TaskCreationOptions.LongRunning);
+        }
+
+        /// <summary>
+        /// Queues `json` to be written as a line.
+        /// </summary>
+        public void Write(JObject json)
+        {
+            if (!_pending.TryAdd(json.ToString(Newtonsoft.Json.Formatting.None)))
+            {
+                Interlocked.Increment(ref _dropped);
+            }
+        }
+
+        /// <summary>
+        /// Writes all pending lines and closes the file.
+        /// </summary>
+        public void Dispose()
+        {
+            _pending.CompleteAdding();
+            _writerTask.Wait();
+        }
+    }
+}
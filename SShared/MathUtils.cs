@@ -133,6 +133,16 @@ namespace SShared
     /// </summary>
     public static class MathUtils
     {
+        /// <summary>
+        /// Writes a line of debugging output of the geometry code. Calls to this (and the evaluation of their arguments)
+        /// are compiled out unless `GEOMETRY_TRACE` is defined (in the calling project).
+        /// </summary>
+        /// <param name="message"></param>
+        [Conditional("GEOMETRY_TRACE")]
+        public static void GeometryTrace(string message)
+        {
+            Console.WriteLine(message);
+        }
 
         /// <summary>
         /// Convert an angle from radians to degrees.
@@ -215,7 +225,7 @@ namespace SShared
         public static bool CircleTriangleIntersection(Vector2 circleCenter, double radius, Vector2 A, Vector2 B, Vector2 C)
         {
 
-            Console.WriteLine("Testing intersection of " + circleCenter.ToString() + ", r=" + radius + " with " + A.ToString() + "," + B.ToString() + "," + C.ToString());
+            GeometryTrace("Testing intersection of " + circleCenter.ToString() + ", r=" + radius + " with " + A.ToString() + "," + B.ToString() + "," + C.ToString());
 
             Vector2 cA = A - circleCenter, cB = B - circleCenter, cC = C - circleCenter;
 
@@ -298,6 +308,15 @@ namespace SShared
             double centerAngle = Math.Atan2(centerDelta.Y, centerDelta.X);
 
             double internalAngle = Math.PI / 2 - bisectAngle;
+            TangentPoints(circleCenter, circleRadius, centerAngle, internalAngle, out tg1, out tg2);
+        }
+
+        /// <summary>
+        /// The tangent points of `CircleTangents()`, given the angle of the line from the external point to `circleCenter`
+        /// and the angle between that line and the radii to the tangent points.
+        /// </summary>
+        static void TangentPoints(Vector2 circleCenter, double circleRadius, double centerAngle, double internalAngle, out Vector2 tg1, out Vector2 tg2)
+        {
             tg1 = circleCenter - MathUtils.DirVec(centerAngle - internalAngle) * (double)circleRadius;
             tg2 = circleCenter - MathUtils.DirVec(centerAngle + internalAngle) * (double)circleRadius;
         }
@@ -504,31 +523,79 @@ namespace SShared
         /// <returns></returns>
         public static double ShieldingAmount(Spaceship ship, Vector2 shotOrigin, double shotDir, double shotWidth, double shotRadius)
         {
-            double shipR = ship.Radius();
-            if ((shotOrigin - ship.Pos).Length() <= shipR)
+            return ShieldingAmountNormalized(ship, shotOrigin, MathUtils.NormalizeAngle(MathUtils.ClampAngle(shotDir)), shotWidth, shotRadius);
+        }
+
+        /// <summary>
+        /// Computes `ShieldingAmount()` for all `ships` struck by the same shot, into `shieldings`.
+        /// </summary>
+        /// <param name="ships"></param>
+        /// <param name="shotOrigin"></param>
+        /// <param name="shotDir"></param>
+        /// <param name="shotWidth"></param>
+        /// <param name="shotRadius"></param>
+        /// <param name="shieldings"></param>
+        public static void ShieldingAmounts(IReadOnlyList<Spaceship> ships, Vector2 shotOrigin, double shotDir, double shotWidth, double shotRadius, double[] shieldings)
+        {
+            shotDir = MathUtils.NormalizeAngle(MathUtils.ClampAngle(shotDir));
+            for (int i = 0; i < ships.Count; i++)
             {
-                return 0.0;
+                shieldings[i] = ShieldingAmountNormalized(ships[i], shotOrigin, shotDir, shotWidth, shotRadius);
             }
+        }
+
+        /// <summary>
+        /// Shields are only tested for fully covering (or missing) the visible side of a ship if they do so by more than
+        /// this many radians; closer calls go through the full computation.
+        /// </summary>
+        const double SHIELD_EARLY_OUT_MARGIN = 1e-6;
 
+        /// <summary>
+        /// `ShieldingAmount()`, with `shotDir` already normalized to the -PI to PI range.
+        /// </summary>
+        static double ShieldingAmountNormalized(Spaceship ship, Vector2 shotOrigin, double shotDir, double shotWidth, double shotRadius)
+        {
             if (ship.ShieldWidth < 0.001)
             {
                 return 0.0;
             }
 
-            shotDir = MathUtils.NormalizeAngle(MathUtils.ClampAngle(shotDir));
+            Vector2 shipPos = ship.Pos;
+            double shipR = ship.Radius();
+            Vector2 shipCenterDelta = shipPos - shotOrigin;
+            double shipCenterDist = shipCenterDelta.Length();
+            if (shipCenterDist <= shipR)
+            {
+                return 0.0;
+            }
 
-            Vector2 tgLeft, tgRight;
-            double tgAngle;
-            MathUtils.CircleTangents(ship.Pos, shipR, shotOrigin, out tgLeft, out tgRight, out tgAngle);
+            double shipCenterAngle = Math.Atan2(shipCenterDelta.Y, shipCenterDelta.X);
+            double tgAngle = Math.PI * 0.5 - Math.Acos(shipR / shipCenterDist);
+            double visibleHalfWidth = Math.PI / 2 - tgAngle;
 
+            // The shot can only hit the side of the ship visible from `shotOrigin`: if the shield covers all of it the
+            // shot is fully shielded, and if it covers none of it the shot is not shielded at all
+            if (ship.ShieldWidth < Math.PI - SHIELD_EARLY_OUT_MARGIN)
+            {
+                double shieldToShooter = Math.Abs(Math.IEEERemainder(ship.ShieldDir - (shipCenterAngle + Math.PI), 2.0 * Math.PI));
+                if (shieldToShooter + visibleHalfWidth < ship.ShieldWidth - SHIELD_EARLY_OUT_MARGIN)
+                {
+                    return 1.0;
+                }
+                if (shieldToShooter - visibleHalfWidth > ship.ShieldWidth + SHIELD_EARLY_OUT_MARGIN)
+                {
+                    return 0.0;
+                }
+            }
+
+            Vector2 tgLeft, tgRight;
+            TangentPoints(shipPos, shipR, shipCenterAngle, visibleHalfWidth, out tgLeft, out tgRight);
 
-            Vector2 shipCenterDelta = ship.Pos - shotOrigin;
-            double shipCenterAngle = Math.Atan2(shipCenterDelta.Y, shipCenterDelta.X);
             double CAS2SS = MathUtils.NormalizeAngle(shipCenterAngle - shotDir);
-            Console.WriteLine("shot dir: " + MathUtils.Rad2Deg(shotDir) + "°, CAS2SS: " + MathUtils.Rad2Deg(CAS2SS) + "°, tgangle: " + MathUtils.Rad2Deg(tgAngle) + "°");
+            GeometryTrace("shot dir: " + MathUtils.Rad2Deg(shotDir) + "°, CAS2SS: " + MathUtils.Rad2Deg(CAS2SS) + "°, tgangle: " + MathUtils.Rad2Deg(tgAngle) + "°");
 
             double tgLeftAngleSS = -tgAngle + CAS2SS, tgRightAngleSS = tgAngle + CAS2SS;
-            Console.WriteLine("LA " + tgLeftAngleSS + " RA " + tgRightAngleSS);
+            GeometryTrace("LA " + tgLeftAngleSS + " RA " + tgRightAngleSS);
             if (tgLeftAngleSS > tgRightAngleSS)
             {
                 (tgLeftAngleSS, tgRightAngleSS) = (tgRightAngleSS, tgLeftAngleSS);
@@ -537,9 +604,9 @@ namespace SShared
 
             Vector2? capHitLeft, capHitRight;
             double leftCapAngleSS = Double.NegativeInfinity, rightCapAngleSS = Double.PositiveInfinity;
-            if (MathUtils.CircleCircleIntersection(shotOrigin, shotRadius, ship.Pos, shipR, out capHitLeft, out capHitRight))
+            if (MathUtils.CircleCircleIntersection(shotOrigin, shotRadius, shipPos, shipR, out capHitLeft, out capHitRight))
             {
-                Console.WriteLine("The circular part of the shot intersects the ship!");
+                GeometryTrace("The circular part of the shot intersects the ship!");
                 if (capHitRight == null) capHitRight = capHitLeft;
 
                 double capDist1 = (capHitLeft.Value - tgLeft).Length(), capDist2 = (capHitRight.Value - tgLeft).Length();
@@ -559,7 +626,7 @@ namespace SShared
                     rightCapAngleSS = Math.Atan2(rightCapDelta.Y, rightCapDelta.X) - shotDir;
                 }
 
-                Console.WriteLine($"leftCapAngleSS={MathUtils.Rad2Deg(leftCapAngleSS)}°, rightCapAngleSS={MathUtils.Rad2Deg(rightCapAngleSS)}°");
+                GeometryTrace($"leftCapAngleSS={MathUtils.Rad2Deg(leftCapAngleSS)}°, rightCapAngleSS={MathUtils.Rad2Deg(rightCapAngleSS)}°");
             }
 
 
@@ -573,21 +640,21 @@ namespace SShared
             double rightRayAngleSS = Math.Min(Math.Min(tgRightAngleSS, shotWidth), rightCapAngleSS);
 
             Vector2? leftHitNear = null, leftHitFar = null;
-            bool leftHit = new Ray(shotOrigin, shotDir + leftRayAngleSS).HitCircle(ship.Pos, shipR, out leftHitNear, out leftHitFar);
+            bool leftHit = new Ray(shotOrigin, shotDir + leftRayAngleSS).HitCircle(shipPos, shipR, out leftHitNear, out leftHitFar);
             Vector2? rightHitNear = null, rightHitFar = null;
-            bool rightHit = new Ray(shotOrigin, shotDir + rightRayAngleSS).HitCircle(ship.Pos, shipR, out rightHitNear, out rightHitFar);
+            bool rightHit = new Ray(shotOrigin, shotDir + rightRayAngleSS).HitCircle(shipPos, shipR, out rightHitNear, out rightHitFar);
 
             if (!leftHit || !rightHit)
             {
                 throw new InvalidOperationException("Raycast missed during shield calculation!");
             }
 
-            Console.WriteLine("LH = " + leftHitNear.Value + " RH = " + rightHitNear.Value);
+            GeometryTrace("LH = " + leftHitNear.Value + " RH = " + rightHitNear.Value);
 
-            double leftVictimHit = Math.Atan2(leftHitNear.Value.Y - ship.Pos.Y, leftHitNear.Value.X - ship.Pos.X);
-            double rightVictimHit = Math.Atan2(rightHitNear.Value.Y - ship.Pos.Y, rightHitNear.Value.X - ship.Pos.X);
+            double leftVictimHit = Math.Atan2(leftHitNear.Value.Y - shipPos.Y, leftHitNear.Value.X - shipPos.X);
+            double rightVictimHit = Math.Atan2(rightHitNear.Value.Y - shipPos.Y, rightHitNear.Value.X - shipPos.X);
 
-            Console.WriteLine("From victim's point of view " + ship.Pos + ": " + leftVictimHit + "," + rightVictimHit);
+            GeometryTrace("From victim's point of view " + shipPos + ": " + leftVictimHit + "," + rightVictimHit);
 
             return ShotShieldIntersection(leftVictimHit, rightVictimHit, ship);
         }
@@ -608,7 +675,7 @@ namespace SShared
             shotStart = MathUtils.ClampAngle(shotStart);
             shotStop = MathUtils.ClampAngle(shotStop);
 
-            Console.WriteLine("shot " + shotStart + "," + shotStop);
+            GeometryTrace("shot " + shotStart + "," + shotStop);
 
             if (Math.Abs(shotStop - shotStart) > Math.PI)
             {
@@ -625,11 +692,12 @@ namespace SShared
                 shotStop = larger;
             }
 
-            double shieldStart = MathUtils.ClampAngle(shielder.ShieldDir - shielder.ShieldWidth);
-            double shieldStop = MathUtils.ClampAngle(shielder.ShieldDir + shielder.ShieldWidth);
+            double shieldDir = shielder.ShieldDir, shieldWidth = shielder.ShieldWidth;
+            double shieldStart = MathUtils.ClampAngle(shieldDir - shieldWidth);
+            double shieldStop = MathUtils.ClampAngle(shieldDir + shieldWidth);
+            double shieldMid = MathUtils.ClampAngle(shieldDir);
 
-
-            if (Math.Min(shieldStart, shieldStop) > MathUtils.ClampAngle(shielder.ShieldDir) || Math.Max(shieldStart, shieldStop) < MathUtils.ClampAngle(shielder.ShieldDir))
+            if (Math.Min(shieldStart, shieldStop) > shieldMid || Math.Max(shieldStart, shieldStop) < shieldMid)
             {
                 double larger = Math.Max(shieldStart, shieldStop);
                 double smaller = Math.Min(shieldStart, shieldStop);
@@ -649,32 +717,37 @@ namespace SShared
             if (shieldStop < shotStart) shieldStop += 2 * Math.PI;
 
 
-            Console.WriteLine("Shooting from " + shotStart + " to " + shotStop + ", shielded from " + shieldStart + " to " + shieldStop);
+            GeometryTrace("Shooting from " + shotStart + " to " + shotStop + ", shielded from " + shieldStart + " to " + shieldStop);
 
-            double[] angles = { shotStart, shotStop, shieldStart, shieldStop };
-            Array.Sort(angles);
+            // Sort the four angles (with a sorting network, to not allocate)
+            double a0 = shotStart, a1 = shotStop, a2 = shieldStart, a3 = shieldStop;
+            SortPair(ref a0, ref a1);
+            SortPair(ref a2, ref a3);
+            SortPair(ref a0, ref a2);
+            SortPair(ref a1, ref a3);
+            SortPair(ref a1, ref a2);
 
             double distanceShielded = 0;
 
 
-            if (angles[1] == shotStop)
+            if (a1 == shotStop)
             {
-                if (angles[2] == shieldStop)
+                if (a2 == shieldStop)
                     distanceShielded = shotStop - shotStart;
                 else
                     distanceShielded = 0;
             }
-            else if (angles[1] == shieldStart)
+            else if (a1 == shieldStart)
             {
-                distanceShielded = angles[2] - angles[1];
+                distanceShielded = a2 - a1;
             }
             else
             {
-                distanceShielded = angles[1] - angles[0];
+                distanceShielded = a1 - a0;
 
-                if (angles[2] == shieldStart)
+                if (a2 == shieldStart)
                 {
-                    distanceShielded += angles[3] - angles[2];
+                    distanceShielded += a3 - a2;
                 }
             }
 
@@ -682,12 +755,20 @@ namespace SShared
             return distanceShielded / distanceTotal;
         }
 
+        static void SortPair(ref double a, ref double b)
+        {
+            if (b < a)
+            {
+                (a, b) = (b, a);
+            }
+        }
+
         public static bool DoesQuadIntersectCircleSector(Quad quad, Messages.ScanShoot msg)
         {
             Vector2 quadCentre = new Vector2(quad.CentreX, quad.CentreY);
             double maximumQuadRadius = 1.41421356237 * quad.Radius;
-            Vector2 leftPoint = new Vector2(msg.Radius * Math.Cos(msg.Direction + msg.Width), msg.Radius * Math.Sin(msg.Direction + msg.Width));
-            Vector2 rightPoint = new Vector2(msg.Radius * Math.Cos(msg.Direction - msg.Width), msg.Radius * Math.Sin(msg.Direction - msg.Width));
+            Vector2 leftPoint = msg.Origin + new Vector2(msg.Radius * Math.Cos(msg.Direction + msg.Width), msg.Radius * Math.Sin(msg.Direction + msg.Width));
+            Vector2 rightPoint = msg.Origin + new Vector2(msg.Radius * Math.Cos(msg.Direction - msg.Width), msg.Radius * Math.Sin(msg.Direction - msg.Width));
 
             return CircleTriangleIntersection(quadCentre, maximumQuadRadius, msg.Origin, leftPoint, rightPoint) || CircleSegmentIntersection(quadCentre, maximumQuadRadius, msg.Origin, msg.Radius, msg.Direction, msg.Width);
         }
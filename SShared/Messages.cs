@@ -43,6 +43,12 @@ namespace SShared.Messages
         /// </summary>
         public string ApiUrl { get; set; }
 
+        /// <summary>
+        /// Tokens of the ships the node in question already manages when it connects (e.g. restored from a snapshot).
+        /// Only sent by SGame nodes to the arbiter; empty otherwise.
+        /// </summary>
+        public string[] Tokens { get; set; } = new string[0];
+
         // -- INetSerializable -------------------------------------------------
 
         public void Serialize(NetDataWriter writer)
@@ -52,6 +58,12 @@ namespace SShared.Messages
             writer.PutBytesWithLength(BusAddress.GetAddressBytes());
             writer.Put(BusPort);
             writer.Put(ApiUrl);
+            // (Not `PutArray()`, which is limited to 65535 elements)
+            writer.Put(Tokens.Length);
+            foreach (var token in Tokens)
+            {
+                writer.Put(token);
+            }
         }
 
         public void Deserialize(NetDataReader reader)
@@ -63,6 +75,11 @@ namespace SShared.Messages
             BusAddress = new IPAddress(ipBytes);
             BusPort = reader.GetUInt();
             ApiUrl = reader.GetString();
+            Tokens = new string[reader.GetInt()];
+            for (int i = 0; i < Tokens.Length; i++)
+            {
+                Tokens[i] = reader.GetString();
+            }
         }
     }
 
@@ -166,17 +183,35 @@ namespace SShared.Messages
         /// </summary>
         public double OriginatorAreaGain { get; set; }
 
-        public class ShipInfo
+        /// <summary>
+        /// What is sent over the bus about a struck ship: only what the originator gets to know about it.
+        /// </summary>
+        public struct ShipInfo
         {
             /// <summary>
-            /// The struck ship.
+            /// Public id of the struck ship.
+            /// </summary>
+            public string PublicId;
+
+            /// <summary>
+            /// Area of the struck ship after the shot (unchanged if the shot was fatal).
             /// </summary>
-            public Spaceship Ship { get; set; }
+            public double Area;
+
+            /// <summary>
+            /// Position of the struck ship.
+            /// </summary>
+            public Vector2 Pos;
 
             /// <summary>
             /// Area damage from the originator of the shot, if any. If negative, it means the shot was fatal.
             /// </summary>
-            public double Damage { get; set; }
+            public double Damage;
+
+            /// <summary>
+            /// The struck ship itself; only set on the node that manages it (it is not sent over the bus).
+            /// </summary>
+            public Spaceship Ship;
         }
 
         /// <summary>
@@ -184,17 +219,32 @@ namespace SShared.Messages
         /// </summary>
         public List<ShipInfo> ShipsInfo = new List<ShipInfo>();
 
+        /// <summary>
+        /// The id of the traced request that caused the scan/shoot, or null if it is not traced.
+        /// </summary>
+        public string TraceId;
+
+        /// <summary>
+        /// When this message was sent (`Tracer.Now` on the sender); only set if `TraceId` is.
+        /// </summary>
+        public double SentAt;
+
         // -- INetSerializable -------------------------------------------------
 
         public void Serialize(NetDataWriter writer)
         {
             writer.Put(Originator);
             writer.Put(OriginatorAreaGain);
+            writer.Put(TraceId);
+            writer.Put(SentAt);
 
             writer.Put(ShipsInfo.Count);
-            foreach (var info in ShipsInfo)
+            for (int i = 0; i < ShipsInfo.Count; i++)
             {
-                info.Ship.Serialize(writer);
+                var info = ShipsInfo[i];
+                writer.Put(info.PublicId);
+                writer.Put(info.Area);
+                writer.Put(info.Pos.X); writer.Put(info.Pos.Y);
                 writer.Put(info.Damage);
             }
         }
@@ -203,18 +253,27 @@ namespace SShared.Messages
         {
             Originator = reader.GetString(64);
             OriginatorAreaGain = reader.GetDouble();
+            // (A null string is written as an empty one; trace ids are never empty)
+            TraceId = reader.GetString();
+            TraceId = string.IsNullOrEmpty(TraceId) ? null : TraceId;
+            SentAt = reader.GetDouble();
 
             int infoCount = reader.GetInt();
-            ShipsInfo = Enumerable.Range(0, infoCount).Select((i) =>
+            ShipsInfo.Clear();
+            if (ShipsInfo.Capacity < infoCount)
+            {
+                ShipsInfo.Capacity = infoCount;
+            }
+            for (int i = 0; i < infoCount; i++)
             {
-                Spaceship ship = new Spaceship();
-                ship.Deserialize(reader);
-                return new ShipInfo()
+                ShipsInfo.Add(new ShipInfo()
                 {
-                    Ship = ship,
+                    PublicId = reader.GetString(64),
+                    Area = reader.GetDouble(),
+                    Pos = new Vector2(reader.GetDouble(), reader.GetDouble()),
                     Damage = reader.GetDouble(),
-                };
-            }).ToList();
+                });
+            }
         }
     }
 
@@ -253,6 +312,16 @@ namespace SShared.Messages
         /// </summary>
         public double ScaledShotEnergy;
 
+        /// <summary>
+        /// The id of the traced request that caused this scan/shoot, or null if it is not traced.
+        /// </summary>
+        public string TraceId;
+
+        /// <summary>
+        /// When this message was sent (`Tracer.Now` on the sender); only set if `TraceId` is.
+        /// </summary>
+        public double SentAt;
+
         // -- INetSerializable -------------------------------------------------
 
         public void Serialize(NetDataWriter writer)
@@ -264,6 +333,8 @@ namespace SShared.Messages
             writer.Put(Width);
             writer.Put(Radius);
             writer.Put(ScaledShotEnergy);
+            writer.Put(TraceId);
+            writer.Put(SentAt);
         }
 
         public void Deserialize(NetDataReader reader)
@@ -275,6 +346,10 @@ namespace SShared.Messages
             Width = reader.GetDouble();
             Radius = reader.GetDouble();
             ScaledShotEnergy = reader.GetDouble();
+            // (A null string is written as an empty one; trace ids are never empty)
+            TraceId = reader.GetString();
+            TraceId = string.IsNullOrEmpty(TraceId) ? null : TraceId;
+            SentAt = reader.GetDouble();
         }
     }
 
@@ -290,39 +365,273 @@ namespace SShared.Messages
         /// </summary>
         public string Token = null;
 
+        /// <summary>
+        /// True if the token was reserved on the node beforehand (see `ReserveShips`); the node then creates the ship
+        /// without replying, since the arbiter does not wait for it.
+        /// </summary>
+        public bool Reserved = false;
+
         // -- INetSerializable -------------------------------------------------
 
         public void Serialize(NetDataWriter writer)
         {
             writer.Put(Token);
+            writer.Put(Reserved);
         }
 
         public void Deserialize(NetDataReader reader)
         {
             Token = reader.GetString();
+            Reserved = reader.GetBool();
         }
     }
 
     /// <summary>
-    /// A message about a ship disconnecting from the SArbiter.
+    /// A message from the arbiter reserving a batch of ship tokens on a node, so that ships can later be connected to
+    /// it with those tokens without waiting for a reply. The node replies with a single `ReserveShips` listing the same
+    /// tokens once they are reserved.
     /// </summary>
-    public class ShipDisconnected : IMessage
+    public class ReserveShips : IMessage
     {
         /// <summary>
-        /// Token of the ship.
+        /// Tokens of the (future) ships.
         /// </summary>
-        public string Token = null;
+        public string[] Tokens = new string[0];
 
         // -- INetSerializable -------------------------------------------------
 
         public void Serialize(NetDataWriter writer)
         {
-            writer.Put(Token);
+            writer.PutArray(Tokens);
         }
 
         public void Deserialize(NetDataReader reader)
         {
-            Token = reader.GetString();
+            Tokens = reader.GetStringArray();
+        }
+    }
+
+    /// <summary>
+    /// A message from the arbiter moving many ships to a node at once (e.g. the ships of a node that went offline).
+    /// The node fetches them from persistence (or creates new ones) and replies with a single `ShipsReassigned` that
+    /// lists the same tokens once all of them have been added.
+    /// </summary>
+    public class ShipsReassigned : IMessage
+    {
+        /// <summary>
+        /// Tokens of the ships.
+        /// </summary>
+        public string[] Tokens = new string[0];
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.PutArray(Tokens);
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            Tokens = reader.GetStringArray();
+        }
+    }
+
+    /// <summary>
+    /// A message sent from the arbiter to a node about ships that disconnected from the SArbiter.
+    /// Disconnects are batched per arbiter tick, and sent only to the node managing the ships (when it is known).
+    /// </summary>
+    public class ShipsDisconnected : IMessage
+    {
+        /// <summary>
+        /// Tokens of the ships.
+        /// </summary>
+        public string[] Tokens = null;
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.PutArray(Tokens);
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            Tokens = reader.GetStringArray();
+        }
+    }
+
+    /// <summary>
+    /// A debug-only message sent from the arbiter to a node to load (part of) a scenario: the node creates the given
+    /// ships, or overwrites the given attributes if it already manages them. The node replies with the same `BatchId`
+    /// (and no ships) once they are all loaded.
+    /// </summary>
+    public class LoadShips : IMessage
+    {
+        /// <summary>
+        /// The attributes of a ship that a scenario can set.
+        /// </summary>
+        [Flags]
+        public enum Fields : byte
+        {
+            None = 0,
+            PosX = 1 << 0,
+            PosY = 1 << 1,
+            VelX = 1 << 2,
+            VelY = 1 << 3,
+            Area = 1 << 4,
+            Energy = 1 << 5,
+            ShieldDir = 1 << 6,
+            ShieldWidth = 1 << 7,
+        }
+
+        /// <summary>
+        /// Identifies the batch (for the reply).
+        /// </summary>
+        public string BatchId;
+
+        /// <summary>
+        /// The ships to load.
+        /// </summary>
+        public Spaceship[] Ships = Array.Empty<Spaceship>();
+
+        /// <summary>
+        /// The attributes given for each of the `Ships`: new ships are created with all of their attributes, but only
+        /// these are overwritten on existing ones.
+        /// </summary>
+        public Fields[] Given = Array.Empty<Fields>();
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.Put(BatchId);
+            writer.Put(Ships.Length);
+            for (int i = 0; i < Ships.Length; i++)
+            {
+                Ships[i].Serialize(writer);
+                writer.Put((byte)Given[i]);
+            }
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            BatchId = reader.GetString();
+            Ships = new Spaceship[reader.GetInt()];
+            Given = new Fields[Ships.Length];
+            for (int i = 0; i < Ships.Length; i++)
+            {
+                Ships[i] = new Spaceship();
+                Ships[i].Deserialize(reader);
+                Given[i] = (Fields)reader.GetByte();
+            }
+        }
+    }
+
+    /// <summary>
+    /// A message sent from a node to another to look for the ships it manages that match a spatial query.
+    /// The other node replies with a `ShipsFound` with the same `QueryId`.
+    /// </summary>
+    public class QueryShips : IMessage
+    {
+        /// <summary>
+        /// Identifies the query (for the reply).
+        /// </summary>
+        public string QueryId;
+
+        /// <summary>
+        /// The region to look for ships in.
+        /// </summary>
+        public SpatialQuery Query;
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.Put(QueryId);
+            Query.Write(writer);
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            QueryId = reader.GetString();
+            Query = SpatialQuery.Read(reader);
+        }
+    }
+
+    /// <summary>
+    /// The reply to a `QueryShips`: the ships found by the node that received it.
+    /// </summary>
+    public class ShipsFound : IMessage
+    {
+        /// <summary>
+        /// The `QueryId` of the query this answers.
+        /// </summary>
+        public string QueryId;
+
+        /// <summary>
+        /// The ships matching the query.
+        /// </summary>
+        public Spaceship[] Ships = Array.Empty<Spaceship>();
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.Put(QueryId);
+            writer.Put(Ships.Length);
+            foreach (var ship in Ships)
+            {
+                ship.Serialize(writer);
+            }
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            QueryId = reader.GetString();
+            Ships = new Spaceship[reader.GetInt()];
+            for (int i = 0; i < Ships.Length; i++)
+            {
+                Ships[i] = new Spaceship();
+                Ships[i].Deserialize(reader);
+            }
+        }
+    }
+
+    /// <summary>
+    /// A message periodically sent from a node to the arbiter to report how loaded it is.
+    /// </summary>
+    public class NodeLoad : IMessage
+    {
+        /// <summary>
+        /// Number of ships currently managed by the node.
+        /// </summary>
+        public uint ShipCount { get; set; }
+
+        /// <summary>
+        /// Average time spent by the node on each game tick, in milliseconds.
+        /// </summary>
+        public double TickMilliseconds { get; set; }
+
+        /// <summary>
+        /// For each `Quadrant` of the node that has no child node, the number of ships fully contained in it
+        /// (i.e. the ships that would move to a new child node placed there).
+        /// </summary>
+        public uint[] QuadrantShipCounts { get; set; } = new uint[4];
+
+        // -- INetSerializable -------------------------------------------------
+
+        public void Serialize(NetDataWriter writer)
+        {
+            writer.Put(ShipCount);
+            writer.Put(TickMilliseconds);
+            writer.PutArray(QuadrantShipCounts);
+        }
+
+        public void Deserialize(NetDataReader reader)
+        {
+            ShipCount = reader.GetUInt();
+            TickMilliseconds = reader.GetDouble();
+            QuadrantShipCounts = reader.GetUIntArray();
         }
     }
 
@@ -342,10 +651,35 @@ namespace SShared.Messages
             processor.RegisterNestedType<ScanShoot>();
             processor.RegisterNestedType<Struck>();
             processor.RegisterNestedType<ShipConnected>();
-            processor.RegisterNestedType<ShipDisconnected>();
+            processor.RegisterNestedType<ShipsReassigned>();
+            processor.RegisterNestedType<ReserveShips>();
+            processor.RegisterNestedType<ShipsDisconnected>();
             processor.RegisterNestedType<TransferShip>();
             processor.RegisterNestedType<ShipTransferred>();
             processor.RegisterNestedType<NodeConfig>();
+            processor.RegisterNestedType<NodeLoad>();
+            processor.RegisterNestedType<LoadShips>();
+            processor.RegisterNestedType<QueryShips>();
+            processor.RegisterNestedType<ShipsFound>();
+        }
+
+        /// <summary>
+        /// Registers the correlation key of all message types that are waited for as replies.
+        /// </summary>
+        public static void RegisterReplyKeys(WaiterRegistry waiters)
+        {
+            // Scan/shoot results are matched to the ship that scanned/shot
+            waiters.RegisterType<Struck>(struck => struck.Originator);
+            waiters.RegisterType<ShipConnected>(msg => msg.Token);
+            // (Only one batch is in flight per node at a time)
+            waiters.RegisterType<ShipsReassigned>(msg => null);
+            waiters.RegisterType<ReserveShips>(msg => msg.Tokens.Length > 0 ? msg.Tokens[0] : null);
+            // (Only sent once by each node, when it connects)
+            waiters.RegisterType<NodeConfig>(msg => null);
+            waiters.RegisterType<LoadShips>(msg => msg.BatchId);
+            waiters.RegisterType<ShipsFound>(msg => msg.QueryId);
+            // Sudo calls are echoed back as they are
+            waiters.RegisterType<Sudo>(msg => msg.Json.ToString(Formatting.None));
         }
     }
 
@@ -4,7 +4,10 @@ using System.Collections.Generic;
 using System.Net;
 using System.Net.Sockets;
 using System.Net.NetworkInformation;
+using System.Threading;
 using System.Threading.Tasks;
+using System.Collections.Concurrent;
+using System.Diagnostics;
 using LiteNetLib;
 using LiteNetLib.Utils;
 
@@ -36,13 +39,56 @@ namespace SShared
         /// </summary>
         public NetManager Host { get; private set; }
 
-        NetDataWriter _writer;
-
         /// <summary>
         /// A serializer that can be used to serialize / deserialize any `BusMsgs.*`.
         /// </summary>
         public NetNodePacketProcessor PacketProcessor { get; private set; }
 
+        /// <summary>
+        /// The tasks waiting for reply messages on this node.
+        /// </summary>
+        public WaiterRegistry Waiters { get; private set; }
+
+        /// <summary>
+        /// How long the bus thread sleeps between polls for events, in milliseconds.
+        /// </summary>
+        const int BUS_THREAD_POLL_INTERVAL = 1;
+
+        /// <summary>
+        /// The thread polling for bus events, if started (see `StartBusThread()`).
+        /// </summary>
+        Thread _busThread = null;
+
+        volatile bool _stopBusThread = false;
+
+        /// <summary>
+        /// Message handlers (subscribed via `SubscribeDeferred()`) waiting to be run by `Update()`.
+        /// </summary>
+        ConcurrentQueue<Action> _deferredHandlers = new ConcurrentQueue<Action>();
+
+        /// <summary>
+        /// True if bus events are polled by a dedicated thread instead of by `Update()`.
+        /// </summary>
+        public bool HasBusThread => _busThread != null;
+
+        /// <summary>
+        /// Number of received messages whose (deferred) handlers are waiting for the next `Update()`.
+        /// </summary>
+        public int DeferredHandlerCount => _deferredHandlers.Count;
+
+        /// <summary>
+        /// Registers the gauges and counters of this bus node (queue depth, waiters, peers) into `metrics`.
+        /// </summary>
+        public void RegisterMetrics(Metrics metrics)
+        {
+            metrics.Gauge("bus_deferred_handlers", "Received bus messages waiting for the game loop to handle them.", () => DeferredHandlerCount);
+            metrics.Gauge("bus_peers", "Connected bus peers.", () => Host.ConnectedPeersCount);
+            metrics.Gauge("bus_waiters_pending", "Tasks waiting for a reply on the bus.", () => Waiters.Pending);
+            metrics.CounterFunc("bus_waiters_completed_total", "Bus replies delivered to a waiting task.", () => Waiters.Completed);
+            metrics.CounterFunc("bus_waiters_expired_total", "Tasks that gave up waiting for a bus reply.", () => Waiters.Expired);
+            metrics.CounterFunc("bus_replies_unclaimed_total", "Bus replies that no task was waiting for.", () => Waiters.Unclaimed);
+        }
+
         /// <summary>
         /// Initializes a bus node.
         /// </summary>
@@ -63,10 +109,12 @@ namespace SShared
             {
                 Host.Start();
             }
-            _writer = new NetDataWriter();
 
             PacketProcessor = new NetNodePacketProcessor();
             Messages.Serialization.RegisterAllSerializers(PacketProcessor);
+
+            Waiters = new WaiterRegistry(PacketProcessor);
+            Messages.Serialization.RegisterReplyKeys(Waiters);
         }
 
         /// <summary>
@@ -79,10 +127,68 @@ namespace SShared
 
         /// <summary>
         /// Poll events and update other internal state.
+        /// If the bus thread is running, only runs the deferred message handlers instead.
         /// </summary>
         public void Update()
         {
-            Host.PollEvents();
+            if (_busThread == null)
+            {
+                Host.PollEvents();
+            }
+
+            Action handler;
+            while (_deferredHandlers.TryDequeue(out handler))
+            {
+                handler();
+            }
+
+            Waiters.ExpireOverdue();
+        }
+
+        /// <summary>
+        /// Starts a dedicated thread that polls for bus events as soon as they arrive, instead of once per `Update()`.
+        /// Message handlers (and `Waiters`) then run on the bus thread, except for the ones subscribed via
+        /// `SubscribeDeferred()`.
+        /// </summary>
+        public void StartBusThread()
+        {
+            if (_busThread != null)
+            {
+                return;
+            }
+            _busThread = new Thread(() =>
+            {
+                while (!_stopBusThread)
+                {
+                    Host.PollEvents();
+                    Waiters.ExpireOverdue();
+                    Thread.Sleep(BUS_THREAD_POLL_INTERVAL);
+                }
+            });
+            _busThread.Name = "Bus";
+            _busThread.IsBackground = true;
+            _busThread.Start();
+        }
+
+        /// <summary>
+        /// Subscribes a handler for `T` messages that always runs from `Update()` (never on the bus thread), even if the
+        /// bus thread is running; this is for handlers that modify state owned by the game loop. Callers must not run
+        /// `Update()` concurrently with the game loop (e.g. hold the same lock).
+        /// </summary>
+        public void SubscribeDeferred<T>(NetNodePacketProcessor.EventDelegates<T>.OnMessageReceivedEventHandler handler)
+            where T : class, IMessage, new()
+        {
+            PacketProcessor.Events<T>().OnMessageReceived += (sender, message) =>
+            {
+                if (_busThread != null)
+                {
+                    _deferredHandlers.Enqueue(() => handler(sender, message));
+                }
+                else
+                {
+                    handler(sender, message);
+                }
+            };
         }
 
         /// <summary>
@@ -91,19 +197,23 @@ namespace SShared
         public void BroadcastMessage<T>(T message, DeliveryMethod delivery = DeliveryMethod.ReliableUnordered, NetPeer excludedPeer = null)
             where T : class, IMessage, new()
         {
-            lock (_writer)
+            var writer = NetDataWriterPool.Rent();
+            try
             {
-                _writer.Reset();
-                PacketProcessor.Write<T>(_writer, message);
+                PacketProcessor.Write<T>(writer, message);
                 if (excludedPeer == null)
                 {
-                    Host.SendToAll(_writer, delivery);
+                    Host.SendToAll(writer, delivery);
                 }
                 else
                 {
-                    Host.SendToAll(_writer, delivery, excludedPeer);
+                    Host.SendToAll(writer, delivery, excludedPeer);
                 }
             }
+            finally
+            {
+                NetDataWriterPool.Return(writer);
+            }
         }
 
         /// <summary>
@@ -112,11 +222,15 @@ namespace SShared
         public void SendMessage<T>(T message, NetPeer peer, DeliveryMethod delivery = DeliveryMethod.ReliableUnordered)
             where T : class, IMessage, new()
         {
-            lock (_writer)
+            var writer = NetDataWriterPool.Rent();
+            try
             {
-                _writer.Reset();
-                PacketProcessor.Write<T>(_writer, message);
-                peer.Send(_writer, delivery);
+                PacketProcessor.Write<T>(writer, message);
+                peer.Send(writer, delivery);
+            }
+            finally
+            {
+                NetDataWriterPool.Return(writer);
             }
         }
 
@@ -138,6 +252,12 @@ namespace SShared
 
         protected virtual void Dispose(bool disposing)
         {
+            if (_busThread != null && disposing)
+            {
+                _stopBusThread = true;
+                _busThread.Join();
+                _busThread = null;
+            }
             if (Host.IsRunning && disposing)
             {
                 Host.Stop();
@@ -175,50 +295,272 @@ namespace SShared
     }
 
     /// <summary>
-    /// Waits for a message of type T from a NetNode.
+    /// A pool of reusable `NetDataWriter`s, so that sending a bus message neither allocates a new writer (and buffer) nor
+    /// makes concurrent senders take turns on a single shared one.
+    /// </summary>
+    public static class NetDataWriterPool
+    {
+        /// <summary>
+        /// Writers whose buffer grew larger than this (in bytes) are not returned to the pool, so that a single huge
+        /// message does not keep its buffer alive forever.
+        /// </summary>
+        public const int MaxPooledCapacity = 64 * 1024;
+
+        /// <summary>
+        /// Maximum number of idle writers kept in the pool.
+        /// </summary>
+        public const int MaxPooledWriters = 32;
+
+        static ConcurrentBag<NetDataWriter> _writers = new ConcurrentBag<NetDataWriter>();
+
+        static int _pooledCount = 0;
+
+        /// <summary>
+        /// Takes an empty writer from the pool, or creates a new one if the pool is empty.
+        /// </summary>
+        public static NetDataWriter Rent()
+        {
+            NetDataWriter writer;
+            if (_writers.TryTake(out writer))
+            {
+                Interlocked.Decrement(ref _pooledCount);
+                writer.Reset();
+                return writer;
+            }
+            return new NetDataWriter();
+        }
+
+        /// <summary>
+        /// Returns a writer obtained from `Rent()` to the pool; it must not be used afterwards.
+        /// </summary>
+        public static void Return(NetDataWriter writer)
+        {
+            if (writer.Capacity > MaxPooledCapacity)
+            {
+                return;
+            }
+            if (Interlocked.Increment(ref _pooledCount) > MaxPooledWriters)
+            {
+                Interlocked.Decrement(ref _pooledCount);
+                return;
+            }
+            _writers.Add(writer);
+        }
+    }
+
+    /// <summary>
+    /// Central registry of the tasks waiting for reply messages on a NetNode.
+    /// Waiters are indexed by (message type, sender peer, correlation key), where the correlation key of each message
+    /// type is computed by the function passed to `RegisterType()`; an incoming message thus completes the oldest
+    /// matching waiter in O(1), no matter how many other waiters are live. Waiters that are not completed by their
+    /// deadline are completed with null by `ExpireOverdue()`.
+    /// All methods are thread-safe.
     /// </summary>
-    public class MessageWaiter<T> where T : class, IMessage, new()
+    public class WaiterRegistry
     {
-        TaskCompletionSource<T> _completionSrc;
+        abstract class Entry
+        {
+            public long Id;
+            public double Deadline;
+            public (Type, NetPeer, object) Index;
+            public LinkedListNode<Entry> Node;
+
+            public abstract void Complete(object message);
+        }
+
+        class Entry<T> : Entry where T : class
+        {
+            // (Do not run the continuations on the bus thread, they would hold up polling for events)
+            public TaskCompletionSource<T> Source = new TaskCompletionSource<T>(TaskCreationOptions.RunContinuationsAsynchronously);
+
+            public override void Complete(object message) => Source.TrySetResult((T)message);
+        }
+
+        class DeadlineComparer : IComparer<Entry>
+        {
+            public int Compare(Entry a, Entry b)
+            {
+                int cmp = a.Deadline.CompareTo(b.Deadline);
+                return cmp != 0 ? cmp : a.Id.CompareTo(b.Id);
+            }
+        }
+
+        NetNodePacketProcessor _packetProcessor;
+
+        Stopwatch _clock = Stopwatch.StartNew();
+
+        long _nextId = 0;
 
         /// <summary>
-        /// Starts waiting for a `T` message coming from `node`.
-        /// If `peer` is not null, ensures that the sender is `peer`.
-        /// If `filter` is not null, ensures that the message passes the given filter.
+        /// The live waiters of each (type, peer, key), oldest first.
         /// </summary>
-        public MessageWaiter(NetNode node, NetPeer peer = null, Predicate<T> filter = null)
+        Dictionary<(Type, NetPeer, object), LinkedList<Entry>> _waiters = new Dictionary<(Type, NetPeer, object), LinkedList<Entry>>();
+
+        /// <summary>
+        /// All live waiters that have a deadline, by deadline.
+        /// </summary>
+        SortedSet<Entry> _byDeadline = new SortedSet<Entry>(new DeadlineComparer());
+
+        /// <summary>
+        /// The correlation key function of each registered message type.
+        /// </summary>
+        Dictionary<Type, Delegate> _keyFunctions = new Dictionary<Type, Delegate>();
+
+        /// <summary>
+        /// Message types whose events this registry is subscribed to.
+        /// </summary>
+        HashSet<Type> _subscribedTypes = new HashSet<Type>();
+
+        /// <summary>
+        /// Number of live waiters.
+        /// </summary>
+        public int Pending { get; private set; }
+
+        /// <summary>
+        /// Number of waiters completed with a message so far.
+        /// </summary>
+        public long Completed { get; private set; }
+
+        /// <summary>
+        /// Number of waiters that expired (i.e. whose message never came, or came too late) so far.
+        /// </summary>
+        public long Expired { get; private set; }
+
+        /// <summary>
+        /// Number of received messages of a type being waited for that no waiter was waiting for (e.g. because they
+        /// arrived after their waiter expired).
+        /// </summary>
+        public long Unclaimed { get; private set; }
+
+        public WaiterRegistry(NetNodePacketProcessor packetProcessor)
         {
-            Node = node;
-            Peer = peer;
-            _completionSrc = new TaskCompletionSource<T>();
-            Node.PacketProcessor.Events<T>().OnMessageReceived += OnMessageReceived;
+            _packetProcessor = packetProcessor;
         }
 
-        internal void OnMessageReceived(NetPeer sender, T message)
+        /// <summary>
+        /// Sets the function computing the correlation key of `T` messages (null keys are allowed).
+        /// Must be called for a message type before waiting for it.
+        /// </summary>
+        public void RegisterType<T>(Func<T, object> keyOf) where T : class, IMessage, new()
         {
-            if (Peer == null || sender == Peer)
+            lock (this)
             {
-                if (Filter == null || Filter(message))
+                _keyFunctions[typeof(T)] = keyOf;
+            }
+        }
+
+        /// <summary>
+        /// Starts waiting for a `T` message with the given correlation key, coming from `peer` (or from any peer if
+        /// `peer` is null). The returned task completes with the message, or with null if it does not arrive within
+        /// `timeout` (which can be `Timeout.InfiniteTimeSpan`).
+        /// Always start waiting BEFORE sending the request the message replies to.
+        /// </summary>
+        public Task<T> Wait<T>(NetPeer peer, object key, TimeSpan timeout) where T : class, IMessage, new()
+        {
+            var entry = new Entry<T>();
+            lock (this)
+            {
+                if (!_keyFunctions.ContainsKey(typeof(T)))
                 {
-                    Node.PacketProcessor.Events<T>().OnMessageReceived -= OnMessageReceived;
-                    _completionSrc.SetResult(message);
+                    throw new InvalidOperationException($"No correlation key registered for {typeof(T).Name}");
                 }
+                if (_subscribedTypes.Add(typeof(T)))
+                {
+                    _packetProcessor.Events<T>().OnMessageReceived += (sender, message) => Deliver(sender, message);
+                }
+
+                entry.Id = _nextId++;
+                entry.Deadline = timeout == Timeout.InfiniteTimeSpan ? double.PositiveInfinity : _clock.Elapsed.TotalSeconds + timeout.TotalSeconds;
+                entry.Index = (typeof(T), peer, key);
+
+                LinkedList<Entry> waiters;
+                if (!_waiters.TryGetValue(entry.Index, out waiters))
+                {
+                    waiters = _waiters[entry.Index] = new LinkedList<Entry>();
+                }
+                entry.Node = waiters.AddLast(entry);
+                if (!double.IsPositiveInfinity(entry.Deadline))
+                {
+                    _byDeadline.Add(entry);
+                }
+                Pending++;
             }
+            return entry.Source.Task;
         }
-        ~MessageWaiter()
+
+        /// <summary>
+        /// Completes the oldest waiter for a received message, if any; returns false if no waiter was waiting for it.
+        /// (This is subscribed to the message events of the waited-for types.)
+        /// </summary>
+        public bool Deliver<T>(NetPeer sender, T message) where T : class, IMessage, new()
         {
-            Node.PacketProcessor.Events<T>().OnMessageReceived -= OnMessageReceived;
+            Entry entry;
+            lock (this)
+            {
+                object key = ((Func<T, object>)_keyFunctions[typeof(T)])(message);
+                entry = Take((typeof(T), sender, key)) ?? Take((typeof(T), null, key));
+                if (entry == null)
+                {
+                    Unclaimed++;
+                    return false;
+                }
+                Completed++;
+            }
+            entry.Complete(message);
+            return true;
         }
 
-        public NetNode Node { get; private set; }
-
-        public NetPeer Peer { get; private set; }
+        /// <summary>
+        /// Completes with null all waiters whose deadline has passed.
+        /// </summary>
+        public void ExpireOverdue()
+        {
+            List<Entry> expired = null;
+            lock (this)
+            {
+                double now = _clock.Elapsed.TotalSeconds;
+                while (_byDeadline.Count > 0 && _byDeadline.Min.Deadline <= now)
+                {
+                    var entry = _byDeadline.Min;
+                    Remove(entry);
+                    Expired++;
+                    (expired ?? (expired = new List<Entry>())).Add(entry);
+                }
+            }
+            if (expired != null)
+            {
+                foreach (var entry in expired)
+                {
+                    entry.Complete(null);
+                }
+            }
+        }
 
-        public Predicate<T> Filter { get; private set; }
+        /// <summary>
+        /// Removes and returns the oldest waiter at the given index, or returns null if there is none.
+        /// </summary>
+        Entry Take((Type, NetPeer, object) index)
+        {
+            LinkedList<Entry> waiters;
+            if (!_waiters.TryGetValue(index, out waiters))
+            {
+                return null;
+            }
+            var entry = waiters.First.Value;
+            Remove(entry);
+            return entry;
+        }
 
-        public Task<T> Wait
+        void Remove(Entry entry)
         {
-            get { return _completionSrc.Task; }
+            var waiters = entry.Node.List;
+            waiters.Remove(entry.Node);
+            if (waiters.Count == 0)
+            {
+                _waiters.Remove(entry.Index);
+            }
+            _byDeadline.Remove(entry);
+            Pending--;
         }
     }
 }
@@ -0,0 +1,262 @@
+using System;
+using System.Collections.Generic;
+using System.Diagnostics;
+using System.Globalization;
+using System.Linq;
+using System.Text;
+using System.Threading;
+
+namespace SShared
+{
+    /// <summary>
+    /// A monotonically increasing count.
+    /// </summary>
+    public class Counter
+    {
+        long _value = 0;
+
+        public long Value => Interlocked.Read(ref _value);
+
+        public void Increment(long amount = 1)
+        {
+            Interlocked.Add(ref _value, amount);
+        }
+    }
+
+    /// <summary>
+    /// Counts observed values (typically durations in seconds) into fixed cumulative buckets.
+    /// </summary>
+    public class Histogram
+    {
+        /// <summary>
+        /// Default bucket upper bounds for latencies, in seconds.
+        /// </summary>
+        public static readonly double[] LatencyBuckets = { 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0 };
+
+        /// <summary>
+        /// Upper bounds of the buckets (ascending); there is an implicit +Inf bucket after the last one.
+        /// </summary>
+        public double[] Bounds { get; private set; }
+
+        long[] _counts;
+
+        long _count = 0;
+
+        // (Updated with a compare-exchange loop, as there is no Interlocked.Add for doubles)
+        double _sum = 0.0;
+
+        public Histogram(double[] bounds)
+        {
+            Bounds = bounds;
+            _counts = new long[bounds.Length + 1];
+        }
+
+        public long Count => Interlocked.Read(ref _count);
+
+        public double Sum => Volatile.Read(ref _sum);
+
+        /// <summary>
+        /// Number of observations that fell in bucket `i` (not cumulative); `i == Bounds.Length` is the +Inf bucket.
+        /// </summary>
+        public long BucketCount(int i) => Interlocked.Read(ref _counts[i]);
+
+        public void Observe(double value)
+        {
+            int bucket = Array.BinarySearch(Bounds, value);
+            if (bucket < 0)
+            {
+                bucket = ~bucket;
+            }
+            Interlocked.Increment(ref _counts[bucket]);
+            Interlocked.Increment(ref _count);
+
+            double sum, newSum;
+            do
+            {
+                sum = Volatile.Read(ref _sum);
+                newSum = sum + value;
+            }
+            while (Interlocked.CompareExchange(ref _sum, newSum, sum) != sum);
+        }
+
+        /// <summary>
+        /// Observes the time elapsed since `start` (a `Stopwatch.GetTimestamp()`), in seconds.
+        /// </summary>
+        public void ObserveSince(long start)
+        {
+            Observe((double)(Stopwatch.GetTimestamp() - start) / Stopwatch.Frequency);
+        }
+    }
+
+    /// <summary>
+    /// A registry of named counters, histograms and gauges, rendered in the Prometheus text exposition format.
+    /// Instruments are meant to be looked up once and then updated directly, which is lock-free; looking them up
+    /// (or rendering the registry) takes a lock.
+    /// </summary>
+    public class Metrics
+    {
+        class Family
+        {
+            public string Name;
+            public string Help;
+            public string Type;
+            /// <summary>
+            /// The instrument of each label set (e.g. `route="scan"`, or "" for no labels), in registration order.
+            /// </summary>
+            public List<KeyValuePair<string, object>> Series = new List<KeyValuePair<string, object>>();
+        }
+
+        Dictionary<string, Family> _families = new Dictionary<string, Family>();
+
+        /// <summary>
+        /// Formats a label set for `Counter()`, `Histogram()` and `Gauge()`, e.g. `Labels("route", "scan")`.
+        /// </summary>
+        public static string Labels(params string[] namesAndValues)
+        {
+            var labels = new StringBuilder();
+            for (int i = 0; i + 1 < namesAndValues.Length; i += 2)
+            {
+                if (labels.Length > 0)
+                {
+                    labels.Append(',');
+                }
+                string value = namesAndValues[i + 1].Replace("\\", "\\\\").Replace("\"", "\\\"").Replace("\n", "\\n");
+                labels.Append(namesAndValues[i]).Append("=\"").Append(value).Append('"');
+            }
+            return labels.ToString();
+        }
+
+        T GetOrAdd<T>(string name, string help, string type, string labels, Func<T> create) where T : class
+        {
+            labels = labels ?? "";
+            lock (this)
+            {
+                Family family;
+                if (!_families.TryGetValue(name, out family))
+                {
+                    family = _families[name] = new Family() { Name = name, Help = help, Type = type };
+                }
+                else if (family.Type != type)
+                {
+                    throw new InvalidOperationException($"Metric {name} is a {family.Type}, not a {type}");
+                }
+
+                foreach (var series in family.Series)
+                {
+                    if (series.Key == labels)
+                    {
+                        return (T)series.Value;
+                    }
+                }
+                var instrument = create();
+                family.Series.Add(new KeyValuePair<string, object>(labels, instrument));
+                return instrument;
+            }
+        }
+
+        /// <summary>
+        /// Returns the counter with the given name and labels, creating it if needed.
+        /// </summary>
+        public Counter Counter(string name, string help, string labels = null)
+        {
+            return GetOrAdd(name, help, "counter", labels, () => new Counter());
+        }
+
+        /// <summary>
+        /// Returns the histogram with the given name and labels, creating it (with the given bucket bounds, or
+        /// `Histogram.LatencyBuckets`) if needed.
+        /// </summary>
+        public Histogram Histogram(string name, string help, string labels = null, double[] bounds = null)
+        {
+            return GetOrAdd(name, help, "histogram", labels, () => new Histogram(bounds ?? SShared.Histogram.LatencyBuckets));
+        }
+
+        /// <summary>
+        /// Registers a gauge whose value is computed by `read` whenever the metrics are rendered.
+        /// </summary>
+        public void Gauge(string name, string help, Func<double> read, string labels = null)
+        {
+            GetOrAdd(name, help, "gauge", labels, () => read);
+        }
+
+        /// <summary>
+        /// Registers a counter whose value is kept elsewhere, and read by `read` whenever the metrics are rendered.
+        /// </summary>
+        public void CounterFunc(string name, string help, Func<double> read, string labels = null)
+        {
+            GetOrAdd(name, help, "counter", labels, () => read);
+        }
+
+        /// <summary>
+        /// Registers a gauge family whose series (label set -> value, see `Labels()`) are all computed by `read` whenever
+        /// the metrics are rendered; for gauges over a changing set of things (e.g. one per node).
+        /// </summary>
+        public void GaugeSet(string name, string help, Func<IEnumerable<KeyValuePair<string, double>>> read)
+        {
+            GetOrAdd(name, help, "gauge", null, () => read);
+        }
+
+        static string Format(double value)
+        {
+            if (double.IsPositiveInfinity(value)) return "+Inf";
+            if (double.IsNegativeInfinity(value)) return "-Inf";
+            return value.ToString("R", CultureInfo.InvariantCulture);
+        }
+
+        static string Series(string name, string labels, string extraLabel = null)
+        {
+            if (extraLabel != null)
+            {
+                labels = labels.Length > 0 ? labels + "," + extraLabel : extraLabel;
+            }
+            return labels.Length > 0 ? $"{name}{{{labels}}}" : name;
+        }
+
+        /// <summary>
+        /// Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+        /// </summary>
+        public string Render()
+        {
+            var text = new StringBuilder();
+            lock (this)
+            {
+                foreach (var family in _families.Values.OrderBy(family => family.Name, StringComparer.Ordinal))
+                {
+                    text.Append("# HELP ").Append(family.Name).Append(' ').Append(family.Help).Append('\n');
+                    text.Append("# TYPE ").Append(family.Name).Append(' ').Append(family.Type).Append('\n');
+                    foreach (var series in family.Series)
+                    {
+                        switch (series.Value)
+                        {
+                            case Counter counter:
+                                text.Append(Series(family.Name, series.Key)).Append(' ').Append(counter.Value).Append('\n');
+                                break;
+                            case Func<double> read:
+                                text.Append(Series(family.Name, series.Key)).Append(' ').Append(Format(read())).Append('\n');
+                                break;
+                            case Func<IEnumerable<KeyValuePair<string, double>>> readAll:
+                                foreach (var value in readAll())
+                                {
+                                    text.Append(Series(family.Name, value.Key)).Append(' ').Append(Format(value.Value)).Append('\n');
+                                }
+                                break;
+                            case Histogram histogram:
+                                long cumulative = 0;
+                                for (int i = 0; i <= histogram.Bounds.Length; i++)
+                                {
+                                    cumulative += histogram.BucketCount(i);
+                                    double bound = i < histogram.Bounds.Length ? histogram.Bounds[i] : double.PositiveInfinity;
+                                    text.Append(Series(family.Name + "_bucket", series.Key, $"le=\"{Format(bound)}\""))
+                                        .Append(' ').Append(cumulative).Append('\n');
+                                }
+                                text.Append(Series(family.Name + "_sum", series.Key)).Append(' ').Append(Format(histogram.Sum)).Append('\n');
+                                text.Append(Series(family.Name + "_count", series.Key)).Append(' ').Append(histogram.Count).Append('\n');
+                                break;
+                        }
+                    }
+                }
+            }
+            return text.ToString();
+        }
+    }
+}
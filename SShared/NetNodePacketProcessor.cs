@@ -25,7 +25,6 @@ SOFTWARE.
 */
 
 using System;
-using System.Reflection;
 using System.Collections.Generic;
 using System.Linq;
 using LiteNetLib;
@@ -54,49 +53,43 @@ namespace SShared
             public delegate void OnMessageReceivedEventHandler(NetPeer sender, T message);
 
             public event OnMessageReceivedEventHandler OnMessageReceived;
+
+            internal void Raise(NetPeer sender, T message)
+            {
+                OnMessageReceived?.Invoke(sender, message);
+            }
         }
 
+        /// <summary>
+        /// The event callbacks for a message type, plus typed closures to deserialize and dispatch messages of that type
+        /// (so that dispatching a message does not go through reflection).
+        /// </summary>
         private class TypeErasedEventHandler
         {
             public Type TType;
-            public Type TEventDelegatesType;
             public object TEventDelegates;
-            public delegate object TDeserializer(NetSerializer serializer, NetDataReader reader);
-            public TDeserializer DeserializeT;
+            public Action<NetPeer, NetDataReader> ReadAndRaise;
+            public Action<NetPeer, object> Raise;
 
             public static TypeErasedEventHandler ForTType<T>() where T : class, INetSerializable, new()
             {
+                var delegates = new EventDelegates<T>();
                 return new TypeErasedEventHandler()
                 {
                     TType = typeof(T),
-                    TEventDelegatesType = typeof(EventDelegates<T>),
-                    TEventDelegates = new EventDelegates<T>(),
-                    DeserializeT = (serializer, reader) =>
+                    TEventDelegates = delegates,
+                    ReadAndRaise = (sender, reader) =>
                     {
                         T t = new T();
                         t.Deserialize(reader);
-                        return t;
-                    }
+                        delegates.Raise(sender, t);
+                    },
+                    Raise = (sender, message) => delegates.Raise(sender, (T)message),
                 };
             }
-
-            public void Invoke(NetPeer sender, string eventName, object arg)
-            {
-                var evtField = TEventDelegatesType.GetFields(BindingFlags.Instance | BindingFlags.Public | BindingFlags.NonPublic)
-                    .Where(field => field.Name == "OnMessageReceived").First();
-                var evtDelegate = (MulticastDelegate)evtField.GetValue(TEventDelegates);
-
-                if (evtDelegate == null) return; // No events attached yet
-
-                foreach (var evtHandler in evtDelegate.GetInvocationList())
-                {
-                    evtHandler.Method.Invoke(evtHandler.Target, new object[] { sender, arg });
-                }
-            }
         }
         private readonly NetSerializer _netSerializer;
         private readonly Dictionary<ulong, TypeErasedEventHandler> _eventHandlers = new Dictionary<ulong, TypeErasedEventHandler>();
-        private readonly NetDataWriter _netDataWriter = new NetDataWriter();
 
         public NetNodePacketProcessor()
         {
@@ -134,7 +127,7 @@ namespace SShared
             {
                 throw new ParseException("Undefined packet in NetDataReader");
             }
-            handler.Invoke(sender, "OnMessageReceived", tMessage);
+            handler.Raise(sender, tMessage);
         }
 
         protected virtual void WriteHash<T>(NetDataWriter writer)
@@ -164,24 +157,27 @@ namespace SShared
             while (reader.AvailableBytes > 0)
             {
                 ulong tHash = reader.GetULong();
-                if (!_eventHandlers.ContainsKey(tHash))
+                TypeErasedEventHandler handler;
+                if (!_eventHandlers.TryGetValue(tHash, out handler))
                 {
                     throw new KeyNotFoundException($"Unknown message type: {tHash:X}");
                 }
-                else
-                {
-                    var handler = _eventHandlers[tHash];
-                    var tMessage = handler.DeserializeT(_netSerializer, reader);
-                    handler.Invoke(sender, "OnMessageReceived", tMessage);
-                }
+                handler.ReadAndRaise(sender, reader);
             }
         }
 
         public void Send<T>(NetPeer peer, T packet, DeliveryMethod options) where T : class, INetSerializable, new()
         {
-            _netDataWriter.Reset();
-            Write(_netDataWriter, packet);
-            peer.Send(_netDataWriter, options);
+            var writer = NetDataWriterPool.Rent();
+            try
+            {
+                Write(writer, packet);
+                peer.Send(writer, options);
+            }
+            finally
+            {
+                NetDataWriterPool.Return(writer);
+            }
         }
 
         public void Write<T>(NetDataWriter writer, T packet) where T : class, INetSerializable, new()
@@ -212,36 +212,74 @@ namespace SShared
         }
 
         /// <summary>
-        /// Checks a range in this quad (and NOT its children) for items intersecting it.
+        /// Looks for the items in this quad (and NOT its children) matching `query`.
         /// </summary>
-        public abstract Task<List<T>> CheckRangeLocal(Quad range);
+        public abstract Task<List<T>> QueryLocal(SpatialQuery query);
 
         /// <summary>
-        /// Checks a range in this quad (and all of its children) for items intersecting it.
+        /// Looks for the items in this quad and all of its children matching `query`.
+        /// All nodes that `query` intersects are queried concurrently; the items found in each of them are yielded as
+        /// soon as that node answers (in no particular order).
         /// </summary>
-        public async Task<List<T>> CheckRangeRecur(Quad range)
+        public async IAsyncEnumerable<List<T>> QueryRecur(SpatialQuery query)
         {
-            List<T> found = new List<T>();
+            var pending = new List<Task<List<T>>>();
 
-            // abort if the range does not intersect this quad
-            if (Bounds.Intersects(range))
+            Stack<QuadTreeNode<T>> stack = new Stack<QuadTreeNode<T>>();
+            stack.Push(this);
+            while (stack.Any())
             {
-                // checking at the current quad level
-                found.AddRange(await CheckRangeLocal(range).ConfigureAwait(false));
+                var node = stack.Pop();
+                // (Prune the subtrees that the query does not intersect)
+                if (!query.Intersects(node.Bounds))
+                {
+                    continue;
+                }
+                pending.Add(node.QueryLocal(query));
 
-                // checking recursively all children
-                foreach (var child in _children)
+                foreach (var child in node._children)
                 {
-                    if (child != null)
-                    {
-                        found.AddRange(await child.CheckRangeRecur(range).ConfigureAwait(false));
-                    }
+                    if (child != null) stack.Push(child);
                 }
             }
 
+            while (pending.Any())
+            {
+                var done = await Task.WhenAny(pending).ConfigureAwait(false);
+                pending.Remove(done);
+                yield return await done.ConfigureAwait(false);
+            }
+        }
+
+        /// <summary>
+        /// Like `QueryRecur()`, but returns all the items found once every node has answered.
+        /// </summary>
+        public async Task<List<T>> QueryAll(SpatialQuery query)
+        {
+            List<T> found = new List<T>();
+            await foreach (var items in QueryRecur(query).ConfigureAwait(false))
+            {
+                found.AddRange(items);
+            }
             return found;
         }
 
+        /// <summary>
+        /// Checks a range in this quad (and NOT its children) for items intersecting it.
+        /// </summary>
+        public Task<List<T>> CheckRangeLocal(Quad range)
+        {
+            return QueryLocal(new RangeQuery(range));
+        }
+
+        /// <summary>
+        /// Checks a range in this quad (and all of its children) for items intersecting it.
+        /// </summary>
+        public Task<List<T>> CheckRangeRecur(Quad range)
+        {
+            return QueryAll(new RangeQuery(range));
+        }
+
         /// <summary>
         /// Get a randomly-chosen leaf of this node.
         /// </summary>
@@ -0,0 +1,58 @@
+using System;
+using Newtonsoft.Json.Linq;
+
+namespace SShared
+{
+    /// <summary>
+    /// Records the REST requests served to a file so that they can be replayed later (see `tests/replay.py`), one JSON
+    /// object per line:
+    /// `{"t": seconds since the recording started, "route": route, "body": request body, "status": HTTP status,
+    ///   "ms": time taken to serve the request, "token": token of the connected ship (`connect` only)}`.
+    /// </summary>
+    public class RequestRecorder : IDisposable
+    {
+        JsonLinesWriter _file;
+
+        double _start = Tracer.Now;
+
+        public RequestRecorder(string path)
+        {
+            _file = new JsonLinesWriter(path);
+        }
+
+        /// <summary>
+        /// Number of requests dropped because too many were waiting to be written.
+        /// </summary>
+        public long Dropped => _file.Dropped;
+
+        /// <summary>
+        /// Records a request to `route` received at `received` (see `Tracer.Now`) and answered by `response`.
+        /// `body` is the (whole) body of the request, or null if it was not read.
+        /// </summary>
+        public void Record(double received, string route, JObject body, ApiResponse response)
+        {
+            double now = Tracer.Now;
+            var json = new JObject()
+            {
+                ["t"] = Math.Round(received - _start, 6),
+                ["route"] = route,
+                ["body"] = body,
+                ["status"] = response.Status,
+                ["ms"] = Math.Round((now - received) * 1000.0, 3),
+            };
+            if (route == "connect" && response.Data.TryGetValue("token", out JToken token))
+            {
+                json["token"] = token;
+            }
+            _file.Write(json);
+        }
+
+        /// <summary>
+        /// Writes all pending requests and closes the file.
+        /// </summary>
+        public void Dispose()
+        {
+            _file.Dispose();
+        }
+    }
+}
@@ -1,8 +1,10 @@
 ﻿using System;
 using System.Collections.Generic;
+using System.Diagnostics;
 using System.Linq;
 using System.Net;
 using System.Reflection;
+using System.Globalization;
 using Newtonsoft.Json;
 using Newtonsoft.Json.Linq;
 using System.Threading.Tasks;
@@ -16,6 +18,165 @@ namespace SShared
     /// <param name="data">The data passed to the API call.</param>
     delegate Task ApiRouteDelegate(ApiResponse response, ApiData data);
 
+    /// <summary>
+    /// Parses a JSON value into a value of a certain type, without throwing.
+    /// </summary>
+    /// <returns>false if the value can not be parsed to that type.</returns>
+    delegate bool ApiParamParser(JToken token, out object value);
+
+    /// <summary>
+    /// Parsers for the types that `ApiParam`s can have.
+    /// </summary>
+    static class ApiParamParsers
+    {
+        /// <summary>
+        /// Maps each supported type to its parser.
+        /// </summary>
+        static readonly Dictionary<Type, ApiParamParser> PARSERS = new Dictionary<Type, ApiParamParser>()
+        {
+            { typeof(string), ParseString },
+            { typeof(double), ParseDouble },
+            { typeof(float), ParseFloat },
+            { typeof(int), ParseInt },
+            { typeof(long), ParseLong },
+            { typeof(bool), ParseBool },
+        };
+
+        /// <summary>
+        /// Returns the parser for the given type.
+        /// Types without a dedicated parser fall back to (slower) `JToken.ToObject()`.
+        /// </summary>
+        public static ApiParamParser For(Type type)
+        {
+            ApiParamParser parser;
+            if (PARSERS.TryGetValue(type, out parser))
+            {
+                return parser;
+            }
+            return (JToken token, out object value) =>
+            {
+                try
+                {
+                    value = token.ToObject(type);
+                    return true;
+                }
+                catch (Exception)
+                {
+                    value = null;
+                    return false;
+                }
+            };
+        }
+
+        static bool ParseString(JToken token, out object value)
+        {
+            switch (token.Type)
+            {
+                case JTokenType.String:
+                case JTokenType.Integer:
+                case JTokenType.Float:
+                case JTokenType.Boolean:
+                case JTokenType.Null:
+                    value = (string)token;
+                    return true;
+                default:
+                    value = null;
+                    return false;
+            }
+        }
+
+        static bool ParseNumber(JToken token, out double number)
+        {
+            switch (token.Type)
+            {
+                case JTokenType.Integer:
+                case JTokenType.Float:
+                    number = (double)token;
+                    return true;
+                case JTokenType.Boolean:
+                    number = (bool)token ? 1.0 : 0.0;
+                    return true;
+                case JTokenType.String:
+                    return double.TryParse((string)token, NumberStyles.Float, CultureInfo.InvariantCulture, out number);
+                default:
+                    number = 0.0;
+                    return false;
+            }
+        }
+
+        static bool ParseDouble(JToken token, out object value)
+        {
+            double number;
+            bool ok = ParseNumber(token, out number);
+            value = number;
+            return ok;
+        }
+
+        static bool ParseFloat(JToken token, out object value)
+        {
+            double number;
+            bool ok = ParseNumber(token, out number);
+            value = (float)number;
+            return ok;
+        }
+
+        static bool ParseInt(JToken token, out object value)
+        {
+            double number;
+            if (token.Type == JTokenType.Integer && ((JValue)token).Value is long integer)
+            {
+                value = (int)integer;
+                return integer >= int.MinValue && integer <= int.MaxValue;
+            }
+            if (ParseNumber(token, out number) && number >= int.MinValue && number <= int.MaxValue)
+            {
+                // (Same rounding as `Convert.ToInt32()`)
+                value = (int)Math.Round(number, MidpointRounding.ToEven);
+                return true;
+            }
+            value = 0;
+            return false;
+        }
+
+        static bool ParseLong(JToken token, out object value)
+        {
+            double number;
+            if (token.Type == JTokenType.Integer && ((JValue)token).Value is long integer)
+            {
+                value = integer;
+                return true;
+            }
+            if (ParseNumber(token, out number) && number >= long.MinValue && number <= long.MaxValue)
+            {
+                value = (long)Math.Round(number, MidpointRounding.ToEven);
+                return true;
+            }
+            value = 0L;
+            return false;
+        }
+
+        static bool ParseBool(JToken token, out object value)
+        {
+            bool flag;
+            switch (token.Type)
+            {
+                case JTokenType.Boolean:
+                    value = (bool)token;
+                    return true;
+                case JTokenType.Integer:
+                    value = !(((JValue)token).Value is long integer) || integer != 0;
+                    return true;
+                case JTokenType.String:
+                    bool ok = bool.TryParse((string)token, out flag);
+                    value = flag;
+                    return ok;
+                default:
+                    value = false;
+                    return false;
+            }
+        }
+    }
+
     /// <summary>
     /// Uses Reflection to dispatch REST API calls to methods of a class.
     /// </summary>
@@ -35,6 +196,31 @@ namespace SShared
             /// The list of parameters this route expects to find.
             /// </summary>
             public List<ApiParam> Params { get; set; }
+
+            /// <summary>
+            /// The parser for each parameter in `Params` (same order).
+            /// </summary>
+            public ApiParamParser[] Parsers { get; set; }
+
+            /// <summary>
+            /// The request fields to extract for this route.
+            /// </summary>
+            public ApiRequestFields Fields { get; set; }
+
+            /// <summary>
+            /// Number of requests to this route (null if metrics are disabled).
+            /// </summary>
+            public Counter Requests { get; set; }
+
+            /// <summary>
+            /// Number of requests to this route that failed (null if metrics are disabled).
+            /// </summary>
+            public Counter Errors { get; set; }
+
+            /// <summary>
+            /// Time spent handling requests to this route, in seconds (null if metrics are disabled).
+            /// </summary>
+            public Histogram Latency { get; set; }
         }
 
         /// <summary>
@@ -47,12 +233,18 @@ namespace SShared
         /// </summary>
         Dictionary<string, RouteData> apiRoutes;
 
+        /// <summary>
+        /// Number of requests to unknown routes (null if metrics are disabled).
+        /// </summary>
+        Counter notFound = null;
+
         /// <summary>
         /// Initializes a router that will dispatch calls to `api`'s route handler methods.
         /// Route handlers have an `[ApiRoute("route")]` attribute.
         /// </summary>
         /// <param name="api">The object to search route handlers in.</param>
-        public Router(Api api)
+        /// <param name="metrics">If not null, per-route request counts and latencies are recorded here.</param>
+        public Router(Api api, Metrics metrics = null)
         {
             this.api = api;
 
@@ -75,47 +267,71 @@ namespace SShared
 
                 RouteData routeData = apiRoutes[apiRouteAttr.Route] = new RouteData();
                 routeData.Params = method.GetCustomAttributes<ApiParam>().ToList();
+                routeData.Parsers = routeData.Params.Select(param => ApiParamParsers.For(param.Type)).ToArray();
+                routeData.Fields = routeData.Params.Count > 0
+                    ? new ApiRequestFields(routeData.Params.Select(param => param.Name))
+                    : ApiRequestFields.All;
 
                 var handler = method.CreateDelegate(typeof(ApiRouteDelegate), this.api) as ApiRouteDelegate;
                 routeData.Delegate = handler;
+
+                if (metrics != null)
+                {
+                    string labels = Metrics.Labels("route", apiRouteAttr.Route);
+                    routeData.Requests = metrics.Counter("api_requests_total", "REST requests handled, by route.", labels);
+                    routeData.Errors = metrics.Counter("api_request_errors_total", "REST requests that failed, by route.", labels);
+                    routeData.Latency = metrics.Histogram("api_request_duration_seconds", "Time spent handling REST requests, by route.", labels);
+                }
+            }
+            if (metrics != null)
+            {
+                notFound = metrics.Counter("api_requests_not_found_total", "REST requests to unknown routes.");
             }
         }
 
         /// <summary>
-        /// Checks if the current param is present in `data` (if it's not optional)
-        /// and that it has the correct type.
+        /// Checks that all of the route's params are present in `data` (unless optional) and that they have the
+        /// correct type, binding their parsed values to `data` (see `ApiData.Arg()`).
         /// </summary>
-        /// <param name="param">The parameter to check.</param>
-        /// <param name="data">The data to search the param in.</param>
+        /// <param name="routeData">The route whose parameters to bind.</param>
+        /// <param name="data">The data to search the params in.</param>
         /// <returns>An error message on error or null otherwise.</returns>
-        string CheckParam(ApiParam param, ApiData data)
+        string BindParams(RouteData routeData, ApiData data)
         {
-            JToken token;
-            bool hasAttr = data.Json.TryGetValue(param.Name, out token);
-            if (!hasAttr)
+            for (int i = 0; i < routeData.Parsers.Length; i++)
             {
-                if (!param.Optional)
+                ApiParam param = routeData.Params[i];
+
+                JToken token;
+                if (!data.Json.TryGetValue(param.Name, out token))
                 {
-                    return $"Missing required parameter: {param.Name}";
+                    if (!param.Optional)
+                    {
+                        return $"Missing required parameter: {param.Name}";
+                    }
+                    continue;
                 }
-                else
+
+                object value;
+                if (!routeData.Parsers[i](token, out value))
                 {
-                    return null;
+                    return $"Expected parameter {param.Name} to be a {param.Type.Name}";
                 }
+                data.Bind(param.Name, value);
             }
-
-            try
-            {
-                var castedValue = token.ToObject(param.Type);
-            }
-            catch (Exception exc)
-            {
-                return $"Expected parameter {param.Name} to be a {param.Type.Name} ({exc.Message})";
-            }
-
             return null;
         }
 
+        /// <summary>
+        /// Returns the request fields that should be extracted from the body of a request to `route`: the route's
+        /// `ApiParam`s, all fields if the route declares none, or no fields if there is no such route.
+        /// </summary>
+        public ApiRequestFields RequestFields(string route)
+        {
+            var routeData = apiRoutes.GetValueOrDefault(route, null);
+            return routeData != null ? routeData.Fields : ApiRequestFields.None;
+        }
+
         /// <summary>
         /// Routes a request to the right route delegate in the `Api`.
         /// </summary>
@@ -128,18 +344,17 @@ namespace SShared
             var routeData = apiRoutes.GetValueOrDefault(route, null);
             if (routeData == null)
             {
+                notFound?.Increment();
                 response.Data["error"] = $"Route {route} not found";
                 await response.Send(404);
                 return false;
             }
 
             bool ok = false;
+            long start = Stopwatch.GetTimestamp();
             try
             {
-                var paramError = routeData.Params
-                    .Select(param => CheckParam(param, data))
-                    .SkipWhile(string.IsNullOrEmpty)
-                    .FirstOrDefault();
+                var paramError = BindParams(routeData, data);
 
                 if (paramError != null)
                 {
@@ -164,6 +379,16 @@ namespace SShared
                     response.Data["error"] = "Internal server error";
                     await response.Send(500);
                 }
+
+                if (routeData.Requests != null)
+                {
+                    routeData.Requests.Increment();
+                    if (!ok)
+                    {
+                        routeData.Errors.Increment();
+                    }
+                    routeData.Latency.ObserveSince(start);
+                }
             }
             return ok;
         }
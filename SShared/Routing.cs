@@ -2,6 +2,7 @@
 using System.Net;
 using System.IO;
 using System.Text;
+using System.Collections.Generic;
 using System.Threading.Tasks;
 using Newtonsoft.Json.Linq;
 
@@ -75,12 +76,49 @@ namespace SShared
         public ApiData(JObject data)
         {
             this.Json = data;
+            this.args = new Dictionary<string, object>();
         }
 
         /// <summary>
         /// The stored parameters. 
         /// </summary>
         public JObject Json { get; private set; }
+
+        /// <summary>
+        /// The id of the trace this request is part of (see `Tracer`), or null if it is not traced.
+        /// </summary>
+        public string TraceId { get; set; }
+
+        /// <summary>
+        /// The values of the route's `ApiParam`s, as parsed by the router.
+        /// </summary>
+        Dictionary<string, object> args;
+
+        /// <summary>
+        /// Binds the parsed value of a parameter.
+        /// </summary>
+        internal void Bind(string name, object value)
+        {
+            args[name] = value;
+        }
+
+        /// <summary>
+        /// Returns true if the given `ApiParam` was passed (and successfully parsed).
+        /// </summary>
+        public bool HasArg(string name)
+        {
+            return args.ContainsKey(name);
+        }
+
+        /// <summary>
+        /// Returns the parsed value of the given `ApiParam`, or `defaultValue` if it was not passed.
+        /// `T` must match the type declared in the `ApiParam`.
+        /// </summary>
+        public T Arg<T>(string name, T defaultValue = default(T))
+        {
+            object value;
+            return args.TryGetValue(name, out value) ? (T)value : defaultValue;
+        }
     }
 
     /// <summary>
@@ -109,11 +147,24 @@ namespace SShared
         /// </summary>
         public bool Sent { get; private set; }
 
+        /// <summary>
+        /// The HTTP status code the response was sent with (0 if not sent yet).
+        /// </summary>
+        public int Status { get; private set; }
+
         /// <summary>
         /// The data to send with the response.
         /// </summary>
         public JObject Data { get; private set; }
 
+        /// <summary>
+        /// Adds a HTTP header to the response; must be called before sending it.
+        /// </summary>
+        public void AddHeader(string name, string value)
+        {
+            response.AddHeader(name, value);
+        }
+
         /// <summary>
         /// Sends `Data` as a response to the API request, closing it off.
         /// </summary>
@@ -126,6 +177,7 @@ namespace SShared
             }
             response.ContentType = "application/json";
             response.StatusCode = status;
+            this.Status = status;
 
             string jsonStr = this.Data.ToString(Newtonsoft.Json.Formatting.None);
             byte[] buffer = Encoding.UTF8.GetBytes(jsonStr);
@@ -138,6 +190,32 @@ namespace SShared
             this.Sent = true;
         }
 
+        /// <summary>
+        /// Sends `text` (instead of `Data`) as a response to the API request, closing it off.
+        /// </summary>
+        /// <param name="text">The body of the response.</param>
+        /// <param name="contentType">The MIME type of the body.</param>
+        /// <param name="status">The HTTP status code of the response.</param>
+        public async Task SendText(string text, string contentType = "text/plain; charset=utf-8", int status = 200)
+        {
+            if (this.Sent)
+            {
+                throw new InvalidOperationException("Response already sent!");
+            }
+            response.ContentType = contentType;
+            response.StatusCode = status;
+            this.Status = status;
+
+            byte[] buffer = Encoding.UTF8.GetBytes(text);
+            response.ContentLength64 = buffer.Length;
+            System.IO.Stream output = response.OutputStream;
+            await output.WriteAsync(buffer, 0, buffer.Length);
+            output.Close();
+
+            response.Close();
+            this.Sent = true;
+        }
+
         /// <summary>
         /// Redirect the request to another address.
         /// </summary>
@@ -145,6 +223,7 @@ namespace SShared
         {
             response.RedirectLocation = url;
             response.StatusCode = 307;
+            this.Status = 307;
             response.StatusDescription = "Temporary Redirect";
             response.Close();
             this.Sent = true;
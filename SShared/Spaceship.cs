@@ -12,35 +12,41 @@ namespace SShared
         /// <summary>
         /// Token (= private key) of this spaceship.
         /// </summary>
-        public string Token { get; set; }
+        public string Token
+        {
+            get { return _token; }
+            set { _token = value; _publicId = null; }
+        }
+
+        private string _token, _publicId;
 
         /// <summary>
-        /// Public id (= public key) of this spaceship. Extracted from `Token`.
+        /// Public id (= public key) of this spaceship. Extracted from `Token` (once).
         /// </summary>
         public string PublicId
         {
-            get { return Token.Substring(Token.Length - 8); }
+            get { return _publicId ?? (_publicId = Token.Substring(Token.Length - 8)); }
         }
 
         /// <summary>
         /// Energy of the spaceship.
         /// </summary>
-        public double Energy { get; set; }
+        public virtual double Energy { get; set; }
 
         /// <summary>
         /// Area of the spaceship.
         /// </summary>
-        public double Area { get; set; }
+        public virtual double Area { get; set; }
 
         /// <summary>
         /// Position of the spaceship.
         /// </summary>
-        public Vector2 Pos { get; set; }
+        public virtual Vector2 Pos { get; set; }
 
         /// <summary>
         /// Velocity of the spaceship.
         /// </summary>
-        public Vector2 Velocity { get; set; }
+        public virtual Vector2 Velocity { get; set; }
 
         private double _shieldDir;
 
@@ -49,7 +55,7 @@ namespace SShared
         /// The shield extends for `ShieldWidth` radians clockwise + `ShieldWidth` radians counterclockwise.
         /// Automatically clamped to 0..2pi when setting it.
         /// </summary>
-        public double ShieldDir
+        public virtual double ShieldDir
         {
             get
             {
@@ -57,17 +63,25 @@ namespace SShared
             }
             set
             {
-                _shieldDir = MathUtils.NormalizeAngle(MathUtils.ClampAngle(value, 2.0 * Math.PI));
+                _shieldDir = NormalizeShieldDir(value);
             }
         }
 
+        /// <summary>
+        /// Clamps a shield direction to the 0..2pi range.
+        /// </summary>
+        protected static double NormalizeShieldDir(double shieldDir)
+        {
+            return MathUtils.NormalizeAngle(MathUtils.ClampAngle(shieldDir, 2.0 * Math.PI));
+        }
+
         private double _shieldWidth;
 
         /// <summary>
         /// The shield half extents, in radians (see `ShieldDir`'s documentation).
         /// WARNING: NOT automatically adjusted in the 0..pi range!
         /// </summary>
-        public double ShieldWidth
+        public virtual double ShieldWidth
         {
             get
             {
@@ -82,7 +96,7 @@ namespace SShared
         /// <summary>
         /// Reward received by opponent for killing this ship
         /// </summary>
-        public double KillReward { get; set; }
+        public virtual double KillReward { get; set; }
 
         /// <summary>
         /// The current bounds of the ship.
@@ -110,7 +124,7 @@ namespace SShared
         /// <summary>
         /// Calculates energy used per second by a shield of width shieldWidth for a ship with given area
         /// </summary>
-        protected static double ShieldEnergyUsage(double shieldWidth, double area)
+        public static double ShieldEnergyUsage(double shieldWidth, double area)
         {
             // shields should usually be turned off for most ships, so this will save cpu time overall
             if (shieldWidth == 0) return 0;
@@ -173,6 +187,8 @@ namespace SShared
             writer.Put(Area);
             writer.Put(Pos.X);
             writer.Put(Pos.Y);
+            writer.Put(Velocity.X);
+            writer.Put(Velocity.Y);
             writer.Put(ShieldDir);
             writer.Put(ShieldWidth);
             writer.Put(KillReward);
@@ -184,6 +200,7 @@ namespace SShared
             Energy = reader.GetDouble();
             Area = reader.GetDouble();
             Pos = new Vector2(reader.GetDouble(), reader.GetDouble());
+            Velocity = new Vector2(reader.GetDouble(), reader.GetDouble());
             ShieldDir = reader.GetDouble();
             ShieldWidth = reader.GetDouble();
             KillReward = reader.GetDouble();
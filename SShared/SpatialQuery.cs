@@ -0,0 +1,207 @@
+using System;
+using LiteNetLib.Utils;
+
+namespace SShared
+{
+    /// <summary>
+    /// A region of world space to look for items in (see `QuadTreeNode.QueryRecur()`).
+    /// Items are treated as circles, centred in their bounds and with their bounds' radius (as ships are).
+    /// Queries can be sent over the bus: `Write()` them, and `Read()` them back as the right subclass.
+    /// </summary>
+    public abstract class SpatialQuery
+    {
+        /// <summary>
+        /// The kinds of query, as written on the wire.
+        /// </summary>
+        protected enum Kind : byte
+        {
+            Range = 0,
+            Radius = 1,
+            Sector = 2,
+        }
+
+        /// <summary>
+        /// Returns true if an item inside `quad` may match this query (false if none can; used to prune quadtree nodes).
+        /// </summary>
+        public abstract bool Intersects(Quad quad);
+
+        /// <summary>
+        /// Returns true if the item with the given bounds matches this query.
+        /// </summary>
+        public abstract bool Matches(Quad itemBounds);
+
+        /// <summary>
+        /// Returns true if `quad` contains `point`.
+        /// </summary>
+        protected static bool Contains(Quad quad, Vector2 point)
+        {
+            return quad.X <= point.X && point.X <= quad.X2 && quad.Y <= point.Y && point.Y <= quad.Y2;
+        }
+
+        protected abstract Kind QueryKind { get; }
+
+        protected abstract void WriteFields(NetDataWriter writer);
+
+        /// <summary>
+        /// Serializes this query (along with its kind).
+        /// </summary>
+        public void Write(NetDataWriter writer)
+        {
+            writer.Put((byte)QueryKind);
+            WriteFields(writer);
+        }
+
+        /// <summary>
+        /// Deserializes a query written by `Write()`.
+        /// </summary>
+        public static SpatialQuery Read(NetDataReader reader)
+        {
+            var kind = (Kind)reader.GetByte();
+            switch (kind)
+            {
+                case Kind.Range:
+                    return new RangeQuery(new Quad(reader.GetDouble(), reader.GetDouble(), reader.GetDouble()));
+                case Kind.Radius:
+                    return new RadiusQuery(new Vector2(reader.GetDouble(), reader.GetDouble()), reader.GetDouble());
+                case Kind.Sector:
+                    return new SectorQuery(new Vector2(reader.GetDouble(), reader.GetDouble()),
+                        reader.GetDouble(), reader.GetDouble(), reader.GetDouble());
+                default:
+                    throw new ArgumentException($"Unknown spatial query kind: {kind}");
+            }
+        }
+    }
+
+    /// <summary>
+    /// Looks for items whose bounds intersect a quad.
+    /// </summary>
+    public class RangeQuery : SpatialQuery
+    {
+        public Quad Range { get; private set; }
+
+        public RangeQuery(Quad range)
+        {
+            Range = range;
+        }
+
+        public override bool Intersects(Quad quad) => Range.Intersects(quad);
+
+        public override bool Matches(Quad itemBounds) => Range.Intersects(itemBounds);
+
+        protected override Kind QueryKind => Kind.Range;
+
+        protected override void WriteFields(NetDataWriter writer)
+        {
+            writer.Put(Range.CentreX);
+            writer.Put(Range.CentreY);
+            writer.Put(Range.Radius);
+        }
+    }
+
+    /// <summary>
+    /// Looks for items intersecting a circle.
+    /// </summary>
+    public class RadiusQuery : SpatialQuery
+    {
+        public Vector2 Centre { get; private set; }
+
+        public double Radius { get; private set; }
+
+        public RadiusQuery(Vector2 centre, double radius)
+        {
+            Centre = centre;
+            Radius = radius;
+        }
+
+        public override bool Intersects(Quad quad)
+        {
+            // (Distance from the centre to the closest point in the quad)
+            double dx = Math.Max(quad.X - Centre.X, Math.Max(0.0, Centre.X - quad.X2));
+            double dy = Math.Max(quad.Y - Centre.Y, Math.Max(0.0, Centre.Y - quad.Y2));
+            return dx * dx + dy * dy <= Radius * Radius;
+        }
+
+        public override bool Matches(Quad itemBounds)
+        {
+            var itemCentre = new Vector2(itemBounds.CentreX, itemBounds.CentreY);
+            return (itemCentre - Centre).Length() <= Radius + itemBounds.Radius;
+        }
+
+        protected override Kind QueryKind => Kind.Radius;
+
+        protected override void WriteFields(NetDataWriter writer)
+        {
+            writer.Put(Centre.X);
+            writer.Put(Centre.Y);
+            writer.Put(Radius);
+        }
+    }
+
+    /// <summary>
+    /// Looks for items intersecting a circle sector (i.e. the cone of a scan or shot).
+    /// </summary>
+    public class SectorQuery : SpatialQuery
+    {
+        /// <summary>
+        /// The centre of the sector's circle.
+        /// </summary>
+        public Vector2 Origin { get; private set; }
+
+        /// <summary>
+        /// World-space direction of the centre of the sector **in radians**.
+        /// </summary>
+        public double Direction { get; private set; }
+
+        /// <summary>
+        /// Half-width of the sector **in radians**.
+        /// </summary>
+        public double Width { get; private set; }
+
+        /// <summary>
+        /// Radius of the sector's circle.
+        /// </summary>
+        public double Radius { get; private set; }
+
+        public SectorQuery(Vector2 origin, double direction, double width, double radius)
+        {
+            Origin = origin;
+            Direction = direction;
+            Width = width;
+            Radius = radius;
+        }
+
+        /// <summary>
+        /// Returns true if the circle with the given centre and radius intersects the sector.
+        /// </summary>
+        private bool IntersectsCircle(Vector2 centre, double radius)
+        {
+            Vector2 leftPoint = Origin + MathUtils.DirVec(Direction + Width) * Radius;
+            Vector2 rightPoint = Origin + MathUtils.DirVec(Direction - Width) * Radius;
+            return MathUtils.CircleTriangleIntersection(centre, radius, Origin, leftPoint, rightPoint)
+                || MathUtils.CircleSegmentIntersection(centre, radius, Origin, Radius, Direction, Width);
+        }
+
+        public override bool Intersects(Quad quad)
+        {
+            // (Test the quad's circumcircle; the root quad can be too big for that, but it always contains the origin)
+            return Contains(quad, Origin)
+                || IntersectsCircle(new Vector2(quad.CentreX, quad.CentreY), Math.Sqrt(2.0) * quad.Radius);
+        }
+
+        public override bool Matches(Quad itemBounds)
+        {
+            return IntersectsCircle(new Vector2(itemBounds.CentreX, itemBounds.CentreY), itemBounds.Radius);
+        }
+
+        protected override Kind QueryKind => Kind.Sector;
+
+        protected override void WriteFields(NetDataWriter writer)
+        {
+            writer.Put(Origin.X);
+            writer.Put(Origin.Y);
+            writer.Put(Direction);
+            writer.Put(Width);
+            writer.Put(Radius);
+        }
+    }
+}
@@ -0,0 +1,111 @@
+using System;
+using System.Diagnostics;
+using Newtonsoft.Json.Linq;
+
+namespace SShared
+{
+    /// <summary>
+    /// Records timed spans of traced requests to a local file, one JSON object per line:
+    /// `{"trace": id, "node": name, "span": name, "start": seconds, "end": seconds, "detail": text}`.
+    /// Times are Unix timestamps (in seconds, with sub-microsecond resolution) so that spans recorded by different
+    /// processes on the same host can be joined into a single timeline (see `tests/tracejoin.py`).
+    /// Spans are written by a `JsonLinesWriter`, so recording one never blocks on I/O.
+    /// </summary>
+    public class Tracer : IDisposable
+    {
+        /// <summary>
+        /// The HTTP header carrying the id of a traced request.
+        /// </summary>
+        public const string HEADER = "X-Request-Id";
+
+        /// <summary>
+        /// Trace ids passed by clients are truncated to this many characters.
+        /// </summary>
+        public const int MAX_TRACE_ID_LENGTH = 64;
+
+        static readonly double _startTime = (DateTime.UtcNow - DateTime.UnixEpoch).TotalSeconds;
+        static readonly long _startTimestamp = Stopwatch.GetTimestamp();
+
+        /// <summary>
+        /// The current time as a Unix timestamp in seconds (high-resolution, but monotonic within this process).
+        /// </summary>
+        public static double Now => _startTime + (double)(Stopwatch.GetTimestamp() - _startTimestamp) / Stopwatch.Frequency;
+
+        /// <summary>
+        /// Generates a new trace id, for requests that did not come with one.
+        /// </summary>
+        public static string NewTraceId() => Guid.NewGuid().ToString("N").Substring(0, 16);
+
+        /// <summary>
+        /// Returns the trace id passed in a `HEADER` header (truncated if too long), or null if there was none.
+        /// </summary>
+        public static string ParseTraceId(string header)
+        {
+            if (string.IsNullOrWhiteSpace(header))
+            {
+                return null;
+            }
+            header = header.Trim();
+            return header.Length > MAX_TRACE_ID_LENGTH ? header.Substring(0, MAX_TRACE_ID_LENGTH) : header;
+        }
+
+        /// <summary>
+        /// The name of this node in the spans (e.g. its API URL).
+        /// </summary>
+        public string Node { get; private set; }
+
+        /// <summary>
+        /// Number of spans dropped because too many were waiting to be written.
+        /// </summary>
+        public long Dropped => _file.Dropped;
+
+        JsonLinesWriter _file;
+
+        public Tracer(string path, string node)
+        {
+            Node = node;
+            _file = new JsonLinesWriter(path);
+        }
+
+        /// <summary>
+        /// Records a span of the trace `traceId`, from `start` to `end` (both as returned by `Now`).
+        /// Does nothing if `traceId` is null.
+        /// </summary>
+        public void Record(string traceId, string span, double start, double end, string detail = null)
+        {
+            if (traceId == null)
+            {
+                return;
+            }
+            var json = new JObject()
+            {
+                ["trace"] = traceId,
+                ["node"] = Node,
+                ["span"] = span,
+                ["start"] = start,
+                ["end"] = end,
+            };
+            if (detail != null)
+            {
+                json["detail"] = detail;
+            }
+            _file.Write(json);
+        }
+
+        /// <summary>
+        /// Records a span of the trace `traceId` from `start` until now.
+        /// </summary>
+        public void RecordSince(string traceId, string span, double start, string detail = null)
+        {
+            Record(traceId, span, start, Now, detail);
+        }
+
+        /// <summary>
+        /// Writes all pending spans and closes the file.
+        /// </summary>
+        public void Dispose()
+        {
+            _file.Dispose();
+        }
+    }
+}
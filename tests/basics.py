@@ -1,6 +1,7 @@
 import requests
 import time
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 
 allowed_fpe = 1e-6
 
@@ -24,6 +25,21 @@ def set_time(server, time):
     assert resp
 
 
+def load_scenario(server, ships, chunk=250):
+    """Creates (or updates, for the ones with a `token`) many ships at once through the `scenario` route, instead of
+    one `connect` and a few `sudo` calls per ship. `ships` is a list of dicts of `token`, `posX`, `posY`, `velX`, `velY`,
+    `area`, `energy`, `shieldDir` and `shieldWidth` (all optional). Requests are sent in chunks (to stay below the
+    maximum request size), concurrently. Returns the tokens of the ships, in order."""
+    def load_chunk(start):
+        resp = requests.post(server.url + 'scenario', json={'ships': ships[start:start + chunk]})
+        assert resp, resp.text
+        return resp.json()['tokens']
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        chunks = list(executor.map(load_chunk, range(0, len(ships), chunk)))
+    return [ token for tokens in chunks for token in tokens ]
+
+
 def test_disconnect(clients):
     """
     Tests that a connected ship can disconnect via REST.
@@ -311,6 +327,39 @@ def test_sudo(server, clients):
             assert is_close(v, kvs[k], 0.001)
 
 
+def test_load_scenario(server):
+    """
+    Tests that the "scenario" endpoint creates ships with the given state, and updates existing ones.
+    """
+    ships = [
+        {'posX': 100.0 * i, 'posY': -50.0 * i, 'velX': 0, 'velY': 0, 'area': 2.0 + i, 'energy': 5.0, 'shieldWidth': 30}
+        for i in range(5)
+    ]
+    tokens = load_scenario(server, ships, chunk=2)
+    try:
+        assert len(tokens) == len(ships) and len(set(tokens)) == len(ships)
+        for token, ship in zip(tokens, ships):
+            resp = requests.post(server.url + 'getShipInfo', json={'token': token})
+            assert resp
+            info = resp.json()
+            assert is_close(info['posX'], ship['posX'], 0.001)
+            assert is_close(info['posY'], ship['posY'], 0.001)
+            assert is_close(info['area'], ship['area'], 0.001)
+            assert is_close(info['shieldWidth'], ship['shieldWidth'], 0.001)
+
+        # Ships with a known token are updated in place, and only the attributes given change
+        assert load_scenario(server, [{'token': tokens[0], 'posX': 1.0, 'posY': 2.0, 'area': 42.0}]) == tokens[:1]
+        resp = requests.post(server.url + 'getShipInfo', json={'token': tokens[0]})
+        assert resp
+        info = resp.json()
+        assert is_close(info['area'], 42.0, 0.001)
+        assert is_close(info['posX'], 1.0, 0.001)
+        assert is_close(info['shieldWidth'], ships[0]['shieldWidth'], 0.001)
+    finally:
+        for token in tokens:
+            requests.post(server.url + 'disconnect', json={'token': token})
+
+
 def test_sudo_bad_or_missing_token(server):
     """
     Tests that the "sudo" endpoint fails if no valid token is passed.
@@ -324,6 +373,46 @@ def test_sudo_bad_or_missing_token(server):
     assert resp
 
 
+@pytest.mark.parametrize("payload, ok", [
+    ({'x': 0, 'y': 0}, True),
+    ({'x': 0.5, 'y': '-1.5'}, True),
+    ({'x': 'not a number', 'y': 0}, False),
+    ({'x': [1, 2], 'y': 0}, False),
+    ({'x': None, 'y': 0}, False),
+    ({'y': 0}, False),
+])
+def test_param_validation(clients, payload, ok):
+    """
+    Tests that route parameters are type-checked before reaching the handler.
+    """
+    with clients(1) as client:
+        payload['token'] = client.token
+        resp = requests.post(client.url + 'accelerate', json=payload)
+        assert bool(resp) == ok
+        if not ok:
+            assert resp.status_code == 500
+            assert 'error' in resp.json().keys()
+
+
+def test_request_body_limits(clients):
+    """
+    Tests that unknown junk fields are ignored and that oversized bodies are rejected.
+    """
+    with clients(1) as client:
+        resp = requests.post(client.url + 'getShipInfo', json={
+            'token': client.token,
+            'gift': 'x' * 1024,
+        })
+        assert resp
+
+        resp = requests.post(client.url + 'getShipInfo', json={
+            'token': client.token,
+            'gift': 'x' * (1024 * 1024),
+        })
+        assert resp.status_code == 413
+        assert 'error' in resp.json().keys()
+
+
 def test_basic_combat(server, clients):
     with clients(2) as (client1, client2):
         # Setting up client 1
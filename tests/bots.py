@@ -28,6 +28,41 @@ def randomAPI():
     api = random.choice(API)
     return api[0], api[1]()
 
+# scraping the `metrics` route of the arbiter and of the SGame nodes
+
+def parse_metrics(text):
+    """Parses metrics in the Prometheus text format into a dict of `'name{labels}'` -> value."""
+    metrics = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        series, value = line.rsplit(' ', 1)
+        metrics[series] = float(value)
+    return metrics
+
+def scrape_metrics(url):
+    """Returns the parsed metrics of the arbiter or SGame node at `url` (empty if it has no `metrics` route)."""
+    try:
+        resp = requests.get(url + 'metrics', timeout=5)
+    except requests.RequestException:
+        return {}
+    if resp.status_code != 200:
+        return {}
+    return parse_metrics(resp.text)
+
+def metrics_delta(before, after, prefix=''):
+    """Returns the series starting with `prefix` whose value changed between two scrapes, and by how much."""
+    return { series: value - before.get(series, 0.0) for series, value in after.items()
+             if series.startswith(prefix) and value != before.get(series, 0.0) }
+
+def metric_label(series, label):
+    """Returns the value of `label` in a `'name{labels}'` series, or None."""
+    start = series.find(label + '="')
+    if start < 0:
+        return None
+    start += len(label) + 2
+    return series[start:series.index('"', start)]
+
 class Bot:
 
     def __init__(self,server):
@@ -95,9 +130,10 @@ class Randombot(Bot):
         super().__init__(server)
         self.rate = rate
         self.name = 'Randombot'
+        self.throttled = 0
 
     def generate_output(self):
-        return (self.apiCallTimes)
+        return (self.apiCallTimes, self.throttled)
 
     def run_inner(self, output, t = 3):
         calls = 0
@@ -108,7 +144,10 @@ class Randombot(Bot):
             last = time.time()
             path, data = randomAPI()
             res = self.timedapi(path, data)
-            assert res[0]
+            if res[0].status_code == 429:
+                self.throttled += 1
+            else:
+                assert res[0]
             #if not res[0]:
             #    print('oops',path,data,res[0].json())
             wait = delay - (time.time() - last)
@@ -121,7 +160,9 @@ class Randombot(Bot):
             print("You need to run " + self.name + " before you finish!")
             return False
         self.p.join()
-        self.apiCallTimes = self.pipe[1].recv()
+        # (A failed assertion kills the bot before it sends its output)
+        assert self.p.exitcode == 0, self.name + ' failed'
+        self.apiCallTimes, self.throttled = self.pipe[1].recv()
         res = self.quit()
         return res
 
@@ -237,17 +278,20 @@ class Spambot(Bot):
         super().__init__(server)
         self.name = 'Spambot'
         self.spams = 0
+        self.throttled = 0
 
     def generate_output(self,):
-        return (self.spams)
+        return (self.spams, self.throttled)
 
     def run_inner(self, output, t = 3):
         start = time.time()
         while time.time()-start < t:
             path,data = randomAPI()
             data['token'] = self.token
-            requests.post(url = 'http://' + self.host + ':' + str(self.port) + '/' + path, json=data)
+            resp = requests.post(url = 'http://' + self.host + ':' + str(self.port) + '/' + path, json=data)
             self.spams += 1
+            if resp.status_code == 429:
+                self.throttled += 1
         output.send(self.generate_output())
 
     def finish(self):
@@ -255,7 +299,7 @@ class Spambot(Bot):
             print("You need to run " + self.name + " before you finish!")
             return False
         self.p.join()
-        self.spams = self.pipe[1].recv()
+        self.spams, self.throttled = self.pipe[1].recv()
         res = self.quit()
         return res
 
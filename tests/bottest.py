@@ -1,11 +1,38 @@
 import requests
 import time
 import pytest
+import random
 import bots
+import tracejoin
+from basics import load_scenario
+from concurrent.futures import ThreadPoolExecutor
 
 def getMaxHangTime(bots):
     return max( [ max([ max(times) for times in bot.apiCallTimes.values()]) for bot in bots ] )
 
+def scrape_cluster(server):
+    """Scrapes the metrics of `server` and of the SGame nodes it reports (if it is an arbiter); url -> metrics."""
+    scrapes = { server.url: bots.scrape_metrics(server.url) }
+    for series in scrapes[server.url]:
+        if series.startswith('sarbiter_node_ships{'):
+            node = bots.metric_label(series, 'api_url')
+            scrapes[node] = bots.scrape_metrics(node)
+    return scrapes
+
+@pytest.fixture(autouse=True)
+def route_metrics(server):
+    """Prints, for each test, the requests served and the time spent per route on the arbiter and each SGame node."""
+    before = scrape_cluster(server)
+    yield
+    after = scrape_cluster(server)
+    for url, metrics in after.items():
+        requests_delta = bots.metrics_delta(before.get(url, {}), metrics, 'api_requests_total{')
+        seconds_delta = bots.metrics_delta(before.get(url, {}), metrics, 'api_request_duration_seconds_sum{')
+        for series, count in sorted(requests_delta.items()):
+            route = bots.metric_label(series, 'route')
+            seconds = seconds_delta.get(f'api_request_duration_seconds_sum{{route="{route}"}}', 0.0)
+            print(f'{url} {route}: {int(count)} requests, {1000.0 * seconds / count:.2f}ms average')
+
 def test_init(server):
     bot1 = bots.Bot(server)
     bot1.run(3)
@@ -92,6 +119,38 @@ def test_random_spammed(server,numBots,timeSec,callsPerSec):
     MHT = getMaxHangTime(randombots)
     print('Highest wait time for random',numBots,timeSec,callsPerSec,', while spambot spammed',str(spambot.spams),'=',str(MHT))
 
+# random bots with spammers, while the arbiter's per-token rate limit is tight
+@pytest.mark.parametrize("numBots, timeSec, callsPerSec", basic_data)
+def test_random_spammed_ratelimited(server,numBots,timeSec,callsPerSec):
+    resp = requests.post(server.url + 'ratelimit', json={})
+    if resp.status_code == 404:
+        pytest.skip('rate limiting is only configurable on a debug arbiter')
+    assert resp
+    old_limits = resp.json()
+
+    # Well-behaved bots stay below the limit; spammers do not (and, as all bots share a client IP, only ships are limited)
+    resp = requests.post(server.url + 'ratelimit', json={'tokenRate': 2 * callsPerSec, 'tokenBurst': callsPerSec, 'ipRate': 0})
+    assert resp
+    try:
+        randombots = [ bots.Randombot(server, callsPerSec) for i in range(numBots) ]
+        spambots = [ bots.Spambot(server) for i in range(2) ]
+        for i in range(numBots):
+            randombots[i].run(timeSec)
+        for spambot in spambots:
+            spambot.run(timeSec)
+        for i in range(numBots):
+            assert randombots[i].finish()
+            assert randombots[i].throttled == 0
+        for spambot in spambots:
+            assert spambot.finish()
+            assert spambot.throttled > 0
+    finally:
+        requests.post(server.url + 'ratelimit', json={k: old_limits[k] for k in ('tokenRate', 'tokenBurst', 'ipRate', 'ipBurst')})
+
+    MHT = getMaxHangTime(randombots)
+    print('Highest wait time for random',numBots,timeSec,callsPerSec,'under rate limiting =',str(MHT),
+          'while spambots were throttled',str([spambot.throttled for spambot in spambots]),'times')
+
 # random bots with a yuuge bot
 @pytest.mark.parametrize("numBots, timeSec, callsPerSec", basic_data)
 def test_random_yuuged(server,numBots,timeSec,callsPerSec):
@@ -124,3 +183,215 @@ def test_random_corona(server,numBots,timeSec,callsPerSec):
     MHT = getMaxHangTime(randombots)
     MHTcorona = getMaxHangTime(coronabots)
     print('Highest wait time for random',numBots,timeSec,callsPerSec,'=',str(MHT),'while accelerators had',str(MHTcorona))
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+def node_of(server, token):
+    """Returns the API URL of the SGame node the arbiter forwards requests for `token` to."""
+    resp = requests.post(server.url + 'getShipInfo', json={'token': token}, allow_redirects=False)
+    if resp.status_code != 307:
+        return server.url
+    return resp.headers['Location'].rsplit('getShipInfo', 1)[0]
+
+# connect storm under each placement policy; compares ship count and p99 latency skew across nodes
+@pytest.mark.parametrize("numBots, callsPerBot", [(200, 10)])
+def test_placement_bench(server, bench, numBots, callsPerBot):
+    resp = requests.post(server.url + 'placement', json={})
+    if resp.status_code == 404:
+        pytest.skip('placement is only configurable on a debug arbiter')
+    old_policy = resp.json()['policy']
+
+    results = {}
+    try:
+        for policy in ['random', 'least-loaded', 'two-choices', 'reported']:
+            assert requests.post(server.url + 'placement', json={'policy': policy})
+
+            tokens = [ requests.post(server.url + 'connect').json()['token'] for i in range(numBots) ]
+            latencies = {}
+            for token in tokens:
+                node = node_of(server, token)
+                for i in range(callsPerBot):
+                    start = time.time()
+                    assert requests.post(node + 'getShipInfo', json={'token': token})
+                    latencies.setdefault(node, []).append(time.time() - start)
+            for token in tokens:
+                requests.post(server.url + 'disconnect', json={'token': token})
+
+            if len(latencies) < 2:
+                pytest.skip('placement benchmark needs more than one SGame node')
+            counts = [ len(times) // callsPerBot for times in latencies.values() ]
+            p99s = [ percentile(times, 99) for times in latencies.values() ]
+            results[policy] = (max(counts) / (sum(counts) / len(counts)), max(p99s) / min(p99s))
+    finally:
+        requests.post(server.url + 'placement', json={'policy': old_policy})
+
+    for policy, (count_skew, p99_skew) in results.items():
+        print(f'Placement {policy}: ship count max/mean = {count_skew:.2f}, p99 latency max/min = {p99_skew:.2f}')
+    assert results['least-loaded'][0] <= results['random'][0]
+
+def reachable(server, token, dead_node):
+    """True if the ship with `token` is served by a node other than `dead_node`."""
+    try:
+        node = node_of(server, token)
+        return node != dead_node and bool(requests.post(node + 'getShipInfo', json={'token': token}, timeout=1))
+    except requests.exceptions.RequestException:
+        return False
+
+# kills the SGame node with the most ships on it and measures how long until all of its ships are served again;
+# failover time should stay nearly flat as the number of orphaned ships grows
+@pytest.mark.parametrize("numShips", [50, 200, 800])
+def test_failover_bench(server, bench, connected_ships, numShips):
+    tokens = connected_ships(numShips)
+    by_node = {}
+    for token in tokens:
+        by_node.setdefault(node_of(server, token), []).append(token)
+    victims = [ node for node in by_node if node != server.url ]
+    if len(by_node) < 2 or not victims:
+        pytest.skip('failover benchmark needs more than one SGame node')
+    victim = max(victims, key=lambda node: len(by_node[node]))
+    orphans = by_node[victim]
+
+    start = time.time()
+    try:
+        resp = requests.post(victim + 'exit', timeout=1)
+        if resp.status_code == 404:
+            pytest.skip('SGame nodes can only be killed remotely in debug builds')
+    except requests.exceptions.RequestException:
+        pass  # The node died before answering
+
+    pending = set(orphans)
+    while pending and time.time() - start < 60.0:
+        pending = { token for token in pending if not reachable(server, token, victim) }
+    elapsed = time.time() - start
+
+    print(f'Failover of {len(orphans)} ships took {elapsed:.2f}s')
+    assert not pending
+
+def timed_connect(server):
+    start = time.time()
+    resp = requests.post(server.url + 'connect')
+    return time.time() - start, resp
+
+# many concurrent connects; with connects pipelined (and tokens reserved in batches via --reserve-batch) the latency
+# should not grow with one bus round trip per ship
+@pytest.mark.parametrize("numShips, concurrency", [(400, 20)])
+def test_connect_bench(server, bench, connected_ships, numShips, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda i: timed_connect(server), range(numShips)))
+    tokens = connected_ships.adopt([ resp.json()['token'] for elapsed, resp in results if resp ])
+
+    latencies = [ elapsed for elapsed, resp in results ]
+    print(f'Connect latency for {numShips} ships, {concurrency} at a time: '
+          f'p50 = {percentile(latencies, 50):.4f}s, p99 = {percentile(latencies, 99):.4f}s')
+    assert len(tokens) == numShips
+
+# scans from ships spread over all nodes; compare runs with and without --bus-thread on the SGame nodes, since
+# scans that cross nodes wait for the other nodes to answer
+@pytest.mark.parametrize("numShips, scansPerShip", [(50, 20)])
+def test_scan_latency_bench(server, bench, connected_ships, numShips, scansPerShip):
+    latencies = []
+    for token in connected_ships(numShips):
+        node = node_of(server, token)
+        for i in range(scansPerShip):
+            start = time.time()
+            assert requests.post(node + 'scan', json={'token': token})
+            latencies.append(time.time() - start)
+
+    print(f'Scan latency over {len(latencies)} scans: '
+          f'p50 = {percentile(latencies, 50):.4f}s, p99 = {percentile(latencies, 99):.4f}s')
+
+# each ship repeats the same scan in quick bursts, like Randombot's `scangen` does; compare runs with and without
+# --scan-cache on the SGame nodes (the node logs its hit rate)
+@pytest.mark.parametrize("numShips, burst", [(50, 10)])
+def test_repeated_scan_bench(server, bench, connected_ships, numShips, burst):
+    latencies = []
+    for token in connected_ships(numShips):
+        node = node_of(server, token)
+        scan = {'token': token, 'direction': 90.0, 'width': 10.0, 'energy': 1}
+        for i in range(burst):
+            start = time.time()
+            assert requests.post(node + 'scan', json=scan)
+            latencies.append(time.time() - start)
+
+    print(f'Repeated scan latency over {len(latencies)} scans: '
+          f'p50 = {percentile(latencies, 50):.4f}s, p99 = {percentile(latencies, 99):.4f}s')
+
+# scans sent with an X-Request-Id through the arbiter; if the cluster was started with --trace-file and the files are
+# passed with --trace-files, prints the timeline of the slowest ones
+@pytest.mark.parametrize("numShips, scansPerShip", [(20, 5)])
+def test_traced_scan_bench(server, bench, request, connected_ships, numShips, scansPerShip):
+    trace_ids = set()
+    for i, token in enumerate(connected_ships(numShips)):
+        for j in range(scansPerShip):
+            trace_id = f'bench-scan-{i}-{j}-{time.time():.0f}'
+            trace_ids.add(trace_id)
+            # (requests keeps the header when following the arbiter's redirect to the SGame node)
+            assert requests.post(server.url + 'scan', headers={'X-Request-Id': trace_id},
+                                 json={'token': token, 'direction': 90.0, 'width': 10.0, 'energy': 1})
+
+    trace_files = request.config.getoption('--trace-files')
+    if trace_files is None:
+        print(f'Sent {len(trace_ids)} traced scans; pass --trace-files to join their spans')
+        return
+    time.sleep(0.5) # (Let the nodes write out their spans)
+    traces = { trace_id: trace for trace_id, trace in tracejoin.join(tracejoin.load_spans(trace_files.split(','))).items()
+               if trace_id in trace_ids }
+    for trace_id, trace in sorted(traces.items(), key=lambda item: tracejoin.duration(item[1]), reverse=True)[:3]:
+        print(tracejoin.format_timeline(trace_id, trace))
+
+# with the SGame nodes started with --stepped: advances each node by a fixed number of ticks and reports the cost of
+# each tick as measured by the node, i.e. simulation throughput without timer jitter
+@pytest.mark.parametrize("numShips, ticks", [(500, 300)])
+def test_stepped_bench(server, bench, connected_ships, numShips, ticks):
+    nodes = set()
+    for token in connected_ships(numShips):
+        node = node_of(server, token)
+        nodes.add(node)
+        # (Keep the ships moving so that every tick integrates them)
+        assert requests.post(node + 'accelerate', json={'token': token, 'x': random.uniform(-1, 1), 'y': random.uniform(-1, 1)})
+
+    for node in sorted(nodes):
+        resp = requests.post(node + 'step', json={'ticks': ticks})
+        if resp.status_code == 400:
+            pytest.skip('stepped benchmark needs SGame nodes started with --stepped')
+        assert resp
+        result = resp.json()
+        print(f"{node}: {result['ships']} ships x {result['ticks']} ticks in {result['totalMs']:.3f}ms "
+              f"({result['shipTicksPerSecond']:.0f} ship-ticks/s); tick p50 = {percentile(result['tickMs'], 50):.4f}ms, "
+              f"p99 = {percentile(result['tickMs'], 99):.4f}ms")
+
+# populates a large world at once through the `scenario` route (instead of connect + sudo per ship)
+@pytest.mark.parametrize("numShips", [10000])
+def test_scenario_bench(server, bench, connected_ships, numShips):
+    ships = [ {'posX': random.uniform(-1e4, 1e4), 'posY': random.uniform(-1e4, 1e4), 'area': random.uniform(1, 10)}
+              for i in range(numShips) ]
+    start = time.time()
+    tokens = connected_ships.adopt(load_scenario(server, ships))
+    elapsed = time.time() - start
+    assert len(tokens) == numShips
+    print(f'Loaded {numShips} ships in {elapsed:.3f}s ({numShips / elapsed:.0f} ships/s)')
+
+# repeated shots into a dense fleet, with random shields; dominated by the shielding computation of each struck ship
+@pytest.mark.parametrize("numShips, numShots", [(2000, 50)])
+def test_dense_shot_bench(server, bench, connected_ships, numShips, numShots):
+    resp = requests.post(server.url + 'scenario', json={'ships': []})
+    if resp.status_code == 404:
+        pytest.skip('scenarios can only be loaded on a debug arbiter')
+    shooter = {'posX': 0.0, 'posY': 0.0, 'area': 100.0, 'energy': 1e9}
+    fleet = [ {'posX': random.uniform(20.0, 300.0), 'posY': random.uniform(-50.0, 50.0), 'area': 50.0,
+               'shieldDir': random.uniform(0.0, 360.0), 'shieldWidth': random.uniform(0.0, 180.0)}
+              for i in range(numShips) ]
+    tokens = connected_ships.adopt(load_scenario(server, [shooter] + fleet))
+    node = node_of(server, tokens[0])
+    shot = {'token': tokens[0], 'direction': 0.0, 'width': 15.0, 'energy': 100, 'damage': 1e-6}
+    latencies, struck = [], 0
+    for i in range(numShots):
+        start = time.time()
+        resp = requests.post(node + 'shoot', json=shot)
+        latencies.append(time.time() - start)
+        assert resp, resp.text
+        struck += len(resp.json()['struck'])
+    print(f'{numShots} shots into {numShips} ships ({struck / numShots:.0f} struck per shot): '
+          f'p50 = {percentile(latencies, 50):.4f}s, p99 = {percentile(latencies, 99):.4f}s')
@@ -7,7 +7,7 @@ import sys
 import pytest
 import requests
 import subprocess as sp
-from typing import Iterable
+from typing import Iterable, List
 from time import sleep
 
 
@@ -23,6 +23,10 @@ def pytest_addoption(parser):
                      type=int, help="Port to bind the SGame server instance to")
     parser.addoption("--persistence", action="store", default=None,
                      type=str, help="If defined this is the address of elastic search instance used for persistence")
+    parser.addoption("--bench", action="store_true", default=False,
+                     help="Also run the (slow) benchmarks")
+    parser.addoption("--trace-files", action="store", default=None,
+                     type=str, help="Comma-separated trace files written by the arbiter and SGame nodes (with --trace-file), for the tracing benchmark")
 
 
 # Test fixtures
@@ -55,6 +59,15 @@ def server(request) -> ServerFixture:
     yield ServerFixture(host, port)
 
 
+@pytest.fixture
+def bench(request):
+    """
+    Skips the test unless benchmarks were enabled with `--bench`.
+    """
+    if not request.config.getoption('--bench'):
+        pytest.skip('benchmarks are only run with --bench')
+
+
 class PersistenceFixture:
     """Parameters about the persistence server."""
 
@@ -143,3 +156,43 @@ def clients(server) -> ClientsFixture:
     ```
     """
     return ClientsFixture(server)  # Acts as a callable but it's actually a class...
+
+
+class ConnectedShipsFixture:
+    """A fixture that connects ships for a test, and disconnects all of them when the test is over."""
+
+    def __init__(self, server: ServerFixture):
+        self.server = server
+        self.tokens = []
+        """The tokens of all ships to disconnect."""
+
+    def __call__(self, n_ships: int) -> List[str]:
+        """Connects `n_ships` ships; returns their tokens."""
+        tokens = [requests.post(self.server.url + 'connect').json()['token'] for i in range(n_ships)]
+        return self.adopt(tokens)
+
+    def adopt(self, tokens: List[str]) -> List[str]:
+        """Also disconnects the ships with the given `tokens` (connected some other way) at the end; returns them."""
+        self.tokens.extend(tokens)
+        return tokens
+
+    def disconnect_all(self):
+        for token in self.tokens:
+            requests.post(self.server.url + 'disconnect', json={'token': token})
+        self.tokens = []
+
+
+@pytest.fixture
+def connected_ships(server) -> ConnectedShipsFixture:
+    """
+    Returns a callable that, when given the number `n` of ships to connect, connects them and returns their tokens;
+    all of them (and the ones passed to its `adopt()`) are disconnected after the test, whether it passed or not.
+    ```
+    def my_test(connected_ships):
+        tokens = connected_ships(100)
+        <do stuff with the ships>
+    ```
+    """
+    fixture = ConnectedShipsFixture(server)
+    yield fixture
+    fixture.disconnect_all()
@@ -0,0 +1,338 @@
+"""
+geometry.py: a NumPy-vectorised reference implementation of the scan/shoot geometry in SShared/MathUtils.cs, used by
+fuzz.py to check the server against many random cases at once.
+
+All functions take array_likes that are broadcast together (e.g. ship arrays of shape (N,) against sector arrays of
+shape (S, 1) to test every ship against every sector) and return arrays. Points are (x, y) pairs of arrays; angles are
+in radians. Each function mirrors its C# counterpart step by step, quirks included, so that any disagreement between
+the two is a change in the server's behaviour rather than in the maths.
+
+    python3 geometry.py [--ships 100000] [--sectors 100]
+
+prints how many (ship, sector) pairs per second this reference evaluates.
+"""
+
+import sys
+import time
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    # (NumPy is optional: `pytest *.py` also collects this module, and fuzz.py skips itself without NumPy)
+    np = None
+
+SCAN_ENERGY_SCALING_FACTOR = 2000
+"""As `MathUtils.SCAN_ENERGY_SCALING_FACTOR`."""
+
+SHIELD_EARLY_OUT_MARGIN = 1e-6
+"""As `MathUtils.SHIELD_EARLY_OUT_MARGIN`."""
+
+MINIMUM_AREA = 0.75
+"""As `LocalQuadTreeNode.MINIMUM_AREA`: ships shot below this area die."""
+
+
+def deg2rad(deg):
+    return np.asarray(deg, dtype=float) * np.pi / 180.0
+
+
+def ship_radius(area):
+    """As `Spaceship.Radius()`."""
+    return np.sqrt(np.asarray(area, dtype=float) / np.pi)
+
+
+def dir_vec(angle):
+    return np.cos(angle), np.sin(angle)
+
+
+def _dot(ax, ay, bx, by):
+    return ax * bx + ay * by
+
+
+def clamp_angle(angle):
+    """As `MathUtils.ClampAngle()`: to the 0 to 2*PI range."""
+    angle = np.fmod(angle, 2.0 * np.pi)
+    return np.where(angle < 0.0, 2.0 * np.pi + angle, angle)
+
+
+def normalize_angle(angle):
+    """As `MathUtils.NormalizeAngle()`: to the -PI to PI range (for angles in -3*PI to 3*PI)."""
+    return np.where(angle > np.pi, angle - 2.0 * np.pi, np.where(angle < -np.pi, angle + 2.0 * np.pi, angle))
+
+
+def ieee_remainder(x, y):
+    """As .NET's `Math.IEEERemainder()` (for finite, non-zero `y`)."""
+    regular = np.fmod(x, y)
+    alternative = regular - np.abs(y) * np.sign(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quotient = x / y
+    tie_alternative = np.abs(np.round(quotient)) > np.abs(quotient)
+    return np.where(np.abs(alternative) == np.abs(regular),
+                    np.where(tie_alternative, alternative, regular),
+                    np.where(np.abs(alternative) < np.abs(regular), alternative, regular))
+
+
+def _point_line_sign(point, line1, line2):
+    """As `MathUtils.pointLineSign()`."""
+    normal_x, normal_y = line2[1] - line1[1], -(line2[0] - line1[0])
+    return np.sign(_dot(normal_x, normal_y, point[0] - line1[0], point[1] - line1[1]))
+
+
+def _circle_triangle_side_intersection(centre, radius, line1, line2):
+    """As `MathUtils.CircleTriangleSideIntersection()`."""
+    line_x, line_y = line2[0] - line1[0], line2[1] - line1[1]
+    to_circle_x, to_circle_y = centre[0] - line1[0], centre[1] - line1[1]
+    along = _dot(to_circle_x, to_circle_y, line_x, line_y)
+    side_sq = _dot(line_x, line_y, line_x, line_y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        along_sq = along * along / side_sq
+    return (along > 0) & (along_sq < side_sq) & (_dot(to_circle_x, to_circle_y, to_circle_x, to_circle_y) - along_sq <= radius * radius)
+
+
+def circle_triangle_intersection(centre, radius, a, b, c):
+    """As `MathUtils.CircleTriangleIntersection()`: does the circle intersect the triangle `abc`?"""
+    radius_sq = radius * radius
+    hit = np.zeros(np.broadcast(centre[0], centre[1], radius, a[0], a[1], b[0], b[1], c[0], c[1]).shape, dtype=bool)
+    for point in (a, b, c):
+        dx, dy = point[0] - centre[0], point[1] - centre[1]
+        hit |= radius_sq >= _dot(dx, dy, dx, dy)
+
+    s_ab = _point_line_sign(centre, a, b)
+    s_bc = _point_line_sign(centre, b, c)
+    s_ca = _point_line_sign(centre, c, a)
+    hit |= (s_ab >= 0) & (s_bc >= 0) & (s_ca >= 0)
+    hit |= (s_ab <= 0) & (s_bc <= 0) & (s_ca <= 0)
+
+    hit |= _circle_triangle_side_intersection(centre, radius, a, b)
+    hit |= _circle_triangle_side_intersection(centre, radius, b, c)
+    hit |= _circle_triangle_side_intersection(centre, radius, c, a)
+    return hit
+
+
+def circle_segment_intersection(centre, circle_radius, segment_centre, segment_radius, segment_angle, segment_width):
+    """As `MathUtils.CircleSegmentIntersection()`: does the circle intersect the circle sector (of half-width
+    `segment_width` around `segment_angle`)?"""
+    dx, dy = centre[0] - segment_centre[0], centre[1] - segment_centre[1]
+    near = ~(circle_radius + segment_radius < np.sqrt(_dot(dx, dy, dx, dy)))
+
+    edge_distance = segment_width * 2
+    centre_angle = np.arctan2(dy, dx)
+    distance1 = np.abs((segment_angle - segment_width) - centre_angle)
+    distance1 = np.where(distance1 > np.pi, 2 * np.pi - distance1, distance1)
+    distance2 = np.abs((segment_angle + segment_width) - centre_angle)
+    distance2 = np.where(distance2 > np.pi, 2 * np.pi - distance2, distance2)
+    return near & ~(distance1 > edge_distance) & ~(distance2 > edge_distance)
+
+
+def scan_shoot_radius(width, energy):
+    """As `MathUtils.ScanShootRadius()` (`width` in radians)."""
+    return np.sqrt(np.asarray(energy, dtype=float) * SCAN_ENERGY_SCALING_FACTOR / (2 * np.asarray(width, dtype=float)))
+
+
+def shot_damage(scaled_energy, width, distance):
+    """As `MathUtils.ShotDamage()`."""
+    distance = np.maximum(distance, 1)
+    return scaled_energy / (np.maximum(1, np.power(2.0, 2 * width)) * np.sqrt(distance))
+
+
+def scanned(pos, radius, origin, direction, width, scan_radius):
+    """Are the ships at `pos` with `radius` caught in the scan (or shot) from `origin`? As the hit test in
+    `LocalQuadTreeNode.ScanShootLocal()`."""
+    left = tuple(o + component * scan_radius for o, component in zip(origin, dir_vec(direction + width)))
+    right = tuple(o + component * scan_radius for o, component in zip(origin, dir_vec(direction - width)))
+    return circle_triangle_intersection(pos, radius, origin, left, right) \
+        | circle_segment_intersection(pos, radius, origin, scan_radius, direction, width)
+
+
+def _circle_circle_intersection(centre1, radius1, centre2, radius2):
+    """As `MathUtils.CircleCircleIntersection()`; returns (hit, inters1, inters2, has_inters2)."""
+    delta_x, delta_y = centre1[0] - centre2[0], centre1[1] - centre2[1]
+    r_dist = np.sqrt(_dot(delta_x, delta_y, delta_x, delta_y))
+    dist_sign = np.sign(r_dist - (radius1 + radius2))
+    hit = ~((dist_sign == 1) | (r_dist + radius1 < radius2) | (r_dist + radius2 < radius1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r1r2_sq = radius1 * radius1 - radius2 * radius2
+        r_dist_sq = r_dist * r_dist
+        c1 = r1r2_sq / (2.0 * r_dist_sq)
+        k1_x = (centre1[0] + centre2[0]) * 0.5 + (centre2[0] - centre1[0]) * c1
+        k1_y = (centre1[1] + centre2[1]) * 0.5 + (centre2[1] - centre1[1]) * c1
+        single = (dist_sign == 0) | (r_dist + radius1 == radius2) | (r_dist + radius2 == radius1)
+        c2 = 0.5 * np.sqrt(2.0 * (radius1 * radius1 + radius2 * radius2) / r_dist_sq
+                           - (r1r2_sq * r1r2_sq) / (r_dist_sq * r_dist_sq) - 1.0)
+        k2_x, k2_y = (centre2[1] - centre1[1]) * c2, (centre1[0] - centre2[0]) * c2
+
+    inters1 = (np.where(single, k1_x, k1_x - k2_x), np.where(single, k1_y, k1_y - k2_y))
+    inters2 = (k1_x + k2_x, k1_y + k2_y)
+    return hit, inters1, inters2, hit & ~single
+
+
+def _ray_hit_circle_near(origin, direction, centre, radius):
+    """As `Ray(origin, direction).HitCircle()`; returns (hit, hit_near, has_hit_near)."""
+    dir_x, dir_y = dir_vec(direction)
+    q_x, q_y = origin[0] - centre[0], origin[1] - centre[1]
+    c2 = 2.0 * _dot(q_x, q_y, dir_x, dir_y)
+    c3 = _dot(q_x, q_y, q_x, q_y) - radius * radius
+    delta = c2 * c2 - 4.0 * 1.0 * c3
+    delta = np.where(np.abs(delta - 0.0) <= 0.001, np.abs(delta), delta)
+
+    with np.errstate(invalid='ignore'):
+        sqrt_delta = np.sqrt(delta)
+    t1 = (-c2 - sqrt_delta) / 2.0
+    t2 = (-c2 + sqrt_delta) / 2.0
+    tangent = delta == 0
+    t_near = np.where(tangent, -c2 / 2.0, t1)
+    has_near = np.where(tangent, -c2 >= 0, t1 >= 0.0)
+    hit = np.where(tangent, True, (delta > 0) & (has_near | (t2 >= 0.0)))
+    return hit, (origin[0] + dir_x * t_near, origin[1] + dir_y * t_near), has_near
+
+
+def shot_shield_intersection(shot_start, shot_stop, shield_dir, shield_width):
+    """As `MathUtils.ShotShieldIntersection()`: the fraction of the shot hitting a ship between the angles (from the
+    ship's centre) `shot_start` and `shot_stop` that its shield covers."""
+    shot_start, shot_stop = clamp_angle(shot_start), clamp_angle(shot_stop)
+    larger, smaller = np.maximum(shot_start, shot_stop), np.minimum(shot_start, shot_stop)
+    wraps = np.abs(shot_stop - shot_start) > np.pi
+    shot_start, shot_stop = np.where(wraps, larger, smaller), np.where(wraps, smaller, larger)
+
+    shield_start = clamp_angle(shield_dir - shield_width)
+    shield_stop = clamp_angle(shield_dir + shield_width)
+    shield_mid = clamp_angle(shield_dir)
+    larger, smaller = np.maximum(shield_start, shield_stop), np.minimum(shield_start, shield_stop)
+    wraps = (smaller > shield_mid) | (larger < shield_mid)
+    shield_start, shield_stop = np.where(wraps, larger, smaller), np.where(wraps, smaller, larger)
+
+    shot_stop = np.where(shot_stop < shot_start, shot_stop + 2 * np.pi, shot_stop)
+    shield_start = np.where(shield_start < shot_start, shield_start + 2 * np.pi, shield_start)
+    shield_stop = np.where(shield_stop < shot_start, shield_stop + 2 * np.pi, shield_stop)
+
+    # (The same sorting network as the server)
+    a0, a1, a2, a3 = shot_start, shot_stop, shield_start, shield_stop
+    a0, a1 = np.minimum(a0, a1), np.maximum(a0, a1)
+    a2, a3 = np.minimum(a2, a3), np.maximum(a2, a3)
+    a0, a2 = np.minimum(a0, a2), np.maximum(a0, a2)
+    a1, a3 = np.minimum(a1, a3), np.maximum(a1, a3)
+    a1, a2 = np.minimum(a1, a2), np.maximum(a1, a2)
+
+    shielded = np.select(
+        [a1 == shot_stop, a1 == shield_start],
+        [np.where(a2 == shield_stop, shot_stop - shot_start, 0.0), a2 - a1],
+        a1 - a0 + np.where(a2 == shield_start, a3 - a2, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return shielded / (shot_stop - shot_start)
+
+
+def shielding_amount(pos, area, shield_dir, shield_width, shot_origin, shot_dir, shot_width, shot_radius):
+    """As `MathUtils.ShieldingAmount()`: the fraction (0 to 1) of the shot's damage stopped by the ships' shields.
+    NaN where the server would fail (with "Raycast missed during shield calculation!")."""
+    pos_x, pos_y = np.asarray(pos[0], dtype=float), np.asarray(pos[1], dtype=float)
+    shield_dir, shield_width = np.asarray(shield_dir, dtype=float), np.asarray(shield_width, dtype=float)
+    shot_dir = normalize_angle(clamp_angle(np.asarray(shot_dir, dtype=float)))
+    ship_r = ship_radius(area)
+
+    delta_x, delta_y = pos_x - shot_origin[0], pos_y - shot_origin[1]
+    centre_dist = np.sqrt(_dot(delta_x, delta_y, delta_x, delta_y))
+    unshieldable = (shield_width < 0.001) | (centre_dist <= ship_r)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centre_angle = np.arctan2(delta_y, delta_x)
+        tg_angle = np.pi * 0.5 - np.arccos(ship_r / centre_dist)
+        visible_half_width = np.pi / 2 - tg_angle
+
+        # The shot can only hit the side of the ship visible from its origin
+        shield_to_shooter = np.abs(ieee_remainder(shield_dir - (centre_angle + np.pi), 2.0 * np.pi))
+        early = shield_width < np.pi - SHIELD_EARLY_OUT_MARGIN
+        fully = early & (shield_to_shooter + visible_half_width < shield_width - SHIELD_EARLY_OUT_MARGIN)
+        none = early & ~fully & (shield_to_shooter - visible_half_width > shield_width + SHIELD_EARLY_OUT_MARGIN)
+
+        tg_left = (pos_x - np.cos(centre_angle - visible_half_width) * ship_r, pos_y - np.sin(centre_angle - visible_half_width) * ship_r)
+        tg_right = (pos_x - np.cos(centre_angle + visible_half_width) * ship_r, pos_y - np.sin(centre_angle + visible_half_width) * ship_r)
+
+        cas2ss = normalize_angle(centre_angle - shot_dir)
+        tg_left_angle, tg_right_angle = -tg_angle + cas2ss, tg_angle + cas2ss
+        swap = tg_left_angle > tg_right_angle
+        tg_left_angle, tg_right_angle = np.where(swap, tg_right_angle, tg_left_angle), np.where(swap, tg_left_angle, tg_right_angle)
+        tg_left, tg_right = (tuple(np.where(swap, r, l) for l, r in zip(tg_left, tg_right)),
+                             tuple(np.where(swap, l, r) for l, r in zip(tg_left, tg_right)))
+
+        cap_hit, cap_left, cap_right, has_cap_right = _circle_circle_intersection(shot_origin, shot_radius, (pos_x, pos_y), ship_r)
+        cap_right = tuple(np.where(has_cap_right, r, l) for l, r in zip(cap_left, cap_right))
+        cap_dist1 = np.sqrt(_dot(cap_left[0] - tg_left[0], cap_left[1] - tg_left[1], cap_left[0] - tg_left[0], cap_left[1] - tg_left[1]))
+        cap_dist2 = np.sqrt(_dot(cap_right[0] - tg_left[0], cap_right[1] - tg_left[1], cap_right[0] - tg_left[0], cap_right[1] - tg_left[1]))
+        swap = cap_dist2 < cap_dist1
+        cap_left, cap_right = (tuple(np.where(swap, r, l) for l, r in zip(cap_left, cap_right)),
+                               tuple(np.where(swap, l, r) for l, r in zip(cap_left, cap_right)))
+
+        left_cap_x, left_cap_y = cap_left[0] - shot_origin[0], cap_left[1] - shot_origin[1]
+        right_cap_x, right_cap_y = cap_right[0] - shot_origin[0], cap_right[1] - shot_origin[1]
+        left_tg_x, left_tg_y = tg_left[0] - shot_origin[0], tg_left[1] - shot_origin[1]
+        right_tg_x, right_tg_y = tg_right[0] - shot_origin[0], tg_right[1] - shot_origin[1]
+        use_left_cap = cap_hit & (_dot(left_cap_x, left_cap_y, left_cap_x, left_cap_y) < _dot(left_tg_x, left_tg_y, left_tg_x, left_tg_y))
+        use_right_cap = cap_hit & (_dot(right_cap_x, right_cap_y, right_cap_x, right_cap_y) < _dot(right_tg_x, right_tg_y, right_tg_x, right_tg_y))
+        left_cap_angle = np.where(use_left_cap, normalize_angle(np.arctan2(left_cap_y, left_cap_x) - shot_dir), -np.inf)
+        right_cap_angle = np.where(use_right_cap, normalize_angle(np.arctan2(right_cap_y, right_cap_x) - shot_dir), np.inf)
+
+        tg_left_angle, tg_right_angle = normalize_angle(tg_left_angle), normalize_angle(tg_right_angle)
+        left_ray_angle = np.maximum(np.maximum(-shot_width, tg_left_angle), left_cap_angle)
+        right_ray_angle = np.minimum(np.minimum(tg_right_angle, shot_width), right_cap_angle)
+
+        left_hit, left_near, has_left_near = _ray_hit_circle_near(shot_origin, shot_dir + left_ray_angle, (pos_x, pos_y), ship_r)
+        right_hit, right_near, has_right_near = _ray_hit_circle_near(shot_origin, shot_dir + right_ray_angle, (pos_x, pos_y), ship_r)
+        valid = left_hit & right_hit & has_left_near & has_right_near
+
+        left_victim_hit = np.arctan2(left_near[1] - pos_y, left_near[0] - pos_x)
+        right_victim_hit = np.arctan2(right_near[1] - pos_y, right_near[0] - pos_x)
+        full = np.where(valid, shot_shield_intersection(left_victim_hit, right_victim_hit, shield_dir, shield_width), np.nan)
+
+    return np.select([unshieldable, fully, none], [0.0, 1.0, 0.0], full)
+
+
+def shot_damages(pos, area, shield_dir, shield_width, shot_origin, shot_dir, shot_width, shot_radius, scaled_energy):
+    """The damage that a shot deals to each ship it strikes (as `LocalQuadTreeNode.ScanShootLocal()`)."""
+    delta_x, delta_y = pos[0] - shot_origin[0], pos[1] - shot_origin[1]
+    distance = np.sqrt(_dot(delta_x, delta_y, delta_x, delta_y))
+    damage = shot_damage(scaled_energy, shot_width, distance)
+    shielding = shielding_amount(pos, area, shield_dir, shield_width, shot_origin, shot_dir, shot_width, shot_radius)
+    return damage * (1.0 - shielding)
+
+
+def random_fleet(rng, num_ships, extent):
+    """A random fleet of `num_ships` ships within `extent` of the origin; (pos, area, shield_dir, shield_width)."""
+    pos = (rng.uniform(-extent, extent, num_ships), rng.uniform(-extent, extent, num_ships))
+    area = rng.uniform(1.0, 50.0, num_ships)
+    shield_dir = rng.uniform(0.0, 2.0 * np.pi, num_ships)
+    shield_width = np.where(rng.random(num_ships) < 0.2, 0.0, rng.uniform(0.0, np.pi, num_ships))
+    return pos, area, shield_dir, shield_width
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure the throughput of the NumPy scan/shoot reference.')
+    parser.add_argument('--ships', type=int, default=100000, help='number of ships')
+    parser.add_argument('--sectors', type=int, default=100, help='number of scans/shots (each against all ships)')
+    parser.add_argument('--seed', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    pos, area, shield_dir, shield_width = random_fleet(rng, args.ships, 1000.0)
+    radius = ship_radius(area)
+    origins = (rng.uniform(-1000.0, 1000.0, (args.sectors, 1)), rng.uniform(-1000.0, 1000.0, (args.sectors, 1)))
+    directions = rng.uniform(0.0, 2.0 * np.pi, (args.sectors, 1))
+    widths = rng.uniform(0.01, np.pi / 2.0 - 0.01, (args.sectors, 1))
+    scan_radii = scan_shoot_radius(widths, rng.integers(1, 100, (args.sectors, 1)))
+
+    start = time.perf_counter()
+    hits = scanned(pos, radius, origins, directions, widths, scan_radii)
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shieldings = shielding_amount(pos, area, shield_dir, shield_width, origins, directions, widths, scan_radii)
+    shield_seconds = time.perf_counter() - start
+
+    pairs = args.ships * args.sectors
+    print(f'{pairs} (ship, sector) pairs: hit tests at {pairs / scan_seconds:.0f} pairs/s ({hits.mean() * 100.0:.2f}% hit), '
+          f'shielding at {pairs / shield_seconds:.0f} pairs/s ({np.isnan(shieldings[hits]).mean() * 100.0:.2f}% of hits '
+          f'would fail with a raycast miss)')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,176 @@
+"""
+replay.py: replays the REST requests recorded by the arbiter (with `--record`) against a (new) cluster, and reports
+the latency of each route compared with the recording, or with a previous replay.
+
+    python3 replay.py recording.jsonl --url http://localhost:8000/ [--speed 1.0] [--save run.json] [--baseline old.json]
+
+Requests are replayed with their original timing, scaled by `--speed` (2 replays twice as fast, 0 as fast as
+possible). The requests of each ship are replayed in order, by the same worker; ship tokens in the recording are
+remapped to the tokens returned by the new cluster's `connect`.
+
+The recording only has the arbiter's serving times, so it is only a baseline for the routes the arbiter serves itself:
+for the ones it forwards to the SGame nodes, it only timed the redirect. Compare those with a previous replay instead
+(`--save` it, then pass it as `--baseline`).
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import requests
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def load_recording(path):
+    """Reads the requests in a recording (one JSON object per line), sorted by time."""
+    records = []
+    with open(path) as recording:
+        for line in recording:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+def sessions_of(records):
+    """Splits the records into sessions that must be replayed in order: one per ship (from its `connect` on), plus
+    one for the requests that are not about a known ship."""
+    sessions = OrderedDict()
+    for record in records:
+        if record['route'] == 'connect' and 'token' in record:
+            key = record['token']
+        else:
+            body = record.get('body') or {}
+            key = body.get('token') if body.get('token') in sessions else None
+        sessions.setdefault(key, []).append(record)
+    return list(sessions.values())
+
+
+class Replayer:
+    """Replays sessions of recorded requests against `url`."""
+
+    def __init__(self, url, speed):
+        self.url = url
+        self.speed = speed
+        self.tokens = {}
+        """Recorded token -> token returned by the new cluster."""
+        self.latencies = defaultdict(list)
+        """Route -> replayed latencies, in milliseconds."""
+        self.recorded = defaultdict(list)
+        """Route -> recorded latencies, in milliseconds (as measured by the arbiter)."""
+        self.forwarded = set()
+        """Routes that the arbiter forwarded to an SGame node (with a 307) in the recording."""
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        """Route -> status code -> count, for mismatching statuses."""
+        self.lock = threading.Lock()
+        self.start = None
+
+    def remap(self, body):
+        if body is None:
+            return None
+        body = dict(body)
+        if 'token' in body:
+            with self.lock:
+                body['token'] = self.tokens.get(body['token'], body['token'])
+        return body
+
+    def replay_session(self, session):
+        http = requests.Session()
+        for record in session:
+            if self.speed > 0:
+                delay = self.start + record['t'] / self.speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            sent = time.time()
+            try:
+                resp = http.post(self.url + record['route'], json=self.remap(record.get('body')))
+                status = resp.status_code
+            except requests.RequestException:
+                resp, status = None, 0
+            latency = 1000.0 * (time.time() - sent)
+
+            with self.lock:
+                route = record['route']
+                self.latencies[route].append(latency)
+                if record.get('status') == 307:
+                    self.forwarded.add(route)
+                else:
+                    self.recorded[route].append(record.get('ms', 0.0))
+                # (Redirects are followed, so a recorded 307 should now be the SGame node's answer)
+                if status != record.get('status') and not (record.get('status') == 307 and status == 200):
+                    self.statuses[route][status] += 1
+                if route == 'connect' and 'token' in record and resp is not None and resp.ok:
+                    self.tokens[record['token']] = resp.json().get('token')
+
+    def run(self, sessions, workers):
+        self.start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [ executor.submit(self.replay_session, session) for session in sessions ]:
+                future.result()
+        return time.time() - self.start
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))] if values else 0.0
+
+
+def summarize(latencies):
+    """Route -> {count, p50, p99} (in milliseconds)."""
+    return { route: { 'count': len(values), 'p50': percentile(values, 50), 'p99': percentile(values, 99) }
+             for route, values in latencies.items() }
+
+
+def report(replayed, baseline, baseline_name):
+    print(f"{'route':<14} {'count':>7} {'p50 ms':>9} {'p99 ms':>9}   {baseline_name + ' p50':>14} {baseline_name + ' p99':>14}")
+    for route in sorted(replayed):
+        now, then = replayed[route], baseline.get(route)
+        line = f"{route:<14} {now['count']:>7} {now['p50']:>9.3f} {now['p99']:>9.3f}"
+        if then is not None:
+            line += f"   {then['p50']:>14.3f} {then['p99']:>14.3f}  ({now['p50'] - then['p50']:+.3f} / {now['p99'] - then['p99']:+.3f})"
+        print(line)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Replay a recording of REST requests against a cluster.')
+    parser.add_argument('recording', help='file written by the arbiter with --record')
+    parser.add_argument('--url', default='http://localhost:8000/', help='base URL of the arbiter to replay against')
+    parser.add_argument('--speed', type=float, default=1.0, help='time scaling (2 = twice as fast, 0 = as fast as possible)')
+    parser.add_argument('--workers', type=int, default=64, help='maximum number of sessions replayed concurrently')
+    parser.add_argument('--save', default=None, help='save the latency summary of this replay to this file')
+    parser.add_argument('--baseline', default=None, help='compare with the latency summary of a previous replay')
+    args = parser.parse_args(argv)
+
+    records = load_recording(args.recording)
+    sessions = sessions_of(records)
+    replayer = Replayer(args.url, args.speed)
+    elapsed = replayer.run(sessions, args.workers)
+    print(f'Replayed {len(records)} requests in {len(sessions)} sessions in {elapsed:.3f}s '
+          f'(recorded over {records[-1]["t"] - records[0]["t"] if records else 0.0:.3f}s)')
+
+    replayed = summarize(replayer.latencies)
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            report(replayed, json.load(baseline_file), 'baseline')
+    else:
+        # (The recorded times of forwarded routes are only the time to redirect them: not comparable)
+        recorded = { route: summary for route, summary in summarize(replayer.recorded).items()
+                     if route not in replayer.forwarded }
+        report(replayed, recorded, 'recorded')
+        if replayer.forwarded:
+            print(f'No recorded baseline for the routes forwarded to SGame nodes ({", ".join(sorted(replayer.forwarded))}): '
+                  f'compare them with a previous replay (--save, then --baseline)')
+    for route, statuses in sorted(replayer.statuses.items()):
+        print(f'{route}: unexpected statuses {dict(statuses)}')
+
+    if args.save is not None:
+        with open(args.save, 'w') as save_file:
+            json.dump(replayed, save_file, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+"""
+tracejoin.py: joins the spans recorded by the arbiter and the SGame nodes (with `--trace-file`) into one timeline
+per traced request.
+
+    python3 tracejoin.py arbiter.trace node1.trace node2.trace [--trace ID] [--slowest N]
+"""
+
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+
+def load_spans(paths):
+    """Reads the spans in all the given trace files (one JSON object per line)."""
+    spans = []
+    for path in paths:
+        with open(path) as trace_file:
+            for line in trace_file:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    return spans
+
+
+def join(spans):
+    """Groups spans by trace id; returns a dict of trace id -> spans sorted by start time."""
+    traces = defaultdict(list)
+    for span in spans:
+        traces[span['trace']].append(span)
+    for trace in traces.values():
+        trace.sort(key=lambda span: (span['start'], -span['end']))
+    return dict(traces)
+
+
+def duration(trace):
+    """Returns the time from the first span's start to the last span's end, in seconds."""
+    return max(span['end'] for span in trace) - min(span['start'] for span in trace)
+
+
+def format_timeline(trace_id, trace):
+    """Formats the spans of a trace as a timeline, in milliseconds since the first one started.
+    Gaps between consecutive spans (e.g. a redirect followed by the client, or a request queued on a node) are shown
+    as such."""
+    origin = min(span['start'] for span in trace)
+    lines = [f'trace {trace_id}: {1000.0 * duration(trace):.3f}ms, {len(trace)} spans']
+    covered = origin
+    for span in trace:
+        start = 1000.0 * (span['start'] - origin)
+        end = 1000.0 * (span['end'] - origin)
+        if span['start'] > covered:
+            lines.append(f'  {1000.0 * (covered - origin):9.3f} .. {start:9.3f}  ({start - 1000.0 * (covered - origin):.3f}ms untraced)')
+        detail = f"  [{span['detail']}]" if span.get('detail') else ''
+        lines.append(f"  {start:9.3f} .. {end:9.3f}  {span['node']} {span['span']} ({end - start:.3f}ms){detail}")
+        covered = max(covered, span['end'])
+    return '\n'.join(lines)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Join the trace files of the arbiter and the SGame nodes.')
+    parser.add_argument('files', nargs='+', help='trace files written with --trace-file')
+    parser.add_argument('--trace', default=None, help='only show the trace with this id')
+    parser.add_argument('--slowest', type=int, default=None, help='only show the N slowest traces')
+    args = parser.parse_args(argv)
+
+    traces = join(load_spans(args.files))
+    if args.trace is not None:
+        traces = {args.trace: traces[args.trace]} if args.trace in traces else {}
+    ordered = sorted(traces.items(), key=lambda item: duration(item[1]), reverse=True)
+    if args.slowest is not None:
+        ordered = ordered[:args.slowest]
+    for trace_id, trace in ordered:
+        print(format_timeline(trace_id, trace))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])